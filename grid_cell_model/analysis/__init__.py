@@ -12,6 +12,7 @@ A collection of modules/packages that deal with data analysis:
     image
     signal
     spikes
+    twisted_torus
 '''
 
 __all__ = [
@@ -25,4 +26,5 @@ __all__ = [
     'signal',
     'spikes',
     'statistics',
+    'twisted_torus',
 ]
@@ -0,0 +1,378 @@
+'''Online tracking of a bump attractor on the twisted torus.
+
+.. currentmodule:: grid_cell_model.analysis.bump_tracking
+
+:meth:`SingleBumpPopulation.bumpPosition
+<grid_cell_model.analysis.image.SingleBumpPopulation.bumpPosition>` needs all
+the spikes of the population and fits a Gaussian to each time window
+independently, every time from the maximum of the firing rate. The
+:class:`OnlineBumpTracker` ingests the spikes in time order, in chunks of any
+size, and keeps only an exponentially decayed firing rate of each neuron. At
+every step of ``dt`` it updates the bump estimate starting from the estimate of
+the previous step, with one of the methods:
+
+ * ``'gaussian'``: least squares fit of a Gaussian, warm started from the
+   previous estimate,
+ * ``'mean'``: a few weighted mean steps (mean shift) of the twisted torus
+   displacements around the previous position; the width is then chosen from
+   a fixed grid and the amplitude and baseline by linear least squares. This
+   does not need an optimiser and is considerably faster.
+
+The memory used does not depend on the length of the recording, so the tracker
+can be updated between the segments of a simulation (it can be pickled
+together with a checkpoint) or fed with a very long recording chunk by chunk.
+
+Classes
+-------
+
+.. autosummary::
+
+    BumpEstimate
+    OnlineBumpTracker
+
+Functions
+---------
+
+.. autosummary::
+
+    wrapTwistedTorus
+    twistedTorusDisplacement
+    trackBump
+'''
+from __future__ import absolute_import, print_function, division
+
+import collections
+
+import numpy as np
+import scipy.optimize
+
+__all__ = ['BumpEstimate', 'OnlineBumpTracker', 'wrapTwistedTorus',
+           'twistedTorusDisplacement', 'trackBump']
+
+METHODS = ('gaussian', 'mean')
+'''Methods of the bump estimation.'''
+
+
+class BumpEstimate(collections.namedtuple('BumpEstimate',
+                                          ['t', 'A', 'mu_x', 'mu_y', 'sigma',
+                                           'err2'])):
+    '''Bump estimate at time ``t`` (ms).
+
+    ``A`` is the amplitude (Hz), ``mu_x`` and ``mu_y`` the position and
+    ``sigma`` the width of the bump (neurons), ``err2`` the sum of squared
+    errors of the Gaussian with these parameters.'''
+    __slots__ = ()
+
+
+def wrapTwistedTorus(x, y, dims):
+    '''Map positions into the fundamental domain of the twisted torus.
+
+    Moving by ``Ny`` in the Y direction shifts the position by ``Nx / 2`` in
+    the X direction.
+
+    Parameters
+    ----------
+    x, y : float or np.ndarray
+        Positions.
+    dims : tuple
+        Size of the torus (Nx, Ny).
+
+    Returns
+    -------
+    x, y : float or np.ndarray
+        Positions with 0 <= x < Nx and 0 <= y < Ny.
+    '''
+    Nx, Ny = float(dims[0]), float(dims[1])
+    wraps = np.floor(np.asarray(y) / Ny)
+    return np.mod(x - wraps * Nx / 2., Nx), np.mod(y - wraps * Ny, Ny)
+
+
+def twistedTorusDisplacement(mu_x, mu_y, X, Y, dims):
+    '''Shortest displacements from a position to points on a twisted torus.
+
+    The torus is twisted in the X direction, as in
+    :func:`~grid_cell_model.analysis.image.remapTwistedTorus`; the position
+    and the points are first mapped by :func:`wrapTwistedTorus`.
+
+    Parameters
+    ----------
+    mu_x, mu_y : float
+        The position.
+    X, Y : np.ndarray
+        Coordinates of the points.
+    dims : tuple
+        Size of the torus (Nx, Ny).
+
+    Returns
+    -------
+    dx, dy : np.ndarray
+        Displacements from (``mu_x``, ``mu_y``) to the points.
+    '''
+    Nx, Ny = float(dims[0]), float(dims[1])
+    X, Y = wrapTwistedTorus(X, Y, dims)
+    mu_x, mu_y = wrapTwistedTorus(mu_x, mu_y, dims)
+    dx0 = X - mu_x
+    dy0 = Y - mu_y
+    shifts = ((0., 0.), (Nx, 0.), (-Nx, 0.), (-.5 * Nx, Ny), (.5 * Nx, Ny),
+              (-.5 * Nx, -Ny), (.5 * Nx, -Ny))
+    dx = dx0.copy()
+    dy = dy0.copy()
+    best = dx ** 2 + dy ** 2
+    for sx, sy in shifts[1:]:
+        cx = dx0 + sx
+        cy = dy0 + sy
+        d2 = cx ** 2 + cy ** 2
+        closer = d2 < best
+        dx[closer] = cx[closer]
+        dy[closer] = cy[closer]
+        best[closer] = d2[closer]
+    return dx, dy
+
+
+class OnlineBumpTracker(object):
+    '''Estimates the bump position from a stream of spikes.
+
+    Parameters
+    ----------
+    sheetSize : tuple
+        Size of the neural sheet (Nx, Ny). Neuron ``n`` is at the position
+        (``n % Nx``, ``n // Nx``).
+    dt : float
+        Time step of the estimates (ms).
+    tau : float
+        Time constant of the exponential decay of the firing rates (ms).
+    tStart : float, optional
+        Time of the start of the tracking (ms). The first estimate is at
+        ``tStart + dt``.
+    method : str, optional
+        ``'gaussian'`` or ``'mean'``.
+    meanSteps : int, optional
+        Number of mean shift steps of the ``'mean'`` method.
+    reseed : float, optional
+        If the firing rate not explained by the estimated bump exceeds this
+        fraction of the maximal firing rate (e.g. the bump has jumped), the
+        estimate is restarted from the maximum of the firing rate.
+    '''
+    def __init__(self, sheetSize, dt, tau, tStart=0., method='gaussian',
+                 meanSteps=3, reseed=.5):
+        if method not in METHODS:
+            raise ValueError("Unknown method '{0}'. Use one of {1}.".format(
+                method, METHODS))
+        if dt <= 0 or tau <= 0:
+            raise ValueError('dt and tau must be positive.')
+        self.Nx, self.Ny = int(sheetSize[0]), int(sheetSize[1])
+        self.dt = float(dt)
+        self.tau = float(tau)
+        self.tStart = float(tStart)
+        self.method = method
+        self.meanSteps = int(meanSteps)
+        self.reseed = float(reseed)
+
+        X, Y = np.meshgrid(np.arange(self.Nx), np.arange(self.Ny))
+        self._X = X.ravel().astype(float)
+        self._Y = Y.ravel().astype(float)
+        self._rate = np.zeros(self.Nx * self.Ny)
+        self._step = 0
+        self._pendingSenders = np.zeros(0, dtype=int)
+        self._pendingTimes = np.zeros(0)
+        self._estimate = None
+        # Candidate bump widths of the 'mean' method
+        self._sigmas = np.logspace(np.log10(.5),
+                                   np.log10(max(self.Nx, self.Ny) / 4.), 24)
+
+    @property
+    def t(self):
+        '''Time of the last estimate (ms).'''
+        return self.tStart + self._step * self.dt
+
+    @property
+    def rate(self):
+        '''The decayed firing rates (Hz), shape (Ny, Nx).'''
+        return self._rate.reshape((self.Ny, self.Nx))
+
+    @property
+    def estimate(self):
+        '''The last :class:`BumpEstimate`, or ``None``.'''
+        return self._estimate
+
+    def update(self, senders, times, tEnd=None):
+        '''Ingest spikes and estimate the bump at all the completed steps.
+
+        Parameters
+        ----------
+        senders, times : np.ndarray
+            Spikes, ordered in time, none of them earlier than the last
+            estimate.
+        tEnd : float, optional
+            Time up to which all the spikes have been ingested. Default is the
+            time of the last spike.
+
+        Returns
+        -------
+        estimates : list of BumpEstimate
+            Estimates at the steps up to ``tEnd``.
+        '''
+        senders = np.asarray(senders, dtype=int).ravel()
+        times = np.asarray(times, dtype=float).ravel()
+        if len(senders) != len(times):
+            raise ValueError('senders and times must have the same length.')
+        if len(times) != 0:
+            if np.any(times < self.t):
+                raise ValueError('Spikes must not precede the last estimate '
+                                 '(t = {0} ms).'.format(self.t))
+            if np.any((senders < 0) | (senders >= len(self._rate))):
+                raise ValueError('Senders out of the sheet.')
+            self._pendingSenders = np.concatenate((self._pendingSenders,
+                                                   senders))
+            self._pendingTimes = np.concatenate((self._pendingTimes, times))
+            if tEnd is None:
+                tEnd = np.max(times)
+        if tEnd is None:
+            return []
+
+        estimates = []
+        # Tolerance for the rounding of tStart + n*dt
+        eps = 1e-9 * self.dt
+        while self.t + self.dt <= tEnd + eps:
+            self._advance(self.t + self.dt)
+            estimates.append(self._estimate)
+        return estimates
+
+    def _advance(self, tNext):
+        '''Decay the rates to ``tNext`` and add the spikes up to it.'''
+        idx = self._pendingTimes <= tNext
+        weights = np.exp(-(tNext - self._pendingTimes[idx]) / self.tau)
+        self._rate *= np.exp(-self.dt / self.tau)
+        self._rate += np.bincount(self._pendingSenders[idx], weights=weights,
+                                  minlength=len(self._rate)) * (1e3 / self.tau)
+        self._pendingSenders = self._pendingSenders[~idx]
+        self._pendingTimes = self._pendingTimes[~idx]
+        self._step += 1
+
+        estimate = self._fitGaussian if self.method == 'gaussian' else \
+            self._meanShift
+        if self._estimate is None or not self._valid(self._estimate):
+            self._estimate = estimate(self._initialEstimate(), tNext)
+            return
+
+        est = estimate(self._estimate, tNext)
+        if self._valid(est):
+            residual = self._rate - self._gaussian(est.A, est.mu_x, est.mu_y,
+                                                   est.sigma)
+            if np.max(residual) <= self.reseed * np.max(self._rate):
+                self._estimate = est
+                return
+        self._estimate = estimate(self._initialEstimate(), tNext)
+
+    def _valid(self, est):
+        return (np.isfinite(est.A) and est.A > 0 and
+                np.isfinite(est.sigma) and
+                0 < est.sigma < max(self.Nx, self.Ny))
+
+    def _initialEstimate(self):
+        '''Start from the maximum of the rates, as
+        :func:`~grid_cell_model.analysis.image.fitGaussianBumpTT` does.'''
+        n = np.argmax(self._rate)
+        return BumpEstimate(self.t, self._rate[n], self._X[n], self._Y[n],
+                            max(self.Nx, self.Ny) / 4., np.nan)
+
+    def _gaussian(self, A, mu_x, mu_y, sigma):
+        dx, dy = twistedTorusDisplacement(mu_x, mu_y, self._X, self._Y,
+                                          (self.Nx, self.Ny))
+        return A * np.exp(-(dx ** 2 + dy ** 2) / 2. / sigma ** 2)
+
+    def _result(self, t, A, mu_x, mu_y, sigma):
+        err2 = np.sum((self._gaussian(A, mu_x, mu_y, sigma) - self._rate) ** 2)
+        mu_x, mu_y = wrapTwistedTorus(mu_x, mu_y, (self.Nx, self.Ny))
+        return BumpEstimate(t, A, float(mu_x), float(mu_y), sigma, err2)
+
+    def _fitGaussian(self, init, t):
+        def residuals(x):
+            return self._gaussian(np.abs(x[0]), x[1], x[2], x[3]) - self._rate
+
+        x0 = np.array([init.A, init.mu_x, init.mu_y, init.sigma])
+        xest, _ = scipy.optimize.leastsq(residuals, x0)
+        return self._result(t, np.abs(xest[0]), xest[1], xest[2],
+                            np.abs(xest[3]))
+
+    def _meanShift(self, init, t):
+        F = self._rate - np.median(self._rate)
+        F[F < 0] = 0
+        if not np.any(F > 0):
+            return BumpEstimate(t, 0., init.mu_x, init.mu_y, np.nan, np.nan)
+
+        mu_x, mu_y = init.mu_x, init.mu_y
+        s2 = np.clip(init.sigma, 1., max(self.Nx, self.Ny) / 4.) ** 2
+        for _ in range(self.meanSteps):
+            dx, dy = twistedTorusDisplacement(mu_x, mu_y, self._X, self._Y,
+                                              (self.Nx, self.Ny))
+            w = F * np.exp(-(dx ** 2 + dy ** 2) / 2. / s2)
+            wSum = np.sum(w)
+            if wSum == 0:
+                break
+            mu_x += np.dot(w, dx) / wSum
+            mu_y += np.dot(w, dy) / wSum
+
+        # Width: the best of the candidate widths, with the amplitude and the
+        # background rate by linear least squares
+        dx, dy = twistedTorusDisplacement(mu_x, mu_y, self._X, self._Y,
+                                          (self.Nx, self.Ny))
+        d2 = dx ** 2 + dy ** 2
+        best = None
+        for sigma in self._sigmas:
+            g = np.exp(-d2 / 2. / sigma ** 2)
+            M = np.column_stack((g, np.ones_like(g)))
+            coef, res, _, _ = np.linalg.lstsq(M, self._rate, rcond=-1)
+            err = np.sum((np.dot(M, coef) - self._rate) ** 2)
+            if best is None or err < best[0]:
+                best = (err, coef[0], sigma)
+        _, A, sigma = best
+        return self._result(t, A, mu_x, mu_y, sigma)
+
+
+def trackBump(senders, times, sheetSize, tStart, tEnd, dt, tau,
+              method='gaussian', chunk=None):
+    '''Track the bump through a whole recording.
+
+    Parameters
+    ----------
+    senders, times : np.ndarray
+        Spikes of the population, ordered in time.
+    sheetSize : tuple
+        Size of the neural sheet (Nx, Ny).
+    tStart, tEnd : float
+        Time span of the tracking (ms).
+    dt, tau, method
+        See :class:`OnlineBumpTracker`.
+    chunk : float, optional
+        Length of the chunks of spikes passed to the tracker (ms); the whole
+        span at once if ``None``.
+
+    Returns
+    -------
+    track : dict
+        Arrays ``times``, ``A``, ``mu_x``, ``mu_y``, ``sigma`` and ``err2Sum``
+        (as in the output of the ``BumpPositionVisitor``).
+    '''
+    tracker = OnlineBumpTracker(sheetSize, dt, tau, tStart=tStart,
+                                method=method)
+    times = np.asarray(times)
+    senders = np.asarray(senders)
+    if chunk is None:
+        chunk = tEnd - tStart
+    estimates = []
+    start = np.searchsorted(times, tStart, side='left')
+    chunkStart = tStart
+    while chunkStart < tEnd:
+        chunkEnd = min(chunkStart + chunk, tEnd)
+        end = np.searchsorted(times, chunkEnd, side='right')
+        estimates.extend(tracker.update(senders[start:end], times[start:end],
+                                        tEnd=chunkEnd))
+        start = end
+        chunkStart = chunkEnd
+
+    track = dict((name, np.array([getattr(e, name) for e in estimates]))
+                 for name in ('A', 'mu_x', 'mu_y', 'sigma'))
+    track['times'] = np.array([e.t for e in estimates])
+    track['err2Sum'] = np.array([e.err2 for e in estimates])
+    return track
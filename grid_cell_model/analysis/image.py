@@ -40,29 +40,12 @@ import numpy as np
 import scipy.optimize
 
 from . import spikes
+from .twisted_torus import Position2D
 
 
 logger = logging.getLogger(__name__)
 
 
-class Position2D(object):
-
-    def __init__(self, x=None, y=None):
-        self.x = x
-        self.y = y
-
-        if not isinstance(x, float) and isinstance(y, float):
-            if len(x) != len(y):
-                msg = "Position2D: x and y parameters must have the same length: %d != %d."
-                logger.warn(msg, len(x), len(y))
-
-    def __str__(self):
-        return "Position2D: x: " + str(self.x) + ", y: " + str(self.y)
-
-    def __len__(self):
-        return len(self.x)
-
-
 class FittingParams(object):
     __meta__ = ABCMeta
 
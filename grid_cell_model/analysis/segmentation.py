@@ -0,0 +1,523 @@
+'''Data-driven segmentation of parameter sweeps into regimes.
+
+.. currentmodule:: grid_cell_model.analysis.segmentation
+
+:class:`~grid_cell_model.analysis.clustering.ThresholdClusters` segments a
+parameter sweep by hand-chosen, axis-aligned thresholds. Here the sweep points
+are clustered by all their features at once (gridness scores, gamma power and
+frequency, bump fraction, firing rates, each possibly at several noise
+levels):
+
+ 1. The features are averaged over trials and standardised.
+ 2. The points are clustered, either by k-means or by a mixture of Gaussians
+    with full covariance matrices. Both are implemented here, only with NumPy.
+ 3. The cluster probabilities are smoothed over the sweep grid (a mean field
+    approximation of a Potts model), so that isolated points take the label of
+    their neighbours unless their features are clearly different.
+ 4. The trials are resampled with replacement and steps 1-3 repeated. The
+    stability of a point is the fraction of the resamples in which it gets
+    the same label as with all the trials.
+
+Example::
+
+    features = [gridness.getTrialData()[0], gammaPower.getTrialData()[0],
+                isBump.getTrialData()[0]]
+    seg = segmentSweep(features, 3, method='gmm', seed=0)
+    unstable = seg.stability < .8
+
+Classes
+-------
+
+.. autosummary::
+
+    SweepSegmentation
+
+Functions
+---------
+
+.. autosummary::
+
+    segmentSweep
+    kMeans
+    gaussianMixture
+    smoothProbabilities
+    alignLabels
+'''
+from __future__ import absolute_import, print_function, division
+
+import logging
+
+import numpy as np
+
+from .clustering import ClusteredData
+
+__all__ = ['SweepSegmentation', 'segmentSweep', 'kMeans', 'gaussianMixture',
+           'smoothProbabilities', 'alignLabels']
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('kmeans', 'gmm')
+'''Clustering methods of :func:`segmentSweep`.'''
+
+
+def _getRng(rng):
+    if isinstance(rng, np.random.RandomState):
+        return rng
+    return np.random.RandomState(rng)
+
+
+def _sqDistances(data, centers):
+    '''Squared distances of all the points to all the centers.'''
+    d2 = (np.sum(data ** 2, axis=1)[:, np.newaxis] -
+          2 * np.dot(data, centers.T) +
+          np.sum(centers ** 2, axis=1)[np.newaxis, :])
+    return np.maximum(d2, 0)
+
+
+def _kMeansPlusPlus(data, nClusters, rng):
+    '''Initial centers, chosen far from each other.'''
+    centers = [data[rng.randint(len(data))]]
+    for _ in range(1, nClusters):
+        d2 = np.min(_sqDistances(data, np.array(centers)), axis=1)
+        if np.sum(d2) == 0:
+            centers.append(data[rng.randint(len(data))])
+        else:
+            centers.append(data[rng.choice(len(data), p=d2 / np.sum(d2))])
+    return np.array(centers)
+
+
+def kMeans(data, nClusters, nInit=10, maxIter=100, tol=1e-6, rng=None):
+    '''Cluster the data by k-means.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data points, shape (points, features).
+    nClusters : int
+        Number of clusters.
+    nInit : int, optional
+        Number of runs from k-means++ initial centers; the run with the
+        lowest inertia is returned.
+    maxIter : int, optional
+        Maximal number of iterations of each run.
+    tol : float, optional
+        A run stops when the centers move less than ``tol``.
+    rng : int or np.random.RandomState, optional
+        Random number generator or its seed.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Cluster of each point.
+    centers : np.ndarray
+        Cluster centers, shape (nClusters, features).
+    inertia : float
+        Sum of squared distances of the points to their centers.
+    '''
+    data = np.asarray(data, dtype=float)
+    if len(data) < nClusters:
+        raise ValueError('Fewer points ({0}) than clusters ({1})'.format(
+            len(data), nClusters))
+    rng = _getRng(rng)
+
+    best = None
+    for _ in range(nInit):
+        centers = _kMeansPlusPlus(data, nClusters, rng)
+        for _ in range(maxIter):
+            labels = np.argmin(_sqDistances(data, centers), axis=1)
+            newCenters = centers.copy()
+            for k in range(nClusters):
+                members = labels == k
+                if np.any(members):
+                    newCenters[k] = np.mean(data[members], axis=0)
+            shift = np.max(np.abs(newCenters - centers))
+            centers = newCenters
+            if shift < tol:
+                break
+        d2 = _sqDistances(data, centers)
+        labels = np.argmin(d2, axis=1)
+        inertia = np.sum(d2[np.arange(len(data)), labels])
+        if best is None or inertia < best[2]:
+            best = (labels, centers, inertia)
+    return best
+
+
+def _logGaussians(data, means, covs):
+    '''Log densities of all the points in all the Gaussians.'''
+    nPoints, nDims = data.shape
+    logp = np.empty((nPoints, len(means)))
+    for k, (mean, cov) in enumerate(zip(means, covs)):
+        L = np.linalg.cholesky(cov)
+        z = np.linalg.solve(L, (data - mean).T)
+        logDet = 2 * np.sum(np.log(np.diag(L)))
+        logp[:, k] = -.5 * (np.sum(z ** 2, axis=0) + logDet +
+                            nDims * np.log(2 * np.pi))
+    return logp
+
+
+def _normalizeLog(logp):
+    '''Normalised probabilities and the log of the normalisation.'''
+    m = np.max(logp, axis=1)[:, np.newaxis]
+    p = np.exp(logp - m)
+    s = np.sum(p, axis=1)[:, np.newaxis]
+    return p / s, (m + np.log(s)).ravel()
+
+
+def gaussianMixture(data, nClusters, nInit=3, maxIter=200, tol=1e-6,
+                    regCovar=1e-6, rng=None):
+    '''Fit a mixture of Gaussians by expectation maximisation.
+
+    Each run starts from the clusters of :func:`kMeans`.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data points, shape (points, features).
+    nClusters : int
+        Number of mixture components.
+    nInit : int, optional
+        Number of runs; the run with the highest likelihood is returned.
+    maxIter : int, optional
+        Maximal number of iterations of each run.
+    tol : float, optional
+        A run stops when the mean log-likelihood improves by less than
+        ``tol``.
+    regCovar : float, optional
+        Added to the diagonals of the covariance matrices, to keep them
+        positive definite.
+    rng : int or np.random.RandomState, optional
+        Random number generator or its seed.
+
+    Returns
+    -------
+    resp : np.ndarray
+        Probabilities of the components for each point, shape (points,
+        nClusters).
+    weights : np.ndarray
+        Weights of the components.
+    means : np.ndarray
+        Means of the components, shape (nClusters, features).
+    covs : np.ndarray
+        Covariance matrices, shape (nClusters, features, features).
+    logLik : float
+        Mean log-likelihood of the points.
+    '''
+    data = np.asarray(data, dtype=float)
+    nPoints, nDims = data.shape
+    rng = _getRng(rng)
+    reg = regCovar * np.eye(nDims)
+
+    best = None
+    for _ in range(nInit):
+        labels, _, _ = kMeans(data, nClusters, nInit=1, rng=rng)
+        resp = np.zeros((nPoints, nClusters))
+        resp[np.arange(nPoints), labels] = 1.
+        logLik = -np.inf
+        for _ in range(maxIter):
+            # M step
+            nk = np.sum(resp, axis=0) + 10 * np.finfo(float).eps
+            weights = nk / nPoints
+            means = np.dot(resp.T, data) / nk[:, np.newaxis]
+            covs = np.empty((nClusters, nDims, nDims))
+            for k in range(nClusters):
+                diff = data - means[k]
+                covs[k] = np.dot(resp[:, k] * diff.T, diff) / nk[k] + reg
+
+            # E step
+            resp, logNorm = _normalizeLog(_logGaussians(data, means, covs) +
+                                          np.log(weights))
+            newLogLik = np.mean(logNorm)
+            converged = newLogLik - logLik < tol
+            logLik = newLogLik
+            if converged:
+                break
+        if best is None or logLik > best[4]:
+            best = (resp, weights, means, covs, logLik)
+    return best
+
+
+def smoothProbabilities(prob, strength=1., nIter=10):
+    '''Smooth cluster probabilities over a 2D grid.
+
+    The probabilities of each point are multiplied by
+    ``exp(strength * mean of the neighbours' probabilities)`` and normalised,
+    repeatedly (a mean field approximation of a Potts model). The neighbours
+    are the four closest points of the grid.
+
+    Parameters
+    ----------
+    prob : np.ndarray or np.ma.MaskedArray
+        Probabilities, shape (rows, cols, clusters). Masked or NaN points are
+        ignored.
+    strength : float, optional
+        Coupling between neighbours; 0 does not smooth at all.
+    nIter : int, optional
+        Number of iterations.
+
+    Returns
+    -------
+    prob : np.ndarray
+        Smoothed probabilities, NaN at the ignored points.
+    '''
+    prob = np.ma.masked_invalid(prob).filled(np.nan)
+    valid = np.all(np.isfinite(prob), axis=2)
+    p0 = np.where(valid[..., np.newaxis], prob, 0.)
+    p = p0.copy()
+    count = np.zeros(valid.shape)
+    count[1:, :] += valid[:-1, :]
+    count[:-1, :] += valid[1:, :]
+    count[:, 1:] += valid[:, :-1]
+    count[:, :-1] += valid[:, 1:]
+    count = np.maximum(count, 1)[..., np.newaxis]
+
+    for _ in range(nIter if strength != 0 else 0):
+        neighbours = np.zeros(p.shape)
+        neighbours[1:, :] += p[:-1, :]
+        neighbours[:-1, :] += p[1:, :]
+        neighbours[:, 1:] += p[:, :-1]
+        neighbours[:, :-1] += p[:, 1:]
+        field = strength * neighbours / count
+        p = p0 * np.exp(field - np.max(field, axis=2)[..., np.newaxis])
+        p /= np.maximum(np.sum(p, axis=2), np.finfo(float).tiny)[...,
+                                                                 np.newaxis]
+        p[~valid] = 0
+    p[~valid] = np.nan
+    return p
+
+
+def alignLabels(labels, reference, nClusters):
+    '''Permute cluster labels to match a reference labelling.
+
+    The clusters are matched greedily, the pairs with the largest overlap
+    first.
+
+    Parameters
+    ----------
+    labels, reference : np.ndarray
+        Labels of the same points; negative labels are ignored.
+    nClusters : int
+        Number of clusters.
+
+    Returns
+    -------
+    permutation : np.ndarray
+        The reference label of each cluster in ``labels``; use as
+        ``permutation[labels]``.
+    '''
+    labels = np.asarray(labels).ravel()
+    reference = np.asarray(reference).ravel()
+    both = (labels >= 0) & (reference >= 0)
+    overlap = np.zeros((nClusters, nClusters))
+    np.add.at(overlap, (labels[both], reference[both]), 1)
+
+    permutation = -np.ones(nClusters, dtype=int)
+    for _ in range(nClusters):
+        k, ref = np.unravel_index(np.argmax(overlap), overlap.shape)
+        permutation[k] = ref
+        overlap[k, :] = -1
+        overlap[:, ref] = -1
+    return permutation
+
+
+class SweepSegmentation(ClusteredData):
+    '''Regimes of a parameter sweep, the result of :func:`segmentSweep`.
+
+    The object is also a sequence of clusters, each an array of the (flat)
+    indices of its points, like the other
+    :class:`~grid_cell_model.analysis.clustering.ClusteredData`, so it can be
+    used with :meth:`mergeClusters` and :meth:`assignClusters`.
+
+    Attributes
+    ----------
+    labels : np.ma.MaskedArray
+        Regime of each point of the sweep, shape (rows, cols). Points with
+        missing features are masked.
+    prob : np.ma.MaskedArray
+        Smoothed probabilities of the regimes, shape (rows, cols, clusters).
+    stability : np.ma.MaskedArray
+        Fraction of the bootstrap resamples in which each point has the same
+        regime as in ``labels``.
+    centers : np.ndarray
+        Mean features of each regime, in the units of the features, shape
+        (clusters, features).
+    method : str
+        The clustering method.
+    '''
+    def __init__(self, data, labels, prob, stability, centers, method):
+        self.labels = labels
+        self.prob = prob
+        self.stability = stability
+        self.centers = centers
+        self.method = method
+        flat = labels.ravel()
+        clusters = [np.nonzero((flat == k).filled(False))[0]
+                    for k in range(len(centers))]
+        ClusteredData.__init__(self, data, clusters)
+
+    @property
+    def nClusters(self):
+        return len(self.centers)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+
+def _featureMatrix(features, trialIdx=None):
+    '''Trial-averaged features of all the points, shape (points, features).
+
+    ``trialIdx`` selects the trials of each feature.'''
+    columns = []
+    for fIdx, f in enumerate(features):
+        if f.ndim == 3:
+            if trialIdx is not None:
+                f = f[:, :, trialIdx[fIdx]]
+            with np.errstate(invalid='ignore'):
+                counts = np.sum(np.isfinite(f), axis=2)
+                f = np.where(counts > 0,
+                             np.nansum(f, axis=2) / np.maximum(counts, 1),
+                             np.nan)
+        columns.append(np.asarray(f, dtype=float).ravel())
+    return np.column_stack(columns)
+
+
+def _clusterProb(data, nClusters, method, nInit, rng):
+    '''Cluster probabilities of the points.'''
+    if method == 'kmeans':
+        # Soft assignment of an isotropic mixture with unit variances
+        _, centers, _ = kMeans(data, nClusters, nInit=nInit, rng=rng)
+        prob, _ = _normalizeLog(-.5 * _sqDistances(data, centers))
+    else:
+        prob = gaussianMixture(data, nClusters, nInit=nInit, rng=rng)[0]
+    return prob
+
+
+def _segment(data, valid, shape, nClusters, method, nInit, smoothing,
+             smoothingIter, rng):
+    '''Smoothed probabilities and labels on the grid (-1 where invalid).'''
+    prob = np.full((valid.size, nClusters), np.nan)
+    prob[valid] = _clusterProb(data[valid], nClusters, method, nInit, rng)
+    prob = smoothProbabilities(prob.reshape(shape + (nClusters,)),
+                               smoothing, smoothingIter)
+    labels = -np.ones(shape, dtype=int)
+    gridValid = valid.reshape(shape)
+    labels[gridValid] = np.argmax(prob[gridValid], axis=1)
+    return prob, labels
+
+
+def segmentSweep(features, nClusters, method='gmm', nBootstrap=50,
+                 smoothing=1., smoothingIter=10, standardize=True, nInit=5,
+                 seed=None):
+    '''Segment a parameter sweep into regimes by clustering its features.
+
+    Parameters
+    ----------
+    features : list of np.ndarray
+        The features of the sweep, each of shape (rows, cols, trials) or
+        (rows, cols). Masked or NaN values are missing; a point is left out
+        of the clustering if any of its features is missing in all trials.
+        Features may have different numbers of trials.
+    nClusters : int
+        Number of regimes.
+    method : str, optional
+        ``'gmm'`` for a mixture of Gaussians (:func:`gaussianMixture`) or
+        ``'kmeans'`` (:func:`kMeans`).
+    nBootstrap : int, optional
+        Number of resamples of the trials to estimate the stability of the
+        labels. Features without trials are not resampled, so if none of the
+        features has trials the stability reflects only the randomness of
+        the clustering.
+    smoothing : float, optional
+        Strength of the smoothing over the sweep grid, see
+        :func:`smoothProbabilities`.
+    smoothingIter : int, optional
+        Number of iterations of the smoothing.
+    standardize : bool, optional
+        Scale the features to zero mean and unit variance before clustering.
+        The resamples are scaled in the same way as the full data.
+    nInit : int, optional
+        Number of initialisations of the clustering.
+    seed : int, optional
+        Seed of the random number generator.
+
+    Returns
+    -------
+    segmentation : SweepSegmentation
+        Regimes are numbered in the ascending order of the mean of the first
+        feature.
+    '''
+    if method not in METHODS:
+        raise ValueError('Unknown segmentation method: {0}; use one of '
+                         '{1}'.format(method, METHODS))
+    features = [np.ma.masked_invalid(f).astype(float).filled(np.nan)
+                for f in features]
+    if len(features) == 0:
+        raise ValueError('No features to segment.')
+    shape = features[0].shape[:2]
+    for f in features:
+        if f.shape[:2] != shape or f.ndim not in (2, 3):
+            raise ValueError('Features must have shape {0} or {0} + '
+                             '(trials,), got {1}'.format(shape, f.shape))
+    rng = np.random.RandomState(seed)
+
+    data = _featureMatrix(features)
+    valid = np.all(np.isfinite(data), axis=1)
+    if np.sum(valid) < nClusters:
+        raise ValueError('Only {0} sweep points have all the features, not '
+                         'enough for {1} clusters'.format(np.sum(valid),
+                                                          nClusters))
+    if standardize:
+        mean = np.mean(data[valid], axis=0)
+        std = np.std(data[valid], axis=0)
+        std[std == 0] = 1.
+    else:
+        mean, std = 0., 1.
+
+    prob, labels = _segment((data - mean) / std, valid, shape, nClusters,
+                            method, nInit, smoothing, smoothingIter, rng)
+
+    # Order the regimes by the first feature, and compute their centers
+    flatLabels = labels.ravel()
+    centers = np.array([np.mean(data[flatLabels == k], axis=0)
+                        if np.any(flatLabels == k)
+                        else np.full(data.shape[1], np.nan)
+                        for k in range(nClusters)])
+    order = np.argsort(centers[:, 0])
+    rank = np.empty(nClusters, dtype=int)
+    rank[order] = np.arange(nClusters)
+    labels = np.where(labels >= 0, rank[labels], -1)
+    prob = prob[:, :, order]
+    centers = centers[order]
+
+    # Bootstrap over trials
+    nTrials = [f.shape[2] if f.ndim == 3 else 0 for f in features]
+    agree = np.zeros(shape)
+    counts = np.zeros(shape)
+    for _ in range(nBootstrap):
+        trialIdx = [rng.randint(n, size=n) if n > 0 else None
+                    for n in nTrials]
+        bData = _featureMatrix(features, trialIdx)
+        bValid = np.all(np.isfinite(bData), axis=1)
+        if np.sum(bValid) < nClusters:
+            continue
+        _, bLabels = _segment((bData - mean) / std, bValid, shape, nClusters,
+                              method, nInit, smoothing, smoothingIter, rng)
+        permutation = alignLabels(bLabels, labels, nClusters)
+        bLabels = np.where(bLabels >= 0, permutation[bLabels], -1)
+        both = (bLabels >= 0) & (labels >= 0)
+        agree += both & (bLabels == labels)
+        counts += both
+    if np.sum(counts) == 0 and nBootstrap > 0:
+        logger.warn('No usable bootstrap resample; the stability is unknown.')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stability = np.where(counts > 0, agree / counts, np.nan)
+
+    mask = labels < 0
+    return SweepSegmentation(
+        data=[data[:, i] for i in range(data.shape[1])],
+        labels=np.ma.MaskedArray(labels, mask=mask),
+        prob=np.ma.masked_invalid(prob),
+        stability=np.ma.MaskedArray(stability,
+                                    mask=mask | ~np.isfinite(stability)),
+        centers=centers,
+        method=method)
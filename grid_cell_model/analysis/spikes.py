@@ -32,7 +32,12 @@ Please use the classes defined above.
 import numpy as np
 import scipy
 import collections
-from scipy import weave
+# Only needed by the compiled firing rate functions; the network models
+# import this module through the data storage
+try:
+    from scipy import weave
+except ImportError:
+    weave = None
 
 from grid_cell_model.otherpkg.log import log_warn
 
@@ -47,6 +52,13 @@ __all__ = [
 ]
 
 
+def _requireWeave():
+    '''Raise an ImportError if ``scipy.weave`` is not available.'''
+    if weave is None:
+        raise ImportError('This function is compiled with scipy.weave, which '
+                          'is not available.')
+
+
 #def firingRate(spikeTrain, tstart, tend):
 #    '''
 #    Compute an average firing rate of a spike train, between tstart and tend
@@ -166,6 +178,7 @@ def slidingFiringRateTuple(spikes, N, tstart, tend, dt, winLen):
             }
         """
 
+    _requireWeave()
     err = weave.inline(code,
             ['N', 'szRate', 'dtWlen', 'lenSpikes', 'n_ids', 'spikeTimes',
                 'tstart', 'dt', 'bitSpikes', 'fr'],
@@ -269,6 +282,7 @@ class PopulationSpikes(SpikeTrain, collections.Sequence):
             }
         '''
 
+        _requireWeave()
         err = weave.inline(code,
                 ['N', 'times', 'senders', 'ts', 'te', 'result'],
                 type_converters=weave.converters.blitz,
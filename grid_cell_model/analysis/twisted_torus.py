@@ -0,0 +1,78 @@
+'''Positions and distances on the twisted torus, without compiled code.
+
+.. currentmodule:: grid_cell_model.analysis.twisted_torus
+
+:func:`~grid_cell_model.analysis.image.remapTwistedTorus` is compiled with
+``scipy.weave``. The network models use the vectorised
+:func:`twistedTorusDistance` instead, so that the NumPy backend and the rate
+model can be used where ``scipy.weave`` is not available.
+
+Classes
+-------
+.. autosummary::
+
+    Position2D
+
+Functions
+---------
+.. autosummary::
+
+    twistedTorusDistance
+'''
+from __future__ import absolute_import, print_function, division
+
+import logging
+
+import numpy as np
+
+__all__ = ['Position2D', 'twistedTorusDistance']
+
+logger = logging.getLogger(__name__)
+
+
+class Position2D(object):
+
+    def __init__(self, x=None, y=None):
+        self.x = x
+        self.y = y
+
+        if not isinstance(x, float) and isinstance(y, float):
+            if len(x) != len(y):
+                msg = "Position2D: x and y parameters must have the same length: %d != %d."
+                logger.warn(msg, len(x), len(y))
+
+    def __str__(self):
+        return "Position2D: x: " + str(self.x) + ", y: " + str(self.y)
+
+    def __len__(self):
+        return len(self.x)
+
+
+def twistedTorusDistance(a_x, a_y, x, y, dim_x, dim_y):
+    '''Vectorised distance on a twisted torus.
+
+    The same as :func:`~grid_cell_model.analysis.image.remapTwistedTorus`,
+    except that the arguments are broadcast against each other.
+
+    Parameters
+    ----------
+    a_x, a_y : np.ndarray
+        Coordinates of the initial positions.
+    x, y : np.ndarray
+        Coordinates of the positions for which to compute the distance.
+    dim_x, dim_y : float
+        Dimensions of the torus.
+
+    Returns
+    -------
+    d : np.ndarray
+        Distances, with the broadcast shape of the arguments.
+    '''
+    dx = np.mod(a_x, dim_x) - np.mod(x, dim_x)
+    dy = np.mod(a_y, dim_y) - np.mod(y, dim_y)
+    d = np.sqrt(dx ** 2 + dy ** 2)
+    for shift_x, shift_y in ((-dim_x, 0), (dim_x, 0),
+                             (.5 * dim_x, -dim_y), (-.5 * dim_x, -dim_y),
+                             (.5 * dim_x, dim_y), (-.5 * dim_x, dim_y)):
+        d = np.minimum(d, np.sqrt((dx + shift_x) ** 2 + (dy + shift_y) ** 2))
+    return d
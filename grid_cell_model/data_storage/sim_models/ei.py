@@ -14,6 +14,38 @@ def getNetParam(data, p):
 def getOption(data, o):
     return data['options'][o]
 
+#: Termination reasons of simulations terminated early by an activity monitor
+#: (see :mod:`grid_cell_model.models.activity_monitor`)
+MAX_RATE_E = 'max_rate_e'
+SILENT = 'silent'
+TERMINATION_REASONS = (MAX_RATE_E, SILENT)
+
+def getTermination(data):
+    '''Return the termination record of a simulation that has been terminated
+    early by an activity monitor (see
+    :mod:`grid_cell_model.models.activity_monitor`), or ``None`` if the
+    simulation has run for the full time.'''
+    if 'termination' in data.keys():
+        return data['termination']
+    return None
+
+def getSimulationTime(data):
+    '''Return the time that has actually been simulated (ms), i.e. the time of
+    the termination if the simulation has been terminated early.'''
+    termination = getTermination(data)
+    if termination is not None:
+        return termination['t']
+    return getOption(data, 'time')
+
+def terminationCode(data):
+    '''Return 0 if the simulation has run for the full time, otherwise the
+    code of the termination reason: the position in ``TERMINATION_REASONS``
+    plus 1.'''
+    termination = getTermination(data)
+    if termination is None:
+        return 0
+    return TERMINATION_REASONS.index(termination['reason']) + 1
+
 def extractSpikes(mon):
     '''
     Extract spikes from a spike monitor (a dict-like object), that contains the
@@ -30,13 +62,216 @@ def sliceSignal(t, sig, tStart, tEnd):
     return t[idx], sig[idx], idx
 
 
+###############################################################################
+#                      Compact state monitor layout
+###############################################################################
+STATE_MON_COMPACT = 'compact'
+
+# Sums of variables precomputed by default, if all of them are recorded:
+# excitatory synaptic current and total synaptic current.
+DEFAULT_STATE_SUMS = (
+    ('I_clamp_AMPA', 'I_clamp_NMDA'),
+    ('I_clamp_AMPA', 'I_clamp_NMDA', 'I_clamp_GABA_A'),
+)
+
+
+def stateSumName(varList):
+    '''Name under which a sum of variables is stored in the compact layout.'''
+    return '+'.join(varList)
+
+
+def compactStateMonData(monList, dtype=None, decimate=1, lowpass=False,
+                        sums=DEFAULT_STATE_SUMS):
+    '''Convert state monitor data into the compact layout.
+
+    The original layout (see :meth:`BasicGridCellNetwork.getStateMonData`) is a
+    list of status dictionaries of NEST multimeters, one for each neuron, each
+    storing its own copy of the time vector and all the variables. The compact
+    layout stores one 2D array (neuron, time) per variable, the time axis is
+    implicit and some sums of the variables can be precomputed.
+
+    Parameters
+    ----------
+    monList : list of dicts
+        Status dictionaries of the multimeters.
+    dtype : numpy dtype, or None
+        Data type of the stored arrays, e.g. ``np.float32``. ``None`` keeps
+        the original data type.
+    decimate : int
+        Keep only every ``decimate``-th sample.
+    lowpass : bool
+        If ``True``, average the blocks of ``decimate`` samples instead of
+        just dropping samples (a boxcar low-pass filter). Incomplete blocks at
+        the end are dropped and the time stamp of each sample is the centre of
+        its block.
+    sums : list of lists of strings
+        Sums of variables to precompute. Only the sums whose variables have
+        all been recorded are computed.
+
+    Returns
+    -------
+    data : dict
+        State monitor data in the compact layout.
+    '''
+    decimate = int(decimate)
+    if decimate < 1:
+        raise ValueError('Decimation factor must be >= 1, got '
+                         '{0}'.format(decimate))
+    if len(monList) == 0:
+        raise ValueError('Cannot convert data of an empty list of monitors.')
+
+    interval = float(monList[0]['interval'])
+    events = [mon['events'] for mon in monList]
+    nSamples = min(len(ev['times']) for ev in events)
+    t_start = float(events[0]['times'][0]) if nSamples > 0 else 0.
+    varNames = [key for key in events[0].keys()
+                if key not in ('times', 'senders')]
+
+    def reduce_time(sig):
+        if decimate == 1:
+            return sig
+        if lowpass:
+            nBlocks = sig.shape[1] // decimate
+            sig = sig[:, 0:nBlocks * decimate]
+            return sig.reshape(sig.shape[0], nBlocks, decimate).mean(axis=2)
+        return sig[:, ::decimate]
+
+    def to_dtype(sig):
+        return sig if dtype is None else sig.astype(dtype)
+
+    signals = {}
+    for var in varNames:
+        signals[var] = reduce_time(np.array([np.asarray(ev[var][0:nSamples])
+                                             for ev in events]))
+
+    out = {
+        'layout'   : STATE_MON_COMPACT,
+        'interval' : interval * decimate,
+        't_start'  : (t_start + (decimate - 1) * interval / 2. if lowpass
+                      else t_start),
+        'senders'  : np.array([ev['senders'][0] if len(ev['senders']) > 0
+                               else -1 for ev in events]),
+        'vars'     : {},
+        'sums'     : {},
+    }
+    for var in varNames:
+        out['vars'][var] = to_dtype(signals[var])
+    for varList in sums:
+        if all(var in signals for var in varList):
+            total = np.sum([signals[var] for var in varList], axis=0)
+            out['sums'][stateSumName(varList)] = to_dtype(total)
+    return out
+
+
+class CompactStateMonitor(object):
+    '''List-like view of state monitor data stored in the compact layout.
+
+    Behaves like the original list of multimeter status dictionaries, i.e.
+    ``mon[nIdx]['events'][varName]`` and ``mon[nIdx]['interval']`` can be used
+    as usual. Each variable is loaded from the storage only once.
+
+    Parameters
+    ----------
+    data : dict-like
+        State monitor data, as returned by :func:`compactStateMonData`.
+    '''
+    def __init__(self, data):
+        self._data = data
+        self._cache = {}
+        self.interval = float(data['interval'])
+        self._senders = np.asarray(data['senders'])
+
+    def __len__(self):
+        return len(self._senders)
+
+    def __getitem__(self, nIdx):
+        if nIdx < 0:
+            nIdx += len(self)
+        if nIdx < 0 or nIdx >= len(self):
+            raise IndexError('Neuron index out of range: {0}'.format(nIdx))
+        return {
+            'events'  : _CompactEvents(self, nIdx),
+            'interval': self.interval,
+        }
+
+    def _load(self, group, name):
+        key = (group, name)
+        if key not in self._cache:
+            self._cache[key] = self._data[group][name]
+        return self._cache[key]
+
+    def varNames(self):
+        '''Names of the recorded variables.'''
+        return list(self._data['vars'].keys())
+
+    def times(self):
+        '''Times of the samples.'''
+        nSamples = self._load('vars', self.varNames()[0]).shape[1]
+        return float(self._data['t_start']) + np.arange(nSamples) * self.interval
+
+    def variable(self, varName, nIdx):
+        '''Return a copy of the signal of variable ``varName`` of neuron
+        ``nIdx``.'''
+        if varName == 'times':
+            return self.times()
+        elif varName == 'senders':
+            nSamples = len(self.times())
+            return np.repeat(self._senders[nIdx], nSamples)
+        return np.array(self._load('vars', varName)[nIdx], dtype=np.float64)
+
+    def sum(self, varList, nIdx):
+        '''Sum of the variables in ``varList`` of neuron ``nIdx``. The
+        precomputed sum is used if it exists.'''
+        name = stateSumName(varList)
+        if name in self._data['sums'].keys():
+            return np.array(self._load('sums', name)[nIdx], dtype=np.float64)
+        sigSum = self.variable(varList[0], nIdx)
+        for var in varList[1:]:
+            sigSum += self.variable(var, nIdx)
+        return sigSum
+
+
+class _CompactEvents(object):
+    '''Dict-like events of a single neuron in :class:`CompactStateMonitor`.'''
+    def __init__(self, mon, nIdx):
+        self._mon = mon
+        self._nIdx = nIdx
+
+    def __getitem__(self, varName):
+        return self._mon.variable(varName, self._nIdx)
+
+    def keys(self):
+        return self._mon.varNames() + ['times', 'senders']
+
+
+def isCompactStateMon(mon):
+    '''Whether ``mon`` contains state monitor data in the compact layout.'''
+    return (isinstance(mon, CompactStateMonitor) or
+            (hasattr(mon, 'keys') and 'layout' in mon.keys() and
+             mon['layout'] == STATE_MON_COMPACT))
+
+
+def stateMonitorList(mon):
+    '''Return a list-like object of state monitor data.
+
+    Data in the original layout are returned unchanged, data in the compact
+    layout are wrapped in :class:`CompactStateMonitor`.
+    '''
+    if isinstance(mon, CompactStateMonitor):
+        return mon
+    if isCompactStateMon(mon):
+        return CompactStateMonitor(mon)
+    return mon
+
+
 def extractStateVariable(mon, nIdx, varStr):
     '''Extract state variable from a monitor.
 
     Parameters
     ----------
     mon : list of dicts
-        A list of (NEST) monitors, each monitoring one neuron.
+        A list of (NEST) monitors, each monitoring one neuron. State monitor
+        data in the compact layout are also accepted.
     nIdx : int
         Neuron index
     varStr : str
@@ -44,7 +279,7 @@ def extractStateVariable(mon, nIdx, varStr):
     output
         A tuple (data, dt), for the signal
     '''
-    n = mon[nIdx]
+    n = stateMonitorList(mon)[nIdx]
     return n['events'][varStr], n['interval']
 
 
@@ -67,6 +302,10 @@ def sumAllVariables(mon, nIdx, varList):
         A tuple (sum, dt) that contains the sum of all the variables 'sum' and
         the sampling rate of the signals ('dt').
     '''
+    mon = stateMonitorList(mon)
+    if isinstance(mon, CompactStateMonitor):
+        return mon.sum(varList, nIdx), mon.interval
+
     sigSum = None
     dtCheck = None
     for idx in range(len(varList)):
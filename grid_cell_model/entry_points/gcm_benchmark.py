@@ -0,0 +1,346 @@
+'''Benchmarks of the data analysis on synthetic data.
+
+The benchmark cases time the core of the analysis of the simulations on data
+generated by :mod:`grid_cell_model.models.synthetic`, at several scales (size
+of the network, simulated time and size of the parameter sweep). The results
+are written into a JSON report, which can be compared with a report of
+another version of the code::
+
+    gcm_benchmark -s small medium -o new.json --compare old.json
+
+The report contains, for each case and scale, the wall clock times of all the
+repetitions and their minimum and median, together with the versions of
+Python, numpy and the git revision of the code.
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import collections
+
+import numpy as np
+
+from grid_cell_model.submitting.base.parsers import BaseParser
+from grid_cell_model.models.synthetic import generateTrial, writeSweep
+
+
+_DESCRIPTION = ("Benchmark the data analysis of grid cell network simulations "
+                "on synthetic data.")
+
+REPORT_VERSION = 1
+'''Version of the format of the JSON report.'''
+
+#: Parameters of the synthetic data at each scale: parameters of
+#: :func:`~grid_cell_model.models.synthetic.generateTrial`, the shape of the
+#: parameter sweep (``sweep``) and the number of trials per job (``trials``).
+SCALES = collections.OrderedDict([
+    ('small',  {'Ne': 20, 'Ni': 20, 'time': 2e3, 'state_nrec_f': 5,
+                'sweep': (3, 3), 'trials': 1}),
+    ('medium', {'Ne': 34, 'Ni': 34, 'time': 10e3, 'state_nrec_f': 20,
+                'sweep': (5, 5), 'trials': 2}),
+    ('large',  {'Ne': 68, 'Ni': 68, 'time': 60e3, 'state_nrec_f': 50,
+                'sweep': (10, 10), 'trials': 2}),
+])
+
+
+class BenchmarkData(object):
+    '''Synthetic data of one scale, generated on demand.
+
+    Parameters
+    ----------
+    scale : dict
+        Parameters of the scale, see :data:`SCALES`.
+    seed : int
+        Seed of the data.
+    '''
+    def __init__(self, scale, seed=0):
+        self._scale = dict(scale)
+        self._sweep = self._scale.pop('sweep')
+        self._trials = self._scale.pop('trials')
+        self._seed = seed
+        self._trial = None
+        self._sweepDir = None
+
+    @property
+    def trial(self):
+        '''Data of one trial.'''
+        if self._trial is None:
+            self._trial = generateTrial(seed=self._seed, **self._scale)
+        return self._trial
+
+    @property
+    def sweepDir(self):
+        '''Directory with a parameter sweep.'''
+        if self._sweepDir is None:
+            self._sweepDir = tempfile.mkdtemp(prefix='gcm_benchmark_')
+            sweepParams = dict(self._scale)
+            sweepParams['state_nrec_f'] = 0
+            writeSweep(self._sweepDir, self._sweep, trials=self._trials,
+                       seed=self._seed, **sweepParams)
+        return self._sweepDir
+
+    @property
+    def sweepShape(self):
+        '''Shape of the parameter sweep.'''
+        return self._sweep
+
+    @property
+    def nTrials(self):
+        '''Number of trials per job of the parameter sweep.'''
+        return self._trials
+
+    def close(self):
+        '''Remove the parameter sweep.'''
+        if self._sweepDir is not None:
+            shutil.rmtree(self._sweepDir, ignore_errors=True)
+            self._sweepDir = None
+
+
+def _spikes(data, pop='e'):
+    '''Senders, times and the sheet size of the population ``pop``.'''
+    from grid_cell_model.data_storage.sim_models.ei import extractSpikes
+    senders, times = extractSpikes(data['spikeMon_' + pop])
+    attr = data['net_attr']
+    sheet = (attr['N{0}_x'.format(pop)], attr['N{0}_y'.format(pop)])
+    return senders, times, sheet
+
+
+def _neuronSpikes(data, neuron=0):
+    '''Spikes of one E neuron, aligned with the positions of the animal.'''
+    senders, times, _ = _spikes(data)
+    times = times[senders == neuron] - data['options']['theta_start_t']
+    return times[times >= 0]
+
+
+def case_sliding_firing_rate(data):
+    '''Sliding window firing rates of the E population, as in the
+    ``FiringRateVisitor``.'''
+    from grid_cell_model.analysis.spikes import slidingFiringRateTuple
+    senders, times, sheet = _spikes(data.trial)
+    tEnd = data.trial['options']['time']
+
+    def run():
+        slidingFiringRateTuple((senders, times), sheet[0] * sheet[1], 0.,
+                               tEnd, .5, 2.)
+    return run
+
+
+def case_bump_position(data):
+    '''Gaussian fits of the E bump during 2 s of the simulation, as in the
+    ``BumpPositionVisitor``.'''
+    from grid_cell_model.analysis.image import SingleBumpPopulation
+    senders, times, sheet = _spikes(data.trial)
+    o = data.trial['options']
+    tStart = o['theta_start_t']
+    tEnd = min(o['time'], tStart + 2e3)
+
+    def run():
+        pop = SingleBumpPopulation(senders, times, sheet)
+        pop.bumpPosition(tStart, tEnd, 125., 250.)
+    return run
+
+
+def case_spatial_rate(data):
+    '''Spatial firing rate map of one E neuron, as in the
+    ``GridPlotVisitor``.'''
+    from grid_cell_model.analysis.grid_cells import SNSpatialRate2D
+    spikes = _neuronSpikes(data.trial)
+    attr = data.trial['net_attr']
+    o = data.trial['options']
+
+    def run():
+        SNSpatialRate2D(spikes, attr['rat_pos_x'], attr['rat_pos_y'],
+                        attr['rat_dt'], o['arenaSize'], 3.)
+    return run
+
+
+def case_gridness_score(data):
+    '''Gridness score of the rate map of one E neuron.'''
+    from grid_cell_model.analysis.grid_cells import (SNSpatialRate2D,
+                                                     cellGridnessScore)
+    attr = data.trial['net_attr']
+    o = data.trial['options']
+    rateMap, _, _ = SNSpatialRate2D(_neuronSpikes(data.trial),
+                                    attr['rat_pos_x'], attr['rat_pos_y'],
+                                    attr['rat_dt'], o['arenaSize'], 3.)
+
+    def run():
+        cellGridnessScore(rateMap, o['arenaSize'], 3., o['gridSep'] / 2.)
+    return run
+
+
+def case_autocorrelation(data):
+    '''Autocorrelations of the inhibitory currents of the ``stateMonF_e``
+    neurons (``AutoCorrelationVisitor``).'''
+    from grid_cell_model.parameters.data_sets import DictDataSet
+    from grid_cell_model.visitors.signals import AutoCorrelationVisitor
+    visitor = AutoCorrelationVisitor('stateMonF_e', ['I_clamp_GABA_A'],
+                                     forceUpdate=True)
+
+    def run():
+        visitor.visitDictDataSet(DictDataSet(dict(data.trial)))
+    return run
+
+
+def case_aggregate_data(data):
+    '''Aggregation of the E spike counts from all the trials of a parameter
+    sweep (``JobTrialSpace2D.aggregateData``).'''
+    from grid_cell_model.parameters import JobTrialSpace2D
+    rootDir = data.sweepDir
+    trials = list(range(data.nTrials))
+
+    def run():
+        sp = JobTrialSpace2D(data.sweepShape, rootDir, fileMode='r')
+        sp.aggregateData(['spikeMon_e', 'events', 'times'], trials,
+                         funReduce=len, loadData=False, saveData=False)
+    return run
+
+
+#: Benchmark cases. Each case takes :class:`BenchmarkData` and returns the
+#: function to time.
+CASES = collections.OrderedDict([
+    ('slidingFiringRateTuple', case_sliding_firing_rate),
+    ('SingleBumpPopulation', case_bump_position),
+    ('SNSpatialRate2D', case_spatial_rate),
+    ('cellGridnessScore', case_gridness_score),
+    ('AutoCorrelationVisitor', case_autocorrelation),
+    ('JobTrialSpace2D.aggregateData', case_aggregate_data),
+])
+
+
+def git_revision():
+    '''Git revision of the code, or ``None`` if it cannot be determined.'''
+    try:
+        out = subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode('utf-8').strip()
+
+
+def time_case(fun, repeat):
+    '''Wall clock times (s) of ``repeat`` calls of ``fun``.'''
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        fun()
+        times.append(time.time() - start)
+    return times
+
+
+def run_benchmarks(scales, cases, repeat=3, seed=0, log=print):
+    '''Run the benchmark ``cases`` at the given ``scales``.
+
+    A case that fails is recorded with its error message, the other cases
+    still run.
+
+    Returns
+    -------
+    report : dict
+        The report, ready to be saved as JSON.
+    '''
+    results = []
+    for scaleName in scales:
+        data = BenchmarkData(SCALES[scaleName], seed=seed)
+        try:
+            for caseName in cases:
+                result = {'case': caseName, 'scale': scaleName}
+                try:
+                    fun = CASES[caseName](data)
+                    times = time_case(fun, repeat)
+                except Exception as e:  # pylint: disable=broad-except
+                    result['error'] = '{0}: {1}'.format(e.__class__.__name__,
+                                                        str(e))
+                    log('%-30s %-7s failed: %s' % (caseName, scaleName,
+                                                    result['error']))
+                else:
+                    result['times'] = times
+                    result['min'] = min(times)
+                    result['median'] = float(np.median(times))
+                    log('%-30s %-7s %10.4f s' % (caseName, scaleName,
+                                                 result['min']))
+                results.append(result)
+        finally:
+            data.close()
+
+    return {
+        'report_version': REPORT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'seed': seed,
+        'scales': dict((name, dict(SCALES[name])) for name in scales),
+        'results': results,
+    }
+
+
+def compare_reports(new, old, log=print):
+    '''Print the ratios of the minimal times of ``new`` and ``old`` report.
+
+    Returns
+    -------
+    ratios : dict
+        (case, scale) -> new time / old time, for the results present in both
+        reports.
+    '''
+    def times(report):
+        return dict(((r['case'], r['scale']), r['min'])
+                    for r in report['results'] if 'min' in r)
+
+    newTimes = times(new)
+    oldTimes = times(old)
+    ratios = {}
+    log('Comparison with revision %s:' % old.get('revision'))
+    for key in sorted(newTimes.keys()):
+        if key not in oldTimes or oldTimes[key] <= 0:
+            continue
+        ratios[key] = newTimes[key] / oldTimes[key]
+        log('%-30s %-7s %10.4f s  %10.4f s  x%.2f' % (
+            key[0], key[1], oldTimes[key], newTimes[key], ratios[key]))
+    return ratios
+
+
+def main(args=None):
+    '''Main function.'''
+    parser = BaseParser(description=_DESCRIPTION)
+    parser.add_argument('-s', '--scales', type=str, nargs='+',
+                        choices=list(SCALES.keys()), default=['small'],
+                        help="Scales of the synthetic data.")
+    parser.add_argument('-c', '--cases', type=str, nargs='+',
+                        choices=list(CASES.keys()),
+                        default=list(CASES.keys()),
+                        help="Benchmark cases to run. Default: all.")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="Number of repetitions of each case.")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the synthetic data.")
+    parser.add_argument('-o', '--output', type=str,
+                        help="JSON file to write the report into.")
+    parser.add_argument('--compare', type=str,
+                        help="JSON report to compare the results with.")
+    args = parser.parse_args(args)
+
+    report = run_benchmarks(args.scales, args.cases, repeat=args.repeat,
+                            seed=args.seed)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare_reports(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
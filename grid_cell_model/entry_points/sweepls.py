@@ -7,6 +7,8 @@ import collections
 from simtools.storage import DataStorage
 from grid_cell_model.submitting.base.parsers import BaseParser
 from grid_cell_model.parameters.param_space import JobTrialSpace2D
+from grid_cell_model.visitors.profiling import (read_profile_logs,
+                                                summarise_profile)
 
 
 _DESCRIPTION = ("List various forms of data from parameter sweeps of grid cell "
@@ -21,6 +23,7 @@ def command_map():
     return {
         Commands.print_data: print_data,
         Commands.inspect_sweep: inspect_sweep,
+        Commands.profile_summary: profile_summary,
     }
 
 
@@ -36,6 +39,7 @@ class Commands(str, Enum):
     '''Command line commands to execute.'''
     print_data = "print-data"
     inspect_sweep = "inspect-sweep"
+    profile_summary = "profile-summary"
 
     @classmethod
     def get_choice_list(cls):
@@ -158,6 +162,61 @@ def inspect_sweep(args):
                           space.get_iteration_range(dim)))
 
 
+def format_bytes(nbytes):
+    '''Format a number of bytes into a human readable string.'''
+    if nbytes is None:
+        return '-'
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if abs(nbytes) < 1024.:
+            return '%.1f %s' % (nbytes, unit)
+        nbytes /= 1024.
+    return '%.1f TB' % nbytes
+
+
+def profile_summary(args):
+    '''Summarise the profile logs of the analysis of a parameter sweep.
+
+    Prints the time, memory and HDF5 reads of each visitor, the most expensive
+    visitors first, and the ``args.top`` slowest visits.
+    '''
+    records = read_profile_logs(args.path)
+    if len(records) == 0:
+        print("No profiling records found in '%s'" % args.path)
+        return Errnum.fail
+
+    summary = summarise_profile(records)
+    total_wall = sum(s.wall_time for s in summary)
+    header = ['visitor', 'items', 'failed', 'wall [s]', '%', 'cpu [s]',
+              'max wall [s]', 'max peak RSS +', 'peak RSS', 'HDF5 read']
+    rows = []
+    for s in summary:
+        rows.append([s.visitor, str(s.items), str(s.failed),
+                     '%.2f' % s.wall_time,
+                     '%.1f' % (100. * s.wall_time / total_wall
+                               if total_wall > 0 else 0.),
+                     '%.2f' % s.cpu_time, '%.2f' % s.max_wall_time,
+                     format_bytes(s.max_peak_rss_delta),
+                     format_bytes(s.peak_rss), format_bytes(s.hdf5_bytes)])
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    print("%d records, %.2f s total wall time" % (len(records), total_wall))
+    for row in [header] + rows:
+        print('  '.join([row[0].ljust(widths[0])] +
+                        [col.rjust(w) for col, w in zip(row[1:], widths[1:])]))
+
+    if args.top > 0:
+        print("\nSlowest visits:")
+        slowest = sorted(records, key=lambda rec: rec.get('wall_time') or 0,
+                         reverse=True)[:args.top]
+        for rec in slowest:
+            print("%8.2f s  %-24s r=%s c=%s trial=%s  %s" % (
+                rec.get('wall_time') or 0, rec['visitor'], rec.get('r'),
+                rec.get('c'), rec.get('trial'),
+                format_bytes(rec.get('peak_rss_delta'))))
+
+    return Errnum.success
+
+
 def perform_command(args):
     '''Run the specified command.'''
     command = Commands.validate(args.command)
@@ -181,6 +240,9 @@ def main():
     parser.add_argument('-d', '--data', type=str,
                         help="Path to the data with a file or parameter "
                              "sweep.")
+    parser.add_argument('--top', type=int, default=10,
+                        help="Number of the slowest visits printed by "
+                             "profile-summary.")
     args = parser.parse_args()
     return perform_command(args)
 
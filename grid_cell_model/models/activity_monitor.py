@@ -0,0 +1,229 @@
+'''Online monitoring of the network activity.
+
+.. currentmodule:: grid_cell_model.models.activity_monitor
+
+Many parameter settings lead to pathological activity of the network, either
+seizure-like activity with very high firing rates, or no activity at all. An
+:class:`ActivityMonitor` can be passed to
+:meth:`~grid_cell_model.models.gc_net_nest.NestGridCellNetwork.simulate`,
+which then advances the simulation in chunks and, between the chunks, lets the
+monitor evaluate the spikes of the E and I populations. When one of the
+criteria is met, the simulation is terminated early and the termination record
+(see :attr:`ActivityMonitor.termination`) is saved with the data of the trial,
+under the ``termination`` key.
+
+The criteria are:
+
+ * ``max_rate_e``: the maximal population firing rate of the E population
+   during a theta cycle exceeds a threshold in ``max_rate_cycles`` consecutive
+   theta cycles. The population firing rate is the number of spikes of all the
+   E neurons in windows of ``rate_win`` ms, divided by the number of neurons
+   and the window length, which is the same as the seizure measure computed
+   from the ``popSliding`` firing rate of
+   :class:`~grid_cell_model.visitors.spikes.FiringRateVisitor`.
+ * ``silent``: there are no spikes in both populations for ``silence`` ms.
+
+Only the activity after ``t_start`` is evaluated. The state of the monitor is
+not saved in checkpoints, i.e. a resumed simulation is evaluated only from the
+checkpoint on.
+
+Classes
+-------
+
+.. autosummary::
+
+    ActivityMonitor
+'''
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+import nest
+
+from grid_cell_model.otherpkg.log import getClassLogger
+from grid_cell_model.data_storage.sim_models.ei import MAX_RATE_E, SILENT
+
+logger = getClassLogger('ActivityMonitor', __name__)
+
+__all__ = ['ActivityMonitor']
+
+
+class ActivityMonitor(object):
+    '''Terminate simulations with pathological activity early.
+
+    Parameters
+    ----------
+    theta_T : float
+        Theta period (ms). The activity is evaluated every theta cycle and the
+        simulation is advanced in chunks of this length.
+    t_start : float
+        Start of the first theta cycle that is evaluated (ms).
+    max_rate_e : float, or None
+        Threshold of the maximal E population firing rate in a theta cycle
+        (Hz). ``None`` disables the criterion.
+    max_rate_cycles : int
+        Number of consecutive theta cycles with the firing rate over the
+        threshold.
+    silence : float, or None
+        Maximal time without any spikes (ms). ``None`` disables the criterion.
+    rate_win : float
+        Length of the window of the population firing rate (ms).
+    '''
+    def __init__(self, theta_T, t_start=0., max_rate_e=None,
+                 max_rate_cycles=3, silence=None, rate_win=2.):
+        if theta_T <= 0 or rate_win <= 0:
+            raise ValueError("Theta period and the firing rate window must be "
+                             "positive.")
+        if max_rate_cycles < 1:
+            raise ValueError("Number of theta cycles must be >= 1, got "
+                             "{0}.".format(max_rate_cycles))
+        self._theta_T = float(theta_T)
+        self._t_start = float(t_start)
+        self._max_rate_e = max_rate_e
+        self._max_rate_cycles = int(max_rate_cycles)
+        self._silence = silence
+        self._rate_win = float(rate_win)
+        self.reset()
+
+        self._det_e = None
+        self._det_i = None
+        self._net = None
+
+    @classmethod
+    def from_options(cls, options):
+        '''Create a monitor from the simulation options.
+
+        Returns ``None`` if no criterion has been set, i.e. the
+        ``monitor_max_rate_e`` and ``monitor_silence`` options are not set.
+        '''
+        max_rate_e = getattr(options, 'monitor_max_rate_e', None)
+        silence = getattr(options, 'monitor_silence', None)
+        if max_rate_e is None and silence is None:
+            return None
+        return cls(1e3 / options.theta_freq,
+                   t_start=options.theta_start_t,
+                   max_rate_e=max_rate_e,
+                   max_rate_cycles=getattr(options, 'monitor_max_rate_cycles',
+                                           3),
+                   silence=silence)
+
+    @property
+    def interval(self):
+        '''Length of the simulation chunks (ms).'''
+        return self._theta_T
+
+    @property
+    def termination(self):
+        '''Termination record, or ``None`` if no criterion has been met.
+
+        A dictionary with the ``reason`` of the termination (``'max_rate_e'``
+        or ``'silent'``), the simulation time ``t`` (ms) at which the
+        simulation has been terminated, and a human readable
+        ``description``.
+        '''
+        return self._termination
+
+    def reset(self):
+        '''Forget all the evaluated activity.'''
+        self._termination = None
+        self._next_cycle = 0
+        self._over_cycles = 0
+        self._last_spike = self._t_start
+        self._times_e = np.array([])
+
+    def attach(self, net):
+        '''Record the spikes of all the E and I neurons in ``net``.'''
+        self._net = net
+        self._N_e = len(net.E_pop)
+        self._det_e = nest.Create('spike_detector')
+        self._det_i = nest.Create('spike_detector')
+        nest.SetStatus(self._det_e + self._det_i, {'withtime': True,
+                                                   'withgid': False})
+        nest.ConvergentConnect(list(net.E_pop), self._det_e)
+        nest.ConvergentConnect(list(net.I_pop), self._det_i)
+
+    def _drain(self, det):
+        '''Return the spike times recorded by ``det`` and clear them.'''
+        times = nest.GetStatus(det, 'events')[0]['times']
+        nest.SetStatus(det, {'n_events': 0})
+        return self._net._shiftTimes(np.asarray(times))
+
+    def update(self, t):
+        '''Evaluate the spikes recorded until time ``t`` (ms).
+
+        Returns
+        -------
+        terminate : bool
+            Whether the simulation should be terminated.
+        '''
+        return self.process(self._drain(self._det_e), self._drain(self._det_i),
+                            t, self._N_e)
+
+    def process(self, times_e, times_i, t, N_e):
+        '''Evaluate new spikes of the E and I populations.
+
+        Parameters
+        ----------
+        times_e, times_i : np.ndarray
+            Times of the spikes (ms) since the last call, in any order.
+        t : float
+            Current simulation time (ms). All the spikes before ``t`` must have
+            been passed.
+        N_e : int
+            Number of E neurons.
+
+        Returns
+        -------
+        terminate : bool
+            Whether the simulation should be terminated.
+        '''
+        if self._termination is not None:
+            return True
+        times_e = np.asarray(times_e, dtype=float)
+        times_i = np.asarray(times_i, dtype=float)
+        if len(times_e) + len(times_i) > 0:
+            self._last_spike = max(self._last_spike,
+                                   np.max(np.concatenate((times_e, times_i))))
+
+        if self._max_rate_e is not None:
+            self._times_e = np.concatenate((self._times_e, times_e))
+            self._evaluate_cycles(t, N_e)
+        if (self._termination is None and self._silence is not None and
+                t - self._last_spike >= self._silence):
+            self._terminate(SILENT, t, "No spikes since {0} ms.".format(
+                self._last_spike))
+
+        return self._termination is not None
+
+    def _evaluate_cycles(self, t, N_e):
+        '''Evaluate the firing rate of all complete theta cycles before t.'''
+        nbins = max(int(np.round(self._theta_T / self._rate_win)), 1)
+        while self._t_start + (self._next_cycle + 1) * self._theta_T <= t:
+            c_start = self._t_start + self._next_cycle * self._theta_T
+            c_end = c_start + self._theta_T
+            counts, _ = np.histogram(self._times_e, bins=nbins,
+                                     range=(c_start, c_end))
+            max_rate = np.max(counts) / (N_e * self._theta_T / nbins * 1e-3)
+            self._times_e = self._times_e[self._times_e >= c_end]
+            self._next_cycle += 1
+
+            if max_rate > self._max_rate_e:
+                self._over_cycles += 1
+            else:
+                self._over_cycles = 0
+            if self._over_cycles >= self._max_rate_cycles:
+                self._terminate(
+                    MAX_RATE_E, t,
+                    "Maximal E population firing rate over {0} Hz in {1} "
+                    "consecutive theta cycles; the last one {2:.1f} "
+                    "Hz.".format(self._max_rate_e, self._over_cycles,
+                                 max_rate))
+                return
+
+    def _terminate(self, reason, t, description):
+        '''Record the termination.'''
+        logger.info('Terminating the simulation at %f ms: %s', t, description)
+        self._termination = {
+            'reason': reason,
+            't': t,
+            'description': description,
+        }
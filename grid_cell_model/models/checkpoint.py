@@ -0,0 +1,193 @@
+'''Checkpoints of long, segmented simulations.
+
+.. currentmodule:: grid_cell_model.models.checkpoint
+
+A checkpointed simulation periodically saves the dynamic state of the network
+(neuron state variables, positions of the current generators and place cells
+and the state of the numpy random number generator), together with the number
+of events streamed to the output file so far. An interrupted simulation can be
+resumed from the last checkpoint: the network is constructed again with the
+same seeds, the event data recorded after the checkpoint are discarded and the
+simulation continues from the checkpointed state.
+
+NEST 2.x does not allow to save the state of its random number generators, set
+the kernel time, or set the spikes that have been emitted but not delivered
+yet. The continuation is made identical to the uninterrupted simulation by
+doing the same at every checkpoint in both cases:
+
+ * the NEST random number generators are reseeded from the trial seed and the
+   checkpoint number,
+ * the network is reset and set to the checkpointed state, which discards the
+   spikes in transit.
+
+The uninterrupted simulation is therefore affected by checkpointing, but the
+results do not depend on whether, or how many times, the simulation has been
+resumed.
+
+Classes
+-------
+
+.. autosummary::
+
+    TrialCheckpointer
+
+Functions
+---------
+
+.. autosummary::
+
+    find_checkpoint
+'''
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+import nest
+
+from grid_cell_model.otherpkg.log import getClassLogger
+
+logger = getClassLogger('TrialCheckpointer', __name__)
+
+__all__ = ['TrialCheckpointer', 'find_checkpoint']
+
+CHECKPOINT_PREFIX = 'checkpoint_'
+
+
+def _is_multiple(x, base):
+    '''Check whether ``x`` is an integer multiple of ``base``.'''
+    n = np.round(x / base)
+    return n >= 1 and np.abs(x - n * base) < 1e-9 * base
+
+
+def _checkpoint_keys(trial_data):
+    '''Return the checkpoint keys in ``trial_data``, sorted by time.'''
+    keys = [key for key in trial_data.keys()
+            if key.startswith(CHECKPOINT_PREFIX)]
+    return sorted(keys, key=lambda k: int(k[len(CHECKPOINT_PREFIX):]))
+
+
+def find_checkpoint(trial_data):
+    '''Return the last checkpoint saved in ``trial_data``.
+
+    Parameters
+    ----------
+    trial_data : dict-like
+        Data of a single trial.
+
+    Returns
+    -------
+    checkpoint : dict-like, or None
+        The last checkpoint or ``None`` if there is none.
+    '''
+    keys = _checkpoint_keys(trial_data)
+    if len(keys) == 0:
+        return None
+    return trial_data[keys[-1]]
+
+
+class TrialCheckpointer(object):
+    '''Save checkpoints of a single trial at regular intervals.
+
+    Pass an instance of this class to
+    :meth:`~grid_cell_model.models.gc_net_nest.NestGridCellNetwork.simulate`.
+    The checkpoints are saved into the storage the data are streamed into.
+    Only the last checkpoint is kept.
+
+    Parameters
+    ----------
+    seed_gen : TrialSeedGenerator
+        Seed generator used to set up the trial.
+    trial : int
+        Trial number.
+    interval : float
+        Checkpoint interval (ms). Must be a multiple of the simulation segment,
+        the time step of the noise generators and the sampling interval of
+        all state monitors.
+    '''
+    def __init__(self, seed_gen, trial, interval):
+        if interval <= 0:
+            raise ValueError("Checkpoint interval must be positive, got "
+                             "{0}".format(interval))
+        self._seed_gen = seed_gen
+        self._trial = trial
+        self._interval = interval
+
+    @property
+    def interval(self):
+        '''Checkpoint interval (ms).'''
+        return self._interval
+
+    def validate(self, net, segment):
+        '''Check that checkpoints can be taken between segments of ``net``.
+
+        A checkpoint must coincide with a segment boundary, a noise generator
+        update and a state monitor sample, otherwise the state of the network
+        is not fully described by the checkpoint.
+        '''
+        if not _is_multiple(self._interval, segment):
+            raise ValueError("Checkpoint interval ({0} ms) must be a multiple "
+                             "of the simulation segment ({1} ms).".format(
+                                 self._interval, segment))
+        steps = [('noise generator time step', dt) for dt in
+                 set(nest.GetStatus(net.E_pop + net.I_pop, 'I_noise_dt'))]
+        for _, mon in net._getStateMonitorList():
+            steps += [('state monitor interval', dt) for dt in
+                      set(nest.GetStatus(mon, 'interval'))]
+        for desc, dt in steps:
+            if not _is_multiple(self._interval, dt):
+                raise ValueError("Checkpoint interval ({0} ms) must be a "
+                                 "multiple of the {1} ({2} ms).".format(
+                                     self._interval, desc, dt))
+
+    def index(self, t):
+        '''Checkpoint number at time ``t`` (ms).'''
+        return int(np.round(t / self._interval))
+
+    def is_due(self, t):
+        '''Whether a checkpoint should be taken at time ``t`` (ms).'''
+        return t > 0 and _is_multiple(t, self._interval)
+
+    def checkpoint(self, net, stream, t):
+        '''Take a checkpoint of ``net`` at time ``t``.
+
+        Saves the state into ``stream`` (if it has not been saved yet), resets
+        the network to the saved state and reseeds the NEST generators.
+        '''
+        idx = self.index(t)
+        key = '{0}{1}'.format(CHECKPOINT_PREFIX, idx)
+        state = net.getDynamicState()
+        if key not in stream:
+            logger.info('Saving checkpoint no. %d at %f ms', idx, t)
+            self.save(stream, key, state, t, net.getStreamLengths(stream))
+
+        net.resetDynamicState(state)
+        self._seed_gen.set_segment_generators(self._trial, idx)
+
+    def save(self, stream, key, state, t, stream_lengths):
+        '''Save a checkpoint into ``stream`` and remove the older ones.
+
+        The new checkpoint is flushed to disk before the old ones are deleted,
+        so that there is always a complete checkpoint in the file.
+        '''
+        name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        stream[key] = {
+            't': t,
+            'state': state,
+            'stream_lengths': stream_lengths,
+            'numpy_rng': {
+                'name': name,
+                'keys': keys,
+                'pos': pos,
+                'has_gauss': has_gauss,
+                'cached_gaussian': cached_gaussian,
+            },
+        }
+        stream.flush()
+        self.clear(stream, keep=key)
+
+    @staticmethod
+    def clear(stream, keep=None):
+        '''Remove all checkpoints from ``stream``, except ``keep``.'''
+        for key in _checkpoint_keys(stream):
+            if key != keep:
+                del stream[key]
+        stream.flush()
@@ -23,6 +23,28 @@ class WeightConstructor(object):
         '''
         raise NotImplementedError()
 
+    def generate_connections(self, profile, weight):
+        '''Generate synaptic connections from the synaptic profile function.
+
+        Parameters
+        ----------
+        profile : np.ndarray
+            Synaptic profile array (1D). It should be normalized between <0,
+            1>.
+        weight : float
+            The actual synaptic weight.
+
+        Returns
+        -------
+        targets : np.ndarray
+            Indexes of the targets (into ``profile``) that should be
+            connected.
+        weights : np.ndarray
+            Synaptic weights of the connections.
+        '''
+        weights = self.generate_weights(profile, weight)
+        return np.arange(len(weights)), weights
+
 
 class IsomorphicConstructor(WeightConstructor):
     '''Generates weights in an isomorhic way, i.e. the weights will equal the
@@ -41,4 +63,81 @@ class ProbabilisticConstructor(WeightConstructor):
     def generate_weights(self, profile, weight):
         return (np.random.rand(*profile.shape) < profile) * weight
 
+    def generate_connections(self, profile, weight):
+        weights = self.generate_weights(profile, weight)
+        targets = np.nonzero(weights)[0]
+        return targets, weights[targets]
+
+
+def sample_bernoulli_sparse(p, max_level=52):
+    '''Indexes of successful independent Bernoulli trials with success
+    probabilities ``p``, without a random number for every trial.
+
+    The trials are grouped into levels of probability (2**-(k+1), 2**-k]. In
+    each level, candidates with the upper bound probability 2**-k are found by
+    drawing geometrically distributed gaps between them and each candidate is
+    then accepted with probability p / 2**-k. The expected number of random
+    numbers is therefore at most about twice the expected number of successes,
+    plus a constant per level. Probabilities below 2**-max_level are treated
+    as zero.
+
+    Parameters
+    ----------
+    p : np.ndarray
+        Success probabilities (1D), between 0 and 1.
+    max_level : int
+        Lowest level of probability.
+
+    Returns
+    -------
+    idx : np.ndarray
+        Sorted indexes of the successful trials.
+    '''
+    p = np.asarray(p, dtype=float)
+    nonzero = np.nonzero(p > 2.**-max_level)[0]
+    if len(nonzero) == 0:
+        return np.array([], dtype=int)
+    levels = np.floor(-np.log2(p[nonzero])).astype(int)
+    levels = np.clip(levels, 0, max_level - 1)
+
+    out = []
+    for level in np.unique(levels):
+        idx = nonzero[levels == level]
+        q = 2.**-level
+        n = len(idx)
+        if q >= 1.:
+            candidates = np.arange(n)
+        else:
+            # Positions of the candidates: cumulative geometric gaps
+            expected = n * q
+            size = int(expected + 5 * np.sqrt(expected) + 10)
+            positions = np.cumsum(np.random.geometric(q, size)) - 1
+            while positions[-1] < n:
+                more = np.cumsum(np.random.geometric(q, size)) + positions[-1]
+                positions = np.concatenate((positions, more))
+            candidates = positions[positions < n]
+        accept = np.random.rand(len(candidates)) < p[idx[candidates]] / q
+        out.append(idx[candidates[accept]])
+    return np.sort(np.concatenate(out))
+
+
+class SparseProbabilisticConstructor(ProbabilisticConstructor):
+    '''Probabilistic constructor that samples only the synapses that exist.
+
+    The synapses are drawn from the same distribution as in
+    :class:`ProbabilisticConstructor`, but the random numbers are drawn only
+    around the synapses that will be created, see
+    :func:`sample_bernoulli_sparse`. This saves the random number generation
+    for low-density profiles and :meth:`generate_connections` returns only the
+    existing synapses. The actual connections differ from those of
+    :class:`ProbabilisticConstructor` with the same seed.
+    '''
+    def generate_weights(self, profile, weight):
+        profile = np.asarray(profile)
+        weights = np.zeros(profile.shape)
+        weights.flat[sample_bernoulli_sparse(profile.ravel())] = weight
+        return weights
 
+    def generate_connections(self, profile, weight):
+        targets = sample_bernoulli_sparse(np.asarray(profile).ravel())
+        return targets, np.repeat(float(weight), len(targets))
@@ -40,7 +40,10 @@ The topology of connections has several characteristics:
    pair of neurons on the twisted torus. Another variant of connections is the
    *probabilistic* synapses. Here, the probability of connection instead of the
    weight is scaled according to the centre-surround principle. See the
-   ``probabilistic_synapses`` parameter.
+   ``probabilistic_synapses`` parameter. With the ``sparse_synapses``
+   parameter, the probabilistic synapses are sampled directly, without
+   drawing a random number for every pair of neurons, and only the existing
+   synapses are created.
 
  - GABA_A connections (I-->E) can also contain extra, distance-independent,
    inhibitory synapses onto stellate cells in order to promote generation of
@@ -57,6 +60,7 @@ Class hierarchy of the attractor networks
 -----------------------------------------
 
 .. inheritance-diagram:: grid_cell_model.models.gc_net_nest
+                         grid_cell_model.models.gc_net_numpy
                          grid_cell_model.models.gc_single_neuron
     :parts: 2
 
@@ -68,18 +72,50 @@ import numpy as np
 import time
 import copy
 
-from ..analysis.image import Position2D, remapTwistedTorus
+from ..analysis.twisted_torus import Position2D, twistedTorusDistance
 from .construction.weights import (IsomorphicConstructor,
-                                   ProbabilisticConstructor)
+                                   ProbabilisticConstructor,
+                                   SparseProbabilisticConstructor)
+from .input_cache import load_rat_trajectory, get_place_cell_input
+from ..data_storage.sim_models.ei import compactStateMonData
+from simtools.storage import DataStorage
 
 
-__all__ = ['GridCellNetwork']
+__all__ = ['GridCellNetwork', 'BasicNetworkMixin', 'PosInputs',
+           'ConstPosInputs']
 
 
+logger = logging.getLogger(__name__)
 gcnLogger = logging.getLogger('{0}.{1}'.format(__name__,
                                                "NestGridCellNetwork"))
 
 
+class PosInputs(object):
+    '''Data representing animal position input.'''
+    def __init__(self, pos_x, pos_y, pos_dt):
+        self.pos_x = pos_x
+        self.pos_y = pos_y
+        self.pos_dt = pos_dt
+
+    def __str__(self):
+        res = ("PosInputs:\n  pos_x: {0}\n  pos_y: {1}\n  "
+               "pos_dt: {2}".format(self.pos_x, self.pos_y, self.pos_dt))
+        return res
+
+
+class ConstPosInputs(PosInputs):
+    '''Data representing constant position of the animal.'''
+    def __init__(self, pos_x, pos_y):
+        # dt here is irrelevant (say 1e3). This data will never get advanced
+        super(ConstPosInputs, self).__init__([float(pos_x)], [float(pos_y)],
+                                             1e3)
+
+    def __str__(self):
+        res = ('ConstPosInputs:\n  pos_x: {0}\n  pos_y: {1}\n  '
+               'pos_dt: {2}'.format(self.pos_x, self.pos_y, self.pos_dt))
+        return res
+
+
 class GridCellNetwork(object):
     '''
     This is an interface to the grid cell network. One should be able to set
@@ -117,6 +153,8 @@ class GridCellNetwork(object):
         self.prefDirs_e = None
         self.prefDirs_i = None
 
+        self._ratVelocitiesLoaded = False
+
         self._weight_constructor = self._select_weight_constructor(neuronOpts)
 
     def simulate(self, t, printTime):
@@ -138,7 +176,12 @@ class GridCellNetwork(object):
         constructor : WeightConstructor
             Constructor instance.
         '''
-        if options.probabilistic_synapses:
+        if (options.probabilistic_synapses and
+                getattr(options, 'sparse_synapses', 0)):
+            gcnLogger.debug('Selecting sparse probabilistic contructor for '
+                            'weights.')
+            return SparseProbabilisticConstructor()
+        elif options.probabilistic_synapses:
             gcnLogger.debug('Selecting probabilistic contructor for weights.')
             return ProbabilisticConstructor()
         else:
@@ -220,7 +263,7 @@ class GridCellNetwork(object):
         shift = Position2D(-prefDirC * prefDir.x, -prefDirC * prefDir.y)
         a = self._shiftOnTwistedTorus(a, shift, dim)
 
-        d = remapTwistedTorus(a, others, dim)
+        d = twistedTorusDistance(a.x, a.y, others.x, others.y, dim.x, dim.y)
         return np.exp(-(d - mu)**2 / 2 / sigma**2)
 
     def _generateGaussianWeights(self, a, others, sigma, prefDir, prefDirC):
@@ -244,7 +287,7 @@ class GridCellNetwork(object):
         a.x -= prefDirC * prefDir.x
         a.y -= prefDirC * prefDir.y
 
-        d = remapTwistedTorus(a, others, dim)
+        d = twistedTorusDistance(a.x, a.y, others.x, others.y, dim.x, dim.y)
         return np.exp(-d**2 / 2. / sigma**2)
 
     def _addToConnections(self, conductances, perc_synapses, h):
@@ -382,10 +425,10 @@ class GridCellNetwork(object):
                     raise Exception('AMPA_gaussian parameters must be 0 or 1')
 
 
-                tmp_templ = self._weight_constructor.generate_weights(
+                # Weights must be in the proper units (e.g. nS)
+                I_nid, weights = self._weight_constructor.generate_connections(
                     tmp_templ, g_AMPA_mean)
-                # tmp_templ down here must be in the proper units (e.g. nS)
-                self._divergentConnectEI(it, range(self.net_Ni), tmp_templ)
+                self._divergentConnectEI(it, I_nid, weights)
 
     def _connect_ei_flat(self):
         '''Make E-->I connections that are distance-independent.'''
@@ -531,6 +574,82 @@ class GridCellNetwork(object):
         '''
         raise NotImplementedError()
 
+    def _loadRatVelocities(self):
+        '''
+        Load rat velocities (in this case positions only)
+        '''
+        if self._ratVelocitiesLoaded:
+            return
+
+        logger.info('Loading rat velocities')
+
+        self.ratData    = load_rat_trajectory(self.no.ratVelFName)
+        self.rat_dt     = self.ratData['dt'][0][0] * 1e3      # units: ms
+
+        self.rat_pos_x  = self.ratData['pos_x'].ravel()
+        self.rat_pos_y  = self.ratData['pos_y'].ravel()
+
+        # Map velocities to currents: we use the slope of bump speed vs. rat
+        # speed and inter-peak grid field distance to remap
+        # Bump speed-current slope must be estimated
+        self.velC = self.Ne_x / self.no.gridSep / self.no.bumpCurrentSlope
+
+        self._ratVelocitiesLoaded = True
+
+        gcnLogger.debug('velC: %f, bumpCurrentSlope: %f, gridSep: %f',
+                        self.velC, self.no.bumpCurrentSlope, self.no.gridSep)
+
+    def _getPlaceCellConnections(self, ctr_x, ctr_y, weight):
+        '''Compute connections from place cells to the E population.
+
+        Here we extract connections from the PlaceCellInput class that was
+        originaly used as a current input generator for place cell resetting
+        mechanism. The output of this class perfectly matches how divergent
+        connections from a single place cell should be mapped onto the twisted
+        torus grid cell sheet.
+
+        Parameters
+        ----------
+        ctr_x, ctr_y : array-like
+            Centers of the place fields.
+        weight : float
+            Maximal connection weight.
+
+        Returns
+        -------
+        pc_idx, e_idx, weights : np.ndarray
+            Indexes of the place cells, indexes of the E neurons and the
+            weights of all the connections.
+        '''
+        # how divergent the connections are, 3sigma rule --> division by 6.
+        connStdDev          = self.no.gridSep / 2. / 6.
+        pc_weight_threshold = 0.1
+
+        pc_input = get_place_cell_input(self.Ne_x, self.Ne_y,
+                                        self.no.arenaSize,
+                                        self.no.gridSep, connStdDev)
+        # Weight templates of all place cells, shape (NTotal, Ne)
+        W = pc_input.getSheetInputs(ctr_x, ctr_y).reshape(len(ctr_x), -1)
+        pc_idx, e_idx = np.nonzero(W > pc_weight_threshold)
+        return pc_idx, e_idx, W[pc_idx, e_idx] * weight
+
+    def _getIPlaceCellConnections(self, NTotal, Nconn_pcs):
+        '''Select the place cells connected to each I neuron.
+
+        I-PCs are connected with a constant connection weight to I cells. The
+        selections are drawn one I cell at a time, in the same order as
+        np.random.choice is called by the older versions, so that the same
+        seed gives the same connectivity.
+
+        Returns
+        -------
+        pc_idx : np.ndarray
+            An array of shape (net_Ni, Nconn_pcs) of place cell indexes.
+        '''
+        return np.array([np.random.choice(NTotal, Nconn_pcs, replace=False)
+                         for _ in xrange(self.net_Ni)],
+                        dtype=int).reshape(self.net_Ni, Nconn_pcs)
+
     def getAttrDictionary(self):
         '''
         Get a dictionary containing all the necessary attributes the user might
@@ -538,6 +657,18 @@ class GridCellNetwork(object):
         '''
         raise NotImplementedError()
 
+    @staticmethod
+    def getStateRecFormat(options):
+        '''Return the compact state recording format given by ``options``,
+        or ``None`` if the state monitor data should be saved as they are.'''
+        if not getattr(options, 'stateRecCompact', 0):
+            return None
+        return {
+            'dtype'   : getattr(options, 'stateRecDtype', None),
+            'decimate': getattr(options, 'stateRecDecimate', 1),
+            'lowpass' : bool(getattr(options, 'stateRecLowpass', 0)),
+        }
+
     ###########################################################################
     #                           Other
     ###########################################################################
@@ -625,3 +756,177 @@ class GridCellNetwork(object):
                 return [0, 1]  # up
             else:
                 return [1, 0]  # Right
+
+
+class BasicNetworkMixin(object):
+    '''Monitors and output data of the basic grid cell networks.
+
+    The code shared by the basic networks of all the simulator backends, so
+    that they create the same monitors and produce the same output data. The
+    backends implement :meth:`getSpikeMonData` and :meth:`getStateMonData`.
+    '''
+    def getDefaultStateMonParams(self):
+        '''Generate default, pre-set state monitor parameters.'''
+        return {
+            'withtime': True,
+            'interval': 10.0 * self.no.sim_dt,
+            'record_from': ['V_m', 'I_clamp_AMPA', 'I_clamp_NMDA',
+                            'I_clamp_GABA_A', 'I_stim']
+        }
+
+    def _createBasicMonitors(self, nrec_spikes, stateRecord_type,
+                             stateRecParams, rec_spikes_probabilistic,
+                             stateRecFormat):
+        '''Create the spike and state monitors of the E and I populations.'''
+        if stateRecFormat is None:
+            stateRecFormat = self.getStateRecFormat(self.no)
+        self.stateRecFormat = stateRecFormat
+
+        # Spikes
+        self.nrecSpikes_e = nrec_spikes[0]
+        self.nrecSpikes_i = nrec_spikes[1]
+
+        if self.nrecSpikes_e is None:
+            self.nrecSpikes_e = self.Ne_x * self.Ne_y
+        if self.nrecSpikes_i is None:
+            self.nrecSpikes_i = self.Ni_x * self.Ni_y
+
+        if rec_spikes_probabilistic == False:
+            self.spikeMon_e  = self.getSpikeDetector(
+                "E", np.arange(self.nrecSpikes_e))
+            self.spikeMon_i  = self.getSpikeDetector(
+                "I", np.arange(self.nrecSpikes_i))
+        else:
+            self.spikeMon_e  = self.getSpikeDetector(
+                "E", np.sort(np.random.choice(len(self.E_pop),
+                                              self.nrecSpikes_e,
+                                              replace=False)))
+            self.spikeMon_i  = self.getSpikeDetector(
+                "I", np.sort(np.random.choice(len(self.I_pop),
+                                              self.nrecSpikes_i,
+                                              replace=False)))
+
+        # States
+        if stateRecord_type == 'middle-center':
+            self.state_record_e = [self.Ne_x // 2 - 1,
+                                   (self.Ne_y // 2 * self.Ne_x +
+                                    self.Ne_x // 2 - 1)]
+            self.state_record_i = [self.Ni_x // 2 - 1,
+                                   (self.Ni_y // 2 * self.Ni_x +
+                                    self.Ni_x // 2 - 1)]
+        else:
+            raise ValueError("Currently stateRecordType must be "
+                             "'middle-center'")
+
+        self.stateMonParams_e = self.getDefaultStateMonParams()
+        self.stateMonParams_i = self.getDefaultStateMonParams()
+
+        stRecp_e = stateRecParams[0]
+        stRecp_i = stateRecParams[1]
+        if stRecp_e is not None:
+            self.stateMonParams_e.update(stRecp_e)
+        if stRecp_i is not None:
+            self.stateMonParams_i.update(stRecp_i)
+
+        self.stateMon_e  = self.getStateMonitor("E",
+                                                self.state_record_e,
+                                                self.stateMonParams_e)
+        self.stateMon_i  = self.getStateMonitor("I",
+                                                self.state_record_i,
+                                                self.stateMonParams_i)
+
+    def getMonitors(self):
+        '''Return the main spike and state monitors.'''
+        return (
+            self.spikeMon_e,
+            self.spikeMon_i,
+            self.stateMon_e,
+            self.stateMon_i
+        )
+
+    def getSpikeMonData(self, mon, gidStart):
+        '''
+        Generate a dictionary of a spike data from the monitor ``mon``, with
+        the senders relative to ``gidStart``.
+        '''
+        raise NotImplementedError()
+
+    def getStateMonData(self, mon):
+        '''
+        Generate a dictionary of state monitor data from the monitor ``mon``
+        '''
+        raise NotImplementedError()
+
+    def getStateMonOutput(self, mon):
+        '''
+        Return the state monitor data from ``mon`` in the format that should be
+        saved, i.e. converted to the compact layout if requested.
+        '''
+        data = self.getStateMonData(mon)
+        if self.stateRecFormat is None:
+            return data
+        return compactStateMonData(data, **self.stateRecFormat)
+
+    def getSpikes(self, **kw):
+        '''
+        Return a dictionary of spike monitor data.
+        '''
+        out = {}
+
+        if self.spikeMon_e is not None:
+            out['spikeMon_e'] = self.getSpikeMonData(self.spikeMon_e,
+                                                     self.E_pop[0])
+        if self.spikeMon_i is not None:
+            out['spikeMon_i'] = self.getSpikeMonData(self.spikeMon_i,
+                                                     self.I_pop[0])
+
+        for label, vals in self._extraSpikeMons.items():
+            assert label not in out.keys()
+            out[label] = self.getSpikeMonData(vals[0], vals[1])
+
+        return out
+
+    def getNetParams(self):
+        '''Get network and derived network parameters, and the termination
+        record if the simulation has been terminated early.'''
+        out = {}
+        out['options'] = self.no._einet_optdict
+        out['net_attr'] = self.getAttrDictionary()
+        if self._termination is not None:
+            out['termination'] = dict(self._termination)
+        return out
+
+    def getAllData(self):
+        '''
+        Save all the simulated data into a dictionary and return it.
+        '''
+        out = self.getNetParams()
+
+        # Spike monitors
+        # Note that getSpikes() is overridden in child classes and requires the
+        # espikes and ispikes arguments.
+        out.update(self.getSpikes(espikes=True, ispikes=True))
+
+        # Save state variables
+        out['stateMon_e'] = self.getStateMonOutput(self.stateMon_e)
+        out['stateMon_i'] = self.getStateMonOutput(self.stateMon_i)
+        for label, val in self._extraStateMons.items():
+            assert label not in out.keys()
+            out[label] = self.getStateMonOutput(val)
+
+        return out
+
+    def saveAll(self, fileName):
+        '''
+        Save all the simulated data that has been recorded into a file.
+
+        Parameters
+        ----------
+        fileName : string
+            Path and name of the file
+        '''
+        out = DataStorage.open(fileName, 'w')
+        d = self.getAllData()
+        for key, val in d.items():
+            out[key] = val
+        out.close()
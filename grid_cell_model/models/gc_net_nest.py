@@ -9,22 +9,25 @@ Classes
     NestGridCellNetwork
     BasicGridCellNetwork
     ConstantVelocityNetwork
+    NetworkBatch
     PosInputs
     ConstPosInputs
 '''
 from __future__ import absolute_import, print_function
 
+import time as _time
 import logging
 import collections
 
 import numpy as np
-from scipy.io import loadmat
+from scipy import sparse
 import nest
 
 from . import gc_neurons
-from .gc_net import GridCellNetwork
-from .place_input import PlaceCellInput
+from .gc_net import (GridCellNetwork, BasicNetworkMixin, PosInputs,
+                     ConstPosInputs)
 from .place_cells import UniformBoxPlaceCells
+from ..data_storage.sim_models.ei import compactStateMonData
 from simtools.storage import DataStorage
 
 logger = logging.getLogger(__name__)
@@ -34,36 +37,42 @@ gcnLogger = logging.getLogger('{0}.{1}'.format(__name__,
 nest.Install('gridcellsmodule')
 
 
-class PosInputs(object):
-    '''Data representing animal position input.'''
-    def __init__(self, pos_x, pos_y, pos_dt):
-        self.pos_x = pos_x
-        self.pos_y = pos_y
-        self.pos_dt = pos_dt
-
-    def __str__(self):
-        res = ("PosInputs:\n  pos_x: {0}\n  pos_y: {1}\n  "
-               "pos_dt: {2}".format(self.pos_x, self.pos_y, self.pos_dt))
-        return res
-
-
-class ConstPosInputs(PosInputs):
-    '''Data representing constant position of the animal.'''
-    def __init__(self, pos_x, pos_y):
-        # dt here is irrelevant (say 1e3). This data will never get advanced
-        super(ConstPosInputs, self).__init__([float(pos_x)], [float(pos_y)],
-                                             1e3)
-
-    def __str__(self):
-        res = ('ConstPosInputs:\n  pos_x: {0}\n  pos_y: {1}\n  '
-               'pos_dt: {2}'.format(self.pos_x, self.pos_y, self.pos_dt))
-        return res
+def _initNESTKernel(options):
+    '''Reset the NEST kernel and set it up according to ``options``.'''
+    gcnLogger.debug('Initializing NEST kernel: no. of threads: %d',
+                    options.nthreads)
+    # ResetKernel() restores the default seeds; keep the ones set by
+    # TrialSeedGenerator.
+    grng_seed, rng_seeds = nest.GetKernelStatus(['grng_seed', 'rng_seeds'])
+    nest.ResetKernel()
+    nest.SetKernelStatus({"resolution": options.sim_dt,
+                          "print_time": False})
+    nest.SetKernelStatus({"local_num_threads": options.nthreads})
+    n_vp = nest.GetKernelStatus(['total_num_virtual_procs'])[0]
+    if len(rng_seeds) == n_vp:
+        nest.SetKernelStatus({'grng_seed': grng_seed,
+                              'rng_seeds': list(rng_seeds)})
+    else:
+        gcnLogger.warn('Seeds were set for %d virtual processes, but the '
+                       'network uses %d. Using the default NEST seeds.',
+                       len(rng_seeds), n_vp)
 
 
 class NestGridCellNetwork(GridCellNetwork):
-    '''Grid cell network implemented in NEST simulator.'''
-    def __init__(self, neuronOpts, simulationOpts):
+    '''Grid cell network implemented in NEST simulator.
+
+    Parameters
+    ----------
+    neuronOpts, simulationOpts
+        See :class:`~grid_cell_model.models.gc_net.GridCellNetwork`.
+    batch : NetworkBatch, or None
+        If not ``None``, the network is a member of a batch of networks that
+        are simulated together in one NEST kernel. Do not use this directly,
+        create the network with :meth:`NetworkBatch.add`.
+    '''
+    def __init__(self, neuronOpts, simulationOpts, batch=None):
         GridCellNetwork.__init__(self, neuronOpts, simulationOpts)
+        self._batch = batch
         self.velocityInputInitialized = False
 
         self.spikeMon_e = None
@@ -75,7 +84,6 @@ class NestGridCellNetwork(GridCellNetwork):
         self._extraSpikeMons = {}   # Extra spike monitors
         self._extraStateMons = {}   # Extra state monitors
 
-        self._ratVelocitiesLoaded = False
         self._placeCellsLoaded = False
         self._i_placeCellsLoaded = False
 
@@ -86,6 +94,13 @@ class NestGridCellNetwork(GridCellNetwork):
         self.IPCHelper = None
         self.NIPC = None
 
+        # Simulation time (ms) at which the NEST kernel time is 0. Non-zero
+        # only when the simulation has been resumed from a checkpoint.
+        self._timeOffset = 0.
+
+        # Termination record of a simulation stopped by an activity monitor
+        self._termination = None
+
         self._initNESTKernel()
         self._constructNetwork()
         self._initStates()
@@ -138,13 +153,10 @@ class NestGridCellNetwork(GridCellNetwork):
     #         clk.reinit()
 
     def _initNESTKernel(self):
-        '''Initialise the NEST kernel.'''
-        gcnLogger.debug('Initializing NEST kernel: no. of threads: %d',
-                        self.no.nthreads)
-        nest.ResetKernel()
-        nest.SetKernelStatus({"resolution": self.no.sim_dt,
-                              "print_time": False})
-        nest.SetKernelStatus({"local_num_threads": self.no.nthreads})
+        '''Initialise the NEST kernel. Networks in a batch share the kernel
+        initialised by the batch.'''
+        if self._batch is None:
+            _initNESTKernel(self.no)
 
     # def reinit(self):
     #     self._initNESTKernel()
@@ -169,21 +181,57 @@ class NestGridCellNetwork(GridCellNetwork):
         self.I_pop = nest.Create(self.i_model_name, self.net_Ni,
                                  params=self.i_neuron_params)
 
-        nest.CopyModel(
-            'static_synapse', 'I_AMPA_NMDA',
-            params={'receptor_type': self.i_receptors['AMPA_NMDA']})
-        nest.CopyModel(
-            'static_synapse', 'E_GABA_A',
-            params={'receptor_type': self.e_receptors['GABA_A']})
-        nest.CopyModel(
-            'static_synapse', 'PC_AMPA',
-            params={'receptor_type': self.e_receptors['AMPA']})
+        # Networks in a batch share the synapse models
+        synapseModels = nest.Models('synapses')
+        for name, receptor in [
+                ('I_AMPA_NMDA', self.i_receptors['AMPA_NMDA']),
+                ('E_GABA_A', self.e_receptors['GABA_A']),
+                ('PC_AMPA', self.e_receptors['AMPA'])]:
+            if name not in synapseModels:
+                nest.CopyModel('static_synapse', name,
+                               params={'receptor_type': receptor})
 
         # Connect E-->I and I-->E
         self._connect_network()
 
-    def simulate(self, time, printTime=True):
-        '''Run the simulation'''
+    def simulate(self, time, printTime=True, segment=None, stream=None,
+                 checkpoint=None, monitor=None):
+        '''Run the simulation
+
+        Parameters
+        ----------
+        time : float
+            Simulation time (ms).
+        printTime : bool
+            Whether NEST should print the simulation progress.
+        segment : float, or None
+            If not ``None``, advance the simulation in segments of this length
+            (ms) instead of one run.
+        stream : DataStorage, or None
+            Only in the segmented mode. After each segment, all the data
+            recorded by the spike and state monitors are drained from NEST and
+            appended to resizable arrays in ``stream`` (see
+            :meth:`flushMonitors`). Peak memory use is then bounded by the
+            segment length and the data of the finished segments survive a
+            crash.
+        checkpoint : TrialCheckpointer, or None
+            Only in the segmented mode. Save the dynamic state of the network
+            into ``stream`` at the checkpoint intervals, so that the simulation
+            can be resumed (see :meth:`restoreCheckpoint`).
+        monitor : ActivityMonitor, or None
+            Evaluate the activity of the network while simulating and
+            terminate the simulation early when the monitor's criteria are
+            met (see :mod:`~grid_cell_model.models.activity_monitor`). The
+            simulation is then advanced in chunks of ``monitor.interval``, or
+            in segments if ``segment`` is set, and the termination record is
+            saved with the data under the ``termination`` key.
+        '''
+        if self._batch is not None:
+            raise RuntimeError("This network is a member of a batch. Use "
+                               "NetworkBatch.simulate() to simulate all the "
+                               "networks of the batch.")
+        if monitor is not None:
+            monitor.attach(self)
         self.endConstruction()
         self.beginSimulation()
         nest.SetKernelStatus({"print_time": bool(printTime)})
@@ -194,7 +242,300 @@ class NestGridCellNetwork(GridCellNetwork):
                       "'velON' parameter to 1, then this message probably "
                       "indicates a bug in the simulation code.")
             gcnLogger.warn(velMsg)
-        nest.Simulate(time)
+
+        if segment is None:
+            if stream is not None or checkpoint is not None:
+                raise ValueError("Streaming the recorded data and "
+                                 "checkpointing require the segmented "
+                                 "simulation mode.")
+            if monitor is None:
+                nest.Simulate(time)
+            else:
+                self._simulateSegmented(time, monitor.interval, None, None,
+                                        monitor)
+        else:
+            self._simulateSegmented(time, segment, stream, checkpoint, monitor)
+
+    def _simulateSegmented(self, time, segment, stream, checkpoint,
+                           monitor=None):
+        '''Advance the simulation in segments of ``segment`` ms.'''
+        if segment <= 0:
+            raise ValueError("Simulation segment must be positive, got "
+                             "{0}".format(segment))
+        if checkpoint is not None:
+            if stream is None:
+                raise ValueError("Checkpoints are stored with the streamed "
+                                 "data, stream must be set.")
+            checkpoint.validate(self, segment)
+
+        t = self._timeOffset
+        while t < time:
+            if checkpoint is not None and checkpoint.is_due(t):
+                checkpoint.checkpoint(self, stream, t)
+            dt = min(segment, time - t)
+            gcnLogger.debug('Simulating segment <%f, %f> ms', t, t + dt)
+            nest.Simulate(dt)
+            t += dt
+            if stream is not None:
+                self.flushMonitors(stream)
+            if monitor is not None and monitor.update(t):
+                self._termination = monitor.termination
+                break
+
+    def _getSpikeMonitorList(self):
+        '''Return a list of (label, monitor, gidStart) of all spike monitors.'''
+        mons = []
+        if self.spikeMon_e is not None:
+            mons.append(('spikeMon_e', self.spikeMon_e, self.E_pop[0]))
+        if self.spikeMon_i is not None:
+            mons.append(('spikeMon_i', self.spikeMon_i, self.I_pop[0]))
+        for label, vals in self._extraSpikeMons.iteritems():
+            mons.append((label, vals[0], vals[1]))
+        return mons
+
+    def _getStateMonitorList(self):
+        '''Return a list of (label, monitor) of all state monitors.'''
+        mons = []
+        if self.stateMon_e is not None:
+            mons.append(('stateMon_e', self.stateMon_e))
+        if self.stateMon_i is not None:
+            mons.append(('stateMon_i', self.stateMon_i))
+        for label, mon in self._extraStateMons.iteritems():
+            mons.append((label, mon))
+        return mons
+
+    def flushMonitors(self, out):
+        '''Move all the recorded events from NEST into ``out``.
+
+        The events of every spike and state monitor are appended to resizable
+        arrays in ``out`` and then cleared in NEST. The layout is the same as
+        that of :meth:`BasicGridCellNetwork.getAllData`, i.e.
+        ``out[label]['events'][key]`` for spike monitors and
+        ``out[label][idx]['events'][key]`` for state monitors (one item for
+        each multimeter).
+
+        Parameters
+        ----------
+        out : HDF5MapStorage
+            Storage to append the data to.
+        '''
+        for label, mon, gidStart in self._getSpikeMonitorList():
+            if label not in out:
+                out[label] = {'events': {}}
+            events = nest.GetStatus(mon, 'events')[0]
+            outEvents = out[label]['events']
+            for key, val in events.iteritems():
+                val = np.asanyarray(val)
+                if key == 'senders':
+                    val = val - gidStart
+                elif key == 'times':
+                    val = self._shiftTimes(val)
+                outEvents.append_array(key, val)
+            nest.SetStatus(mon, {'n_events': 0})
+
+        for label, mon in self._getStateMonitorList():
+            if label not in out:
+                out[label] = [{'events': {}} for _ in mon]
+            outList = out[label]
+            for mon_idx, events in enumerate(nest.GetStatus(mon, 'events')):
+                outEvents = outList[mon_idx]['events']
+                for key, val in events.iteritems():
+                    val = np.asanyarray(val)
+                    if key == 'times':
+                        val = self._shiftTimes(val)
+                    outEvents.append_array(key, val)
+            nest.SetStatus(mon, {'n_events': 0})
+
+        out.flush()
+
+    def _shiftTimes(self, times):
+        '''Convert NEST kernel times into the simulation time.
+
+        The conversion goes through the integer number of tics so that the
+        result is the same as if NEST had recorded the time itself.
+        '''
+        if self._timeOffset == 0:
+            return times
+        ms_per_tic = nest.GetKernelStatus('ms_per_tic')
+        offset = np.rint(self._timeOffset / ms_per_tic)
+        return (np.rint(times / ms_per_tic) + offset) * ms_per_tic
+
+    ###########################################################################
+    #                     Checkpointing
+    ###########################################################################
+    # State variables of the neurons that must be restored from a checkpoint.
+    # All the others are either parameters or are computed from these.
+    NEURON_STATE_KEYS = ('V_m', 'I_stim', 'g_AHP', 'g_AMPA', 'g_NMDA',
+                         'g_GABA_A', 'ref_steps', 'gen_steps')
+
+    def _getPlaceCellGenerators(self):
+        '''Return a list of (label, generators) of all place cell groups.'''
+        gens = []
+        for label, pcs in (('PC', self.PC), ('PC_start', self.PC_start),
+                           ('IPC', self.IPC)):
+            if pcs is not None and len(pcs) != 0:
+                gens.append((label, list(pcs)))
+        return gens
+
+    def _getTimedDevices(self):
+        '''Return all the devices whose activity depends on time.'''
+        devices = []
+        for _, pcs in self._getPlaceCellGenerators():
+            devices += pcs
+        for _, mon, _ in self._getSpikeMonitorList():
+            devices += list(mon)
+        for _, mon in self._getStateMonitorList():
+            devices += list(mon)
+        return devices
+
+    def _getKernelSteps(self):
+        '''Current NEST kernel time in simulation steps.'''
+        return int(round(nest.GetKernelStatus('time') / self.no.sim_dt))
+
+    def getDynamicState(self):
+        '''Return the dynamic state of the network.
+
+        This contains the state variables of all the neurons, including the
+        position of the theta and velocity current generators, and the
+        positional state of the place cells. Together with the network
+        parameters and seeds it is sufficient to continue the simulation (see
+        :meth:`setDynamicState`).
+
+        Returns
+        -------
+        state : dict
+            ``state['E']`` and ``state['I']`` contain arrays of
+            :attr:`NEURON_STATE_KEYS`. ``state['place_cells'][label]`` contains
+            the positional index and the number of steps until the next
+            position change of each group of place cells.
+        '''
+        state = {}
+        for label, pop in (('E', self.E_pop), ('I', self.I_pop)):
+            values = nest.GetStatus(pop, self.NEURON_STATE_KEYS)
+            state[label] = {}
+            for key_idx, key in enumerate(self.NEURON_STATE_KEYS):
+                state[label][key] = np.array([v[key_idx] for v in values])
+
+        now = self._getKernelSteps()
+        state['place_cells'] = {}
+        for label, pcs in self._getPlaceCellGenerators():
+            values = nest.GetStatus(pcs, ('pos_it', 'next_pos_step'))
+            state['place_cells'][label] = {
+                'pos_it': np.array([v[0] for v in values]),
+                'pos_steps_left': np.array([v[1] - now for v in values]),
+            }
+        return state
+
+    def setDynamicState(self, state):
+        '''Set the dynamic state of the network.
+
+        Parameters
+        ----------
+        state : dict-like
+            State of the network, as returned by :meth:`getDynamicState`.
+        '''
+        for label, pop in (('E', self.E_pop), ('I', self.I_pop)):
+            columns = [np.asarray(state[label][key]).tolist()
+                       for key in self.NEURON_STATE_KEYS]
+            nest.SetStatus(pop, [dict(zip(self.NEURON_STATE_KEYS, values))
+                                 for values in zip(*columns)])
+
+        now = self._getKernelSteps()
+        for label, pcs in self._getPlaceCellGenerators():
+            pc_state = state['place_cells'][label]
+            pos_it = np.asarray(pc_state['pos_it']).tolist()
+            left = np.asarray(pc_state['pos_steps_left']).tolist()
+            nest.SetStatus(pcs, [{'pos_it': it, 'next_pos_step': now + l}
+                                 for it, l in zip(pos_it, left)])
+
+    def resetDynamicState(self, state):
+        '''Reset the network in NEST and set its dynamic state.
+
+        NEST cannot set the spikes that are in transit, i.e. those that have
+        been emitted but not delivered yet. Resetting the network discards
+        them, so that a simulation that continues after this call is identical
+        to a simulation resumed from a checkpoint with the same ``state``.
+        '''
+        nest.ResetNetwork()
+        self.setDynamicState(state)
+
+    def getStreamLengths(self, stream):
+        '''Return the lengths of all event arrays stored in ``stream``.'''
+        lengths = {}
+        for label, _, _ in self._getSpikeMonitorList():
+            if label in stream:
+                events = stream[label]['events']
+                lengths[label] = dict((key, len(events[key]))
+                                      for key in events.keys())
+        for label, _ in self._getStateMonitorList():
+            if label in stream:
+                lengths[label] = {}
+                for mon_idx, item in enumerate(stream[label]):
+                    events = item['events']
+                    lengths[label][str(mon_idx)] = dict(
+                        (key, len(events[key])) for key in events.keys())
+        return lengths
+
+    def _truncateStream(self, stream, lengths):
+        '''Truncate the event arrays in ``stream`` to ``lengths``.
+
+        Arrays that are not in ``lengths`` have been created after the
+        checkpoint and are therefore emptied.
+        '''
+        def truncate(events, ev_lengths):
+            for key in events.keys():
+                length = ev_lengths[key] if key in ev_lengths else 0
+                events.truncate_array(key, length)
+
+        for label, _, _ in self._getSpikeMonitorList():
+            if label in stream:
+                truncate(stream[label]['events'],
+                         lengths[label] if label in lengths else {})
+        for label, _ in self._getStateMonitorList():
+            if label in stream:
+                mon_lengths = lengths[label] if label in lengths else {}
+                for mon_idx, item in enumerate(stream[label]):
+                    idx = str(mon_idx)
+                    truncate(item['events'],
+                             mon_lengths[idx] if idx in mon_lengths else {})
+
+    def restoreCheckpoint(self, checkpoint, stream=None):
+        '''Continue the simulation from a checkpoint.
+
+        The network must have been constructed with the same parameters and
+        random seeds as the checkpointed network and nothing must have been
+        simulated yet. NEST kernel time cannot be set, so the simulation
+        continues at kernel time 0: all the time dependent devices are shifted
+        and the recorded times are converted back into the simulation time.
+
+        Parameters
+        ----------
+        checkpoint : dict-like
+            A checkpoint saved by
+            :class:`~grid_cell_model.models.checkpoint.TrialCheckpointer`.
+        stream : DataStorage, or None
+            Storage with the streamed data of the interrupted simulation. Any
+            data recorded after the checkpoint are discarded.
+        '''
+        if self._getKernelSteps() != 0:
+            raise RuntimeError("Checkpoints can only be restored before the "
+                               "simulation has started.")
+        t = float(checkpoint['t'])
+        gcnLogger.info('Restoring the network from a checkpoint at %f ms', t)
+
+        self._timeOffset = t
+        nest.SetStatus(self._getTimedDevices(), 'origin', -t)
+        self.setDynamicState(checkpoint['state'])
+
+        rng_state = checkpoint['numpy_rng']
+        np.random.set_state((str(rng_state['name']), rng_state['keys'],
+                             int(rng_state['pos']),
+                             int(rng_state['has_gauss']),
+                             float(rng_state['cached_gaussian'])))
+
+        if stream is not None:
+            self._truncateStream(stream, checkpoint['stream_lengths'])
+            stream.flush()
 
     def getSpikeDetector(self, type, N_ids=None):
         '''
@@ -365,10 +706,15 @@ class NestGridCellNetwork(GridCellNetwork):
                               model='E_GABA_A', weight=list(weights),
                               delay=[self.no.delay] * len(weights))
 
-    def getConnMatrix(self, popType):
+    def getConnMatrixSparse(self, popType):
         '''
-        Return all *input* connections to neuron with index post from the
-        specified popType.
+        Return all connections *from* the specified population to the other
+        population, as a sparse matrix.
+
+        The connections are obtained from the kernel in bulk: one query for
+        all the connections of the synapse model between the two populations
+        and one query for their weights. Multiple connections between the same
+        pair of neurons are summed up.
 
         Parameters
         ----------
@@ -380,71 +726,49 @@ class NestGridCellNetwork(GridCellNetwork):
 
             If popType == 'I' the connection weights returned will be for
             GABA_A connections.
-        output : a 2D numpy array
-            An array containing the connections. The shape is (post,
+        output : scipy.sparse.csr_matrix
+            A matrix containing the connections. The shape is (post,
             pre)/(target, source).
         '''
-        EStart = np.min(self.E_pop)
-        IStart = np.min(self.I_pop)
-        print("EStart: {0}".format(EStart))
-        print("IStart: {0}".format(IStart))
-        print("len(self.E_pop): {0}".format(len(self.E_pop)))
-        print("len(self.I_pop): {0}".format(len(self.I_pop)))
         if popType == 'E':
-            W_IE = np.zeros((len(self.I_pop), len(self.E_pop)))
-            for e in xrange(len(self.E_pop)):
-                print("E neuron {0} --> I neurons".format(e))
-                conns = nest.FindConnections([self.E_pop[e]])
-                for i in xrange(len(conns)):
-                    target = nest.GetStatus([conns[i]], 'target')
-                    if target[0] in self.I_pop:
-                        W_IE[target[0] - IStart, e] = \
-                            nest.GetStatus([conns[i]], 'weight')[0]
-            return W_IE
+            pre, post, model = self.E_pop, self.I_pop, 'I_AMPA_NMDA'
         elif popType == 'I':
-            W_EI = np.zeros((len(self.E_pop), len(self.I_pop)))
-            for i in xrange(len(self.I_pop)):
-                print("I neuron {0} --> E neurons".format(i))
-                conns = nest.FindConnections([self.I_pop[i]])
-                for e in xrange(len(conns)):
-                    target = nest.GetStatus([conns[e]], 'target')
-                    if target[0] in self.E_pop:
-                        W_EI[target[0] - EStart, i] = \
-                            nest.GetStatus([conns[e]], 'weight')[0]
-            return W_EI
-
+            pre, post, model = self.I_pop, self.E_pop, 'E_GABA_A'
         else:
             msg = 'popType must be either \'E\' or \'I\'. Got {0}'
             raise ValueError(msg.format(popType))
 
-    ###########################################################################
-    #                     External sources definitions
-    ###########################################################################
-    def _loadRatVelocities(self):
-        '''
-        Load rat velocities (in this case positions only)
-        '''
-        if self._ratVelocitiesLoaded:
-            return
-
-        logger.info('Loading rat velocities')
+        shape = (len(post), len(pre))
+        conns = nest.GetConnections(source=list(pre), target=list(post),
+                                    synapse_model=model)
+        if len(conns) == 0:
+            return sparse.csr_matrix(shape)
+
+        # Connection identifiers: (source, target, target thread, synapse
+        # model, port)
+        ids = np.asarray(conns)
+        weights = np.asarray(nest.GetStatus(conns, 'weight'), dtype=float)
+        W = sparse.coo_matrix((weights, (ids[:, 1] - np.min(post),
+                                         ids[:, 0] - np.min(pre))),
+                              shape=shape)
+        return W.tocsr()
 
-        self.ratData    = loadmat(self.no.ratVelFName)
-        self.rat_dt     = self.ratData['dt'][0][0] * 1e3      # units: ms
-
-        self.rat_pos_x  = self.ratData['pos_x'].ravel()
-        self.rat_pos_y  = self.ratData['pos_y'].ravel()
-
-        # Map velocities to currents: we use the slope of bump speed vs. rat
-        # speed and inter-peak grid field distance to remap
-        # Bump speed-current slope must be estimated
-        self.velC = self.Ne_x / self.no.gridSep / self.no.bumpCurrentSlope
+    def getConnMatrix(self, popType):
+        '''
+        Return all connections *from* the specified population to the other
+        population, as a dense matrix.
 
-        self._ratVelocitiesLoaded = True
+        See :meth:`getConnMatrixSparse` for the description of the parameters.
 
-        gcnLogger.debug('velC: %f, bumpCurrentSlope: %f, gridSep: %f',
-                        self.velC, self.no.bumpCurrentSlope, self.no.gridSep)
+        output : a 2D numpy array
+            An array containing the connections. The shape is (post,
+            pre)/(target, source).
+        '''
+        return self.getConnMatrixSparse(popType).toarray()
 
+    ###########################################################################
+    #                     External sources definitions
+    ###########################################################################
     def setVelocityCurrentInput_e(self, prefDirs_mask=None):
         '''
         Set up movement simulation, based on preferred directions of neurons.
@@ -464,6 +788,9 @@ class NestGridCellNetwork(GridCellNetwork):
         # iaf_gridcells nodes so only one neuron needs setting the actual
         # values
         npos = int(self.no.time / self.rat_dt)
+        if self._batch is not None:
+            self._batch.shareTrajectory(self.rat_pos_x[0:npos],
+                                        self.rat_pos_y[0:npos], self.rat_dt)
         nest.SetStatus([self.E_pop[0]], {
             "rat_pos_x" : self.rat_pos_x[0:npos].tolist(),
             "rat_pos_y" : self.rat_pos_y[0:npos].tolist(),
@@ -500,24 +827,38 @@ class NestGridCellNetwork(GridCellNetwork):
         # Force these velocities, not the animal velocitites
         self._ratVelocitiesLoaded = True
 
+        # Map velocities to currents: Here the mapping is 1:1, i.e. the
+        # velocity dictates the current
+        self.velC = 1.
+
+        # The positions in NEST are shared among all iaf_gridcells nodes, even
+        # in different networks of a batch. The networks of a batch therefore
+        # share the direction of the movement and each network scales the
+        # current by its own speed, which gives the same velocity current.
+        if self._batch is None:
+            nest_pos_x, nest_pos_y, nest_velC = (self.rat_pos_x,
+                                                 self.rat_pos_y, self.velC)
+        else:
+            direction, nest_velC = self._batch.shareVelocityDirection(vel)
+            nest_pos_x = np.cumsum(np.array([direction[0]] * nVel)) * (
+                self.rat_dt * 1e-3)
+            nest_pos_y = np.cumsum(np.array([direction[1]] * nVel)) * (
+                self.rat_dt * 1e-3)
+
         # Load velocities into nest: they are all shared among all
         # iaf_gridcells nodes so only one neuron needs setting the actual
         # values
         nest.SetStatus([self.E_pop[0]], {
-            "rat_pos_x" : self.rat_pos_x.tolist(),
-            "rat_pos_y" : self.rat_pos_y.tolist(),
+            "rat_pos_x" : nest_pos_x.tolist(),
+            "rat_pos_y" : nest_pos_y.tolist(),
             "rat_pos_dt": self.rat_dt})  # s --> ms
 
         print(self.rat_pos_x)
         print(self.rat_pos_y)
 
-        # Map velocities to currents: Here the mapping is 1:1, i.e. the
-        # velocity dictates the current
-        self.velC = 1.
-
         nest.SetStatus(self.E_pop, "pref_dir_x", self.prefDirs_e[:, 0])
         nest.SetStatus(self.E_pop, "pref_dir_y", self.prefDirs_e[:, 1])
-        nest.SetStatus(self.E_pop, "velC", self.velC)
+        nest.SetStatus(self.E_pop, "velC", nest_velC)
 
         self.setStartPlaceCells(PosInputs([0.], [.0], self.rat_dt))
 
@@ -608,34 +949,13 @@ class NestGridCellNetwork(GridCellNetwork):
             # print test_x, test_y
 
             # Connections
-            # Here we extract connections from the PlaceCellInput class that
-            # was originaly used as a current input generator for place cell
-            # resetting mechanism. The output of this class perfectly matches
-            # how divergent connections from a single place cell should be
-            # mapped onto the twisted torus grid cell sheet
-
-            # how divergent the connections are, 3sigma rule --> division by 6.
-            connStdDev          = self.no.gridSep / 2. / 6.
-            pc_weight_threshold = 0.1
-
-            pc_input = PlaceCellInput(self.Ne_x, self.Ne_y, self.no.arenaSize,
-                                      self.no.gridSep, [.0, .0],
-                                      fieldSigma=connStdDev)
             ctr_x = nest.GetStatus(PC, 'ctr_x')
             ctr_y = nest.GetStatus(PC, 'ctr_y')
-            for pc_id in xrange(NTotal):
-                w = pc_input.getSheetInput(ctr_x[pc_id],
-                                           ctr_y[pc_id]).flatten()
-                gt_th = w > pc_weight_threshold
-                post = np.array(self.E_pop)[gt_th]
-                w    = w[gt_th]
-                # print post, w
-                nest.DivergentConnect(
-                    [PC[pc_id]],
-                    list(post),
-                    weight=list(w * weight),
-                    delay=[self.no.delay] * len(w),
-                    model='PC_AMPA')
+            pc_idx, e_idx, pc_weights = self._getPlaceCellConnections(
+                ctr_x, ctr_y, weight)
+            self._bulkConnect(np.asarray(PC)[pc_idx],
+                              np.asarray(self.E_pop)[e_idx],
+                              pc_weights, 'PC_AMPA')
 
             return PC, PCHelper, NTotal
 
@@ -645,6 +965,19 @@ class NestGridCellNetwork(GridCellNetwork):
 
         self._placeCellsLoaded = True
 
+    def _bulkConnect(self, pre, post, weights, model):
+        '''Create one-to-one connections between ``pre`` and ``post`` in a
+        single call to the kernel.
+
+        Connections of one presynaptic neuron are created in the order in
+        which they appear in ``post``.
+        '''
+        if len(pre) == 0:
+            return
+        nest.Connect(np.asarray(pre).tolist(), np.asarray(post).tolist(),
+                     np.asarray(weights, dtype=float).tolist(),
+                     [float(self.no.delay)] * len(pre), model=model)
+
     def setIPlaceCells(self):
         self._createIPlaceCells(self.no.ipc_N,
                                 int(self.no.ipc_nconn),
@@ -703,13 +1036,11 @@ class NestGridCellNetwork(GridCellNetwork):
                 'rat_pos_dt': posIn.pos_dt})
 
             # Connections
-            # I-PCs are connected with a constant connection weight to I cells
-            for i_idx in self.I_pop:
-                pc_idx = np.random.choice(PC, Nconn_pcs, replace=False)
-                nest.ConvergentConnect(pc_idx.tolist(), [i_idx],
-                                       weight=weight,
-                                       delay=self.no.delay,
-                                       model='PC_AMPA')
+            pc_idx = self._getIPlaceCellConnections(NTotal, Nconn_pcs)
+            self._bulkConnect(np.asarray(PC)[pc_idx].ravel(),
+                              np.repeat(self.I_pop, Nconn_pcs),
+                              np.repeat(float(weight), pc_idx.size),
+                              'PC_AMPA')
         else:
             gcnLogger.warn("Trying to set up I place cells with 0 place cells.")
 
@@ -766,22 +1097,13 @@ class NestGridCellNetwork(GridCellNetwork):
         return d
 
 
-class BasicGridCellNetwork(NestGridCellNetwork):
+class BasicGridCellNetwork(BasicNetworkMixin, NestGridCellNetwork):
     '''The default grid cell network.
 
     A grid cell network that generates the common network and creates a basic
     set of spike monitors and state monitors which are generically usable in
     most of the simulation setups.
     '''
-    def getDefaultStateMonParams(self):
-        '''Generate default, pre-set state monitor parameters.'''
-        return {
-            'withtime': True,
-            'interval': 10.0 * self.no.sim_dt,
-            'record_from': ['V_m', 'I_clamp_AMPA', 'I_clamp_NMDA',
-                            'I_clamp_GABA_A', 'I_stim']
-        }
-
     def fillParams(self, dest, src):
         '''Fill properties into a dictionary.'''
         for key, value in src.iteritems():
@@ -792,72 +1114,27 @@ class BasicGridCellNetwork(NestGridCellNetwork):
                  nrec_spikes=(None, None),
                  stateRecord_type='middle-center',
                  stateRecParams=(None, None),
-                 rec_spikes_probabilistic=False):
+                 rec_spikes_probabilistic=False,
+                 stateRecFormat=None,
+                 batch=None):
         '''
-        TODO
+        Parameters
+        ----------
+        stateRecFormat : dict, or None
+            If not ``None``, the state monitor data are saved in the compact
+            layout. The dictionary contains keyword arguments of
+            :func:`~grid_cell_model.data_storage.sim_models.ei.compactStateMonData`.
+            If ``None``, the format is determined from the ``stateRec*``
+            options, if present.
+        batch : NetworkBatch, or None
+            See :class:`NestGridCellNetwork`.
         '''
-        NestGridCellNetwork.__init__(self, options, simulationOpts)
-
-        # Spikes
-        self.nrecSpikes_e = nrec_spikes[0]
-        self.nrecSpikes_i = nrec_spikes[1]
-
-        if self.nrecSpikes_e is None:
-            self.nrecSpikes_e = self.Ne_x * self.Ne_y
-        if self.nrecSpikes_i is None:
-            self.nrecSpikes_i = self.Ni_x * self.Ni_y
-
-        if rec_spikes_probabilistic == False:
-            self.spikeMon_e  = self.getSpikeDetector("E",
-                                                     np.arange(self.nrecSpikes_e))
-            self.spikeMon_i  = self.getSpikeDetector("I",
-                                                     np.arange(self.nrecSpikes_i))
-        else:
-            self.spikeMon_e  = self.getSpikeDetector(
-                "E", np.sort(np.random.choice(len(self.E_pop), self.nrecSpikes_e,
-                                      replace=False)))
-            self.spikeMon_i  = self.getSpikeDetector(
-                "I", np.sort(np.random.choice(len(self.I_pop),
-                                              self.nrecSpikes_i,
-                                              replace=False)))
-
-        # States
-        if stateRecord_type == 'middle-center':
-            self.state_record_e = [self.Ne_x / 2 - 1,
-                                   (self.Ne_y / 2 * self.Ne_x +
-                                    self.Ne_x / 2 - 1)]
-            self.state_record_i = [self.Ni_x / 2 - 1,
-                                   (self.Ni_y / 2 * self.Ni_x +
-                                    self.Ni_x / 2 - 1)]
-        else:
-            raise ValueError("Currently stateRecordType must be "
-                             "'middle-center'")
-
-        self.stateMonParams_e = self.getDefaultStateMonParams()
-        self.stateMonParams_i = self.getDefaultStateMonParams()
-
-        stRecp_e = stateRecParams[0]
-        stRecp_i = stateRecParams[1]
-        if stRecp_e is not None:
-            self.fillParams(self.stateMonParams_e, stRecp_e)
-        if stRecp_i is not None:
-            self.fillParams(self.stateMonParams_i, stRecp_i)
-
-        self.stateMon_e  = self.getStateMonitor("E",
-                                                self.state_record_e,
-                                                self.stateMonParams_e)
-        self.stateMon_i  = self.getStateMonitor("I",
-                                                self.state_record_i,
-                                                self.stateMonParams_i)
-
-    def getMonitors(self):
-        '''Return the main spike and state monitors.'''
-        return (
-            self.spikeMon_e,
-            self.spikeMon_i,
-            self.stateMon_e,
-            self.stateMon_i
-        )
+        NestGridCellNetwork.__init__(self, options, simulationOpts,
+                                     batch=batch)
+
+        self._createBasicMonitors(nrec_spikes, stateRecord_type,
+                                  stateRecParams, rec_spikes_probabilistic,
+                                  stateRecFormat)
 
     def getSpikeMonData(self, mon, gidStart):
         '''
@@ -897,51 +1174,52 @@ class BasicGridCellNetwork(NestGridCellNetwork):
                 events[key] = np.asanyarray(events[key])
         return out
 
-    def getSpikes(self, **kw):
-        '''
-        Return a dictionary of spike monitor data.
-        '''
-        out = {}
+    def saveStreamedData(self, out):
+        '''Complete the data streamed during a segmented simulation.
 
-        if self.spikeMon_e is not None:
-            out['spikeMon_e'] = self.getSpikeMonData(self.spikeMon_e,
-                                                     self.E_pop[0])
-        if self.spikeMon_i is not None:
-            out['spikeMon_i'] = self.getSpikeMonData(self.spikeMon_i,
-                                                     self.I_pop[0])
-
-        for label, vals in self._extraSpikeMons.iteritems():
-            assert label not in out.keys()
-            out[label] = self.getSpikeMonData(vals[0], vals[1])
-
-        return out
+        Flushes whatever is left in the monitors and stores the network
+        parameters and the remaining monitor status entries into ``out``, so
+        that it has the same layout as the output of :meth:`getAllData`. The
+        event arrays already stored in ``out`` are not touched.
 
-    def getNetParams(self):
-        '''Get network and derived network parameters.'''
-        out = {}
-        out['options'] = self.no._einet_optdict
-        out['net_attr'] = self.getAttrDictionary()
-        return out
-
-    def getAllData(self):
-        '''
-        Save all the simulated data into a dictionary and return it.
+        Parameters
+        ----------
+        out : HDF5MapStorage
+            Storage passed to :meth:`simulate` as ``stream``.
         '''
-        out = self.getNetParams()
-
-        # Spike monitors
-        # Note that getSpikes() is overridden in child classes and requires the
-        # espikes and ispikes arguments.
-        out.update(self.getSpikes(espikes=True, ispikes=True))
-
-        # Save state variables
-        out['stateMon_e'] = self.getStateMonData(self.stateMon_e)
-        out['stateMon_i'] = self.getStateMonData(self.stateMon_i)
-        for label, val in self._extraStateMons.iteritems():
-            assert label not in out.keys()
-            out[label] = self.getStateMonData(val)
+        self.flushMonitors(out)
+        for key, val in self.getNetParams().iteritems():
+            out[key] = val
 
-        return out
+        for label, mon, _ in self._getSpikeMonitorList():
+            self._saveMonitorStatus(out[label], nest.GetStatus(mon)[0],
+                                    self._timeOffset)
+        for label, mon in self._getStateMonitorList():
+            outList = out[label]
+            for mon_idx, status in enumerate(nest.GetStatus(mon)):
+                self._saveMonitorStatus(outList[mon_idx], status,
+                                        self._timeOffset)
+            if self.stateRecFormat is not None:
+                # The streamed data are converted only at the end, when
+                # they are complete
+                out[label] = compactStateMonData(list(outList),
+                                                 **self.stateRecFormat)
+        out.flush()
+
+    @staticmethod
+    def _saveMonitorStatus(out, status, timeOffset=0.):
+        '''Save monitor ``status`` entries except the events into ``out``.'''
+        for key, val in status.iteritems():
+            if key == 'events':
+                continue
+            if key == 'n_events':
+                # Events have been cleared in NEST after each segment
+                stored = list(out['events'].keys())
+                val = len(out['events'][stored[0]]) if stored else 0
+            elif key == 'origin':
+                # Devices are shifted when resumed from a checkpoint
+                val += timeOffset
+            out[key] = val
 
     def saveSpikes(self, fileName):
         '''
@@ -956,21 +1234,6 @@ class BasicGridCellNetwork(NestGridCellNetwork):
         d = self.getSpikes()  # FIXME: what is d?
         out.close()
 
-    def saveAll(self, fileName):
-        '''
-        Save all the simulated data that has been recorded into a file.
-
-        Parameters
-        ----------
-        fileName : string
-            Path and name of the file
-        '''
-        out = DataStorage.open(fileName, 'w')
-        d = self.getAllData()
-        for key, val in d.iteritems():
-            out[key] = val
-        out.close()
-
 
 class ConstantVelocityNetwork(BasicGridCellNetwork):
     '''
@@ -981,7 +1244,8 @@ class ConstantVelocityNetwork(BasicGridCellNetwork):
                  vel=[0.0, 0.0],
                  nrec_spikes=(None, None),
                  stateRecord_type='middle-center',
-                 stateRecParams=(None, None)):
+                 stateRecParams=(None, None),
+                 batch=None):
         '''
         Generate the network.
 
@@ -990,12 +1254,16 @@ class ConstantVelocityNetwork(BasicGridCellNetwork):
         vel : a pair [x, y]
             Velocity input vector, i.e. it specifies the direction and
             magnitude of the velocity current.
+        batch : NetworkBatch, or None
+            See :class:`NestGridCellNetwork`. All the networks of a batch
+            must have velocities in the same or the opposite direction.
         '''
         BasicGridCellNetwork.__init__(self,
                                       options, simulationOpts,
                                       nrec_spikes,
                                       stateRecord_type,
-                                      stateRecParams)
+                                      stateRecParams,
+                                      batch=batch)
 
         self.setConstantVelocityCurrent_e(vel)
 
@@ -1029,3 +1297,167 @@ class ConstantVelocityNetwork(BasicGridCellNetwork):
         out = self.getNetParams()
         out.update(self.getSpikes(**kw))
         return out
+
+
+class NetworkBatch(object):
+    '''Several independent networks simulated together in one NEST kernel.
+
+    Short simulations, e.g. the velocity calibration or the stationary bump
+    runs, spend a large part of their run time in setting up the NEST kernel.
+    A batch initialises the kernel once and then creates several networks in
+    it (see :meth:`add`), each with its own populations, place cells and
+    monitors. The networks are not connected to each other and
+    :meth:`simulate` runs them all in a single simulation. The data of each
+    network are then retrieved from the network as usual, e.g. with
+    ``getMinimalSaveData()``.
+
+    The positions of the animal that drive the velocity inputs and the place
+    cells are shared by all the nodes in NEST. The networks of a batch must
+    therefore use the same animal trajectory, or constant velocities in the
+    same (or the opposite) direction; constant velocities of different
+    magnitudes are handled by scaling the velocity current of each network.
+
+    All the networks draw their random numbers from the generators of the one
+    kernel, so the results of a batch are statistically equivalent to, but not
+    the same as, the results of the networks simulated one by one. The
+    connectivity and the initial states are the same if the numpy generator
+    is reseeded before each :meth:`add` in the same way as before each
+    separate simulation.
+
+    Parameters
+    ----------
+    options : Options
+        Network options. Only the kernel options (``sim_dt``, ``nthreads``)
+        are used by the batch.
+    '''
+    def __init__(self, options):
+        self._startT = _time.time()
+        self._simStartT = None
+        self._simEndT = None
+        self.no = options
+        self.networks = []
+        self._velDirection = None
+        self._trajectory = None
+        _initNESTKernel(options)
+
+    def __len__(self):
+        return len(self.networks)
+
+    def __iter__(self):
+        return iter(self.networks)
+
+    def __getitem__(self, idx):
+        return self.networks[idx]
+
+    def add(self, cls, *args, **kwargs):
+        '''Create a network of class ``cls`` in this batch.
+
+        Parameters
+        ----------
+        cls : class
+            A subclass of :class:`NestGridCellNetwork`.
+        args, kwargs
+            Arguments of the constructor of ``cls``.
+
+        Returns
+        -------
+        net : cls
+            The new network.
+        '''
+        if self._simStartT is not None:
+            raise RuntimeError("Cannot add networks to a batch that has "
+                               "already been simulated.")
+        kwargs['batch'] = self
+        net = cls(*args, **kwargs)
+        net.endConstruction()
+        self.networks.append(net)
+        return net
+
+    def shareVelocityDirection(self, vel):
+        '''Register a constant velocity of a network.
+
+        Returns
+        -------
+        direction : np.ndarray
+            Unit vector of the direction shared by all the networks.
+        velC : float
+            The velocity current multiplier of the network, i.e. its velocity
+            projected onto ``direction``.
+        '''
+        if self._trajectory is not None:
+            raise ValueError("Networks with constant velocities cannot be "
+                             "mixed with networks driven by an animal "
+                             "trajectory in one batch.")
+        vel = np.asarray(vel, dtype=float)
+        speed = np.sqrt(np.sum(vel ** 2))
+        if speed == 0:
+            if self._velDirection is None:
+                return np.zeros(2), 0.
+            return self._velDirection, 0.
+        if self._velDirection is None:
+            self._velDirection = vel / speed
+        direction = self._velDirection
+        cross = vel[0] * direction[1] - vel[1] * direction[0]
+        if abs(cross) > 1e-9 * speed:
+            raise ValueError("All the constant velocities in a batch must "
+                             "have the same direction; got {0}, but the "
+                             "direction is {1}.".format(vel.tolist(),
+                                                        direction.tolist()))
+        return direction, float(np.dot(vel, direction))
+
+    def shareTrajectory(self, pos_x, pos_y, pos_dt):
+        '''Register the animal trajectory of a network. Raise ValueError if
+        it differs from the trajectory of the other networks.'''
+        if self._velDirection is not None:
+            raise ValueError("Networks with constant velocities cannot be "
+                             "mixed with networks driven by an animal "
+                             "trajectory in one batch.")
+        if self._trajectory is None:
+            self._trajectory = (np.asarray(pos_x), np.asarray(pos_y), pos_dt)
+            return
+        old_x, old_y, old_dt = self._trajectory
+        if (old_dt != pos_dt or not np.array_equal(old_x, pos_x) or
+                not np.array_equal(old_y, pos_y)):
+            raise ValueError("All the networks in a batch must use the same "
+                             "animal trajectory.")
+
+    def simulate(self, time, printTime=True):
+        '''Simulate all the networks of the batch.
+
+        Parameters
+        ----------
+        time : float
+            Simulation time (ms).
+        printTime : bool
+            Whether NEST should print the simulation progress.
+        '''
+        if len(self.networks) == 0:
+            raise RuntimeError("The batch does not contain any networks.")
+        if self._simStartT is not None:
+            raise RuntimeError("The batch has already been simulated.")
+        for net in self.networks:
+            if not net.velocityInputInitialized:
+                gcnLogger.warn("Velocity input has not been initialized in "
+                               "one of the networks of the batch. Make sure "
+                               "this is the desired behavior.")
+            net.beginSimulation()
+        nest.SetKernelStatus({"print_time": bool(printTime)})
+
+        gcnLogger.info('Simulating a batch of %d networks.',
+                       len(self.networks))
+        self._simStartT = _time.time()
+        nest.Simulate(time)
+        self._simEndT = _time.time()
+        for net in self.networks:
+            net.endSimulation()
+
+    def simulationTime(self):
+        '''Time of the simulation of the whole batch (s).'''
+        if self._simEndT is None:
+            raise RuntimeError("Cannot compute simulation time. The batch has "
+                               "not been simulated.")
+        return self._simEndT - self._simStartT
+
+    def totalTime(self):
+        '''Time elapsed since the creation of the batch (s).'''
+        return _time.time() - self._startT
@@ -0,0 +1,425 @@
+'''Batched firing-rate model of the grid cell network.
+
+.. currentmodule:: grid_cell_model.models.gc_net_rate
+
+A reduced model of the E/I twisted torus, intended to pre-screen the
+parameter sweeps (``g_AMPA_total`` x ``g_GABA_total`` x ``noise_sigma``)
+before the spiking simulations are submitted to a cluster. Many parameter
+points are integrated at once: the state of every neuron is an array with a
+leading batch axis, so that one step of the whole batch is a couple of
+matrix products.
+
+The connections are created by the connectivity code of
+:class:`~grid_cell_model.models.gc_net.GridCellNetwork` (through
+:class:`~grid_cell_model.models.gc_net_numpy.NumpyGridCellNetwork`) with
+unit ``g_AMPA_total`` and ``g_GABA_total``. All the connection weights are
+proportional to these two parameters, so the weights of each parameter point
+are obtained by scaling the unit matrices, with the same random (flat and
+probabilistic) connections in the whole batch.
+
+Each neuron is described by its firing rate and the mean synaptic and
+adaptation conductances that the spikes of the presynaptic neurons would
+generate. The firing rate relaxes, with the time constant ``tauRate``,
+towards the rate of a leaky integrate and fire neuron with the same leak,
+reset, threshold and refractory period, frozen conductances and the input
+current of the spiking model (constant, theta and noise currents). The noise
+current is redrawn every ``I_noise_dt`` (1 ms), like in the spiking model.
+The synaptic delays are not modelled.
+
+The population rate of noisy spiking neurons follows its inputs on the time
+scale of the synapses rather than that of the membrane, hence the default
+``tauRate`` of 1 ms. With the membrane time constant instead, the E/I loop is
+too slow to resonate and the oscillation maps are empty.
+
+The analysis of the E population activity in the last ``winLen`` ms of the
+simulation gives, for every parameter point:
+
+ - ``bump``: whether a bump of activity is present, i.e. at least
+   ``minRate`` peak firing rate and at most ``maxActiveFrac`` of the E
+   neurons firing above half of the peak rate;
+
+ - ``bump_sigma``: width of the bump (neurons), estimated from the second
+   moment of the firing rate map around its peak on the twisted torus;
+
+ - ``osc_freq`` and ``osc_amplitude``: frequency (Hz) and amplitude (Hz) of
+   the largest spectral peak of the mean I firing rate in ``freqRange``,
+   after the mean theta cycle has been subtracted, so that the harmonics of
+   the theta input are not detected as oscillations. ``osc_freq`` is NaN
+   where the amplitude is below ``minOscAmplitude``;
+
+ - ``rate_e``, ``rate_i`` and ``peak_rate_e``: mean firing rates of the E
+   and I populations and the peak E firing rate (Hz).
+
+With the default parameters (34x30 neurons in each population) one step of
+a batch of 961 parameter points takes about 0.2 s on a single core, half of
+it in the matrix products. A 31x31 sweep of 1 s of simulated time with the
+default 0.5 ms time step therefore takes about 7 minutes per noise level,
+compared to about 27 CPU hours for the spiking sweep (5 trials of 10 s) with
+the NumPy backend. With a 0.1 ms time step, the bump map of a 7x7 sweep
+changed in one point on the border of the bump region and the oscillation
+frequencies in 5 of 49 points, where the spectral peaks are weak. The
+maps are an approximation of the spiking network only and should be used to
+select the regions worth simulating.
+
+Classes
+-------
+.. autosummary::
+
+    RateGridCellNetwork
+'''
+from __future__ import absolute_import, print_function, division
+
+import copy
+import logging
+
+import numpy as np
+
+from .gc_net_numpy import (NumpyGridCellNetwork, NEURON_DEFAULTS,
+                           nmdaMgMultiplier)
+from ..analysis.twisted_torus import twistedTorusDistance
+
+__all__ = ['RateGridCellNetwork']
+
+logger = logging.getLogger(__name__)
+
+
+class RatePopulation(object):
+    '''Firing-rate description of a population of ``iaf_gridcells`` neurons.
+
+    Parameters
+    ----------
+    params : dict
+        Neuron parameters, see :mod:`~grid_cell_model.models.gc_neurons`.
+    batchShape : tuple
+        (number of parameter points, number of neurons).
+    dt : float
+        Time step (ms).
+    tauRate : float
+        Time constant of the firing rate (ms).
+    '''
+    def __init__(self, params, batchShape, dt, tauRate):
+        self.p = p = params
+        self.dt = dt
+        self.tauRate = tauRate
+        self.r = np.zeros(batchShape)
+        self.g_AMPA = np.zeros(batchShape)
+        self.g_NMDA = np.zeros(batchShape)
+        self.g_GABA_A = np.zeros(batchShape)
+        self.I_noise = np.zeros(batchShape)
+        self.s_NMDA = nmdaMgMultiplier(.5 * (p['V_reset'] + p['V_th']),
+                                       p.get('C_Mg', 0.))
+
+    def relax(self, name, tau, target):
+        '''Exponential Euler step of ``name`` towards ``target``.'''
+        value = getattr(self, name)
+        decay = np.exp(-self.dt / tau)
+        value *= decay
+        value += (1. - decay) * target
+
+    def g_AHP(self):
+        '''Mean adaptation conductance of neurons firing regularly at the
+        current rates.'''
+        p = self.p
+        r = self.r * 1e-3   # 1/ms
+        if p['g_AHP_ad']:
+            return p['g_AHP_max'] * p['tau_AHP'] * r
+        # The conductance is reset to g_AHP_max after each spike
+        with np.errstate(divide='ignore', over='ignore'):
+            g = (p['g_AHP_max'] * p['tau_AHP'] * r *
+                 (1. - np.exp(-1. / (r * p['tau_AHP']))))
+        return np.where(r > 0, g, 0.)
+
+    def steadyRate(self, I_ext):
+        '''Firing rate (Hz) of leaky integrate and fire neurons with the
+        current conductances and external current ``I_ext`` (pA).'''
+        p = self.p
+        g_AHP = self.g_AHP()
+        g_NMDA = self.g_NMDA * self.s_NMDA
+        G = p['g_L'] + g_AHP + self.g_AMPA + g_NMDA + self.g_GABA_A
+        mu = (p['g_L'] * p['E_L'] + g_AHP * p['E_AHP'] +
+              (self.g_AMPA + g_NMDA) * p['E_AMPA'] +
+              self.g_GABA_A * p['E_GABA_A'] + I_ext) / G
+        above = mu > p['V_th']
+        ratio = ((mu - p['V_reset']) /
+                 np.where(above, mu - p['V_th'], 1.))
+        isi = p['t_ref'] + p['C_m'] / G * np.log(np.where(above, ratio, 1.))
+        return np.where(above, 1e3 / isi, 0.)
+
+
+class RateGridCellNetwork(object):
+    '''Batched firing-rate model of the E/I grid cell network.
+
+    Parameters
+    ----------
+    options : dict-like
+        Network and neuron parameters with attribute access, the same as for
+        the spiking networks. ``g_AMPA_total``, ``g_GABA_total`` and
+        ``noise_sigma`` are ignored, they are set for each parameter point in
+        :meth:`simulate`.
+    dt : float
+        Time step (ms).
+    tauRate : float
+        Time constant of the firing rates (ms).
+    '''
+    def __init__(self, options, dt=.5, tauRate=1.):
+        self.no = copy.deepcopy(options)
+        self.dt = dt
+        self.tauRate = tauRate
+
+        unitOpts = copy.deepcopy(options)
+        unitOpts.g_AMPA_total = 1.
+        unitOpts.g_GABA_total = 1.
+        net = NumpyGridCellNetwork(unitOpts, simulationOpts=None)
+        self.Ne_x, self.Ne_y = net.Ne_x, net.Ne_y
+        self.Ni_x, self.Ni_y = net.Ni_x, net.Ni_y
+        self.net_Ne, self.net_Ni = net.net_Ne, net.net_Ni
+
+        # Unit weights, (pre, post); EE and II weights are not scaled
+        self.W_EI = net.getWeightMatrix('E', 'I').toarray()
+        self.W_IE = net.getWeightMatrix('I', 'E').toarray()
+        W_EE = net.getWeightMatrix('E', 'E')
+        W_II = net.getWeightMatrix('I', 'I')
+        self.W_EE = W_EE.toarray() if W_EE.nnz != 0 else None
+        self.W_II = W_II.toarray() if W_II.nnz != 0 else None
+
+        self.e_neuron_params = dict(NEURON_DEFAULTS)
+        self.e_neuron_params.update(net.e_neuron_params)
+        self.i_neuron_params = dict(NEURON_DEFAULTS)
+        self.i_neuron_params.update(net.i_neuron_params)
+
+        X, Y = np.meshgrid(np.arange(self.Ne_x), np.arange(self.Ne_y))
+        self._pos_e = X.ravel(), Y.ravel()
+
+    @staticmethod
+    def _synapticInput(r, W, scale=None):
+        '''Mean rate of synaptic events (1/ms), weighted by ``W``.'''
+        inp = np.dot(r, W) * 1e-3
+        if scale is not None:
+            inp *= scale[:, np.newaxis]
+        return inp
+
+    def _theta(self, p, t):
+        '''Theta current (pA) at time ``t``.'''
+        if t < p['I_ac_start_t']:
+            return 0.
+        return .5 * p['I_ac_amp'] * (1. + np.sin(
+            2. * np.pi * p['I_ac_freq'] * 1e-3 * t + p['I_ac_phase']))
+
+    def _simulateBatch(self, g_AMPA, g_GABA, noise, time, winLen, initRate):
+        '''Simulate one batch of parameter points.
+
+        Returns
+        -------
+        rateMap_e : np.ndarray
+            Mean firing rates of E neurons in the analysis window, shape
+            (batch, net_Ne).
+        rateMap_i : np.ndarray
+            The same for I neurons.
+        trace_i : np.ndarray
+            Mean firing rate of the I population in each step of the
+            analysis window, shape (batch, steps).
+        '''
+        B = len(g_AMPA)
+        dt = self.dt
+        E = RatePopulation(self.e_neuron_params, (B, self.net_Ne), dt,
+                           self.tauRate)
+        I = RatePopulation(self.i_neuron_params, (B, self.net_Ni), dt,
+                           self.tauRate)
+        E.r[:] = initRate * np.random.rand(B, self.net_Ne)
+        I.r[:] = initRate * np.random.rand(B, self.net_Ni)
+
+        nSteps = int(round(time / dt))
+        winSteps = min(int(round(winLen / dt)), nSteps)
+        noiseSteps = max(int(round(E.p['I_noise_dt'] / dt)), 1)
+        NMDA_frac_i = .01 * I.p['g_NMDA_fraction']
+        NMDA_frac_e = .01 * E.p['g_NMDA_fraction']
+
+        rateMap_e = np.zeros((B, self.net_Ne))
+        rateMap_i = np.zeros((B, self.net_Ni))
+        trace_i = np.zeros((B, winSteps))
+        for step in range(nSteps):
+            t = step * dt
+            if step % noiseSteps == 0:
+                for pop in (E, I):
+                    pop.I_noise[:] = (noise[:, np.newaxis] *
+                                      np.random.randn(*pop.r.shape))
+
+            # Synaptic conductances, from the rates in the previous step
+            inp_ei = self._synapticInput(E.r, self.W_EI, g_AMPA)
+            inp_ie = self._synapticInput(I.r, self.W_IE, g_GABA)
+            I.relax('g_AMPA', I.p['tau_AMPA_fall'],
+                    I.p['tau_AMPA_fall'] * inp_ei)
+            I.relax('g_NMDA', I.p['tau_NMDA_fall'],
+                    I.p['tau_NMDA_fall'] * NMDA_frac_i * inp_ei)
+            E.relax('g_GABA_A', E.p['tau_GABA_A_fall'],
+                    E.p['tau_GABA_A_fall'] * inp_ie)
+            if self.W_EE is not None:
+                inp_ee = self._synapticInput(E.r, self.W_EE)
+                E.relax('g_AMPA', E.p['tau_AMPA_fall'],
+                        E.p['tau_AMPA_fall'] * inp_ee)
+                E.relax('g_NMDA', E.p['tau_NMDA_fall'],
+                        E.p['tau_NMDA_fall'] * NMDA_frac_e * inp_ee)
+            if self.W_II is not None:
+                inp_ii = self._synapticInput(I.r, self.W_II)
+                I.relax('g_GABA_A', I.p['tau_GABA_A_fall'],
+                        I.p['tau_GABA_A_fall'] * inp_ii)
+
+            # Firing rates
+            for pop in (E, I):
+                I_ext = pop.p['I_const'] + self._theta(pop.p, t) + pop.I_noise
+                pop.relax('r', pop.tauRate, pop.steadyRate(I_ext))
+
+            winIt = step - (nSteps - winSteps)
+            if winIt >= 0:
+                rateMap_e += E.r
+                rateMap_i += I.r
+                trace_i[:, winIt] = np.mean(I.r, axis=1)
+
+        if winSteps != 0:
+            rateMap_e /= winSteps
+            rateMap_i /= winSteps
+        return rateMap_e, rateMap_i, trace_i
+
+    def _bumpStats(self, rateMap, minRate, maxActiveFrac):
+        '''Bump presence and width of E firing rate maps.'''
+        peakIdx = np.argmax(rateMap, axis=1)
+        peak = rateMap[np.arange(len(rateMap)), peakIdx]
+        activeFrac = np.mean(rateMap > .5 * peak[:, np.newaxis], axis=1)
+        bump = (peak >= minRate) & (activeFrac <= maxActiveFrac)
+
+        x, y = self._pos_e
+        d = twistedTorusDistance(x[peakIdx][:, np.newaxis],
+                                 y[peakIdx][:, np.newaxis],
+                                 x[np.newaxis, :], y[np.newaxis, :],
+                                 self.Ne_x, self.Ne_y)
+        r = rateMap - np.min(rateMap, axis=1)[:, np.newaxis]
+        total = np.sum(r, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sigma = np.sqrt(np.sum(r * d**2, axis=1) / total / 2.)
+        sigma[~bump] = np.nan
+        return bump, sigma, peak
+
+    def _removeThetaLocked(self, trace, t0):
+        '''Subtract the mean theta cycle from ``trace`` that starts at
+        ``t0``, so that only the oscillations not driven by theta remain.'''
+        p = self.i_neuron_params
+        if p['I_ac_amp'] == 0 and self.e_neuron_params['I_ac_amp'] == 0:
+            return trace
+        if t0 < p['I_ac_start_t']:
+            return trace
+        period = 1e3 / p['I_ac_freq']
+        nBins = int(round(period / self.dt))
+        t = t0 + np.arange(trace.shape[1]) * self.dt
+        phaseIdx = np.round(np.mod(t, period) / self.dt).astype(int) % nBins
+        counts = np.bincount(phaseIdx, minlength=nBins)
+        onehot = np.zeros((len(phaseIdx), nBins))
+        onehot[np.arange(len(phaseIdx)), phaseIdx] = 1.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cycle = np.dot(trace, onehot) / counts
+        return trace - cycle[:, phaseIdx]
+
+    def _oscillationStats(self, trace, t0, segLen, freqRange,
+                          minOscAmplitude):
+        '''Frequency and amplitude of the largest spectral peak of
+        ``trace`` in ``freqRange``, after the theta-locked component has been
+        removed.'''
+        nB, nT = trace.shape
+        if nT < 4:
+            return np.repeat(np.nan, nB), np.zeros(nB)
+        x = self._removeThetaLocked(trace, t0)
+        # Welch's method: averaged periodograms of half-overlapping segments
+        segSteps = min(int(round(segLen / self.dt)), nT)
+        starts = np.arange(0, nT - segSteps + 1, max(segSteps // 2, 1))
+        window = np.hanning(segSteps)
+        segs = x[:, starts[:, np.newaxis] + np.arange(segSteps)]
+        segs = segs - np.mean(segs, axis=2)[:, :, np.newaxis]
+        power = np.mean(np.abs(np.fft.rfft(segs * window, axis=2))**2,
+                        axis=1)
+        amplitude = 2. * np.sqrt(power) / np.sum(window)
+        freqs = np.fft.rfftfreq(segSteps, self.dt * 1e-3)
+        band = np.nonzero((freqs >= freqRange[0]) &
+                          (freqs <= freqRange[1]))[0]
+        if len(band) == 0:
+            return np.repeat(np.nan, nB), np.zeros(nB)
+        peakIdx = np.argmax(amplitude[:, band], axis=1)
+        peakAmp = amplitude[np.arange(nB), band[peakIdx]]
+        freq = freqs[band[peakIdx]]
+        freq[peakAmp < minOscAmplitude] = np.nan
+        return freq, peakAmp
+
+    def simulate(self, g_AMPA_total, g_GABA_total, noise_sigma, time=1e3,
+                 winLen=500., batchSize=1024, initRate=10., minRate=1.,
+                 maxActiveFrac=.5, segLen=100., freqRange=(20., 200.),
+                 minOscAmplitude=.1):
+        '''Simulate the rate model for a batch of parameter points.
+
+        Parameters
+        ----------
+        g_AMPA_total, g_GABA_total : float or np.ndarray
+            Total E-->I and I-->E conductances (nS).
+        noise_sigma : float or np.ndarray
+            Standard deviation of the noise current (pA).
+        time : float
+            Simulation time (ms).
+        winLen : float
+            Length of the analysis window at the end of the simulation (ms).
+        batchSize : int
+            Maximal number of parameter points simulated at once. Limits the
+            memory footprint.
+        initRate : float
+            The initial firing rates are drawn uniformly from <0,
+            ``initRate``) Hz.
+        minRate, maxActiveFrac : float
+            Bump detection thresholds, see the module documentation.
+        segLen : float
+            Length of the segments of the analysis window whose spectra are
+            averaged (ms). Determines the frequency resolution.
+        freqRange : pair of floats
+            Range of oscillation frequencies (Hz).
+        minOscAmplitude : float
+            Minimal oscillation amplitude (Hz).
+
+        Returns
+        -------
+        maps : dict
+            The maps described in the module documentation, each with the
+            broadcast shape of ``g_AMPA_total``, ``g_GABA_total`` and
+            ``noise_sigma``.
+        '''
+        g_AMPA_total, g_GABA_total, noise_sigma = np.broadcast_arrays(
+            np.asarray(g_AMPA_total, dtype=float),
+            np.asarray(g_GABA_total, dtype=float),
+            np.asarray(noise_sigma, dtype=float))
+        shape = g_AMPA_total.shape
+        g_AMPA = g_AMPA_total.ravel()
+        g_GABA = g_GABA_total.ravel()
+        noise = noise_sigma.ravel()
+        nPoints = len(g_AMPA)
+
+        names = ('bump', 'bump_sigma', 'peak_rate_e', 'rate_e', 'rate_i',
+                 'osc_freq', 'osc_amplitude')
+        out = dict((name, np.empty(nPoints)) for name in names)
+        out['bump'] = np.empty(nPoints, dtype=bool)
+        for start in range(0, nPoints, batchSize):
+            batch = slice(start, min(start + batchSize, nPoints))
+            logger.info('Rate model: parameter points %d-%d of %d.',
+                        batch.start, batch.stop - 1, nPoints)
+            rateMap_e, rateMap_i, trace_i = self._simulateBatch(
+                g_AMPA[batch], g_GABA[batch], noise[batch], time, winLen,
+                initRate)
+            bump, sigma, peak = self._bumpStats(rateMap_e, minRate,
+                                                maxActiveFrac)
+            freq, amplitude = self._oscillationStats(
+                trace_i, time - trace_i.shape[1] * self.dt, segLen,
+                freqRange, minOscAmplitude)
+            out['bump'][batch] = bump
+            out['bump_sigma'][batch] = sigma
+            out['peak_rate_e'][batch] = peak
+            out['rate_e'][batch] = np.mean(rateMap_e, axis=1)
+            out['rate_i'][batch] = np.mean(rateMap_i, axis=1)
+            out['osc_freq'][batch] = freq
+            out['osc_amplitude'][batch] = amplitude
+
+        for name in names:
+            out[name] = out[name].reshape(shape)
+        return out
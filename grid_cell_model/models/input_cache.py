@@ -0,0 +1,185 @@
+'''Process-wide cache of network inputs.
+
+.. currentmodule:: grid_cell_model.models.input_cache
+
+Constructing a network reads the animal trajectory from a MAT file and
+computes the place cell connection template. Both are the same for all the
+trials and simulations of a parameter sweep, so they are cached here and
+repeated network construction in one process does no redundant I/O or
+computation.
+
+The cached arrays are shared and therefore read-only.
+
+The trajectory data and templates can be also cached on disk, as ``.npy``
+files which are memory-mapped when loaded. This is useful when many
+short-lived processes (e.g. cluster jobs) need the same inputs. The on-disk
+cache is enabled by :func:`set_cache_dir` or the
+``GRID_CELL_MODEL_CACHE_DIR`` environment variable.
+
+Functions
+---------
+
+.. autosummary::
+
+    load_rat_trajectory
+    get_place_cell_input
+    set_cache_dir
+    clear_cache
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import errno
+import hashlib
+import logging
+
+import numpy as np
+from scipy.io import loadmat
+
+from .place_input import PlaceCellInput
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['load_rat_trajectory', 'get_place_cell_input', 'set_cache_dir',
+           'clear_cache']
+
+CACHE_DIR_ENV = 'GRID_CELL_MODEL_CACHE_DIR'
+
+#: Variables loaded from the trajectory file
+TRAJECTORY_KEYS = ('dt', 'pos_x', 'pos_y')
+
+_trajectory_cache = {}
+_template_cache = {}
+_cache_dir = None
+
+
+def set_cache_dir(path):
+    '''Set the directory of the on-disk cache, ``None`` disables it.'''
+    global _cache_dir
+    _cache_dir = path
+
+
+def get_cache_dir():
+    '''Return the directory of the on-disk cache, or ``None``.'''
+    if _cache_dir is not None:
+        return _cache_dir
+    return os.environ.get(CACHE_DIR_ENV, None)
+
+
+def clear_cache():
+    '''Clear the in-memory caches. The on-disk cache is not touched.'''
+    _trajectory_cache.clear()
+    _template_cache.clear()
+
+
+def _read_only(arr):
+    '''Make ``arr`` read-only and return it.'''
+    arr.flags.writeable = False
+    return arr
+
+
+def _file_key(path):
+    '''Cache key of a file: it changes when the file is modified.'''
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return (path, st.st_mtime, st.st_size)
+
+
+def _save_npy(path, arr):
+    '''Save ``arr`` into the on-disk cache.
+
+    The array is written to a temporary file first, because other processes
+    might be reading the cache at the same time.
+    '''
+    cache_dir = os.path.dirname(path)
+    try:
+        os.makedirs(cache_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr)
+    os.rename(tmp_path, path)
+
+
+def _load_trajectory_npy(key, cache_dir):
+    '''Load the trajectory from the on-disk cache, converting the MAT file
+    first if it is not cached yet.'''
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    paths = dict((name, os.path.join(cache_dir, '{0}_{1}.npy'.format(digest,
+                                                                     name)))
+                 for name in TRAJECTORY_KEYS)
+
+    if not all(os.path.exists(p) for p in paths.values()):
+        logger.debug('Converting %s into the on-disk cache in %s', key[0],
+                     cache_dir)
+        data = loadmat(key[0])
+        for name in TRAJECTORY_KEYS:
+            _save_npy(paths[name], data[name])
+
+    return dict((name, np.load(paths[name], mmap_mode='r'))
+                for name in TRAJECTORY_KEYS)
+
+
+def load_rat_trajectory(path):
+    '''Load the animal trajectory from a MAT file.
+
+    The file is read only once per process, unless it changes.
+
+    Parameters
+    ----------
+    path : str
+        Path to the MAT file, which must contain the ``dt``, ``pos_x`` and
+        ``pos_y`` variables.
+
+    Returns
+    -------
+    data : dict
+        ``dt``, ``pos_x`` and ``pos_y`` arrays, in the same shape as returned
+        by :func:`scipy.io.loadmat`. The arrays are read-only.
+    '''
+    key = _file_key(path)
+    if key not in _trajectory_cache:
+        cache_dir = get_cache_dir()
+        if cache_dir is not None:
+            data = _load_trajectory_npy(key, cache_dir)
+        else:
+            logger.debug('Loading animal trajectory from %s', path)
+            mat = loadmat(path)
+            data = dict((name, _read_only(mat[name]))
+                        for name in TRAJECTORY_KEYS)
+        _trajectory_cache[key] = data
+    return dict(_trajectory_cache[key])
+
+
+def get_place_cell_input(Ne_x, Ne_y, arenaSize, gridSep, sigma,
+                         gridCenter=(.0, .0)):
+    '''Return a place cell input template.
+
+    The template (:class:`~grid_cell_model.models.place_input.PlaceCellInput`)
+    is computed only once per process for each combination of the
+    parameters. See the class for the description of the parameters.
+    '''
+    key = (int(Ne_x), int(Ne_y), float(arenaSize), float(gridSep),
+           float(sigma), tuple(float(c) for c in gridCenter))
+    if key not in _template_cache:
+        arena = None
+        cache_dir = get_cache_dir()
+        if cache_dir is not None:
+            digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+            arena_path = os.path.join(cache_dir,
+                                      'pc_template_{0}.npy'.format(digest))
+            if os.path.exists(arena_path):
+                arena = np.load(arena_path, mmap_mode='r')
+
+        if arena is None:
+            logger.debug('Computing place cell input template: %s', str(key))
+        pc_input = PlaceCellInput(Ne_x, Ne_y, arenaSize, gridSep,
+                                  list(gridCenter), fieldSigma=sigma,
+                                  arena=arena)
+        if arena is None and cache_dir is not None:
+            _save_npy(arena_path, pc_input.arena)
+        _read_only(pc_input.arena)
+        _template_cache[key] = pc_input
+    return _template_cache[key]
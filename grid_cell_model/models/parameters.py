@@ -62,13 +62,23 @@ class ParameterSelector(object):
         self.parser.add_argument("--ntrials",     type=int,   help="Number of trials for the parameter set")
         self.parser.add_argument("--delay",       type=float, help="Synaptic delay (ms)")
         self.parser.add_argument("--nthreads",    type=int,   help="Number of threads (NEST)")
+        self.parser.add_argument("--trial_procs", type=int,   default=1, help="Number of processes that run the trials in parallel, each with --nthreads threads")
         self.parser.add_argument("--printTime",   type=int,   help="Whether to print time (0=False, 1=True)")
         self.parser.add_argument("--time",        type=float, help="Total simulation time (ms)")
         self.parser.add_argument("--sim_dt",      type=float, help="Simulation time step (ms)")
+        self.parser.add_argument("--sim_segment", type=float, help="If set, simulate in segments of this length and flush the recorded data to disk after each segment (ms)")
+        self.parser.add_argument("--checkpoint_interval", type=float, help="If set, save a checkpoint of the simulation at these intervals, so that an interrupted simulation can be resumed (ms). Implies segmented simulation.")
+        self.parser.add_argument("--monitor_max_rate_e", type=float, help="If set, terminate the simulation when the maximal E population firing rate in a theta cycle is above this threshold (Hz) in --monitor_max_rate_cycles consecutive theta cycles")
+        self.parser.add_argument("--monitor_max_rate_cycles", type=int, default=3, help="Number of consecutive theta cycles for --monitor_max_rate_e")
+        self.parser.add_argument("--monitor_silence", type=float, help="If set, terminate the simulation when there are no spikes for this time (ms)")
 
         self.parser.add_argument("--output_dir",     type=str,   help="Output directory path.")
         self.parser.add_argument("--fileNamePrefix", type=str,   default='', help="Prefix to include for each output file")
         self.parser.add_argument("--stateMonDur",    type=float, help="State monitors window duration (ms)")
+        self.parser.add_argument("--stateRecCompact",  type=int,   choices=[0, 1], default=0, help="Save state monitor data in the compact layout: one (neuron, time) array per variable")
+        self.parser.add_argument("--stateRecDtype",    type=str,   choices=['float64', 'float32'], default='float64', help="Data type of the state monitor data in the compact layout")
+        self.parser.add_argument("--stateRecDecimate", type=int,   default=1, help="Keep only every n-th state monitor sample (compact layout only)")
+        self.parser.add_argument("--stateRecLowpass",  type=int,   choices=[0, 1], default=0, help="Average the decimated samples instead of dropping them (compact layout only)")
         self.parser.add_argument("--job_num",        type=int,   help="Use argument of this option to specify the output file name number, instead of using time")
 
     def external_currents(self):
@@ -165,6 +175,7 @@ class ParameterSelector(object):
         self.parser.add_argument("--NMDA_amount", type=float, help="NMDA portion relative to AMPA (%%)")
 
         self.parser.add_argument("--probabilistic_synapses", type=float, help="Whether the synapses are generated in a probabilistic way.")
+        self.parser.add_argument("--sparse_synapses", type=float, help="Whether the probabilistic synapses are sampled sparsely, i.e. only the existing synapses.")
 
     def preferred_directions(self):
         '''Preferred directions.'''
@@ -26,7 +26,8 @@ class PlaceCellInput(object):
     This can be used to reset the bump to a correct position
     '''
 
-    def __init__(self, Ne_x, Ne_y, arenaSize, gridsep, gridCenter, fieldSigma=7):
+    def __init__(self, Ne_x, Ne_y, arenaSize, gridsep, gridCenter, fieldSigma=7,
+                 arena=None):
         '''
         Create a place cell input template. Here we work with a twisted torus
         topology with dimensions X x Y = 1 x sqrt(3)/2.
@@ -35,6 +36,9 @@ class PlaceCellInput(object):
         gridSep     Distance between grid field peaks (cm)
         gridCenter  Offset of the center of grid fields (cm)
         fieldSigma  Sigma of the gaussians used to produce the template (cm)
+        arena       Precomputed template for the same parameters, e.g. from
+                    :mod:`~grid_cell_model.models.input_cache`. If None, the
+                    template is computed.
         '''
 
         self.sigma = fieldSigma
@@ -55,6 +59,12 @@ class PlaceCellInput(object):
 
         X = 1. * (X - arenaSize)
         Y = 1. * (Y - arenaSize)
+        self.X= X
+        self.Y= Y
+
+        if arena is not None:
+            self.arena = arena
+            return
 
         X_mod = np.abs(np.mod(X - self.gridsep_x/2 - gridCenter[0], self.gridsep_x) - self.gridsep_x/2)
         Y_mod = np.abs(np.mod(Y - self.gridsep_y/2 - gridCenter[1], self.gridsep_y) - self.gridsep_y/2)
@@ -66,8 +76,6 @@ class PlaceCellInput(object):
 
         self.arena = arena1 + arena2
         self.arena = self.arena / np.max(self.arena)
-        self.X= X
-        self.Y= Y
 
 
     def getSheetInput(self, pos_x, pos_y):
@@ -78,7 +86,41 @@ class PlaceCellInput(object):
         x = (pos_x - self.arenaSize)/self.dx
         y = (pos_y - self.arenaSize)/self.dx
 
-        return self.arena[y-self.Ne_y/2:y+self.Ne_y/2, x-self.Ne_x/2:x+self.Ne_x/2]
+        return self.arena[int(y-self.Ne_y//2):int(y+self.Ne_y//2),
+                          int(x-self.Ne_x//2):int(x+self.Ne_x//2)]
+
+    def getSheetInputs(self, pos_x, pos_y):
+        '''
+        Return the sheet inputs for an array of positions of the animal.
+
+        This is a vectorised version of :meth:`getSheetInput`: all the windows
+        are extracted from the template at once. The result has shape
+        (len(pos_x), Ne_y, Ne_x) and item ``n`` is equal to
+        ``getSheetInput(pos_x[n], pos_y[n])``.
+        '''
+        x_idx = self._windowIndices(pos_x, self.Ne_x, self.arena.shape[1])
+        y_idx = self._windowIndices(pos_y, self.Ne_y, self.arena.shape[0])
+        return self.arena[y_idx[:, :, np.newaxis], x_idx[:, np.newaxis, :]]
+
+    def _windowIndices(self, pos, n, size):
+        '''
+        Template indices of the windows of width ``n`` around positions
+        ``pos``, along an axis of the template with length ``size``. The
+        bounds are computed in the same way as the slices in
+        :meth:`getSheetInput`, including the negative bounds.
+        '''
+        c = (np.asarray(pos, dtype=float).ravel() - self.arenaSize) / self.dx
+        bounds = []
+        for b in (np.trunc(c - n//2), np.trunc(c + n//2)):
+            b = b.astype(int)
+            b[b < 0] += size
+            bounds.append(b)
+        start, stop = bounds
+        if np.any(start < 0) or np.any(stop > size) or \
+                np.any(stop - start != n):
+            raise ValueError('Some of the positions are outside of the place '
+                             'cell input template.')
+        return start[:, np.newaxis] + np.arange(n)
 
 
 
@@ -4,6 +4,8 @@
 
 '''
 
+import collections
+
 import numpy as np
 import nest
 
@@ -11,12 +13,23 @@ from grid_cell_model.otherpkg.log import getClassLogger
 
 trial_logger = getClassLogger("TrialSeedGenerator", __name__)
 
+TrialSeeds = collections.namedtuple('TrialSeeds',
+                                    ['grng_seed', 'rng_seeds', 'numpy_seed'])
+
 
 class TrialSeedGenerator(object):
     '''Seed manipulator that generates seeds based on trial numbers.
 
-    This generator works only with NEST simulator and number of virtual
-    processes must always be 1.
+    This generator works only with NEST simulator. The global NEST
+    generator, the generators of all the virtual processes and the numpy
+    generator get seeds derived from (master seed, offset, trial number,
+    number of virtual processes). The results are therefore reproducible for
+    a given number of virtual processes, but differ between different numbers
+    of virtual processes, because NEST distributes the neurons, and hence the
+    random numbers, among them. The number of virtual processes and
+    :attr:`SEED_SCHEME` should be saved along with the master seed and checked
+    by :meth:`check_master_seed` when simulations are appended to existing
+    data.
 
     Parameters
     ----------
@@ -25,13 +38,25 @@ class TrialSeedGenerator(object):
     offset : int
         Additional offset to the seed to enable further parameterisation. This
         will be added to the master seed.
+    n_vp : int
+        Number of NEST virtual processes, i.e. number of threads times number
+        of MPI processes.
     '''
 
     NGENS = 3
 
-    def __init__(self, master_seed, offset=0):
+    #: Version of the seeding scheme. Increase it whenever the same master
+    #: seed starts to produce different simulations. Version 1 is the
+    #: scheme whose seeds were discarded by ``ResetKernel()``; data simulated
+    #: with it do not store the version.
+    SEED_SCHEME = 2
+
+    def __init__(self, master_seed, offset=0, n_vp=1):
+        if n_vp < 1:
+            raise ValueError('Number of virtual processes must be >= 1.')
         self._msd = master_seed
         self._offset = offset
+        self._n_vp = int(n_vp)
 
     @property
     def master_seed(self):
@@ -43,34 +68,132 @@ class TrialSeedGenerator(object):
         '''Seed offset.'''
         return self._offset
 
+    @property
+    def n_vp(self):
+        '''Number of NEST virtual processes.'''
+        return self._n_vp
+
     def get_trial_seed(self, trial_no):
         '''Generate seed for the given trial.'''
         return self._msd + self._offset + trial_no * self.NGENS
 
+    def _derive_seeds(self, seed):
+        '''Derive the seeds of all the generators from ``seed``.
+
+        With a single virtual process the seeds are ``seed``, ``seed + 1`` and
+        ``seed + 2``, so that the simulations are the same as before the
+        multi-threaded seeding was introduced. Otherwise a block of
+        ``n_vp + 2`` consecutive seeds is drawn using (``seed``, ``n_vp``).
+        '''
+        if self._n_vp == 1:
+            return TrialSeeds(seed, [seed + 1], seed + 2)
+        rng = np.random.RandomState([seed, self._n_vp])
+        base = int(rng.randint(2**30))
+        return TrialSeeds(base, list(range(base + 1, base + 1 + self._n_vp)),
+                          base + 1 + self._n_vp)
+
+    def get_trial_seeds(self, trial_no):
+        '''Generate the seeds of all the generators for the given trial.
+
+        Returns
+        -------
+        seeds : TrialSeeds
+            Seeds of the global NEST generator, the NEST generators of the
+            virtual processes and the numpy generator.
+        '''
+        return self._derive_seeds(self.get_trial_seed(trial_no))
+
+    def _set_nest_seeds(self, seeds):
+        '''Set the number of virtual processes and seeds in NEST.'''
+        n_vp = nest.GetKernelStatus(['total_num_virtual_procs'])[0]
+        if n_vp != self._n_vp:
+            nest.SetKernelStatus({'total_num_virtual_procs': self._n_vp})
+        nest.SetKernelStatus({'grng_seed' : seeds.grng_seed})
+        nest.SetKernelStatus({'rng_seeds' : seeds.rng_seeds})
+
     def set_generators(self, trial):
         '''Set all random number generators appropriately, for a given `trial`.
 
+        The number of virtual processes in NEST is set to :attr:`n_vp`. The
+        NEST network keeps the seeds when its kernel is initialised with the
+        same number of virtual processes.
+
         Notes
         -----
         This methods is always deterministic, i.e. for a given master seed,
-        offset and trial number, it will regenerate all the necessary seeds for
-        all generators in numpy and NEST.
+        offset, trial number and number of virtual processes, it will
+        regenerate all the necessary seeds for all generators in numpy and
+        NEST.
+        '''
+        seeds = self.get_trial_seeds(trial)
+        trial_logger.info('master seed: %d, seed for trial no. %d: %d, '
+                          'virtual processes: %d', self._msd, trial,
+                          self.get_trial_seed(trial), self._n_vp)
+        self._set_nest_seeds(seeds)
+        np.random.seed(seeds.numpy_seed)
+
+    def set_numpy_generator(self, trial):
+        '''Set only the numpy generator for a given `trial`.
+
+        Use this for the networks of a
+        :class:`~grid_cell_model.models.gc_net_nest.NetworkBatch`, which share
+        the NEST generators, but each of which should be constructed with the
+        same numpy random numbers as a separate simulation of the `trial`.
+        '''
+        np.random.seed(self.get_trial_seeds(trial).numpy_seed)
+
+    def get_segment_seed(self, trial_no, segment_no):
+        '''Generate seed for the given simulation segment of a trial.
+
+        The seed is derived from the trial seed and the segment number, so that
+        it does not collide with the seeds of other trials.
+        '''
+        rng = np.random.RandomState([self.get_trial_seed(trial_no),
+                                     segment_no])
+        return int(rng.randint(2**30))
+
+    def set_segment_generators(self, trial, segment):
+        '''Reseed the NEST generators at the start of a simulation `segment`.
+
+        Checkpointed simulations reseed at every checkpoint. The state of the
+        NEST generators cannot be saved, but this way a simulation resumed from
+        a checkpoint draws the same random numbers as the uninterrupted one.
+        '''
+        current_seed = self.get_segment_seed(trial, segment)
+        trial_logger.debug('Seed for trial no. %d, segment no. %d: %d', trial,
+                           segment, current_seed)
+        self._set_nest_seeds(self._derive_seeds(current_seed))
+
+    def check_master_seed(self, old_seed, new_seed, msg=None, old_n_vp=1,
+                          old_scheme=None):
+        '''Abort if old seed is not equal new seed, or if the data were
+        simulated with a different number of virtual processes or a different
+        seeding scheme.
+
+        Parameters
+        ----------
+        old_seed, new_seed : int
+            Master seed saved with the data and the current master seed.
+        msg : str, optional
+            Error message.
+        old_n_vp : int, optional
+            Number of virtual processes saved with the data. Data without this
+            information were simulated with 1 virtual process.
+        old_scheme : int, optional
+            :attr:`SEED_SCHEME` saved with the data. ``None`` if the data do
+            not contain it, i.e. they were simulated with the first scheme.
         '''
-        n_vp = nest.GetKernelStatus(['total_num_virtual_procs'])[0]
-        if n_vp != 1:
-            raise RuntimeError('Number of virtual processes in NEST must be'
-                               ' 1.')
-        current_seed = self.get_trial_seed(trial)
-        trial_logger.info('master seed: %d, seed for trial no. %d: %d',
-                          self._msd, trial, current_seed)
-        nest.SetKernelStatus({'grng_seed' : current_seed})
-        nest.SetKernelStatus({'rng_seeds' : [current_seed + 1]})
-        np.random.seed(current_seed + 2)
-
-    def check_master_seed(self, old_seed, new_seed, msg=None):
-        '''Abort if old seed is not equal new seed.'''
         trial_logger.debug(
-            'Checking master seed consistency. Old: %d, new: %d',
-            old_seed, new_seed)
+            'Checking master seed consistency. Old: %d, new: %d, old n_vp: '
+            '%d, new n_vp: %d', old_seed, new_seed, old_n_vp, self._n_vp)
         if old_seed != new_seed:
             raise ValueError(msg or "Old seed != new seed. Aborting.")
+        if old_n_vp != self._n_vp:
+            raise ValueError(msg or "Old number of virtual processes ({0}) != "
+                             "new number of virtual processes ({1}). "
+                             "Aborting.".format(old_n_vp, self._n_vp))
+        if old_scheme != self.SEED_SCHEME:
+            raise ValueError(msg or "Old seeding scheme ({0}) != new seeding "
+                             "scheme ({1}). Aborting.".format(
+                                 1 if old_scheme is None else old_scheme,
+                                 self.SEED_SCHEME))
@@ -0,0 +1,413 @@
+'''Synthetic simulation data of the grid cell network, without NEST.
+
+.. currentmodule:: grid_cell_model.models.synthetic
+
+The analysis code (the visitors, the parameter spaces and the figures) works
+on dictionaries in the format produced by
+:meth:`~grid_cell_model.models.gc_net_nest.BasicGridCellNetwork.getAllData`.
+This module generates such dictionaries with a statistical model of the
+network activity instead of a simulation, so that the analysis can be tested
+and benchmarked without NEST and at any scale:
+
+ * The animal moves in a circular arena (``arenaSize`` cm) with a constant
+   speed and a randomly drifting direction, reflected from the walls. The
+   positions are sampled every ``rat_dt`` ms from ``theta_start_t``, like the
+   velocity inputs of the network.
+ * A Gaussian bump of activity moves on the twisted torus of each population,
+   so that the bump travels across the whole sheet of neurons when the animal
+   moves by ``gridSep`` cm. The spatial firing fields of the neurons are
+   therefore hexagonal grids with the spacing ``gridSep``.
+ * The firing rate of each neuron, given by its distance from the bump, is
+   modulated by a theta and a gamma rhythm, and the spikes are drawn from an
+   inhomogeneous Poisson process.
+ * The state monitors record synaptic currents oscillating at the gamma
+   frequency, with an amplitude modulated by theta, plus white noise, and the
+   membrane potential. Their size is controlled by the number of monitored
+   neurons, the sampling interval and the compact layout (see
+   :func:`~grid_cell_model.data_storage.sim_models.ei.compactStateMonData`).
+
+The data are generated in blocks of time, so that the memory used by the
+generator is bounded by the size of the output.
+
+Functions
+---------
+
+.. autosummary::
+
+    generateTrial
+    ratTrajectory
+    writeSweep
+'''
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+
+from simtools.storage import DataStorage
+
+from ..data_storage.sim_models.ei import compactStateMonData
+from ..analysis.twisted_torus import twistedTorusDistance
+
+__all__ = ['DEFAULT_PARAMETERS', 'generateTrial', 'ratTrajectory',
+           'writeSweep']
+
+#: Default parameters of :func:`generateTrial`. All of them are also saved
+#: into the ``options`` of the generated data.
+DEFAULT_PARAMETERS = {
+    'Ne'             : 34,
+    'Ni'             : 34,
+    'time'           : 10e3,    # ms
+    'theta_start_t'  : 500.,    # ms
+    'spike_dt'       : .5,      # ms, resolution of the Poisson process
+    'job_num'        : 0,
+
+    # Bumps and firing rates (Hz)
+    'rate_e_min'     : .5,
+    'rate_e_max'     : 40.,
+    'bump_sigma_e'   : 2.5,     # neurons
+    'rate_i_min'     : 20.,
+    'rate_i_max'     : 80.,
+    'bump_sigma_i'   : 5.,      # neurons
+
+    # Rhythms
+    'theta_freq'     : 8.,      # Hz
+    'theta_depth'    : .5,
+    'gamma_freq'     : 70.,     # Hz
+    'gamma_depth'    : .3,
+
+    # Animal movement
+    'arenaSize'      : 180.,    # cm
+    'gridSep'        : 60.,     # cm
+    'rat_dt'         : 20.,     # ms
+    'rat_speed'      : 20.,     # cm/s
+    'rat_turn_sigma' : 2.,      # rad/sqrt(s)
+
+    # State monitors
+    'state_nrec'     : 2,       # neurons in stateMon_e/i
+    'state_nrec_f'   : 0,       # neurons in stateMonF_e/i, 0: no monitor
+    'state_interval' : 1.,      # ms
+    'state_amplitude': 200.,    # pA
+    'state_noise'    : 100.,    # pA
+}
+
+# Maximal number of (neuron, time step) pairs generated at once
+_BLOCK_SIZE = 2**20
+
+
+def _sheetSize(N):
+    '''Size of the twisted torus with ``N`` neurons along the X axis, the
+    same as in :class:`~grid_cell_model.models.gc_net.GridCellNetwork`.'''
+    return N, int(np.ceil(N * np.sqrt(3) / 2.)) // 2 * 2
+
+
+def ratTrajectory(time, dt, arenaDiam, speed, turnSigma, rng):
+    '''Random trajectory of the animal in a circular arena.
+
+    The animal moves with a constant ``speed`` and its direction drifts as a
+    random walk. When the animal would leave the arena, the direction is
+    reflected by the wall.
+
+    Parameters
+    ----------
+    time : float
+        Duration of the trajectory (ms).
+    dt : float
+        Sampling interval (ms).
+    arenaDiam : float
+        Arena diameter (cm).
+    speed : float
+        Speed (cm/s).
+    turnSigma : float
+        Standard deviation of the change of the direction (rad/sqrt(s)).
+    rng : np.random.RandomState
+        Random number generator.
+
+    Returns
+    -------
+    pos_x, pos_y : np.ndarray
+        Positions (cm), the centre of the arena is (0, 0).
+    '''
+    nSteps = int(time / dt) + 1
+    step = speed * dt * 1e-3
+    radius = arenaDiam / 2.
+    turns = rng.normal(0., turnSigma * np.sqrt(dt * 1e-3), nSteps)
+
+    pos_x = np.zeros(nSteps)
+    pos_y = np.zeros(nSteps)
+    x, y = 0., 0.
+    direction = rng.uniform(0, 2 * np.pi)
+    for idx in range(1, nSteps):
+        direction += turns[idx]
+        new_x = x + step * np.cos(direction)
+        new_y = y + step * np.sin(direction)
+        if new_x**2 + new_y**2 > radius**2:
+            # Reflect the direction from the wall
+            normal = np.arctan2(y, x)
+            direction = 2 * normal + np.pi - direction
+            new_x = x + step * np.cos(direction)
+            new_y = y + step * np.sin(direction)
+            if new_x**2 + new_y**2 > radius**2:
+                new_x, new_y = x, y
+        x, y = new_x, new_y
+        pos_x[idx] = x
+        pos_y[idx] = y
+    return pos_x, pos_y
+
+
+def _rhythms(p, t):
+    '''Theta and gamma modulation of the activity at times ``t`` (ms).'''
+    theta = 1. + p['theta_depth'] * np.sin(2 * np.pi * p['theta_freq'] *
+                                           t * 1e-3)
+    gamma = 1. + p['gamma_depth'] * np.sin(2 * np.pi * p['gamma_freq'] *
+                                           t * 1e-3)
+    return theta, gamma
+
+
+class _Bump(object):
+    '''Position of the bump on the twisted torus of a population.'''
+    def __init__(self, p, N, pos_x, pos_y, start):
+        self.Nx, self.Ny = _sheetSize(N)
+        self._t0 = p['theta_start_t']
+        self._dt = p['rat_dt']
+        # One grid period of the movement moves the bump across the sheet
+        x = start[0] + pos_x * self.Nx / p['gridSep']
+        y = start[1] + pos_y * self.Nx / p['gridSep']
+        # Wrap into the sheet; crossing the Y border shifts the bump by half
+        # of the sheet in the X direction
+        wraps = np.floor(y / self.Ny)
+        self._x = np.mod(x - wraps * self.Nx / 2., self.Nx)
+        self._y = y - wraps * self.Ny
+        idx = np.arange(self.Nx * self.Ny)
+        self.neuron_x = idx % self.Nx
+        self.neuron_y = idx // self.Nx
+
+    def sampleIndex(self, t):
+        '''Indices of the positions of the animal at times ``t`` (ms); the
+        bump does not move before the movement of the animal starts.'''
+        idx = np.round((t - self._t0) / self._dt).astype(int)
+        return np.clip(idx, 0, len(self._x) - 1)
+
+    def distance(self, sampleIdx):
+        '''Distances (neuron, sample) of the neurons from the bump at the
+        positions ``sampleIdx`` of the animal.'''
+        b_x = self._x[sampleIdx]
+        b_y = self._y[sampleIdx]
+        return twistedTorusDistance(b_x[np.newaxis, :], b_y[np.newaxis, :],
+                                    self.neuron_x[:, np.newaxis],
+                                    self.neuron_y[:, np.newaxis],
+                                    self.Nx, self.Ny)
+
+
+def _poissonSpikes(p, bump, rateMin, rateMax, sigma, rng):
+    '''Spikes of a population driven by the moving bump.
+
+    Returns
+    -------
+    senders, times : np.ndarray
+        Spikes sorted by time, like the events of a NEST spike detector.
+    '''
+    dt = p['spike_dt']
+    nSteps = int(p['time'] / dt)
+    N = len(bump.neuron_x)
+    blockSteps = max(1, _BLOCK_SIZE // N)
+
+    senders = []
+    times = []
+    for start in range(0, nSteps, blockSteps):
+        t = (np.arange(start, min(start + blockSteps, nSteps)) + .5) * dt
+        # The bump moves only between the positions of the animal
+        samples, sampleIdx = np.unique(bump.sampleIndex(t),
+                                       return_inverse=True)
+        d = bump.distance(samples)
+        profile = rateMin + (rateMax - rateMin) * np.exp(-d**2 / 2. /
+                                                         sigma**2)
+        rate = profile[:, sampleIdx]
+        theta, gamma = _rhythms(p, t)
+        rate *= theta * gamma
+        counts = rng.poisson(rate * dt * 1e-3)
+        tIdx, nIdx = np.nonzero(counts.T)
+        reps = counts.T[tIdx, nIdx]
+        tIdx = np.repeat(tIdx, reps)
+        senders.append(np.repeat(nIdx, reps))
+        times.append(t[tIdx] + rng.uniform(-.5 * dt, .5 * dt, len(tIdx)))
+
+    senders = np.concatenate(senders) if senders else np.array([], dtype=int)
+    times = np.concatenate(times) if times else np.array([])
+    order = np.argsort(times, kind='mergesort')
+    return senders[order], times[order]
+
+
+def _spikeMonitor(senders, times):
+    '''Status dictionary of a spike detector.'''
+    return {
+        'events'  : {'senders': senders, 'times': times},
+        'n_events': len(times),
+    }
+
+
+def _stateMonitor(p, neurons, rng, excitatory):
+    '''Status dictionaries of the multimeters recording ``neurons``.'''
+    interval = p['state_interval']
+    t = np.arange(interval, p['time'] + interval / 2., interval)
+    theta, gamma = _rhythms(p, t)
+    amplitude = p['state_amplitude']
+    out = []
+    for n in neurons:
+        phase = rng.uniform(-.2, .2)
+        osc = theta * (1. + p['gamma_depth'] * np.sin(
+            2 * np.pi * p['gamma_freq'] * t * 1e-3 + phase))
+
+        def noise():
+            return p['state_noise'] * rng.normal(size=len(t))
+
+        ampa = -amplitude * (.5 if excitatory else 1.) * osc + noise()
+        gaba = amplitude * (1. if excitatory else .5) * osc + noise()
+        events = {
+            'times'         : t,
+            'senders'       : np.repeat(n, len(t)),
+            'I_clamp_AMPA'  : ampa,
+            'I_clamp_NMDA'  : .1 * ampa,
+            'I_clamp_GABA_A': gaba,
+            'I_stim'        : np.zeros(len(t)) + (400. if excitatory else 200.),
+            'V_m'           : (-65. + 5. * (osc - 1.) +
+                               rng.normal(0., 1., len(t))),
+        }
+        out.append({'interval': interval, 'events': events})
+    return out
+
+
+def generateTrial(seed=None, stateRecFormat=None, **params):
+    '''Generate the data of one simulation trial.
+
+    Parameters
+    ----------
+    seed : int, optional
+        Seed of the random number generator. The same seed and parameters
+        generate the same data.
+    stateRecFormat : dict, optional
+        If not ``None``, the state monitor data are in the compact layout,
+        with these arguments of
+        :func:`~grid_cell_model.data_storage.sim_models.ei.compactStateMonData`.
+    params
+        Parameters that override :data:`DEFAULT_PARAMETERS`.
+
+    Returns
+    -------
+    data : dict
+        The data in the format of
+        :meth:`~grid_cell_model.models.gc_net_nest.BasicGridCellNetwork.getAllData`:
+        ``options``, ``net_attr``, ``spikeMon_e``, ``spikeMon_i``,
+        ``stateMon_e``, ``stateMon_i`` and, if ``state_nrec_f`` is not 0,
+        ``stateMonF_e`` and ``stateMonF_i``.
+    '''
+    unknown = set(params.keys()) - set(DEFAULT_PARAMETERS.keys())
+    if unknown:
+        raise TypeError('Unknown parameters: {0}'.format(
+            ', '.join(sorted(unknown))))
+    p = dict(DEFAULT_PARAMETERS)
+    p.update(params)
+    if p['time'] < p['theta_start_t']:
+        raise ValueError('The simulation time (time={0}) must not be shorter '
+                         'than the start of the movement '
+                         '(theta_start_t={1}).'.format(p['time'],
+                                                       p['theta_start_t']))
+    p['sim_dt'] = p['spike_dt']
+    if seed is not None:
+        p['master_seed'] = seed
+    rng = np.random.RandomState(seed)
+
+    pos_x, pos_y = ratTrajectory(p['time'] - p['theta_start_t'], p['rat_dt'],
+                                 p['arenaSize'], p['rat_speed'],
+                                 p['rat_turn_sigma'], rng)
+    Ne_x, Ne_y = _sheetSize(p['Ne'])
+    start = (rng.uniform(0, Ne_x), rng.uniform(0, Ne_y))
+    bump_e = _Bump(p, p['Ne'], pos_x, pos_y, start)
+    # The I sheet is smaller; the bumps are at the same relative position
+    Ni_x, Ni_y = _sheetSize(p['Ni'])
+    bump_i = _Bump(p, p['Ni'], pos_x, pos_y,
+                   (start[0] * Ni_x / Ne_x, start[1] * Ni_y / Ne_y))
+
+    senders_e, times_e = _poissonSpikes(p, bump_e, p['rate_e_min'],
+                                        p['rate_e_max'], p['bump_sigma_e'],
+                                        rng)
+    senders_i, times_i = _poissonSpikes(p, bump_i, p['rate_i_min'],
+                                        p['rate_i_max'], p['bump_sigma_i'],
+                                        rng)
+
+    net_Ne = Ne_x * Ne_y
+    net_Ni = Ni_x * Ni_y
+    data = {
+        'options' : p,
+        'net_attr': {
+            'net_Ne'    : net_Ne,
+            'net_Ni'    : net_Ni,
+            'Ne_x'      : Ne_x,
+            'Ne_y'      : Ne_y,
+            'Ni_x'      : Ni_x,
+            'Ni_y'      : Ni_y,
+            'E_pop'     : np.arange(net_Ne) + 1,
+            'I_pop'     : np.arange(net_Ni) + 1 + net_Ne,
+            'rat_pos_x' : pos_x,
+            'rat_pos_y' : pos_y,
+            'rat_dt'    : p['rat_dt'],
+            'velC'      : 1.,
+        },
+        'spikeMon_e': _spikeMonitor(senders_e, times_e),
+        'spikeMon_i': _spikeMonitor(senders_i, times_i),
+    }
+
+    monitors = [('stateMon', p['state_nrec'])]
+    if p['state_nrec_f'] > 0:
+        monitors.append(('stateMonF', p['state_nrec_f']))
+    for name, nrec in monitors:
+        for suffix, N, excitatory in (('_e', net_Ne, True),
+                                      ('_i', net_Ni, False)):
+            neurons = np.linspace(0, N - 1, nrec).astype(int)
+            mon = _stateMonitor(p, neurons, rng, excitatory)
+            if stateRecFormat is not None:
+                mon = compactStateMonData(mon, **stateRecFormat)
+            data[name + suffix] = mon
+    return data
+
+
+def writeSweep(rootDir, shape, trials=1, seed=0, labels=('g_AMPA_total',
+                                                          'g_GABA_total'),
+               **params):
+    '''Write a 2D parameter sweep of synthetic data.
+
+    The job files and the metadata file have the layout of the simulated
+    sweeps, so that the directory can be opened by
+    :class:`~grid_cell_model.parameters.param_space.JobTrialSpace2D`.
+
+    Parameters
+    ----------
+    rootDir : str
+        Output directory, must exist.
+    shape : pair of ints
+        Shape of the sweep (rows, columns).
+    trials : int
+        Number of trials per job.
+    seed : int
+        Seed of the first trial; the other trials get consecutive seeds.
+    labels : pair of str
+        Names of the iterated parameters; the values are the row and column
+        indices.
+    params
+        Parameters of :func:`generateTrial`.
+    '''
+    rows, cols = shape
+    meta = DataStorage.open('{0}/iterparams.h5'.format(rootDir), 'w')
+    r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    meta['iterParams'] = {labels[0]: r.ravel().astype(float),
+                          labels[1]: c.ravel().astype(float)}
+    meta['dimension_labels'] = list(labels)
+    meta['dimensions'] = [rows, cols]
+    meta.close()
+
+    for job in range(rows * cols):
+        ds = DataStorage.open('{0}/job{1:05}_output.h5'.format(rootDir, job),
+                              'w')
+        ds['trials'] = []
+        for trial in range(trials):
+            ds['trials'].append(generateTrial(seed=seed + job * trials + trial,
+                                              job_num=job, **params))
+        ds.close()
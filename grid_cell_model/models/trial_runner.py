@@ -0,0 +1,222 @@
+'''Run the trials of a simulation job, optionally in parallel.
+
+.. currentmodule:: grid_cell_model.models.trial_runner
+
+The simulation scripts run several trials of the same parameter set, each with
+its own seeds (see :class:`~grid_cell_model.models.seeds.TrialSeedGenerator`),
+and append them to the ``trials`` list of the job's output file. Since the
+trials are independent, they can run in separate worker processes. Each worker
+simulates one trial and writes it into a *shard*, a separate HDF5 file next to
+the output file. The shards are merged into the ``trials`` list of the output
+file in the trial order, as soon as all the preceding trials have been merged,
+and are then deleted. The output file therefore looks the same as if the trials
+had been run sequentially.
+
+A shard that has not been merged (e.g. because the job was killed) is kept.
+When the job is run again, a complete shard is merged without running the
+trial again and an incomplete shard is passed to the trial function again, so
+that a segmented trial can be resumed from its last checkpoint.
+
+A trial function has the signature ``trial_fn(trial_idx, job, pos)``:
+
+ * ``trial_idx`` is the trial number, used to set the seeds.
+ * ``job`` is the storage the trial should be saved into: the output file when
+   running sequentially or the shard when running in parallel. Job-wide data,
+   like the network parameters, should be saved into ``job`` as well.
+ * ``pos`` is the position of the trial in ``job['trials']``. If
+   ``pos < len(job['trials'])``, the trial has been started before and should
+   be resumed or replaced; otherwise the trial should be appended (see
+   :func:`store_trial`).
+
+It must return a tuple ``(run_time, stop)``, where ``stop`` is ``True`` if the
+simulation has been interrupted and no further trials should be run.
+
+Functions
+---------
+
+.. autosummary::
+
+    run_trials
+    store_trial
+    shard_file_name
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import logging
+import multiprocessing
+
+from simtools.storage import DataStorage
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['run_trials', 'store_trial', 'shard_file_name']
+
+
+def shard_file_name(output_fname, trial_idx):
+    '''File name of the shard of trial ``trial_idx`` of ``output_fname``.'''
+    root, ext = os.path.splitext(output_fname)
+    return '{0}_trial{1:03}{2}'.format(root, trial_idx, ext)
+
+
+def store_trial(job, pos, data):
+    '''Save ``data`` as trial at position ``pos`` in ``job['trials']``.
+
+    The trial is replaced if it already exists, otherwise it is appended.
+    '''
+    if pos < len(job['trials']):
+        job['trials'][pos] = data
+    else:
+        job['trials'].append(data)
+
+
+def run_trials(job, output_fname, trial_fn, first_trial, ntrials, nproc=1):
+    '''Run trials ``first_trial``, ..., ``ntrials - 1`` of a job.
+
+    Before the trials are run, ``job['invalidated']`` is set, so that the data
+    will be analysed again.
+
+    Parameters
+    ----------
+    job : DataStorage
+        Output storage of the job. It must contain the ``trials`` list.
+    output_fname : str
+        File name of ``job``. The shards are saved next to it.
+    trial_fn : callable
+        Trial function. See the module documentation. When ``nproc > 1``, it
+        must be picklable, i.e. defined at the module level.
+    first_trial : int
+        First trial to run. The trials before it must be in ``job['trials']``.
+    ntrials : int
+        Total number of trials.
+    nproc : int
+        Number of worker processes. If 1, the trials are run sequentially in
+        this process and saved directly into ``job``.
+
+    Returns
+    -------
+    run_time : float
+        Sum of the run times of all the trials.
+    '''
+    if nproc < 1:
+        raise ValueError('Number of processes must be >= 1, got '
+                         '{0}.'.format(nproc))
+    job['invalidated'] = 1
+    job.flush()
+    trial_list = range(first_trial, ntrials)
+    if nproc == 1:
+        return _run_sequential(job, trial_fn, trial_list)
+    else:
+        return _run_parallel(job, output_fname, trial_fn, trial_list, nproc)
+
+
+def _run_sequential(job, trial_fn, trial_list):
+    '''Run the trials one by one, saving them directly into ``job``.'''
+    overalT = 0.
+    for trial_idx in trial_list:
+        print("\n\t\tStarting trial no. {0}\n".format(trial_idx))
+        run_time, stop = trial_fn(trial_idx, job, trial_idx)
+        overalT += run_time
+        if stop:
+            break
+    return overalT
+
+
+def _prepare_shard(job, trial_idx, shard_fname):
+    '''Create the shard of a trial, unless it exists.
+
+    A trial that has already been started is copied from ``job`` into the new
+    shard.
+
+    Returns
+    -------
+    complete : bool
+        Whether the shard contains a complete trial that only needs to be
+        merged.
+    '''
+    shard = None
+    if os.path.exists(shard_fname):
+        try:
+            shard = DataStorage.open(shard_fname, 'a')
+        except IOError:
+            logger.warn('Cannot open shard %s. Running trial no. %d again.',
+                        shard_fname, trial_idx)
+            os.remove(shard_fname)
+
+    if shard is None or 'trials' not in shard:
+        shard = DataStorage.open(shard_fname, 'w')
+        shard['trials'] = []
+        if trial_idx < len(job['trials']):
+            shard['trials'].append(job['trials'][trial_idx])
+
+    complete = 'complete' in shard
+    shard.close()
+    return complete
+
+
+def _run_shard(args):
+    '''Worker: run a single trial, saving it into its shard.'''
+    trial_fn, trial_idx, shard_fname = args
+    print("\n\t\tStarting trial no. {0}\n".format(trial_idx))
+    shard = DataStorage.open(shard_fname, 'a')
+    try:
+        run_time, stop = trial_fn(trial_idx, shard, 0)
+        shard['run_time'] = run_time
+        if not stop:
+            shard['complete'] = 1
+    finally:
+        shard.close()
+    return run_time, stop
+
+
+def _merge_shard(job, trial_idx, shard_fname):
+    '''Merge the trial and job-wide data from a shard into ``job``.
+
+    Returns
+    -------
+    run_time : float
+        Run time of the trial, or 0 if the trial function did not finish.
+    '''
+    shard = DataStorage.open(shard_fname, 'r')
+    run_time = shard['run_time'] if 'run_time' in shard else 0.
+    for key in shard.keys():
+        if key not in ('trials', 'complete', 'run_time'):
+            job[key] = shard[key]
+    if len(shard['trials']) > 0:
+        store_trial(job, trial_idx, shard['trials'][0])
+    job.flush()
+    shard.close()
+    os.remove(shard_fname)
+    return run_time
+
+
+def _run_parallel(job, output_fname, trial_fn, trial_list, nproc):
+    '''Run the trials in worker processes and merge their shards in order.'''
+    shards = {}
+    pending = []
+    for trial_idx in trial_list:
+        shards[trial_idx] = shard_file_name(output_fname, trial_idx)
+        if _prepare_shard(job, trial_idx, shards[trial_idx]):
+            logger.info('Trial no. %d is complete in its shard.', trial_idx)
+        else:
+            pending.append(trial_idx)
+    job.flush()
+
+    pool = multiprocessing.Pool(min(nproc, max(len(pending), 1)),
+                                maxtasksperchild=1)
+    results = pool.imap(_run_shard, [(trial_fn, trial_idx, shards[trial_idx])
+                                     for trial_idx in pending])
+    overalT = 0.
+    try:
+        for trial_idx in trial_list:
+            stop = False
+            if trial_idx in pending:
+                _, stop = next(results)
+            overalT += _merge_shard(job, trial_idx, shards[trial_idx])
+            logger.info('Merged trial no. %d.', trial_idx)
+            if stop:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return overalT
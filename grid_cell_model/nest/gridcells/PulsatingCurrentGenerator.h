@@ -72,6 +72,18 @@ class PulsatingCurrentGenerator : public CurrentGenerator {
     }
 
 
+    /** Number of steps the generator has been advanced from startT **/
+    long getSteps() const {
+        return currSteps;
+    }
+
+
+    /** Set the generator state as if it was advanced n times from startT **/
+    void setSteps(long n) {
+        currSteps = n;
+    }
+
+
     void printCurrSteps() {
         std::cout << "currSteps: " << currSteps << std::endl;
     }
@@ -192,6 +192,43 @@ class VelocityInputGenerator : public CurrentGenerator {
     }
 
 
+    /** Number of steps the generator has been advanced from startT **/
+    long getSteps() const {
+        return stepNow;
+    }
+
+
+    /**
+     * Set the generator state as if advance() has been called n times after
+     * reset(), without having to iterate.
+     *
+     * @param n Number of steps from startT
+     */
+    void setSteps(long n)
+    {
+        reset();
+        if (n <= 0)
+            return;
+
+        long nChanges = n / veldtSteps;
+        stepNow = n;
+        currT = stepNow*dt + startT;
+        nextChange = (nChanges + 1) * veldtSteps;
+
+        // The index is only incremented on changes that occur after genStart.
+        // Find the first such change, evaluating the time exactly as advance()
+        // does.
+        long first = (long) ((genStart - startT) / dt / veldtSteps);
+        if (first < 1)
+            first = 1;
+        while (first > 1 && (first - 1)*veldtSteps*dt + startT >= genStart)
+            first--;
+        while (first <= nChanges && first*veldtSteps*dt + startT < genStart)
+            first++;
+        velInputIt = (first <= nChanges) ? nChanges - first + 1 : 0;
+    }
+
+
     /**
      * Setup velocity inputs for all objects
      * 
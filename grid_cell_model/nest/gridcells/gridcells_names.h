@@ -70,6 +70,10 @@ namespace nest
         const Name ctr_x("ctr_x");
         const Name ctr_y("ctr_y");
         const Name field_size("field_size");
+        const Name gen_steps("gen_steps");
+        const Name ref_steps("ref_steps");
+        const Name pos_it("pos_it");
+        const Name next_pos_step("next_pos_step");
 
     } // namespace names
 
@@ -270,6 +270,8 @@ void nest::iaf_gridcells::Parameters::get(DictionaryDatum &d) const
     def< std::vector<double> >(d, names::rat_pos_y,  vi.getPosY());
     def<double>(               d, names::rat_pos_dt, vi.get_dt());
 
+    // Number of steps the theta and velocity generators have advanced
+    def<long>(d, names::gen_steps, thetaGen.getSteps());
 }
 
 void nest::iaf_gridcells::Parameters::set(const DictionaryDatum &d)
@@ -373,6 +375,17 @@ void nest::iaf_gridcells::Parameters::set(const DictionaryDatum &d)
     noiseGen.setGendt(Time::ms(I_noise_dt));
     thetaGen = PulsatingCurrentGenerator(Time::get_resolution().get_ms(), 0.0,
             I_ac_start_t, I_ac_amp, I_ac_freq, I_ac_phase);
+
+    // Restore the position of the generators, e.g. when resuming a simulation
+    // from a checkpoint. Otherwise the theta generator starts from the
+    // beginning.
+    long gen_steps;
+    if (updateValue<long>(d, names::gen_steps, gen_steps)) {
+        if (gen_steps < 0)
+            throw BadProperty("Generator steps must be >= 0.");
+        thetaGen.setSteps(gen_steps);
+        velGen.setSteps(gen_steps);
+    }
 }
 
 void nest::iaf_gridcells::State_::get(DictionaryDatum &d) const
@@ -384,19 +397,27 @@ void nest::iaf_gridcells::State_::get(DictionaryDatum &d) const
     def<double>(d,names::g_GABA_A, y_[G_GABA_A]);
     def<double>(d,names::I_stim,   y_[I_STIM]);
     def<double>(d, names::s_NMDA,  y_[S_NMDA]);
+    def<long>(d,  names::ref_steps, r_);
 }
 
 void nest::iaf_gridcells::State_::set(const DictionaryDatum &d, const Parameters &p)
 {
     updateValue<double>(d,names::V_m,      y_[V_M]);
+    updateValue<double>(d,names::g_AHP,    y_[G_AHP]);
     updateValue<double>(d,names::g_AMPA,   y_[G_AMPA]);
     updateValue<double>(d,names::g_NMDA,   y_[G_NMDA]);
     updateValue<double>(d,names::g_GABA_A, y_[G_GABA_A]);
     updateValue<double>(d,names::I_stim,   y_[I_STIM]);
+    long ref_steps = r_;
+    if (updateValue<long>(d, names::ref_steps, ref_steps))
+        r_ = ref_steps;
 
-    if ( y_[G_AMPA] < 0 || y_[G_NMDA] < 0 || y_[G_GABA_A] < 0 )
+    if ( y_[G_AHP] < 0 || y_[G_AMPA] < 0 || y_[G_NMDA] < 0 || y_[G_GABA_A] < 0 )
         throw BadProperty("Conductances must not be negative.");
 
+    if ( ref_steps < 0 )
+        throw BadProperty("Refractory steps must not be negative.");
+
     // This is automatic, cannot be set by user
     y_[S_NMDA] = nmda_mg_multiplier(y_[V_M], p.C_Mg);
 }
@@ -99,6 +99,29 @@ void place_cell_generator::Parameters_::set(const DictionaryDatum& d)
 
 
 
+void place_cell_generator::get_state(DictionaryDatum &d) const
+{
+    def<long>(d, nest::names::pos_it,        pos_it);
+    def<long>(d, nest::names::next_pos_step, next_pos_step);
+}
+
+
+void place_cell_generator::set_state(const DictionaryDatum& d)
+{
+    long it   = pos_it;
+    long next = next_pos_step;
+    updateValue<long>(d, nest::names::pos_it,        it);
+    updateValue<long>(d, nest::names::next_pos_step, next);
+
+    if (it < 0 || it >= (long) P_.rat_pos_x.size())
+        throw BadProperty("Positional index out of range of the positional data.");
+
+    pos_it = it;
+    next_pos_step = next;
+    setFiringRate();
+}
+
+
 /* ----------------------------------------------------------------
  * Default and copy constructor for node
  * ---------------------------------------------------------------- */
@@ -107,7 +130,7 @@ place_cell_generator::place_cell_generator()
     : Node(), device_(), P_()
 {
     sim_dt_per_pos_dt = 0;
-    next_pos_step = 0;
+    next_pos_step = -1;
     pos_it = 0;
 }
 
@@ -129,6 +152,12 @@ void place_cell_generator::init_state_(const Node& proto)
     const place_cell_generator& pr = downcast<place_cell_generator>(proto);
 
     device_.init_state(pr.device_);
+
+    // Positional index is a state: it must survive subsequent calls to
+    // Simulate, but not ResetNetwork. A negative next_pos_step marks it for
+    // initialisation in calibrate().
+    next_pos_step = -1;
+    pos_it = 0;
 }
 
 
@@ -146,8 +175,10 @@ void place_cell_generator::calibrate()
 
     // Calibrate how often to advance the positional index
     sim_dt_per_pos_dt = (int) (P_.rat_pos_dt / sim_dt);
-    next_pos_step = sim_dt_per_pos_dt;
-    pos_it = 0; 
+    if (next_pos_step < 0) {
+        next_pos_step = sim_dt_per_pos_dt;
+        pos_it = 0;
+    }
 
     setFiringRate();
 }
@@ -80,6 +80,10 @@ class place_cell_generator : public nest::Node
 
     private:
 
+        /** Store/set the positional state (index and next change step) **/
+        void get_state(DictionaryDatum&) const;
+        void set_state(const DictionaryDatum&);
+
         void init_state_(const Node&);
         void init_buffers_();
         void calibrate();
@@ -145,6 +149,7 @@ inline
 void place_cell_generator::get_status(DictionaryDatum &d) const
 {
     P_.get(d);
+    get_state(d);
     device_.get_status(d);
 }
 
@@ -161,6 +166,7 @@ void place_cell_generator::set_status(const DictionaryDatum &d)
 
     // if we get here, temporaries contain consistent set of properties
     P_ = ptmp;
+    set_state(d);
 }
 
 } // namespace mynest
@@ -0,0 +1,248 @@
+'''Out-of-core storage of aggregated parameter sweep data.
+
+.. currentmodule:: grid_cell_model.parameters.out_of_core
+
+:meth:`JobTrialSpace2D.aggregateData
+<grid_cell_model.parameters.param_space.JobTrialSpace2D.aggregateData>`
+keeps the whole aggregated array in memory. Reductions that are arrays
+themselves, e.g. a rate map or the bump positions of every trial, give arrays
+of the shape (rows, cols, trials, ...) that may not fit into memory.
+:meth:`JobTrialSpace2D.aggregateDataOutOfCore
+<grid_cell_model.parameters.param_space.JobTrialSpace2D.aggregateDataOutOfCore>`
+writes them, one (row, col) block at a time, into a preallocated file:
+
+ * ``'hdf5'``: an HDF5 data set chunked by the (row, col) blocks, optionally
+   compressed,
+ * ``'npy'``: a ``.npy`` file, accessed as a memory map.
+
+The data are then returned as an :class:`OutOfCoreArray`, which loads only
+the parts of the data that are indexed.
+
+Each file has a JSON sidecar (``<file>.json``) with the aggregated variable,
+the trials and the shape of the data. It is written when the aggregation is
+complete and the aggregation is skipped while the sidecar matches the
+request.
+
+Classes
+-------
+
+.. autosummary::
+
+    OutOfCoreArray
+    OutOfCoreWriter
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import json
+import errno
+
+import numpy as np
+
+__all__ = ['OutOfCoreArray', 'OutOfCoreWriter', 'FORMATS']
+
+FORMATS = ('hdf5', 'npy')
+'''Supported file formats.'''
+
+_EXTENSIONS = {'hdf5': '.h5', 'npy': '.npy'}
+_HDF5_DATASET = 'data'
+
+
+def defaultFileName(rootDir, varList, fileFormat):
+    '''File of the data aggregated from ``varList`` in the space ``rootDir``.
+    '''
+    _checkFormat(fileFormat)
+    return os.path.join(rootDir, 'reductions_ooc',
+                        '-'.join(str(v) for v in varList) +
+                        _EXTENSIONS[fileFormat])
+
+
+def _checkFormat(fileFormat):
+    if fileFormat not in FORMATS:
+        raise ValueError("Unknown out-of-core format '{0}'. Use one of "
+                         "{1}.".format(fileFormat, FORMATS))
+
+
+def _metaFileName(fileName):
+    return fileName + '.json'
+
+
+def readMetadata(fileName):
+    '''Metadata of a complete aggregation, or ``None`` if the aggregation does
+    not exist or is not complete.'''
+    try:
+        with open(_metaFileName(fileName)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class OutOfCoreArray(object):
+    '''A read-only array in a file, loaded lazily when indexed.
+
+    Indexing returns numpy arrays; only the indexed part of the data is read.
+    ``np.asarray(a)`` loads the whole array.
+
+    Parameters
+    ----------
+    fileName : str
+        Path to the file.
+    fileFormat : str
+        ``'hdf5'`` or ``'npy'``.
+    '''
+    def __init__(self, fileName, fileFormat):
+        _checkFormat(fileFormat)
+        self._fileName = fileName
+        self._format = fileFormat
+        self._file = None
+        if fileFormat == 'hdf5':
+            import h5py
+            self._file = h5py.File(fileName, 'r')
+            self._data = self._file[_HDF5_DATASET]
+        else:
+            self._data = np.load(fileName, mmap_mode='r')
+
+    @property
+    def file_name(self):
+        '''Path to the file with the data.'''
+        return self._fileName
+
+    @property
+    def shape(self):
+        '''Shape of the array.'''
+        return tuple(self._data.shape)
+
+    @property
+    def ndim(self):
+        '''Number of dimensions.'''
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        '''Data type of the array.'''
+        return self._data.dtype
+
+    @property
+    def metadata(self):
+        '''Metadata of the aggregation (a dict).'''
+        return readMetadata(self._fileName)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return np.asarray(self._data[key])
+
+    def __array__(self, dtype=None):
+        data = self[...]
+        return data if dtype is None else data.astype(dtype)
+
+    def close(self):
+        '''Close the file. The array cannot be used afterwards.'''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __repr__(self):
+        return '<OutOfCoreArray {0} {1} in {2}>'.format(self.shape,
+                                                        self.dtype,
+                                                        self._fileName)
+
+
+class OutOfCoreWriter(object):
+    '''Writes an aggregated array into a file one (row, col) block at a time.
+
+    The file is preallocated and filled with NaN.
+
+    Parameters
+    ----------
+    fileName : str
+        Path to the file. The directory is created if it does not exist.
+    fileFormat : str
+        ``'hdf5'`` or ``'npy'``.
+    shape : tuple
+        Shape of the whole array; the first two dimensions are rows and
+        columns.
+    dtype : numpy dtype
+        Data type; must be a floating point type, because the missing data are
+        NaN.
+    compression : str, optional
+        HDF5 compression filter, e.g. ``'gzip'``.
+    '''
+    def __init__(self, fileName, fileFormat, shape, dtype,
+                 compression=None):
+        _checkFormat(fileFormat)
+        dtype = np.dtype(dtype)
+        if not np.issubdtype(dtype, np.floating):
+            raise ValueError('Out-of-core aggregation requires a floating '
+                             'point data type, got {0}.'.format(dtype))
+        dirName = os.path.dirname(fileName)
+        if dirName:
+            try:
+                os.makedirs(dirName)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        # The old aggregation is not valid any more
+        if os.path.exists(_metaFileName(fileName)):
+            os.remove(_metaFileName(fileName))
+
+        self._fileName = fileName
+        self._format = fileFormat
+        self._shape = tuple(shape)
+        self._file = None
+        if fileFormat == 'hdf5':
+            import h5py
+            self._file = h5py.File(fileName, 'w')
+            self._data = self._file.create_dataset(
+                _HDF5_DATASET, shape=self._shape, dtype=dtype,
+                chunks=(1, 1) + self._shape[2:], fillvalue=np.nan,
+                compression=compression)
+        else:
+            self._data = np.lib.format.open_memmap(fileName, mode='w+',
+                                                   dtype=dtype,
+                                                   shape=self._shape)
+            for row in range(self._shape[0]):
+                self._data[row] = np.nan
+
+    @property
+    def shape(self):
+        '''Shape of the whole array.'''
+        return self._shape
+
+    def write(self, row, col, block):
+        '''Write the data of position (``row``, ``col``).'''
+        self._data[row, col] = block
+
+    def close(self, metadata):
+        '''Finish the file and mark the aggregation as complete.
+
+        Parameters
+        ----------
+        metadata : dict
+            Metadata saved into the sidecar file, must be serialisable to
+            JSON.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        else:
+            self._data.flush()
+        self._data = None
+        with open(_metaFileName(self._fileName), 'w') as f:
+            json.dump(metadata, f, sort_keys=True)
+
+    def abort(self):
+        '''Close the file without marking the aggregation as complete.'''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = None
@@ -10,18 +10,32 @@ Classes
     DummyTrialSet
     JobTrialSpace2D
     JobTrialSpace1D
+
+Irregular parameter spaces
+--------------------------
+A 2D parameter sweep that has been adaptively refined (see
+:mod:`~grid_cell_model.parameters.refinement`) saves its
+:class:`~grid_cell_model.parameters.refinement.SweepLayout` into the metadata
+file. :class:`JobTrialSpace2D` then has the shape of the refinement lattice
+and the lattice points that have not been simulated are empty trial sets, i.e.
+their aggregated values are NaN.
 '''
 from __future__ import absolute_import
 from collections    import Sequence
+import itertools
 from os.path        import exists, basename
-import subprocess
 
 import numpy as np
 from simtools.storage import DataStorage
+from simtools.storage.compaction import compact_files
 
 from ..otherpkg.log   import log_warn, log_info, getClassLogger
 from ..data_storage.dict  import getDictData
+from ..data_storage.sim_models.ei import getTermination, terminationCode
 from .data_sets           import DictDataSet
+from .refinement          import SweepLayout
+from .                    import out_of_core
+from ..visitors.profiling   import ProfilingVisitor
 
 __all__ = [
     'DataSpace',
@@ -34,6 +48,17 @@ __all__ = [
 
 job2DLogger = getClassLogger('JobTrialSpace2D', __name__)
 
+
+def _isMissing(value):
+    '''Whether a reduced ``value`` is the NaN of a missing item.'''
+    if np.ndim(value) != 0:
+        return False
+    try:
+        return bool(np.isnan(value))
+    except TypeError:
+        return False
+
+
 class DataSpace(Sequence):
     '''
     An interface to the space of data with different parameters.
@@ -174,6 +199,9 @@ class DummyTrialSet(DataSpace):
     def __getitem__(self, key):
         raise ValueError("A DummyTrialSet cannot be indexed!")
 
+    def getAllTrialsAsDataSet(self):
+        return DictDataSet(None)
+
     def visit(self, visitor, trialList=None, **kw):
         pass
 
@@ -216,6 +244,7 @@ class JobTrialSpace2D(DataSpace):
         self._fileMode = fileMode
         self._rootDir = rootDir
         self._iter_file = None
+        self._layout = self._load_layout()
         self._shape = self._determine_shape(shape)
         self._dataPoints = dataPoints
         if self._dataPoints is not None:
@@ -249,6 +278,17 @@ class JobTrialSpace2D(DataSpace):
             raise e
         return ds
 
+    def _load_layout(self):
+        '''Load the layout of an irregular (refined) parameter space, or return
+        ``None`` if the space is regular.'''
+        if not exists("{0}/iterparams.h5".format(self._rootDir)):
+            return None
+        try:
+            layout = self._meta_file['layout']
+        except (IOError, KeyError):
+            return None
+        return SweepLayout.from_dict(layout)
+
     @property
     def metadata(self):
         '''Return a reference to the metadata associated with this parameter
@@ -256,55 +296,95 @@ class JobTrialSpace2D(DataSpace):
         '''
         return self._extractor
 
-    def repackItem(self, r, c):
+    @property
+    def layout(self):
+        '''The :class:`~grid_cell_model.parameters.refinement.SweepLayout` of
+        an irregular parameter space, or ``None`` if the space is a regular
+        grid.'''
+        return self._layout
+
+    def repackItem(self, r, c, **kwargs):
         '''
         Repack the underlying item at ``r`` and ``c`` position.
 
+        The live objects of the job file are rewritten into a fresh file,
+        which atomically replaces the original one.
+
         .. warning::
 
             This applies only to HDF5, use with care.
-        '''
-
-        def _cleanUp(r, c, tmpFile):
-            job2DLogger.info('Cleaning up temporary.')
-            subprocess.call(['rm', '-f', tmpFile])
-            job2DLogger.info("Reloading the new item")
-            self._vals[r]._vals[c] = self._loadItem(r, c)
 
-        job2DLogger.info("Repacking item at %d, %d", r, c)
-        currentFile = self._getFilename(r, c)
-        tmpFile = currentFile + ".repacked"
-
-
-        job2DLogger.info("Removing current item")
-        self._vals[r]._vals[c] = None
+        Parameters
+        ----------
+        r, c : int
+            Row and column of the item.
+        kwargs : keyword arguments
+            Passed on to :func:`simtools.storage.compaction.compact_file`
+            (``chunks``, ``compression``, ``compression_opts``, ``dry_run``).
 
-        # Try to repack to temporary file
-        job2DLogger.info("Repacking to temporary file...")
-        repackArgs = ['h5repack', currentFile, tmpFile]
-        if subprocess.call(repackArgs) != 0:
-            job2DLogger.warn('Repacking to %s failed.', tmpFile)
-            _cleanUp(r, c, tmpFile)
-            return
+        Returns
+        -------
+        report : CompactionReport, or None
+            Compaction summary, or ``None`` if the job file does not exist.
+        '''
+        reports = self._repack([(r, c)], processes=1, **kwargs)
+        return reports[0] if len(reports) != 0 else None
 
-        # Move temporary file to original
-        job2DLogger.info("Replacing original file")
-        moveArgs = ['mv', tmpFile, currentFile]
-        if subprocess.call(moveArgs) != 0:
-            job2DLogger.warn('Replacing original %s failed.', tmpFile)
-            _cleanUp(r, c, tmpFile)
-            return
+    def repackAllItems(self, processes=None, **kwargs):
+        '''Repack all the items in this space, in a pool of worker processes.
 
-        # Reload the repacked file
-        _cleanUp(r, c, tmpFile)
+        Parameters
+        ----------
+        processes : int or None
+            Number of worker processes. ``None`` uses all the available CPUs.
+        kwargs : keyword arguments
+            See :meth:`repackItem`.
 
-    def repackAllItems(self):
-        for row in xrange(self.shape[0]):
-            for col in xrange(self.shape[1]):
-                self.repackItems(row, col)
+        Returns
+        -------
+        reports : list of CompactionReport
+            One report for each existing job file.
+        '''
+        if self._dataPoints is not None:
+            items = list(self._dataPoints)
+        else:
+            items = [(row, col) for row in xrange(self.shape[0])
+                     for col in xrange(self.shape[1])]
+        return self._repack(items, processes=processes, **kwargs)
+
+    def _repack(self, items, processes, **kwargs):
+        '''Compact the job files of all (row, col) pairs in ``items``.'''
+        dry_run = kwargs.get('dry_run', False)
+        if not dry_run:
+            job2DLogger.info("Releasing %d items before repacking", len(items))
+            for r, c in items:
+                self._vals[r]._vals[c] = None
+
+        fileNames = [self._getFilename(r, c) for r, c in items]
+        try:
+            reports = compact_files(fileNames, processes=processes, **kwargs)
+        finally:
+            if not dry_run:
+                job2DLogger.info("Reloading the repacked items")
+                for r, c in items:
+                    self._vals[r]._vals[c] = self._loadItem(r, c)
+
+        total = 0
+        for report in reports:
+            if report.success:
+                job2DLogger.info(str(report))
+                total += report.reclaimable
+            else:
+                job2DLogger.warn(str(report))
+        job2DLogger.info("Total %s: %d bytes",
+                         'reclaimable' if dry_run else 'reclaimed', total)
+        return reports
 
     def _getFilename(self, row, col):
-        it = row * self.shape[1] + col
+        if self._layout is not None:
+            it = self._layout.job_number(row, col)
+        else:
+            it = row * self.shape[1] + col
         fileName = self._rootDir + '/' + self._fileFormat.format(it)
         #job2DLogger.debug('row: %d, col: %d, filename: %s', row, col, fileName)
         return fileName
@@ -313,6 +393,8 @@ class JobTrialSpace2D(DataSpace):
         # Here either we have a full data space, or a particular row
         # and column are present in the list of selected data points.
         # Otherwise, append an empty list, i.e. this will do nothing
+        if self._layout is not None and not self._layout.simulated[row, col]:
+            return DummyTrialSet()
         if (self._dataPoints is None or
                 (row, col) in self._dataPoints):
             fileName = self._getFilename(row, col)
@@ -365,6 +447,14 @@ class JobTrialSpace2D(DataSpace):
             Returns the correct shape or raises RuntimeError if it cannot be
             determined.
         '''
+        if self._layout is not None:
+            if (custom_shape is not None and
+                    tuple(custom_shape) != self._layout.shape):
+                job2DLogger.info('Space %s is irregular; using the lattice '
+                                 'shape %s instead of %s.', self._rootDir,
+                                 self._layout.shape, tuple(custom_shape))
+            return self._layout.shape
+
         if custom_shape is not None:
             return custom_shape
 
@@ -408,18 +498,30 @@ class JobTrialSpace2D(DataSpace):
         ret = []
         for nm in name_list:
             if nm is not None:
-                ret.append(np.reshape(self._meta_file['iterParams'][nm],
-                                    self._shape))
+                ret.append(self._reshapeIterParam(nm))
                 if self._checkParams:
                     self._checkIteratedParameters(nm, ret[-1])
         return ret
 
+    def _reshapeIterParam(self, name):
+        '''Return the iterated parameter ``name`` in the shape of the space.
+
+        In an irregular space, the dimension parameters are defined on the
+        whole lattice; other parameters are NaN where there is no job.
+        '''
+        if self._layout is None:
+            return np.reshape(self._meta_file['iterParams'][name],
+                              self._shape)
+        labels = list(self.get_iteration_labels())
+        if name in labels:
+            return self._layout.lattice_parameters()[labels.index(name)]
+        return self._layout.to_lattice(self._meta_file['iterParams'][name])
+
     def get_iterated_parameter(self, dim):
         '''Return the iterated parameter data for dimension ``dim``.'''
         label = self.get_iteration_labels()[dim]
         if label is not None:
-            return np.reshape(self._meta_file['iterParams'][label],
-                              self._shape)
+            return self._reshapeIterParam(label)
         else:
             return None
 
@@ -456,7 +558,22 @@ class JobTrialSpace2D(DataSpace):
             raise ValueError("Dimension %d is out of range in a 2D parameter "
                              "sweep")
 
-    def visit(self, visitor, trialList=None):
+    def visit(self, visitor, trialList=None, profile=None):
+        '''Apply the visitor to all the trial sets of the space.
+
+        Parameters
+        ----------
+        visitor : DictDSVisitor
+            The visitor to apply.
+        trialList : list, or None, or string
+            Trials to visit, see :meth:`TrialSet.visit`.
+        profile : ProfileLog, optional
+            If not ``None``, the time, memory and HDF5 reads of each visit are
+            recorded into this log (see
+            :mod:`~grid_cell_model.visitors.profiling`).
+        '''
+        if profile is not None:
+            visitor = ProfilingVisitor(visitor, profile)
         for r in xrange(self.rows):
             for c in xrange(self.cols):
                 self[r][c].visit(visitor, trialList=trialList, r=r, c=c)
@@ -491,28 +608,90 @@ class JobTrialSpace2D(DataSpace):
 
     def _aggregateItem(self, retVar, r, c, trialNumList, varList, funReduce):
         if (trialNumList == 'all-at-once'):
-            data = self[r][c].getAllTrialsAsDataSet().data
-            if (data is None):
-                retVar[r][c] = np.nan
-            else:
-                try:
-                    retVar[r][c] = funReduce(getDictData(data, varList))
-                except (IOError, KeyError) as e:
-                    self._reductionFailureMsg(e, r, c)
-                    retVar[r][c] = np.nan
+            retVar[r][c] = self._reduceAllTrials(r, c, varList, funReduce)
         else:
             for trialNum in trialNumList:
-                if (len(self[r][c]) == 0):
-                    retVar[r][c][trialNum] = np.nan
-                    continue
+                retVar[r][c][trialNum] = self._reduceTrial(r, c, trialNum,
+                                                           varList, funReduce)
+
+    def _reduceAllTrials(self, r, c, varList, funReduce):
+        '''Reduce the data of all the trials of item (r, c) at once; NaN if
+        the data are missing.'''
+        data = self[r][c].getAllTrialsAsDataSet().data
+        if (data is None):
+            return np.nan
+        try:
+            return funReduce(getDictData(data, varList))
+        except (IOError, KeyError) as e:
+            self._reductionFailureMsg(e, r, c)
+            return np.nan
+
+    def _reduceTrial(self, r, c, trialNum, varList, funReduce):
+        '''Reduce the data of one trial of item (r, c); NaN if the data are
+        missing.'''
+        if (len(self[r][c]) == 0):
+            return np.nan
+
+        data = None
+        try:
+            data = self[r][c][trialNum].data
+            return funReduce(getDictData(data, varList))
+        except (IOError, KeyError) as e:
+            if isinstance(e, KeyError) and self._isTerminated(data):
+                msg = ('Simulation at (r, c, trial) == ({0}, {1}, '
+                       '{2}) was terminated early. Setting value as '
+                       'NaN.')
+                log_info('JobTrialSpace2D',
+                         msg.format(r, c, trialNum))
+            else:
+                self._reductionFailureMsg(e, r, c)
+            return np.nan
+
+    @staticmethod
+    def _isTerminated(data):
+        '''Whether the trial ``data`` have been terminated early.'''
+        if data is None:
+            return False
+        try:
+            return getTermination(data) is not None
+        except (IOError, KeyError):
+            return False
 
-                try:
-                    data = self[r][c][trialNum].data
-                    retVar[r][c][trialNum] = funReduce(getDictData(data,
-                        varList))
-                except (IOError, KeyError) as e:
-                    self._reductionFailureMsg(e, r, c)
-                    retVar[r][c][trialNum] = np.nan
+    def aggregateTermination(self, trialNumList):
+        '''Aggregate the termination codes of the simulations.
+
+        The simulations that have been terminated early by an activity monitor
+        do not contain the results of some of the analyses, but unlike
+        missing data they have the reason of the termination.
+
+        Parameters
+        ----------
+        trialNumList : list of ints
+            A list of trials to aggregate.
+
+        Returns
+        -------
+        codes : np.ndarray
+            A 3D array (row, col, trial), which contains 0 for the simulations
+            that have run for the full time, the code of the termination
+            reason otherwise (see
+            :func:`~grid_cell_model.data_storage.sim_models.ei.terminationCode`)
+            and NaN if the data are missing.
+        '''
+        rows, cols = self.getShape()
+        retVar = self._createAggregateOutput(trialNumList, 'array')
+        retVar[:] = np.nan
+        for r in xrange(rows):
+            for c in xrange(cols):
+                if len(self[r][c]) == 0:
+                    continue
+                for trialNum in trialNumList:
+                    try:
+                        data = self[r][c][trialNum].data
+                        retVar[r][c][trialNum] = terminationCode(data)
+                    except (IOError, KeyError, IndexError) as e:
+                        self._reductionFailureMsg(e, r, c)
+        return retVar
 
     def _reductionFailureMsg(self, e, r, c):
         msg = 'Reduction step failed at (r, c) == ({0}, '+\
@@ -577,6 +756,10 @@ class JobTrialSpace2D(DataSpace):
         Returns
         -------
             All the aggregated data
+
+        See also
+        --------
+        aggregateDataOutOfCore : Aggregation of large data into a file.
         '''
         if (self._partial):
             # Cannot do aggregation on a restricted data set
@@ -591,7 +774,12 @@ class JobTrialSpace2D(DataSpace):
                     varList))
                 inData = self._getAggregationDS()
                 if (inData is not None):
-                    return inData.get_item_chained(varList)
+                    retVar = inData.get_item_chained(varList)
+                    if self._hasShape(retVar):
+                        return retVar
+                    # The space has been refined since the reduction
+                    log_info('JobTrialSpace2D', 'Shape of the aggregated '
+                             'data does not match. Performing the reduction.')
                 else:
                     io_err = 'Could not open file: {0}. Performing the reduction.'
                     log_info('JobTrialSpace2D', io_err.format(self.saveDataFileName))
@@ -627,6 +815,169 @@ class JobTrialSpace2D(DataSpace):
 
         return retVar
 
+    def aggregateDataOutOfCore(self, varList, trialNumList, funReduce=None,
+                               fileName=None, fileFormat='hdf5',
+                               dtype=np.float64, loadData=True,
+                               compression=None, cacheKey=None):
+        '''Aggregate the data like :meth:`aggregateData`, but into a file.
+
+        This is intended for reductions that are arrays themselves, whose
+        aggregation would not fit into memory. The data are written into a
+        preallocated HDF5 data set or a ``.npy`` file, one (row, col) item at
+        a time, and returned as a lazily loaded
+        :class:`~grid_cell_model.parameters.out_of_core.OutOfCoreArray`.
+
+        Parameters
+        ----------
+        varList : list of strings
+            A path to the hierarchical dictionary.
+        trialNumList : list of ints or string
+            A list of trials to aggregate, or 'all-at-once', see
+            :meth:`aggregateData`. The trials are stored in the order of the
+            list.
+        funReduce : a function f(x), or None
+            A function to apply to each data point for each trial. All the
+            reductions must be scalars or arrays of the same shape.
+        fileName : str, optional
+            Output file. Default is
+            ``<rootDir>/reductions_ooc/<varList joined by '-'>.h5`` (``.npy``
+            for the ``npy`` format).
+        fileFormat : str, optional
+            ``'hdf5'`` for a chunked (and optionally compressed) HDF5 data set,
+            ``'npy'`` for a memory mapped numpy file.
+        dtype : numpy dtype, optional
+            Data type of the output. Must be a floating point type, the
+            missing data are NaN.
+        loadData : bool, optional
+            If True and the file contains a complete aggregation of the same
+            variable, trials, reduction (see ``cacheKey``), data type and shape
+            of the reduced items for the current shape of the space, return it
+            without doing the reduction.
+        compression : str, optional
+            HDF5 compression filter (e.g. 'gzip'), ignored for ``npy``.
+        cacheKey : str, optional
+            Identifies the reduction in the stored file. Default is the name
+            of ``funReduce``. Lambdas and callables without a name cannot be
+            told apart, so their results are not loaded from the file unless
+            ``cacheKey`` is given.
+
+        Returns
+        -------
+        data : OutOfCoreArray
+            Array of the shape (rows, cols, trials) + shape of the reduction,
+            or (rows, cols) + shape of the reduction if ``trialNumList`` is
+            'all-at-once'.
+        '''
+        if (self._partial):
+            raise NotImplementedError("Data aggregation on a partial data " +
+                    "space has not been implemented yet.")
+
+        if fileName is None:
+            fileName = out_of_core.defaultFileName(self._rootDir, varList,
+                                                   fileFormat)
+        if cacheKey is None and funReduce is None:
+            cacheKey = 'identity'
+        elif cacheKey is None:
+            name = getattr(funReduce, '__name__', None)
+            if name is not None and name != '<lambda>':
+                cacheKey = name
+        if funReduce is None:
+            funReduce = lambda x: x
+        allAtOnce = trialNumList == 'all-at-once'
+        rows, cols = self.getShape()
+        metadata = {
+            'varList': [str(v) for v in varList],
+            'trials': trialNumList if allAtOnce else
+                      [int(t) for t in trialNumList],
+            'funReduce': cacheKey,
+            'dtype': np.dtype(dtype).str,
+            'rows': rows,
+            'cols': cols,
+        }
+
+        def reduceItem(r, c):
+            '''Reductions of (r, c) that are not missing, with their index.'''
+            if allAtOnce:
+                values = [self._reduceAllTrials(r, c, varList, funReduce)]
+            else:
+                values = [self._reduceTrial(r, c, trialNum, varList, funReduce)
+                          for trialNum in trialNumList]
+            return [(idx, v) for idx, v in enumerate(values)
+                    if not _isMissing(v)]
+
+        if loadData and cacheKey is None:
+            msg = ('The reduction {0!r} has no name and no cacheKey was '
+                   'given. Performing the reduction.')
+            log_info('JobTrialSpace2D', msg.format(funReduce))
+        elif loadData:
+            stored = out_of_core.readMetadata(fileName)
+            if stored is not None and all(stored.get(key) == value for key,
+                                          value in metadata.items()):
+                # The reduction could have changed under the same name
+                itemShape = None
+                for r, c in itertools.product(xrange(rows), xrange(cols)):
+                    valid = reduceItem(r, c)
+                    if valid:
+                        itemShape = list(np.shape(valid[0][1]))
+                        break
+                if stored.get('itemShape') == itemShape:
+                    msg = 'Loading out-of-core aggregated data from: {0}'
+                    log_info('JobTrialSpace2D', msg.format(fileName))
+                    return out_of_core.OutOfCoreArray(fileName, fileFormat)
+            msg = ('Out-of-core aggregated data in {0} not found or out of '
+                   'date. Performing the reduction.')
+            log_info('JobTrialSpace2D', msg.format(fileName))
+
+        outShape = (rows, cols) if allAtOnce else (rows, cols,
+                                                    len(trialNumList))
+        writer = None
+        itemShape = None
+        try:
+            for r in xrange(rows):
+                for c in xrange(cols):
+                    valid = reduceItem(r, c)
+                    if len(valid) == 0:
+                        # The file is filled with NaN
+                        continue
+                    if writer is None:
+                        itemShape = np.shape(valid[0][1])
+                        writer = out_of_core.OutOfCoreWriter(
+                            fileName, fileFormat, outShape + itemShape, dtype,
+                            compression=compression)
+
+                    block = np.empty(outShape[2:] + itemShape, dtype=dtype)
+                    block[...] = np.nan
+                    for idx, value in valid:
+                        if np.shape(value) != itemShape:
+                            raise ValueError(
+                                'Reduction at (r, c) == ({0}, {1}) has shape '
+                                '{2}, expected {3}.'.format(
+                                    r, c, np.shape(value), itemShape))
+                        if allAtOnce:
+                            block[...] = value
+                        else:
+                            block[idx] = value
+                    writer.write(r, c, block)
+
+            if writer is None:
+                # No data at all
+                writer = out_of_core.OutOfCoreWriter(fileName, fileFormat,
+                                                     outShape, dtype,
+                                                     compression=compression)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        metadata['itemShape'] = None if itemShape is None else list(itemShape)
+        writer.close(metadata)
+        return out_of_core.OutOfCoreArray(fileName, fileFormat)
+
+    def _hasShape(self, data):
+        '''Whether aggregated ``data`` have the shape of this space.'''
+        rows, cols = self.getShape()
+        return len(data) == rows and all(len(row) == cols for row in data)
+
     @property
     def rootDir(self):
         return self._rootDir
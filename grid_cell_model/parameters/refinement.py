@@ -0,0 +1,237 @@
+'''Adaptive refinement of 2D parameter sweeps.
+
+.. currentmodule:: grid_cell_model.parameters.refinement
+
+A uniform parameter sweep spends most of the simulations in regions where the
+results do not change. An adaptive sweep starts with a coarse uniform grid and
+then, in each refinement step, adds simulations only into the grid cells
+whose corner values (e.g. gridness scores or the fraction of bump formation)
+differ by more than a threshold.
+
+The refined points always lie on a regular *lattice*, which is twice as dense
+as the lattice of the previous step. The lattice therefore contains points
+that have not been simulated and the jobs do not map to the lattice in the
+row-major order anymore. A :class:`SweepLayout` keeps track of the lattice:
+
+ * ``positions``: lattice position (row, column) of each job, in the order of
+   the job numbers,
+ * ``cells``: the leaf cells of the refinement, each given by the lattice
+   position of its top left corner and its size,
+ * ``row_range`` and ``col_range``: values of the iterated parameters along
+   the rows and columns of the lattice.
+
+The layout is saved into the ``iterparams.h5`` file of the sweep (under the
+``layout`` key) and
+:class:`~grid_cell_model.parameters.param_space.JobTrialSpace2D` uses it to
+map the lattice to the job files. The lattice points that have not been
+simulated appear in the space as empty trial sets.
+
+Classes
+-------
+
+.. autosummary::
+
+    SweepLayout
+'''
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+__all__ = ['SweepLayout']
+
+
+def _refine_range(rng):
+    '''Add midpoints between all the values of ``rng``.'''
+    rng = np.asarray(rng, dtype=float)
+    out = np.empty(2 * len(rng) - 1)
+    out[::2] = rng
+    out[1::2] = (rng[:-1] + rng[1:]) / 2.
+    return out
+
+
+class SweepLayout(object):
+    '''Layout of the jobs of an adaptively refined 2D parameter sweep.
+
+    Parameters
+    ----------
+    positions : array of ints, shape (njobs, 2)
+        Lattice position of each job.
+    cells : array of ints, shape (ncells, 3)
+        Leaf cells ``(row, col, size)``.
+    row_range, col_range : np.ndarray
+        Values of the iterated parameters along the lattice rows and columns.
+    '''
+    def __init__(self, positions, cells, row_range, col_range):
+        self.positions = np.asarray(positions, dtype=int).reshape((-1, 2))
+        self.cells = np.asarray(cells, dtype=int).reshape((-1, 3))
+        self.row_range = np.asarray(row_range, dtype=float)
+        self.col_range = np.asarray(col_range, dtype=float)
+        self._jobs = -np.ones(self.shape, dtype=int)
+        self._jobs[self.positions[:, 0], self.positions[:, 1]] = \
+            np.arange(len(self.positions))
+
+    @classmethod
+    def uniform(cls, row_range, col_range):
+        '''Layout of a uniform sweep, with the jobs in the row-major
+        order.'''
+        rows, cols = len(row_range), len(col_range)
+        r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+        cr, cc = np.meshgrid(np.arange(rows - 1), np.arange(cols - 1),
+                             indexing='ij')
+        cells = np.column_stack((cr.ravel(), cc.ravel(),
+                                 np.ones(cr.size, dtype=int)))
+        return cls(np.column_stack((r.ravel(), c.ravel())), cells, row_range,
+                   col_range)
+
+    @classmethod
+    def from_dict(cls, d):
+        '''Create the layout from data saved by :meth:`to_dict`.'''
+        return cls(d['positions'], d['cells'], d['row_range'], d['col_range'])
+
+    def to_dict(self):
+        '''Return a dictionary that can be saved into a data storage.'''
+        return {
+            'positions': self.positions,
+            'cells': self.cells,
+            'row_range': self.row_range,
+            'col_range': self.col_range,
+        }
+
+    @property
+    def shape(self):
+        '''Shape of the lattice.'''
+        return (len(self.row_range), len(self.col_range))
+
+    @property
+    def njobs(self):
+        '''Number of jobs.'''
+        return len(self.positions)
+
+    @property
+    def simulated(self):
+        '''A boolean lattice of the points that have a job.'''
+        return self._jobs >= 0
+
+    def job_number(self, row, col):
+        '''Job number at a lattice position, or ``None`` if the position has
+        not been simulated.'''
+        job = self._jobs[row, col]
+        return None if job < 0 else int(job)
+
+    def lattice_parameters(self):
+        '''Return the iterated parameters on the lattice, as a pair of 2D
+        arrays (row parameter, column parameter).'''
+        return np.meshgrid(self.row_range, self.col_range, indexing='ij')
+
+    def job_parameters(self, positions=None):
+        '''Return the values of the iterated parameters of jobs at
+        ``positions`` (all jobs by default), as a pair of 1D arrays.'''
+        if positions is None:
+            positions = self.positions
+        positions = np.asarray(positions, dtype=int).reshape((-1, 2))
+        return (self.row_range[positions[:, 0]],
+                self.col_range[positions[:, 1]])
+
+    def to_lattice(self, job_values):
+        '''Place a value of each job onto the lattice. The points that have
+        not been simulated are NaN.'''
+        job_values = np.asarray(job_values, dtype=float)
+        if len(job_values) != self.njobs:
+            raise ValueError("Expected {0} job values, got "
+                             "{1}.".format(self.njobs, len(job_values)))
+        out = np.empty(self.shape)
+        out[:] = np.nan
+        out[self.positions[:, 0], self.positions[:, 1]] = job_values
+        return out
+
+    def fill(self, data):
+        '''Fill the points that have not been simulated with the value of the
+        nearest simulated point.
+
+        Parameters
+        ----------
+        data : np.ndarray or np.ma.MaskedArray
+            Lattice data, of shape :attr:`shape` in the first two dimensions.
+
+        Returns
+        -------
+        filled : np.ndarray or np.ma.MaskedArray
+            A copy of ``data`` with the filled values.
+        '''
+        _, (ri, ci) = distance_transform_edt(np.logical_not(self.simulated),
+                                             return_indices=True)
+        return data[ri, ci]
+
+    def refine(self, values, threshold):
+        '''Split the leaf cells whose corner values differ by more than
+        ``threshold``.
+
+        The lattice is made twice as dense and all the positions of this
+        layout are converted to the new lattice. The cells with less than two
+        valid (not NaN) corner values are not split.
+
+        Parameters
+        ----------
+        values : 2D array
+            Value of each lattice point, e.g. the output of
+            :meth:`~grid_cell_model.parameters.param_space.JobTrialSpace2D.aggregateData`
+            averaged over trials. Only the corners of the cells are used.
+        threshold : float
+            Maximal difference of the corner values of a cell that will not
+            be refined.
+
+        Returns
+        -------
+        layout : SweepLayout
+            The refined layout. The jobs of this layout keep their numbers
+            and the new jobs are appended.
+        parents : list of lists of ints
+            For each new job, the job numbers of the points it has been
+            interpolated from: the two end points of the cell edge, or the
+            four corners of the cell.
+        '''
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.shape:
+            raise ValueError("Shape of the values {0} does not match the "
+                             "lattice shape {1}.".format(values.shape,
+                                                         self.shape))
+
+        new_jobs = dict(((2 * r, 2 * c), job)
+                        for job, (r, c) in enumerate(self.positions))
+        njobs = self.njobs
+        new_cells = []
+        parents = []
+        for r, c, s in self.cells:
+            corners = [(r, c), (r + s, c), (r, c + s), (r + s, c + s)]
+            v = np.array([values[p] for p in corners])
+            v = v[np.isfinite(v)]
+            if len(v) < 2 or np.max(v) - np.min(v) <= threshold:
+                new_cells.append((2 * r, 2 * c, 2 * s))
+                continue
+
+            # Refined lattice: the cell has size 2s and h is the half
+            r, c, h = 2 * r, 2 * c, s
+            tl, bl, tr, br = [(cr * 2, cc * 2) for cr, cc in corners]
+            candidates = [
+                ((r + h, c), (tl, bl)),
+                ((r, c + h), (tl, tr)),
+                ((r + h, c + 2 * h), (tr, br)),
+                ((r + 2 * h, c + h), (bl, br)),
+                ((r + h, c + h), (tl, bl, tr, br)),
+            ]
+            for pos, ends in candidates:
+                if pos not in new_jobs:
+                    new_jobs[pos] = njobs
+                    njobs += 1
+                    parents.append([new_jobs[e] for e in ends])
+            new_cells.extend([(r, c, h), (r + h, c, h), (r, c + h, h),
+                              (r + h, c + h, h)])
+
+        positions = np.zeros((njobs, 2), dtype=int)
+        for pos, job in new_jobs.items():
+            positions[job] = pos
+        layout = SweepLayout(positions, new_cells,
+                             _refine_range(self.row_range),
+                             _refine_range(self.col_range))
+        return layout, parents
@@ -15,6 +15,8 @@ import grid_cell_model.visitors.plotting
 import grid_cell_model.visitors.plotting.spikes
 import grid_cell_model.visitors.plotting.grids
 import grid_cell_model.visitors.plotting.grids_ipc
+import grid_cell_model.visitors.profiling
+import grid_cell_model.visitors.dependencies
 from grid_cell_model.parameters import JobTrialSpace2D
 from grid_cell_model.submitting import flagparse
 
@@ -31,6 +33,12 @@ parser.add_argument("--output_dir",   type=str, required=True)
 parser.add_argument("--job_num",      type=int) # unused
 parser.add_argument("--type",         type=str, choices=common.allowedTypes, required=True, nargs="+")
 parser.add_argument("--bumpSpeedMax", type=float)
+parser.add_argument("--profile",      type=int, default=0,
+                    help="Record time, memory and HDF5 reads of the visitors "
+                         "into <output_dir>/profile.")
+parser.add_argument("--incremental", type=int, default=0,
+                    help="Rerun only the visitors whose parameters, code "
+                         "version or inputs have changed.")
 
 o = parser.parse_args()
 
@@ -44,6 +52,24 @@ trialNums = None
 sp = JobTrialSpace2D(shape, o.output_dir, dataPoints=dataPoints)
 forceUpdate = bool(o.forceUpdate)
 
+profile = None
+if o.profile:
+    profile = vis.profiling.ProfileLog(
+        '{0}/{1}/analysis_r{2:03}_c{3:03}.jsonl'.format(
+            o.output_dir, vis.profiling.PROFILE_DIR, o.row, o.col),
+        job={'row': o.row, 'col': o.col, 'type': o.type})
+
+
+def visitTrials(*visitors):
+    '''Apply the visitors to all the trials, through the dependency tracking
+    planner if the analysis is incremental.'''
+    if o.incremental:
+        sp.visit(vis.dependencies.AnalysisPlanner(visitors), profile=profile)
+    else:
+        for visitor in visitors:
+            sp.visit(visitor, profile=profile)
+
+
 # Common parameters
 isBump_win_dt = 125.
 isBump_tstart = 0.
@@ -70,9 +96,9 @@ if common.bumpType in o.type:
             readme=isBump_readme,
             forceUpdate=forceUpdate)
 
-    sp.visit(bumpVisitor)
-    sp.visit(isBumpVisitor)
-    sp.visit(FRVisitor)
+    sp.visit(bumpVisitor, profile=profile)
+    sp.visit(isBumpVisitor, profile=profile)
+    sp.visit(FRVisitor, profile=profile)
     #sp.visit(FRPlotter)
 
 if common.gammaType in o.type:
@@ -84,8 +110,7 @@ if common.gammaType in o.type:
     ACVisitor = vis.signals.AutoCorrelationVisitor(monName, stateList,
                                                    forceUpdate=forceUpdate)
 
-    sp.visit(ACVisitor)
-    sp.visit(statsVisitor_e)
+    visitTrials(ACVisitor, statsVisitor_e)
 
 if common.velocityType in o.type:
     speedEstimator = vis.bumps.SpeedEstimator(
@@ -98,9 +123,9 @@ if common.velocityType in o.type:
             maxFitRangeIdx=10)
     speedPlotter = vis.bumps.SpeedPlotter(plotFittedLine=True)
 
-    sp.visit(speedEstimator, trialList='all-at-once')
-    sp.visit(gainEstimator, trialList='all-at-once')
-    sp.visit(speedPlotter, trialList='all-at-once')
+    sp.visit(speedEstimator, trialList='all-at-once', profile=profile)
+    sp.visit(gainEstimator, trialList='all-at-once', profile=profile)
+    sp.visit(speedPlotter, trialList='all-at-once', profile=profile)
 
 if common.gridsType in o.type:
 
@@ -129,11 +154,9 @@ if common.gridsType in o.type:
                                              forceUpdate=forceUpdate,
                                              sliding_analysis=False)
 
-    sp.visit(gridVisitor)
-    sp.visit(gridVisitor_i)
     #sp.visit(isBumpVisitor)
     #sp.visit(ISIVisitor)
-    sp.visit(FRVisitor)
+    visitTrials(gridVisitor, gridVisitor_i, FRVisitor)
 
 if common.gridsIPCType in o.type:
     # This is solely for the purpose of analyzing simulations where a
@@ -157,9 +180,9 @@ if common.gridsIPCType in o.type:
         forceUpdate=forceUpdate,
         sliding_analysis=False)
 
-    sp.visit(ipc_gridVisitor)
-    sp.visit(ipc_gridVisitor_i)
-    sp.visit(ipc_FRVisitor)
+    sp.visit(ipc_gridVisitor, profile=profile)
+    sp.visit(ipc_gridVisitor_i, profile=profile)
+    sp.visit(ipc_FRVisitor, profile=profile)
 
 if common.posType in o.type:
     bumpPosVisitor = vis.bumps.BumpPositionVisitor(
@@ -168,7 +191,9 @@ if common.posType in o.type:
             win_dt=125.0,
             readme='Bump position estimation. Whole simulation.',
             forceUpdate=forceUpdate)
-    sp.visit(bumpPosVisitor)
+    visitTrials(bumpPosVisitor)
 
 
+if profile is not None:
+    profile.close()
 print('Total time: %.3f s' % (time.time() - startT))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+'''
+Compact (repack) the job files of a parameter sweep in place.
+
+Rewrites the live objects of each job file into a fresh file, optionally
+re-chunking and recompressing the datasets. Use --dry_run to only report the
+number of reclaimable bytes for each file.
+'''
+from parameters  import JobTrialSpace2D
+from submitting import flagparse
+
+###############################################################################
+parser = flagparse.FlagParser()
+parser.add_argument('-r', '--row',  type=int)
+parser.add_argument('-c', '--col',  type=int)
+parser.add_argument("--where",       type=str, required=True)
+parser.add_argument("--ns",          type=int, choices=[0, 150, 300])
+parser.add_argument("--nproc",       type=int, help='Number of processes (default: all CPUs)')
+parser.add_argument("--compression", type=str, choices=['gzip', 'lzf'], help='Recompress datasets with this filter')
+parser.add_argument('--output_dir',  type=str, help='Unused')
+parser.add_flag("--ns_all")
+parser.add_flag("--dry_run", help='Only report the reclaimable space')
+o = parser.parse_args()
+
+if not o.ns_all and o.ns is None:
+    raise RuntimeError("Must specify either --ns or --ns_all!")
+if (o.row is None) ^ (o.col is None):
+    raise RuntimeError("Must specify either both --row and --col or none!")
+
+
+ns_all  = [0, 150, 300]
+shape   = (31, 31)
+
+if o.row is not None and o.col is not None:
+    dataPoints = [(o.row, o.col)]
+else:
+    dataPoints = None
+
+################################################################################
+noise_sigmas = ns_all if o.ns_all  else [o.ns]
+for noise_sigma in noise_sigmas:
+    rootDir = '{0}/{1}pA'.format(o.where, int(noise_sigma))
+
+    sp = JobTrialSpace2D(shape, rootDir, dataPoints=dataPoints)
+    reports = sp.repackAllItems(processes=o.nproc,
+                                compression=o.compression,
+                                dry_run=o.dry_run)
+    for report in reports:
+        print(report)
+    print("{0}: {1} bytes {2}".format(
+        rootDir, sum(r.reclaimable for r in reports),
+        'reclaimable' if o.dry_run else 'reclaimed'))
@@ -15,6 +15,7 @@ parser.add_argument('--targetType', type=str, required=True)
 parser.add_argument('--output_dir', type=str, help='Unused')
 parser.add_flag("--ns_all")
 parser.add_flag("--repack", help='Whether to repack data after the operation')
+parser.add_argument('--nproc', type=int, help='Number of processes to use for repacking (default: all CPUs)')
 o = parser.parse_args()
 
 if not o.ns_all and o.ns is None:
@@ -47,7 +48,7 @@ for noise_sigma in noise_sigmas:
             if o.row is not None:
                 sp.repackItem(o.row, o.col)
             else:
-                sp.repackAllItems()
+                sp.repackAllItems(processes=o.nproc)
     else:
         raise RuntimeError("Whoops! We shouldn't be here!")
 
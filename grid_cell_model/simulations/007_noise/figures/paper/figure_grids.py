@@ -20,6 +20,11 @@ parser.add_flag('--detailed_noise')
 parser.add_flag('--diff_sweep')
 parser.add_flag('--grids_pbumps_prob')
 parser.add_flag('--high_gscore_frac')
+parser.add_argument('--processes', type=int, default=1,
+                    help='Number of worker processes that run the plotters')
+parser.add_argument('--keep_going', action='store_true',
+                    help='Continue when a plotter fails and print a summary '
+                         'of the failures at the end')
 args = parser.parse_args()
 
 env = NoiseEnvironment(user_config=config.get_config())
@@ -104,4 +109,4 @@ if args.high_gscore_frac or args.all:
     env.register_plotter(noisefigs.plotters.HighGridScoreFraction)
 
 
-env.plot()
+env.plot(processes=args.processes, keep_going=args.keep_going)
@@ -6,6 +6,8 @@ from grid_cell_model.submitting.factory   import SubmitterFactory
 from grid_cell_model.submitting.arguments import ArgumentCreator
 from grid_cell_model.submitting.noise.slopes import (DefaultSelector,
                                                      NoThetaSelector)
+from grid_cell_model.parameters import JobTrialSpace2D
+from grid_cell_model.parameters.refinement import SweepLayout
 from grid_cell_model.otherpkg.log import log_info
 from simtools.storage import DataStorage
 
@@ -52,6 +54,95 @@ def submitParamSweep(p, startG, endG, Nvals, ENV, simRootDir, simLabel, appName,
                              dry_run=dry_run)
 
 
+#: Reductions that can drive the refinement of a sweep (paths in 'analysis')
+refinementReductions = {
+    'gridness': ['gridnessScore'],
+    'isBump'  : ['bump_e', 'isBump', 'fracTotal'],
+}
+
+
+def _loadRefinementData(rootDir, varList, ntrials):
+    '''Load the layout, trial-averaged values of ``varList`` and the iterated
+    parameters of a simulated parameter sweep.'''
+    sp = JobTrialSpace2D(None, rootDir, fileMode='r')
+    labels = list(sp.get_iteration_labels())
+    layout = sp.layout
+    if layout is None:
+        layout = SweepLayout.uniform(sp.get_iteration_range(0),
+                                     sp.get_iteration_range(1))
+    values = sp.aggregateData(['analysis'] + varList, range(ntrials),
+                              funReduce=None, loadData=False, saveData=False)
+    values = np.nanmean(values, axis=2)
+
+    meta = DataStorage.open('{0}/iterparams.h5'.format(rootDir), 'r')
+    iterparams = dict((key, np.asarray(meta['iterParams'][key]))
+                      for key in meta['iterParams'].keys())
+    meta.close()
+    return layout, values, iterparams, labels
+
+
+def submitRefinedParamSweep(p, reduction, threshold, ntrials, ENV,
+                            simRootDir, simLabel, appName, rtLimit, numCPU,
+                            blocking, dry_run, **kwargs):
+    '''Refine a simulated gE vs gI parameter sweep and submit the new points.
+
+    The sweep in ``simRootDir/simLabel`` must have been simulated and
+    analysed. Its grid cells, in which the trial-averaged ``reduction``
+    differs by more than ``threshold`` between the corners, are split (see
+    :meth:`~grid_cell_model.parameters.refinement.SweepLayout.refine`) and
+    the new points are submitted as jobs appended to the sweep. The extra
+    iterated parameters (e.g. ``bumpCurrentSlope``) of the new jobs are
+    interpolated from the corners of the split cells.
+
+    Both regular sweeps (:func:`submitParamSweep`) and sweeps refined before
+    can be refined. The reductions saved in the sweep must be aggregated
+    again after the new jobs have been simulated and analysed.
+
+    Parameters
+    ----------
+    reduction : str
+        The reduction to refine on; a key of :data:`refinementReductions`.
+    threshold : float
+        Maximal difference of the reduction in a grid cell that will not be
+        refined.
+    ntrials : int
+        Number of trials to average the reduction over.
+    '''
+    printout = kwargs.pop('printout', True)
+    rootDir = '{0}/{1}'.format(simRootDir, simLabel)
+    layout, values, iterparams, labels = _loadRefinementData(
+        rootDir, refinementReductions[reduction], ntrials)
+
+    refined, parents = layout.refine(values, threshold)
+    log_info('submitRefinedParamSweep',
+             'Refining {0}: {1} new points, lattice shape: {2}'.format(
+                 rootDir, len(parents), refined.shape))
+    if len(parents) == 0:
+        return
+
+    newParams = dict(zip(labels, refined.job_parameters(
+        refined.positions[layout.njobs:])))
+    for key, vals in iterparams.items():
+        if key not in labels:
+            newParams[key] = np.array([np.mean(vals[par]) for par in parents])
+
+    ac = ArgumentCreator(p, printout=printout)
+    ac.insertDict(newParams, mult=False)
+
+    ###############################################################################
+    submitter = SubmitterFactory.getSubmitter(
+        ac, appName, envType=ENV, rtLimit=rtLimit, output_dir=simRootDir,
+        label=simLabel, blocking=blocking, timePrefix=False, numCPU=numCPU,
+        **kwargs)
+    ac.setOption('output_dir', submitter.outputDir())
+    submitter.submitAll(layout.njobs, 1, dry_run=dry_run)
+
+    allParams = dict((key, np.concatenate((iterparams[key], newParams[key])))
+                     for key in newParams)
+    submitter.saveIterParams(allParams, labels, list(refined.shape),
+                             dry_run=dry_run, layout=refined)
+
+
 ###############################################################################
 
 def getBumpCurrentSlope(noise_sigma, threshold=0, type=None):
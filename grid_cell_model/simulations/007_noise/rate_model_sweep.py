@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+'''Pre-screen the gE vs gI parameter sweeps with the batched rate model.
+
+Computes the bump, bump width and oscillation frequency maps of the rate model
+(:mod:`grid_cell_model.models.gc_net_rate`) on the same 31x31 grid of
+``g_AMPA_total`` and ``g_GABA_total`` as the spiking sweeps, for each noise
+level, and saves them into ``<where>/rate_model_sweep.h5``, under the
+``<noise>pA`` keys.
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import argparse
+import logging
+
+import numpy as np
+
+from grid_cell_model.models.gc_net_rate import RateGridCellNetwork
+from grid_cell_model.otherpkg.log import log_info
+from simtools.storage import DataStorage
+from default_params import defaultParameters as dp
+
+logging.basicConfig(level=logging.INFO)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--where', type=str, required=True,
+                    help='Output directory.')
+parser.add_argument('--ns', type=float, nargs='+', default=[0., 150., 300.],
+                    help='Noise levels (pA).')
+parser.add_argument('--Nvals', type=int, default=31,
+                    help='Number of values for each dimension.')
+parser.add_argument('--endG', type=float, default=6120.,
+                    help='Largest g_AMPA_total and g_GABA_total (nS).')
+parser.add_argument('--time', type=float, default=1e3,
+                    help='Simulation time (ms).')
+parser.add_argument('--dt', type=float, default=.5, help='Time step (ms).')
+parser.add_argument('--seed', type=int, default=123456)
+o = parser.parse_args()
+
+np.random.seed(o.seed)
+net = RateGridCellNetwork(argparse.Namespace(**dp), dt=o.dt)
+
+GArr = np.linspace(0., o.endG, o.Nvals)
+g_AMPA_total, g_GABA_total = np.meshgrid(GArr, GArr, indexing='ij')
+
+if not os.path.exists(o.where):
+    os.makedirs(o.where)
+ds = DataStorage.open(os.path.join(o.where, 'rate_model_sweep.h5'), 'a')
+for noise_sigma in o.ns:
+    log_info('rate_model_sweep', 'Noise level: {0} pA'.format(noise_sigma))
+    maps = net.simulate(g_AMPA_total, g_GABA_total, noise_sigma,
+                        time=o.time)
+    maps.update(g_AMPA_total=g_AMPA_total, g_GABA_total=g_GABA_total,
+                noise_sigma=noise_sigma)
+    ds['{0}pA'.format(int(noise_sigma))] = maps
+    ds.flush()
+ds.close()
@@ -14,6 +14,10 @@ from grid_cell_model.models.parameters  import getOptParser
 from grid_cell_model.models.gc_net_nest import (BasicGridCellNetwork,
                                                 ConstPosInputs)
 from grid_cell_model.models.seeds import TrialSeedGenerator
+from grid_cell_model.models.checkpoint import (TrialCheckpointer,
+                                               find_checkpoint)
+from grid_cell_model.models.trial_runner import run_trials, store_trial
+from grid_cell_model.models.activity_monitor import ActivityMonitor
 from simtools.storage import DataStorage
 
 import logging
@@ -49,23 +53,49 @@ d = DataStorage.open(output_fname, 'a')
 if ("trials" not in d.keys()):
     d['trials'] = []
 
-seed_gen = TrialSeedGenerator(int(o.master_seed))
+seed_gen = TrialSeedGenerator(int(o.master_seed), n_vp=o.nthreads)
 if len(d['trials']) == 0:
     d['master_seed'] = int(o.master_seed)
+    d['n_vp'] = seed_gen.n_vp
+    d['seed_scheme'] = seed_gen.SEED_SCHEME
 else:
     try:
-        seed_gen.check_master_seed(d['master_seed'], int(o.master_seed))
+        old_n_vp = d['n_vp'] if 'n_vp' in d.keys() else 1
+        old_scheme = d['seed_scheme'] if 'seed_scheme' in d.keys() else None
+        seed_gen.check_master_seed(d['master_seed'], int(o.master_seed),
+                                   old_n_vp=old_n_vp, old_scheme=old_scheme)
     except ValueError as e:
         d.close()
         raise e
 
-overalT = 0.
-stop = False
-###############################################################################
-for trial_idx in range(len(d['trials']), o.ntrials):
-    print("\n\t\tStarting trial no. {0}\n".format(trial_idx))
+# Checkpointing implies the segmented mode; by default one segment per
+# checkpoint.
+sim_segment = o.sim_segment
+if o.checkpoint_interval is not None and sim_segment is None:
+    sim_segment = o.checkpoint_interval
+
+# A streamed trial is complete only when the network parameters have been
+# saved at its end. An incomplete trial is resumed from its last checkpoint or
+# simulated again.
+first_trial = len(d['trials'])
+if sim_segment is not None and first_trial > 0:
+    if 'net_attr' not in d['trials'][first_trial - 1]:
+        first_trial -= 1
+
+
+def run_trial(trial_idx, job, pos):
+    '''Simulate a single trial and save it into ``job['trials'][pos]``.'''
+    trials = job['trials']
+    checkpoint = None
+    if sim_segment is not None and pos < len(trials):
+        if o.checkpoint_interval is not None:
+            checkpoint = find_checkpoint(trials[pos])
+        if checkpoint is None:
+            logger.info('Trial no. %d is incomplete and has no checkpoint. '
+                        'Simulating again.', trial_idx)
+            trials[pos] = {}
+
     seed_gen.set_generators(trial_idx)
-    d['invalidated'] = 1
     ei_net = BasicGridCellNetwork(o, simulationOpts=None,
                                   nrec_spikes=(nrec_spikes_e, nrec_spikes_i),
                                   stateRecParams=(stateMonParams,
@@ -88,25 +118,52 @@ for trial_idx in range(len(d['trials']), o.ntrials):
                                "ON.")
         ei_net.setIPlaceCells()
 
-    d['net_params'] = ei_net.getNetParams()  # Common settings will stay
-    d.flush()
-
+    job['net_params'] = ei_net.getNetParams()  # Common settings will stay
+    job.flush()
+
+    # In the segmented mode, the recorded data are streamed directly into the
+    # trial in the output file.
+    stream = None
+    checkpointer = None
+    if sim_segment is not None:
+        if pos == len(trials):
+            trials.append({})
+        stream = trials[pos]
+    if o.checkpoint_interval is not None:
+        checkpointer = TrialCheckpointer(seed_gen, trial_idx,
+                                         o.checkpoint_interval)
+        if checkpoint is not None:
+            ei_net.restoreCheckpoint(checkpoint, stream)
+
+    stop = False
     try:
-        ei_net.simulate(o.time, printTime=o.printTime)
+        ei_net.simulate(o.time, printTime=o.printTime, segment=sim_segment,
+                        stream=stream, checkpoint=checkpointer,
+                        monitor=ActivityMonitor.from_options(o))
     except NESTError as e:
         print("Simulation interrupted. Message: {0}".format(str(e)))
         print("Trying to save the simulated data if possible...")
         stop = True
     ei_net.endSimulation()
-    d['trials'].append(ei_net.getAllData())
-    d.flush()
+    if stream is None:
+        store_trial(job, pos, ei_net.getAllData())
+    elif stop and checkpointer is not None:
+        # Leave the trial incomplete, so that it is resumed from the last
+        # checkpoint
+        pass
+    else:
+        ei_net.saveStreamedData(stream)
+        if checkpointer is not None:
+            checkpointer.clear(stream)
+    job.flush()
     constrT, simT, totalT = ei_net.printTimes()
-    overalT += totalT
-    if stop:
-        break
+    return totalT, stop
+
+
+###############################################################################
+overalT = run_trials(d, output_fname, run_trial, first_trial, o.ntrials,
+                     nproc=o.trial_procs)
 
 d.close()
 print("Script total run time: {0} s".format(overalT))
 ################################################################################
-
-
@@ -7,8 +7,10 @@ import numpy as np
 from nest.hl_api        import NESTError
 
 from grid_cell_model.models.parameters  import getOptParser
-from grid_cell_model.models.gc_net_nest import ConstantVelocityNetwork
+from grid_cell_model.models.gc_net_nest import (ConstantVelocityNetwork,
+                                                NetworkBatch)
 from grid_cell_model.models.seeds import TrialSeedGenerator
+from grid_cell_model.models.trial_runner import run_trials
 from simtools.storage import DataStorage
 
 logger = logging.getLogger(__name__)
@@ -17,12 +19,13 @@ parser = getOptParser()
 parser.add_argument("--IvelMax", type=float, required=True, help="Max constant velocity current input (pA)")
 parser.add_argument("--dIvel",   type=float, required=True, help="Constant velocity current input step (pA)")
 parser.add_argument("--ispikes", type=int,   choices=[0, 1], default=0, help="Whether to save spikes from the I population")
+parser.add_argument("--nest_batch", type=int, default=1, help="Number of velocity inputs of a trial simulated together in one NEST kernel")
 
 def check_ivel_vec(trial):
     if 'IvelVec' not in trial.keys() and 'IvelData' in trial.keys():
         logger.info("Data present, but IvelVec is missing. Fixing...")
         trial['IvelVec'] = np.arange(.0, len(trial['IvelData'])*o.dIvel, o.dIvel)
-        d.flush()
+        trial.flush()
 
 (o, args) = parser.parse_args()
 
@@ -34,24 +37,27 @@ if ("trials" not in d.keys()):
     d['trials'] = []
 
 # Initialise seeds and check their consistency with previously saved data
-seed_gen = TrialSeedGenerator(int(o.master_seed))
+seed_gen = TrialSeedGenerator(int(o.master_seed), n_vp=o.nthreads)
 if len(d['trials']) == 0:
     d['master_seed'] = int(o.master_seed)
+    d['n_vp'] = seed_gen.n_vp
+    d['seed_scheme'] = seed_gen.SEED_SCHEME
 else:
     try:
-        seed_gen.check_master_seed(d['master_seed'], int(o.master_seed))
+        old_n_vp = d['n_vp'] if 'n_vp' in d.keys() else 1
+        old_scheme = d['seed_scheme'] if 'seed_scheme' in d.keys() else None
+        seed_gen.check_master_seed(d['master_seed'], int(o.master_seed),
+                                   old_n_vp=old_n_vp, old_scheme=old_scheme)
     except ValueError as e:
         d.close()
         raise e
 
-overalT = 0.
-oldNTrials = len(d['trials'])
-################################################################################
-for trial_idx in range(o.ntrials):
-    print("\n\t\tStarting/appending to trial no. {0}\n".format(trial_idx))
-    if trial_idx >= oldNTrials:  # Create new trial
-        d['trials'].append({})
-    trialOut = d['trials'][trial_idx]
+
+def run_trial(trial_idx, job, pos):
+    '''Append the missing velocity inputs to trial ``job['trials'][pos]``.'''
+    if pos >= len(job['trials']):  # Create new trial
+        job['trials'].append({})
+    trialOut = job['trials'][pos]
 
     # Now check if there is data in the trial and append
     # Additionally, if data was saved but IvelVec missing, add it so that it
@@ -63,26 +69,60 @@ for trial_idx in range(o.ntrials):
     else:
         oldNIvel = len(trialOut['IvelVec'])
 
+    trialT = 0.
     try:
         IvelVecAppend = np.arange(oldNIvel*o.dIvel, o.IvelMax + o.dIvel, o.dIvel)
-        for Ivel in IvelVecAppend:
-            seed_gen.set_generators(trial_idx)  # Each trial is reproducible
-            const_v = [0.0, -Ivel]
-            ei_net = ConstantVelocityNetwork(o, simulationOpts=None, vel=const_v)
-
-            ei_net.simulate(o.time, printTime=o.printTime)
-            ei_net.endSimulation()
-            trialOut['IvelData'].append(ei_net.getMinimalSaveData(ispikes=o.ispikes))
-            trialOut['IvelVec'] = np.arange(
-                .0, len(trialOut['IvelData']) * o.dIvel, o.dIvel)
-            d.flush()
-            constrT, simT, totalT = ei_net.printTimes()
-            overalT += totalT
-        d.flush()
+        if o.nest_batch > 1:
+            # Several velocity inputs in one NEST kernel; the connectivity
+            # is the same as in the separate simulations
+            for start in range(0, len(IvelVecAppend), o.nest_batch):
+                seed_gen.set_generators(trial_idx)
+                batch = NetworkBatch(o)
+                for Ivel in IvelVecAppend[start:start + o.nest_batch]:
+                    seed_gen.set_numpy_generator(trial_idx)
+                    batch.add(ConstantVelocityNetwork, o,
+                              simulationOpts=None, vel=[0.0, -Ivel])
+
+                batch.simulate(o.time, printTime=o.printTime)
+                for ei_net in batch:
+                    trialOut['IvelData'].append(
+                        ei_net.getMinimalSaveData(ispikes=o.ispikes))
+                trialOut['IvelVec'] = np.arange(
+                    .0, len(trialOut['IvelData']) * o.dIvel, o.dIvel)
+                job.flush()
+                trialT += batch.totalTime()
+                print("Batch of {0} velocity inputs: simulation time: {1} s, "
+                      "total time: {2} s".format(len(batch),
+                                                 batch.simulationTime(),
+                                                 batch.totalTime()))
+        else:
+            for Ivel in IvelVecAppend:
+                seed_gen.set_generators(trial_idx)  # Each trial is reproducible
+                const_v = [0.0, -Ivel]
+                ei_net = ConstantVelocityNetwork(o, simulationOpts=None,
+                                                 vel=const_v)
+
+                ei_net.simulate(o.time, printTime=o.printTime)
+                ei_net.endSimulation()
+                trialOut['IvelData'].append(
+                    ei_net.getMinimalSaveData(ispikes=o.ispikes))
+                trialOut['IvelVec'] = np.arange(
+                    .0, len(trialOut['IvelData']) * o.dIvel, o.dIvel)
+                job.flush()
+                constrT, simT, totalT = ei_net.printTimes()
+                trialT += totalT
+        job.flush()
     except NESTError as e:
         print("Simulation interrupted. Message: {0}".format(str(e)))
         print("Not saving the last trial. Trying to clean up if possible...")
-        break
+        return trialT, True
+    return trialT, False
+
+
+################################################################################
+# All the trials are visited, in order to append the missing velocity inputs
+overalT = run_trials(d, output_fname, run_trial, 0, o.ntrials,
+                     nproc=o.trial_procs)
 
 d.close()
 print("Script total run time: {0} s".format(overalT))
@@ -32,6 +32,10 @@ parser.add_argument('--shape',   type=positive_int, nargs=2,
 parser.add_flag("--ns_all")
 parser.add_flag("--forceUpdate")
 parser.add_flag("--ignoreErrors")
+parser.add_flag("--profile", help="Profile the visitors of the analysis "
+                                  "(see sweepls profile-summary).")
+parser.add_flag("--incremental", help="Rerun only the analyses whose "
+                                      "parameters, code or inputs changed.")
 o = parser.parse_args()
 
 if not o.ns_all and o.ns is None:
@@ -66,6 +70,8 @@ for noise_sigma in noise_sigmas:
     p['shapeCols']   = colN
     p['verbosity']   = o.verbosity
     p['forceUpdate'] = int(o.forceUpdate)
+    p['profile']     = int(o.profile)
+    p['incremental'] = int(o.incremental)
 
     if common.velocityType in o.type:
         percentile = 99.0
@@ -28,7 +28,8 @@ for noise_sigma in parser.noise_sigmas:
 
     p['master_seed']      = 123456
     p['time']             = 600e3 if o.time is None else o.time  # ms
-    p['nthreads']         = 1
+    p['nthreads']         = o.nthreads
+    p['trial_procs']      = o.trial_procs
     p['ntrials']          = o.ntrials
     p['velON']            = 1
     p['pcON']             = 1
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+'''Submit job(s) to the cluster/workstation: refinement of the grid field
+parameter sweeps.
+
+Run this after the sweeps submitted by ``submit_param_sweep_grids.py`` (or
+the previous refinement) have been simulated and analysed. Each run adds one
+level of refinement.
+'''
+
+from grid_cell_model.submitting.noise import SubmissionParserBase
+from param_sweep    import submitRefinedParamSweep, refinementReductions
+from default_params import defaultParameters as dp
+
+parser = SubmissionParserBase()
+parser.add_argument('--reduction', type=str, default='gridness',
+                    choices=sorted(refinementReductions.keys()),
+                    help='The analysis result that drives the refinement.')
+parser.add_argument('--threshold', type=float, required=True,
+                    help='Refine the grid cells in which the trial-averaged '
+                         'reduction differs by more than this value.')
+o = parser.parse_args()
+
+for noise_sigma in parser.noise_sigmas:
+    p = dp.copy()
+    p['noise_sigma'] = noise_sigma # pA
+
+    # Submitting
+    ENV         = o.env
+    simRootDir  = o.where
+    simLabel    = '{0}pA'.format(int(p['noise_sigma']))
+    appName     = 'simulation_grids.py'
+    rtLimit     = o.rtLimit
+    numCPU      = 1
+    blocking    = True
+    dry_run     = o.dry_run
+
+    p['master_seed']      = 123456
+    p['time']             = 600e3 if o.time is None else o.time  # ms
+    p['nthreads']         = o.nthreads
+    p['trial_procs']      = o.trial_procs
+    p['ntrials']          = o.ntrials
+    p['velON']            = 1
+    p['pcON']             = 1
+    p['constantPosition'] = 0
+    p['verbosity']        = o.verbosity
+
+    ###############################################################################
+    submitRefinedParamSweep(p, o.reduction, o.threshold, o.ntrials, ENV,
+                            simRootDir, simLabel, appName, rtLimit, numCPU,
+                            blocking, dry_run, printout=o.printout)
@@ -44,6 +44,7 @@ for noise_sigma in parser.noise_sigmas:
 
     p['IvelMax']     = 100
     p['dIvel']       = 10
+    p['nest_batch']  = 1   # >1: several Ivel values in one NEST kernel
 
     p['verbosity']   = 'DEBUG'
 
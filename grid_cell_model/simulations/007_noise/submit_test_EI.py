@@ -8,8 +8,6 @@ from default_params import defaultParameters as dp
 sim = BasicNoiseSimulation('../common/simulation_test_network.py', dp)
 
 parser = sim.parser
-parser.add_argument('--nthreads', type=int, default=1,
-                    help='Number of simulation threads.')
 parser.add_argument('--Ivel', type=float,
                     help='Velocity input (pA). Default is 50 pA.')
 parser.add_argument('--use_II', type=int, choices=(0, 1), default=0,
@@ -11,8 +11,6 @@ from default_params import defaultParameters as dp
 sweep = ParameterSweep('../common/simulation_stationary.py', dp)
 
 parser = sweep.parser
-parser.add_argument('--nthreads', type=int, default=1,
-                    help='Number of simulation threads.')
 parser.add_argument('--Ivel', type=float,
                     help='Velocity input (pA). Default is 50 pA.')
 parser.add_argument('--g_AMPA_total', type=float,
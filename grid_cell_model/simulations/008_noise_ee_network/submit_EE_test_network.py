@@ -9,8 +9,6 @@ from grid_cell_model.submitting.noise import SubmissionParserBase
 from default_params import defaultParameters as dp
 
 parser = SubmissionParserBase()
-parser.add_argument('--nthreads', type=int, default=1,
-                    help='Number of simulation threads.')
 parser.add_argument('--Ivel', type=float,
                     help='Velocity input (pA). Default is 50 pA.')
 parser.add_argument('--ee_connections', type=int, choices=[0, 1], default=0,
@@ -13,7 +13,7 @@ parser = getOptParser()
 output_fname = "{0}/{1}job{2:05}_output.h5".format(o.output_dir,
                                                    o.fileNamePrefix, o.job_num)
 d = DataStorage.open(output_fname, 'w')
-seed_gen = TrialSeedGenerator(int(o.master_seed))
+seed_gen = TrialSeedGenerator(int(o.master_seed), n_vp=o.nthreads)
 
 out = []
 overalT = 0.
@@ -22,6 +22,8 @@ for trial_idx in range(o.ntrials):
     print("\n\t\tStarting trial no. {0}\n".format(trial_idx))
     seed_gen.set_generators(trial_idx)
     d['master_seed'] = int(o.master_seed)
+    d['n_vp'] = seed_gen.n_vp
+    d['seed_scheme'] = seed_gen.SEED_SCHEME
     d['invalidated'] = 1
 
     ei_net = BasicGridCellNetwork(o, simulationOpts=None)
@@ -30,10 +32,11 @@ for trial_idx in range(o.ntrials):
     ei_net.beginSimulation()
 
     data = ei_net.getNetParams()
+    # Stored as sparse (CSR) matrices: (post, pre)
     # E --> I neurons
-    data['g_IE'] = ei_net.getConnMatrix("E")
+    data['g_IE'] = ei_net.getConnMatrixSparse("E")
     # I --> E neurons
-    data['g_EI'] = ei_net.getConnMatrix("I")
+    data['g_EI'] = ei_net.getConnMatrixSparse("I")
 
     ei_net.endSimulation()
 
@@ -7,6 +7,9 @@ from nest.hl_api import NESTError
 from grid_cell_model.models.parameters import getOptParser
 from grid_cell_model.models.gc_net_nest import BasicGridCellNetwork
 from grid_cell_model.models.seeds import TrialSeedGenerator
+from grid_cell_model.models.trial_runner import run_trials, store_trial
+from grid_cell_model.models.activity_monitor import ActivityMonitor
+from grid_cell_model.data_storage.sim_models.ei import isCompactStateMon
 from grid_cell_model.parameters.data_sets import DictDataSet
 from grid_cell_model.visitors.spikes import SpikeStatsVisitor
 from grid_cell_model.visitors.signals import AutoCorrelationVisitor
@@ -35,8 +38,9 @@ def signal_analysis(data):
     stats_visitor_e.visitDictDataSet(dummy_data_set)
     ac_visitor.visitDictDataSet(dummy_data_set)
 
-    # Clean the state monitor
-    data['stateMonF_e'] = [data['stateMonF_e'][0]]
+    # Clean the state monitor. The compact layout is small enough to be kept.
+    if not isCompactStateMon(data['stateMonF_e']):
+        data['stateMonF_e'] = [data['stateMonF_e'][0]]
 
     return data
 
@@ -51,16 +55,17 @@ d = DataStorage.open(output_fname, 'a')
 if "trials" not in d.keys():
     d['trials'] = []
 
-seed_gen = TrialSeedGenerator(int(options.master_seed))
+seed_gen = TrialSeedGenerator(int(options.master_seed),
+                              n_vp=options.nthreads)
+if len(d['trials']) < options.ntrials:
+    d['master_seed'] = int(options.master_seed)
+    d['n_vp'] = seed_gen.n_vp
+    d['seed_scheme'] = seed_gen.SEED_SCHEME
 
-overalT = 0.
 
-###############################################################################
-for trial_idx in range(len(d['trials']), options.ntrials):
-    print("\n\t\tStarting trial no. {0}\n".format(trial_idx))
+def run_trial(trial_idx, job, pos):
+    '''Simulate a single trial and save it into ``job['trials'][pos]``.'''
     seed_gen.set_generators(trial_idx)
-    d['master_seed'] = int(options.master_seed)
-    d['invalidated'] = 1
     try:
         ei_net = BasicGridCellNetwork(options, simulationOpts=None)
 
@@ -80,19 +85,25 @@ for trial_idx in range(len(d['trials']), options.ntrials):
                                                     stateMonF_e_params,
                                                     'stateMonF_e')
 
-        d['net_params'] = ei_net.getNetParams()  # Common settings will stay
-        d.flush()
+        job['net_params'] = ei_net.getNetParams()  # Common settings will stay
+        job.flush()
 
-        ei_net.simulate(options.time, printTime=options.printTime)
+        ei_net.simulate(options.time, printTime=options.printTime,
+                        monitor=ActivityMonitor.from_options(options))
         ei_net.endSimulation()
-        d['trials'].append(signal_analysis(ei_net.getAllData()))
-        d.flush()
+        store_trial(job, pos, signal_analysis(ei_net.getAllData()))
+        job.flush()
         constrT, simT, totalT = ei_net.printTimes()
-        overalT += totalT
+        return totalT, False
     except NESTError as e:
         print("Simulation interrupted. Message: {0}".format(str(e)))
         print("Trying to save the simulated data if possible...")
-        break
+        return 0., True
+
+
+###############################################################################
+overalT = run_trials(d, output_fname, run_trial, len(d['trials']),
+                     options.ntrials, nproc=options.trial_procs)
 
 d.close()
 print("Script total run time: {0} s".format(overalT))
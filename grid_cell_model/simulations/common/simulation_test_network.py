@@ -23,10 +23,12 @@ d['trials'] = []
 overalT = 0.
 stop = False
 ###############################################################################
-seed_gen = TrialSeedGenerator(int(o.master_seed))
+seed_gen = TrialSeedGenerator(int(o.master_seed), n_vp=o.nthreads)
 for trial_idx in range(o.ntrials):
     seed_gen.set_generators(trial_idx)  # Each trial is reproducible
     d['master_seed'] = int(o.master_seed)
+    d['n_vp'] = seed_gen.n_vp
+    d['seed_scheme'] = seed_gen.SEED_SCHEME
     d['invalidated'] = 1
 
     const_v = [0.0, -o.Ivel]
@@ -32,6 +32,7 @@ defaultParameters = {
         "Ni"                    :   34,
         "delay"                 :   0.1,          # ms
         "nthreads"              :   1,
+        "trial_procs"           :   1,
         "printTime"             :   0,            # This is boolean
 
         "ratVelFName"           : '../../../data/hafting_et_al_2005/rat_trajectory_lowpass.mat',
@@ -56,6 +57,7 @@ defaultParameters = {
         "C_Mg"                  :      .0,        # mM; def is no Vm dependence
 
         "probabilistic_synapses":     0,          # bool
+        "sparse_synapses"       :     0,          # bool
 
         "Iext_e_const"          :   300.0,        # pA
         "Iext_i_const"          :   200.0,        # pA
@@ -9,8 +9,6 @@ sim_label = "demo_output_data"
 sim = DemoSimulation('../common/simulation_test_network.py', sim_label, dp)
 
 parser = sim.parser
-parser.add_argument('--nthreads', type=int, default=1,
-                    help='Number of simulation threads.')
 parser.add_argument('--Ivel', type=float,
                     help='Velocity input (pA). Default is 50 pA.')
 o = parser.parse_args()
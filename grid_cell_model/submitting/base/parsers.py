@@ -76,6 +76,14 @@ class GenericSubmissionParser(flagparse.FlagParser):
                           help='Number of processors when running on a '
                                'workstation. This can be used to run several '
                                'simulations in parallel.')
+        self.add_argument('--nthreads', type=positive_int, default=1,
+                          help='Number of threads (NEST virtual processes) of '
+                               'each simulation. The simulations are '
+                               'reproducible for a given number of threads.')
+        self.add_argument('--trial_procs', type=positive_int, default=1,
+                          help='Number of processes that run the trials of '
+                               'each simulation in parallel. Each process '
+                               'uses --nthreads threads.')
         self.add_flag('--dry_run',
                       help='Do no run anything nor save any meta-data')
 
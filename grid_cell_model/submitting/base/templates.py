@@ -50,6 +50,7 @@ class DemoSimulation(SimulationTemplate):
         p['time']        = 10e3 if o.time is None else o.time  # ms
 
         p['nthreads']    = o.nthreads
+        p['trial_procs'] = o.trial_procs
         p['ntrials']     = o.ntrials
         p['verbosity']   = o.verbosity
 
@@ -85,6 +85,7 @@ class BasicNoiseSimulation(SimulationTemplate):
             p['time']        = 10e3 if o.time is None else o.time  # ms
 
             p['nthreads']    = 1
+            p['trial_procs'] = o.trial_procs
             p['ntrials']     = o.ntrials
             p['verbosity']   = o.verbosity
 
@@ -146,6 +147,7 @@ class ParameterSweep(SimulationTemplate):
             p['time']        = 10e3 if o.time is None else o.time  # ms
 
             p['nthreads']    = 1
+            p['trial_procs'] = o.trial_procs
             p['ntrials']     = o.ntrials
             p['verbosity']   = o.verbosity
 
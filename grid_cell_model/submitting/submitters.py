@@ -175,7 +175,7 @@ class ProgramSubmitter(object):
 
 
     def saveIterParams(self, iterParams, dimension_labels, dimensions,
-                       fileName='iterparams.h5', dry_run=False):
+                       fileName='iterparams.h5', dry_run=False, layout=None):
         '''
         Save iterated parameters.
 
@@ -197,6 +197,9 @@ class ProgramSubmitter(object):
             package.
         dry_run : bool
             If ``True`` perform only the dry run.
+        layout : SweepLayout, or None
+            Layout of the jobs of an irregular (refined) 2D parameter sweep.
+            ``dimensions`` must then be the shape of the layout's lattice.
         '''
         if ((dimension_labels is not None and dimensions is not None) and
             len(dimension_labels) != len(dimensions)):
@@ -215,6 +218,8 @@ class ProgramSubmitter(object):
                 o['dimension_labels'] = list(dimension_labels)
             if dimensions is not None:
                 o['dimensions'] = list(dimensions)
+            if layout is not None:
+                o['layout'] = layout.to_dict()
             o.close()
 
     def _saveAllOptions(self):
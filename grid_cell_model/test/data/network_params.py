@@ -2,7 +2,7 @@
 
 import numpy as np
 
-__all__ = ['defaultParameters']
+__all__ = ['defaultParameters', 'Params']
 
 _defaultOutputDir = "output/"
 
@@ -13,24 +13,33 @@ defaultParameters = {
         "Ni"                    :   34,
         "delay"                 :   0.1,          # ms
         "nthreads"              :   1,
+        "trial_procs"           :   1,
         "printTime"             :   0,            # This is boolean
 
         "ratVelFName"           : '../../data/hafting_et_al_2005/rat_trajectory_lowpass.mat',
 
         "gridSep"               :   60.,          # cm
 
+        "EI_flat"               :   0,            # bool
+        "IE_flat"               :   0,            # bool
+        "use_EE"                :   0,            # bool
+        "pEE_sigma"             :   .05,
         "pAMPA_mu"              :   y_dim/2.0,
         "pAMPA_sigma"           :   0.5/6,
         "pGABA_mu"              :   y_dim/2.0,
         "pGABA_sigma"           :   0.5/6,
         "AMPA_gaussian"         :   0,            # bool
         "prefDirC_e"            :   4.0,
+        "prefDirC_ee"           :   0.0,
         "prefDirC_i"            :   0.0,
         "arenaSize"             :   180.0,        # cm
 
         "NMDA_amount"           :   2.0,          # %
         "C_Mg"                  :      .0,        # mM; def is no Vm dependence
 
+        "probabilistic_synapses":     0,          # bool
+        "sparse_synapses"       :     0,          # bool
+
         "Iext_e_const"          :   300.0,        # pA
         "Iext_i_const"          :   200.0,        # pA
         "Iext_e_theta"          :   375.0,        # pA
@@ -78,6 +87,13 @@ defaultParameters = {
         "g_uni_GABA_frac"       :   0.013,        # fraction of g_GABA_total
         "uni_GABA_density"      :   0.4,
 
+        "g_EI_uni_density"      :     .1,         # Probability
+        "g_IE_uni_density"      :     .1,         # Probability
+
+        "use_II"                :   0,            # bool
+        "g_II_total"            :   50.,          # nS
+        "g_II_uni_density"      :   .1,           # Probability
+
         "E_AMPA"                :   0.,           # mV
         "E_GABA_A"              :   -75.,         # mV
 
@@ -89,6 +105,13 @@ defaultParameters = {
         "pc_start_max_rate"     :   100.0,        # Hz
         "pc_start_conn_weight"  :   5.0,          # nS
 
+        "ipc_ON"                :   0,            # bool
+        "ipc_N"                 :   30,           # sqrt(total IPC number)
+        "ipc_nconn"             :   10,
+        "ipc_field_std"         :   20.0,         # cm
+        "ipc_max_rate"          :   50.0,         # Hz
+        "ipc_weight"            :   0.5,          # nS
+
         "noise_sigma"           :   150.0,        # pA
         "gammaNSample"          :   25,           # No. of neurons
 
@@ -102,3 +125,8 @@ defaultParameters = {
 }
 
 
+class Params(object):
+    '''Dictionary that has fields as natural naming.'''
+    def __init__(self, params):
+        self._params = params
+        self.__dict__ = params
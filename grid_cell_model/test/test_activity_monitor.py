@@ -0,0 +1,125 @@
+'''Tests of the online activity monitor.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.activity_monitor import ActivityMonitor
+from grid_cell_model.data_storage.sim_models.ei import (MAX_RATE_E, SILENT,
+                                                        getSimulationTime,
+                                                        terminationCode)
+
+THETA_T = 125.  # ms
+N_E = 10
+
+
+def theta_spikes(cycle, rate, t_start=0.):
+    '''Spikes of ``N_E`` neurons, all firing at ``rate`` (Hz) during the
+    first 10 ms of a theta cycle.'''
+    start = t_start + cycle * THETA_T
+    nspikes = int(rate * N_E * 10e-3)
+    return start + np.linspace(0., 10., nspikes, endpoint=False)
+
+
+def run_cycles(monitor, rates, t_start=0.):
+    '''Process the theta cycles one by one; return the number of processed
+    cycles.'''
+    for cycle, rate in enumerate(rates):
+        t = t_start + (cycle + 1) * THETA_T
+        if monitor.process(theta_spikes(cycle, rate, t_start), [], t, N_E):
+            return cycle + 1
+    return len(rates)
+
+
+def test_no_criteria():
+    monitor = ActivityMonitor(THETA_T)
+    assert run_cycles(monitor, [1000.] * 5 + [0.] * 5) == 10
+    assert monitor.termination is None
+
+
+def test_max_rate_e():
+    monitor = ActivityMonitor(THETA_T, max_rate_e=500., max_rate_cycles=3)
+    assert run_cycles(monitor, [100., 1000., 1000., 100., 1000., 1000., 1000.,
+                                100.]) == 7
+    assert monitor.termination['reason'] == MAX_RATE_E
+    assert monitor.termination['t'] == 7 * THETA_T
+
+
+def test_max_rate_e_normal_activity():
+    monitor = ActivityMonitor(THETA_T, max_rate_e=500., max_rate_cycles=3)
+    assert run_cycles(monitor, [100., 400., 1000., 1000., 200.] * 2) == 10
+    assert monitor.termination is None
+
+
+def test_max_rate_e_t_start():
+    '''Cycles before t_start are not evaluated.'''
+    monitor = ActivityMonitor(THETA_T, t_start=THETA_T, max_rate_e=500.,
+                              max_rate_cycles=1)
+    assert not monitor.process(theta_spikes(0, 1000.), [], THETA_T, N_E)
+    assert monitor.process(theta_spikes(1, 1000.), [], 2 * THETA_T, N_E)
+
+
+def test_max_rate_e_chunks():
+    '''Theta cycles split between several calls.'''
+    monitor = ActivityMonitor(THETA_T, max_rate_e=500., max_rate_cycles=2)
+    spikes = np.concatenate((theta_spikes(0, 1000.), theta_spikes(1, 1000.)))
+    assert not monitor.process(spikes[spikes < 50.], [], 50., N_E)
+    assert not monitor.process(spikes[(spikes >= 50.) & (spikes < 200.)], [],
+                               200., N_E)
+    assert monitor.process(spikes[spikes >= 200.], [], 250., N_E)
+
+
+def test_silence():
+    monitor = ActivityMonitor(THETA_T, silence=2 * THETA_T)
+    assert run_cycles(monitor, [100., 100., 0., 0., 0., 100.]) == 4
+    assert monitor.termination['reason'] == SILENT
+    assert monitor.termination['t'] == 4 * THETA_T
+
+
+def test_silence_i_spikes():
+    '''Spikes of the I population count as activity.'''
+    monitor = ActivityMonitor(THETA_T, silence=2 * THETA_T)
+    for cycle in range(5):
+        assert not monitor.process([], [cycle * THETA_T + 1.],
+                                   (cycle + 1) * THETA_T, N_E)
+
+
+def test_reset():
+    monitor = ActivityMonitor(THETA_T, silence=THETA_T)
+    assert monitor.process([], [], THETA_T, N_E)
+    assert monitor.process([], [], 2 * THETA_T, N_E)
+    monitor.reset()
+    assert monitor.termination is None
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        ActivityMonitor(0.)
+    with pytest.raises(ValueError):
+        ActivityMonitor(THETA_T, max_rate_cycles=0)
+
+
+class Options(object):
+    theta_freq = 8.
+    theta_start_t = 500.
+    monitor_max_rate_e = None
+    monitor_max_rate_cycles = 3
+    monitor_silence = None
+
+
+def test_from_options():
+    o = Options()
+    assert ActivityMonitor.from_options(o) is None
+    o.monitor_silence = 500.
+    monitor = ActivityMonitor.from_options(o)
+    assert monitor.interval == THETA_T
+
+
+def test_termination_data():
+    data = {'options': {'time': 1e3}}
+    assert getSimulationTime(data) == 1e3
+    assert terminationCode(data) == 0
+
+    data['termination'] = {'reason': SILENT, 't': 250., 'description': ''}
+    assert getSimulationTime(data) == 250.
+    assert terminationCode(data) == 2
@@ -0,0 +1,100 @@
+'''Tests of the online bump tracking.'''
+from __future__ import absolute_import, print_function, division
+
+import pickle
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from grid_cell_model.analysis.bump_tracking import (OnlineBumpTracker,
+                                                    wrapTwistedTorus,
+                                                    twistedTorusDisplacement,
+                                                    trackBump)
+
+SHEET = (34, 30)
+SIGMA = 3.
+
+
+def bump_center(t):
+    '''Position of the bump at time t (ms); it crosses the Y border.'''
+    return 5 + t * .01, 26 + t * .004
+
+
+def moving_bump_spikes(T=1500., seed=0):
+    '''Poisson spikes of a Gaussian bump moving on the twisted torus.'''
+    rng = np.random.RandomState(seed)
+    X, Y = np.meshgrid(np.arange(SHEET[0]), np.arange(SHEET[1]))
+    X, Y = X.ravel(), Y.ravel()
+    senders, times = [], []
+    for t in np.arange(0, T):
+        dx, dy = twistedTorusDisplacement(*(bump_center(t) + (X, Y, SHEET)))
+        rate = 2 + 80 * np.exp(-(dx ** 2 + dy ** 2) / 2. / SIGMA ** 2)
+        n = np.nonzero(rng.rand(len(X)) < rate * 1e-3)[0]
+        senders.append(n)
+        times.append(t + np.sort(rng.rand(len(n))))
+    return np.concatenate(senders), np.concatenate(times)
+
+
+@pytest.fixture(scope='module')
+def spikes():
+    return moving_bump_spikes()
+
+
+def test_twisted_torus():
+    x, y = wrapTwistedTorus(np.array([1., 1., 40.]), np.array([31., -1., 2.]),
+                            SHEET)
+    assert_allclose(x, [18., 18., 6.])
+    assert_allclose(y, [1., 29., 2.])
+    # Across the Y border, the neighbours are shifted by Nx / 2
+    dx, dy = twistedTorusDisplacement(1., 29.5, np.array([18., 1.]),
+                                      np.array([0., 0.]), SHEET)
+    assert_allclose(dx, [0., -17.])
+    assert_allclose(dy, [.5, .5])
+
+
+@pytest.mark.parametrize('method', ['gaussian', 'mean'])
+def test_tracking(spikes, method):
+    senders, times = spikes
+    track = trackBump(senders, times, SHEET, 0., 1500., 25., 50.,
+                      method=method)
+    assert_allclose(track['times'], np.arange(25., 1501., 25.))
+
+    # Estimates lag behind the bump by about tau
+    true_x, true_y = bump_center(track['times'] - 50.)
+    dx, dy = twistedTorusDisplacement(0., 0., track['mu_x'] - true_x,
+                                      track['mu_y'] - true_y, SHEET)
+    err = np.hypot(dx, dy)[4:]
+    assert np.median(err) < 1.
+    assert np.mean(err < 2.) > .9
+    assert np.median(track['sigma'][4:]) == pytest.approx(SIGMA, rel=.25)
+    assert np.median(track['A'][4:]) == pytest.approx(80, rel=.25)
+
+    # Chunks do not change the estimates
+    chunked = trackBump(senders, times, SHEET, 0., 1500., 25., 50.,
+                        method=method, chunk=333.)
+    assert_allclose(chunked['mu_x'], track['mu_x'])
+
+
+def test_resume(spikes):
+    '''A pickled tracker continues as if it had not been interrupted.'''
+    senders, times = spikes
+    split = np.searchsorted(times, 700.)
+    whole = OnlineBumpTracker(SHEET, 25., 50., method='mean')
+    expected = whole.update(senders, times, tEnd=1000.)
+
+    tracker = OnlineBumpTracker(SHEET, 25., 50., method='mean')
+    first = tracker.update(senders[:split], times[:split], tEnd=690.)
+    assert len(first) == 27
+    tracker = pickle.loads(pickle.dumps(tracker))
+    rest = tracker.update(senders[split:], times[split:], tEnd=1000.)
+    assert first + rest == expected
+    assert tracker.t == 1000.
+    assert tracker.rate.shape == (SHEET[1], SHEET[0])
+
+    with pytest.raises(ValueError):
+        tracker.update([0], [900.])
+    with pytest.raises(ValueError):
+        tracker.update([SHEET[0] * SHEET[1]], [1001.])
+    with pytest.raises(ValueError):
+        OnlineBumpTracker(SHEET, 25., 50., method='unknown')
@@ -0,0 +1,90 @@
+'''Integration tests of resuming simulations from checkpoints.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.gc_net_nest import BasicGridCellNetwork
+from grid_cell_model.models.seeds import TrialSeedGenerator
+from grid_cell_model.models.checkpoint import (TrialCheckpointer,
+                                               find_checkpoint)
+from simtools.storage import DataStorage
+
+from data.network_params import defaultParameters, Params
+
+
+SEGMENT = 100.              # ms
+CHECKPOINT_INTERVAL = 200.  # ms
+
+
+def run_trial(o, stream, stop_time, checkpoint=None):
+    '''Simulate one trial up to ``stop_time`` and stream the data into
+    ``stream``. If ``checkpoint`` is given, resume from it.
+    '''
+    seed_gen = TrialSeedGenerator(o.master_seed)
+    seed_gen.set_generators(0)
+    ei_net = BasicGridCellNetwork(
+        o, simulationOpts=None, nrec_spikes=(None, 10),
+        stateRecParams=({'start': o.time - o.stateMonDur},
+                        {'start': o.time - o.stateMonDur}))
+    ei_net.setVelocityCurrentInput_e()
+    ei_net.setPlaceCells()
+
+    if checkpoint is not None:
+        ei_net.restoreCheckpoint(checkpoint, stream)
+    ei_net.simulate(stop_time, printTime=False, segment=SEGMENT,
+                    stream=stream,
+                    checkpoint=TrialCheckpointer(seed_gen, 0,
+                                                 CHECKPOINT_INTERVAL))
+    ei_net.endSimulation()
+    if stop_time == o.time:
+        ei_net.saveStreamedData(stream)
+
+
+@pytest.fixture(scope='function')
+def fix_params():
+    p = defaultParameters.copy()
+    p['noise_sigma']      = 150.0  # pA
+    p['time']             = 1e3    # ms
+    p['nthreads']         = 1
+    p['velON']            = 1
+    p['constantPosition'] = 0
+    p['master_seed']      = 123456
+    p['_einet_optdict'] = p.copy()
+    return Params(p)
+
+
+def test_resume_is_identical(fix_params, tmpdir):
+    '''A resumed simulation must produce the same data as an uninterrupted
+    one.'''
+    o = fix_params
+
+    ref = DataStorage.open(str(tmpdir.join('reference.h5')), 'w')
+    ref['trials'] = [{}]
+    run_trial(o, ref['trials'][0], o.time)
+
+    # Interrupt between two checkpoints, then resume
+    res = DataStorage.open(str(tmpdir.join('resumed.h5')), 'w')
+    res['trials'] = [{}]
+    run_trial(o, res['trials'][0], 700.)
+    checkpoint = find_checkpoint(res['trials'][0])
+    assert checkpoint is not None
+    assert checkpoint['t'] == 600.
+    run_trial(o, res['trials'][0], o.time, checkpoint)
+
+    for label in ('spikeMon_e', 'spikeMon_i'):
+        ref_ev = ref['trials'][0][label]['events']
+        res_ev = res['trials'][0][label]['events']
+        assert len(ref_ev['times']) > 0
+        assert np.all(ref_ev['times'] == res_ev['times'])
+        assert np.all(ref_ev['senders'] == res_ev['senders'])
+    for label in ('stateMon_e', 'stateMon_i'):
+        for ref_mon, res_mon in zip(ref['trials'][0][label],
+                                    res['trials'][0][label]):
+            assert np.all(ref_mon['events']['V_m'] ==
+                          res_mon['events']['V_m'])
+            assert np.all(ref_mon['events']['times'] ==
+                          res_mon['events']['times'])
+
+    ref.close()
+    res.close()
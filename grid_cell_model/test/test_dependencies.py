@@ -0,0 +1,158 @@
+'''Tests of the dependency tracking of the visitors.'''
+from __future__ import absolute_import, print_function, division
+
+import json
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.synthetic import writeSweep
+from grid_cell_model.parameters import JobTrialSpace2D
+from grid_cell_model.parameters.data_sets import DictDataSet
+from grid_cell_model.visitors.interface import DictDSVisitor
+from grid_cell_model.visitors.dependencies import (AnalysisPlanner,
+                                                   visitor_fingerprint,
+                                                   plan_space)
+
+
+class ScaleVisitor(DictDSVisitor):
+    '''Scales the input and counts the runs.'''
+    def __init__(self, inputKey, outputName, scale=1., forceUpdate=False):
+        self.inputKey = inputKey
+        self.outputName = outputName
+        self.scale = scale
+        self.forceUpdate = forceUpdate
+        self.runs = 0
+
+    fingerprintExclude = ('forceUpdate', 'readme', 'runs')
+
+    def getInputKeys(self):
+        return [self.inputKey]
+
+    def getOutputKeys(self):
+        return [('analysis', self.outputName)]
+
+    def visitDictDataSet(self, ds, **kw):
+        data = ds.data
+        if 'analysis' not in data.keys():
+            data['analysis'] = {}
+        if self.outputName in data['analysis'].keys() and not self.forceUpdate:
+            return
+        value = data
+        for key in self.inputKey:
+            value = value[key]
+        data['analysis'][self.outputName] = np.asarray(value) * self.scale
+        self.runs += 1
+
+
+class CountingVisitor(DictDSVisitor):
+    '''A visitor without declared outputs.'''
+    def __init__(self):
+        self.visits = 0
+
+    def visitDictDataSet(self, ds, **kw):
+        self.visits += 1
+
+
+def make_visitors(scale=1.):
+    up = ScaleVisitor(('raw',), 'up', scale=scale)
+    down = ScaleVisitor(('analysis', 'up'), 'down', scale=10.)
+    other = ScaleVisitor(('raw',), 'other', scale=3.)
+    return up, down, other
+
+
+def run(visitors, data):
+    planner = AnalysisPlanner(visitors)
+    DictDataSet(data).visit(planner, r=0, c=0, trialNum=0)
+    return dict(planner.plans[0].stale)
+
+
+def test_fingerprint():
+    up, down, _ = make_visitors()
+    assert visitor_fingerprint(up) == visitor_fingerprint(make_visitors()[0])
+    assert visitor_fingerprint(up) != visitor_fingerprint(down)
+    up.forceUpdate = True
+    up.runs = 5
+    up.readme = 'Scaled input'
+    assert visitor_fingerprint(up) == visitor_fingerprint(make_visitors()[0])
+    assert visitor_fingerprint(up) != visitor_fingerprint(
+        make_visitors(2.)[0])
+
+
+def test_incremental():
+    data = {'raw': np.arange(3.)}
+    up, down, other = make_visitors()
+    counter = CountingVisitor()
+
+    # Downstream visitor first: the planner orders them
+    stale = run([down, counter, up, other], data)
+    assert sorted(stale.keys()) == ['ScaleVisitor:analysis.down',
+                                    'ScaleVisitor:analysis.other',
+                                    'ScaleVisitor:analysis.up']
+    assert counter.visits == 1
+    assert np.all(data['analysis']['down'] == 10 * data['raw'])
+    records = data['analysis']['provenance']
+    rec = json.loads(records['ScaleVisitor:analysis.down'])
+    assert rec['inputs'][0][0] == ['analysis', 'up']
+    assert rec['outputs'] == [['analysis', 'down']]
+
+    # Nothing changed
+    assert run([up, down, other, counter], data) == {}
+    assert (up.runs, down.runs, other.runs) == (1, 1, 1)
+    assert counter.visits == 2
+
+    # Changed parameters of the upstream visitor
+    up2, down2, other2 = make_visitors(scale=2.)
+    stale = run([up2, down2, other2], data)
+    assert stale['ScaleVisitor:analysis.up'] == ('parameters or code version '
+                                                 'changed')
+    assert stale['ScaleVisitor:analysis.down'].startswith('upstream')
+    assert len(stale) == 2
+    assert other2.runs == 0
+    assert np.all(data['analysis']['down'] == 20 * data['raw'])
+
+    # A new version of the downstream code
+    up3, down3, other3 = make_visitors(scale=2.)
+    down3.VERSION = 2
+    assert list(run([up3, down3, other3], data).keys()) == [
+        'ScaleVisitor:analysis.down']
+
+    # Outputs removed
+    del data['analysis']['other']
+    assert list(run([up3, down3, other3], data).keys()) == [
+        'ScaleVisitor:analysis.other']
+
+
+def test_upstream_rerun_separately():
+    '''A downstream visitor notices that its inputs have been recomputed by
+    another planner.'''
+    data = {'raw': np.arange(3.)}
+    run(make_visitors()[:2], data)
+    run([make_visitors(scale=5.)[0]], data)
+    stale = run(make_visitors(scale=5.)[:2], data)
+    assert stale == {'ScaleVisitor:analysis.down': 'inputs changed'}
+
+
+def test_errors():
+    up, down, _ = make_visitors()
+    with pytest.raises(ValueError):
+        AnalysisPlanner([up, ScaleVisitor(('x',), 'up')])
+    cyclic = ScaleVisitor(('analysis', 'down'), 'up')
+    with pytest.raises(ValueError):
+        AnalysisPlanner([cyclic, down])
+
+
+def test_plan_space(tmpdir):
+    writeSweep(str(tmpdir), (1, 2), trials=2, Ne=10, Ni=10, time=500.)
+    sp = JobTrialSpace2D((1, 2), str(tmpdir))
+    times = ('spikeMon_e', 'events', 'times')
+    visitor = ScaleVisitor(times, 'times')
+    sp.visit(AnalysisPlanner([visitor]), trialList=[0])
+    assert visitor.runs == 2
+
+    sp = JobTrialSpace2D((1, 2), str(tmpdir), fileMode='r')
+    plans = plan_space(sp, [ScaleVisitor(times, 'times')])
+    assert [(p.r, p.c, p.trial) for p in plans] == [(0, 0, 1), (0, 1, 1)]
+    assert plans[0].stale == [('ScaleVisitor:analysis.times',
+                               'no provenance record')]
+    assert plan_space(sp, [ScaleVisitor(times, 'times')], trialList=[0]) == []
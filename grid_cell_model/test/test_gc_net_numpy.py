@@ -0,0 +1,94 @@
+'''Tests of the NumPy implementation of the grid cell network.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+from scipy import sparse
+
+from grid_cell_model.models.gc_net import ConstPosInputs
+from grid_cell_model.models.gc_net_numpy import (BasicNumpyGridCellNetwork,
+                                                 sumRows)
+
+from data.network_params import defaultParameters, Params
+
+
+@pytest.fixture(scope='function')
+def fix_params():
+    p = defaultParameters.copy()
+    p['Ne']            = 12
+    p['Ni']            = 12
+    p['N_place_cells'] = 10
+    p['theta_start_t'] = 100.   # ms
+    p['time']          = 300.   # ms
+    p['_einet_optdict'] = p.copy()
+    return Params(p)
+
+
+def run_network(o, seed, method='exp_euler'):
+    np.random.seed(seed)
+    ei_net = BasicNumpyGridCellNetwork(o, nrec_spikes=(None, 10),
+                                       method=method)
+    ei_net.setConstantVelocityCurrent_e([0., 0.])
+    ei_net.setPlaceCells(posIn=ConstPosInputs(0, 0))
+    ei_net.simulate(o.time, printTime=False)
+    ei_net.endSimulation()
+    return ei_net, ei_net.getAllData()
+
+
+def test_sum_rows():
+    M = sparse.random(20, 15, density=.3, format='csr', random_state=1)
+    rows = np.array([3, 0, 3, 19])
+    assert np.allclose(sumRows(M, rows), M.toarray()[rows].sum(axis=0))
+    assert np.allclose(sumRows(M, rows, np.array([1, 2, 3, 4])),
+                       np.dot([1, 2, 3, 4], M.toarray()[rows]))
+    assert np.all(sumRows(M, np.array([], dtype=int)) == 0)
+
+
+@pytest.mark.parametrize('method', ['exp_euler', 'euler'])
+def test_output_layout(fix_params, method):
+    '''The output has the same layout as that of the NEST network.'''
+    o = fix_params
+    ei_net, d = run_network(o, 1234, method)
+
+    assert 'options' in d and 'net_attr' in d
+    assert 'termination' not in d
+    for label, N in (('spikeMon_e', ei_net.net_Ne), ('spikeMon_i', 10)):
+        events = d[label]['events']
+        assert len(events['times']) > 0
+        assert np.all(events['senders'] >= 0)
+        assert np.all(events['senders'] < N)
+        assert np.all(np.diff(events['times']) >= 0)
+        assert np.all((events['times'] > 0) & (events['times'] <= o.time))
+
+    for label in ('stateMon_e', 'stateMon_i'):
+        assert len(d[label]) == 2
+        for mon in d[label]:
+            events = mon['events']
+            assert mon['interval'] == 10 * o.sim_dt
+            assert len(events['times']) == int(o.time / mon['interval'])
+            for var in ('V_m', 'I_clamp_AMPA', 'I_clamp_NMDA',
+                        'I_clamp_GABA_A', 'I_stim'):
+                assert len(events[var]) == len(events['times'])
+                assert np.all(np.isfinite(events[var]))
+
+
+def test_reproducible(fix_params):
+    _, d1 = run_network(fix_params, 1234)
+    _, d2 = run_network(fix_params, 1234)
+    for label in ('spikeMon_e', 'spikeMon_i'):
+        for key in ('times', 'senders'):
+            assert np.all(d1[label]['events'][key] ==
+                          d2[label]['events'][key])
+
+
+def test_conn_matrix(fix_params):
+    np.random.seed(1234)
+    ei_net = BasicNumpyGridCellNetwork(fix_params)
+    W_e = ei_net.getConnMatrixSparse('E')
+    W_i = ei_net.getConnMatrixSparse('I')
+    assert W_e.shape == (ei_net.net_Ni, ei_net.net_Ne)
+    assert W_i.shape == (ei_net.net_Ne, ei_net.net_Ni)
+    assert W_e.nnz > 0 and W_i.nnz > 0
+    assert np.all(ei_net.getConnMatrix('E') == W_e.toarray())
+    with pytest.raises(ValueError):
+        ei_net.getConnMatrixSparse('X')
@@ -0,0 +1,54 @@
+'''Tests of the batched rate model of the grid cell network.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.gc_net_rate import RateGridCellNetwork
+
+from data.network_params import defaultParameters, Params
+
+
+@pytest.fixture(scope='module')
+def rate_net():
+    p = defaultParameters.copy()
+    p['Ne'] = 12
+    p['Ni'] = 12
+    np.random.seed(1234)
+    return RateGridCellNetwork(Params(p))
+
+
+def test_weights_scaled(rate_net):
+    assert rate_net.W_EI.shape == (rate_net.net_Ne, rate_net.net_Ni)
+    assert rate_net.W_IE.shape == (rate_net.net_Ni, rate_net.net_Ne)
+    # Unit total conductance
+    assert np.all(rate_net.W_EI >= 0)
+    assert np.max(rate_net.W_EI) <= 1. / rate_net.net_Ne
+
+
+def test_output_shape(rate_net):
+    gE = np.linspace(0, 3000, 3)
+    gI = np.linspace(0, 3000, 4)
+    out = rate_net.simulate(gE[:, np.newaxis], gI[np.newaxis, :], 150.,
+                            time=200., winLen=100., batchSize=5)
+    for name in ('bump', 'bump_sigma', 'peak_rate_e', 'rate_e', 'rate_i',
+                 'osc_freq', 'osc_amplitude'):
+        assert out[name].shape == (3, 4)
+    assert out['bump'].dtype == bool
+    assert np.all(np.isnan(out['bump_sigma'][~out['bump']]))
+    assert np.all(out['rate_e'] >= 0) and np.all(out['rate_i'] >= 0)
+
+
+def test_reproducible(rate_net):
+    np.random.seed(1)
+    out1 = rate_net.simulate([0., 1000.], 1000., 150., time=100., winLen=50.)
+    np.random.seed(1)
+    out2 = rate_net.simulate([0., 1000.], 1000., 150., time=100., winLen=50.)
+    for name in out1:
+        np.testing.assert_array_equal(out1[name], out2[name])
+
+
+def test_uncoupled_no_bump(rate_net):
+    '''Without any coupling all E neurons receive the same input.'''
+    out = rate_net.simulate(0., 0., 0., time=600., winLen=200.)
+    assert not out['bump']
@@ -0,0 +1,70 @@
+'''Tests of the process-wide cache of network inputs.'''
+from __future__ import absolute_import, print_function, division
+
+import os
+
+import pytest
+import numpy as np
+from scipy.io import savemat
+
+from grid_cell_model.models import input_cache
+from grid_cell_model.models.place_input import PlaceCellInput
+
+
+@pytest.fixture(scope='function')
+def trajectory(tmpdir):
+    input_cache.clear_cache()
+    input_cache.set_cache_dir(None)
+    path = str(tmpdir.join('trajectory.mat'))
+    savemat(path, {'dt': 0.02, 'pos_x': np.arange(10.), 'pos_y': -np.arange(10.)})
+    yield path
+    input_cache.clear_cache()
+    input_cache.set_cache_dir(None)
+
+
+def test_trajectory_cached(trajectory):
+    d1 = input_cache.load_rat_trajectory(trajectory)
+    d2 = input_cache.load_rat_trajectory(trajectory)
+    assert d1['pos_x'] is d2['pos_x']
+    assert np.all(d1['pos_x'].ravel() == np.arange(10.))
+    assert d1['dt'][0][0] == 0.02
+    with pytest.raises(ValueError):
+        d1['pos_x'][0, 0] = 1.
+
+    # Modified file is reloaded
+    savemat(trajectory, {'dt': 0.02, 'pos_x': np.arange(11.),
+                         'pos_y': -np.arange(11.)})
+    os.utime(trajectory, (0, 0))
+    d3 = input_cache.load_rat_trajectory(trajectory)
+    assert d3['pos_x'].size == 11
+
+
+def test_trajectory_on_disk(trajectory, tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    input_cache.set_cache_dir(cache_dir)
+    d1 = input_cache.load_rat_trajectory(trajectory)
+    assert len(os.listdir(cache_dir)) == 3
+
+    # A new process would read the .npy files
+    input_cache.clear_cache()
+    d2 = input_cache.load_rat_trajectory(trajectory)
+    assert isinstance(d2['pos_y'], np.memmap)
+    assert np.all(d1['pos_y'] == d2['pos_y'])
+
+
+def test_place_cell_input(trajectory, tmpdir):
+    args = (34, 30, 180., 60., 5.)
+    pc1 = input_cache.get_place_cell_input(*args)
+    pc2 = input_cache.get_place_cell_input(*args)
+    assert pc1 is pc2
+    ref = PlaceCellInput(34, 30, 180., 60., [.0, .0], fieldSigma=5.)
+    assert np.all(pc1.arena == ref.arena)
+    assert np.all(pc1.getSheetInput(10., 20.) == ref.getSheetInput(10., 20.))
+
+    input_cache.set_cache_dir(str(tmpdir.join('cache')))
+    input_cache.clear_cache()
+    input_cache.get_place_cell_input(*args)
+    input_cache.clear_cache()
+    pc3 = input_cache.get_place_cell_input(*args)
+    assert isinstance(pc3.arena, np.memmap)
+    assert np.all(pc3.arena == ref.arena)
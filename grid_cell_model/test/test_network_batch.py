@@ -0,0 +1,92 @@
+'''Tests of the batches of networks simulated in one NEST kernel.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from grid_cell_model.models.gc_net_nest import (ConstantVelocityNetwork,
+                                                NetworkBatch)
+from grid_cell_model.models.seeds import TrialSeedGenerator
+
+from data.network_params import defaultParameters, Params
+
+
+@pytest.fixture(scope='function')
+def fix_params():
+    p = defaultParameters.copy()
+    p['noise_sigma'] = 150.0  # pA
+    p['time']        = 600.   # ms
+    p['nthreads']    = 1
+    p['master_seed'] = 123456
+    p['_einet_optdict'] = p.copy()
+    return Params(p)
+
+
+def make_batch(o, velocities):
+    seed_gen = TrialSeedGenerator(o.master_seed)
+    seed_gen.set_generators(0)
+    batch = NetworkBatch(o)
+    for vel in velocities:
+        seed_gen.set_numpy_generator(0)
+        batch.add(ConstantVelocityNetwork, o, simulationOpts=None, vel=vel)
+    return batch
+
+
+def test_batch_data(fix_params):
+    velocities = [[0., 0.], [0., -10.], [0., -20.]]
+    batch = make_batch(fix_params, velocities)
+    assert len(batch) == 3
+    batch.simulate(fix_params.time, printTime=False)
+
+    for net, vel in zip(batch, velocities):
+        data = net.getMinimalSaveData(ispikes=True)
+        for mon, pop in [('spikeMon_e', net.E_pop), ('spikeMon_i',
+                                                      net.I_pop)]:
+            events = data[mon]['events']
+            assert len(events['senders']) > 0
+            assert np.all(events['senders'] >= 0)
+            assert np.all(events['senders'] < len(pop))
+
+        # Saved velocity inputs are the same as in a separate simulation
+        assert net.velC == 1.
+        assert_allclose(np.diff(net.rat_pos_y), vel[1] * net.rat_dt * 1e-3)
+
+
+def test_batch_connectivity(fix_params):
+    '''Networks in a batch are the same as the separate networks.'''
+    batch = make_batch(fix_params, [[0., 0.], [0., -10.]])
+    conn = [net.getConnMatrixSparse('E').toarray() for net in batch]
+    assert_array_equal(conn[0], conn[1])
+
+    seed_gen = TrialSeedGenerator(fix_params.master_seed)
+    seed_gen.set_generators(0)
+    single = ConstantVelocityNetwork(fix_params, simulationOpts=None,
+                                     vel=[0., -10.])
+    assert_array_equal(single.getConnMatrixSparse('E').toarray(), conn[1])
+
+
+def test_velocity_direction(fix_params):
+    batch = NetworkBatch(fix_params)
+    direction, velC = batch.shareVelocityDirection([0., 0.])
+    assert velC == 0.
+    direction, velC = batch.shareVelocityDirection([0., -10.])
+    assert_allclose(direction, [0., -1.])
+    assert velC == 10.
+    direction, velC = batch.shareVelocityDirection([0., 5.])
+    assert velC == -5.
+    with pytest.raises(ValueError):
+        batch.shareVelocityDirection([1., -10.])
+    with pytest.raises(ValueError):
+        batch.shareTrajectory([0., 1.], [0., 1.], 20.)
+
+
+def test_simulate_member(fix_params):
+    '''Members of a batch cannot be simulated on their own.'''
+    batch = make_batch(fix_params, [[0., -10.]])
+    with pytest.raises(RuntimeError):
+        batch[0].simulate(fix_params.time, printTime=False)
+    batch.simulate(fix_params.time, printTime=False)
+    with pytest.raises(RuntimeError):
+        batch.add(ConstantVelocityNetwork, fix_params, simulationOpts=None,
+                  vel=[0., -20.])
@@ -0,0 +1,140 @@
+'''Tests of the out-of-core aggregation of parameter sweeps.'''
+from __future__ import absolute_import, print_function, division
+
+import os
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from grid_cell_model.models.synthetic import writeSweep
+from grid_cell_model.parameters import JobTrialSpace2D
+from grid_cell_model.parameters.out_of_core import OutOfCoreArray
+
+N = 10 * 10
+SENDERS = ['spikeMon_e', 'events', 'senders']
+
+
+def spike_counts(senders):
+    '''Spike counts of all the E neurons.'''
+    return np.bincount(np.asarray(senders, dtype=int), minlength=N)
+
+
+@pytest.fixture(scope='module')
+def sweep_dir(tmpdir_factory):
+    rootDir = str(tmpdir_factory.mktemp('sweep'))
+    writeSweep(rootDir, (2, 3), trials=2, Ne=10, Ni=10, time=500.)
+    # Job with missing data
+    os.remove(os.path.join(rootDir, 'job00004_output.h5'))
+    return rootDir
+
+
+@pytest.fixture
+def space(sweep_dir):
+    return JobTrialSpace2D((2, 3), sweep_dir, fileMode='r')
+
+
+@pytest.mark.parametrize('fileFormat', ['hdf5', 'npy'])
+def test_aggregate(tmpdir, space, fileFormat):
+    fileName = str(tmpdir.join('counts'))
+    expected = space.aggregateData(SENDERS, [0, 1], funReduce=spike_counts,
+                                   output_dtype='list', loadData=False)
+    counts = space.aggregateDataOutOfCore(SENDERS, [1, 0],
+                                          funReduce=spike_counts,
+                                          fileName=fileName,
+                                          fileFormat=fileFormat)
+    assert isinstance(counts, OutOfCoreArray)
+    assert counts.shape == (2, 3, 2, N)
+    assert counts.dtype == np.float64
+    for r in range(2):
+        for c in range(3):
+            if (r, c) == (1, 1):
+                assert np.all(np.isnan(counts[r, c]))
+            else:
+                # Trials are stored in the order of the list
+                assert_array_equal(counts[r, c, 0], expected[r][c][1])
+                assert_array_equal(counts[r, c, 1], expected[r][c][0])
+    assert_array_equal(counts[:, :, 0, 5], np.asarray(counts)[:, :, 0, 5])
+    counts.close()
+
+
+def test_cache(tmpdir, space):
+    fileName = str(tmpdir.join('counts.h5'))
+    with space.aggregateDataOutOfCore(SENDERS, [0], funReduce=spike_counts,
+                                      fileName=fileName,
+                                      dtype=np.float32) as counts:
+        assert counts.metadata['trials'] == [0]
+        first = counts[...]
+    mtime = int(os.path.getmtime(fileName)) - 10
+
+    os.utime(fileName, (mtime, mtime))
+    with space.aggregateDataOutOfCore(SENDERS, [0], funReduce=spike_counts,
+                                      fileName=fileName,
+                                      dtype=np.float32) as counts:
+        assert_array_equal(counts[...], first)
+    assert int(os.path.getmtime(fileName)) == mtime
+
+    # A different data type invalidates the file
+    with space.aggregateDataOutOfCore(SENDERS, [0], funReduce=spike_counts,
+                                      fileName=fileName) as counts:
+        assert counts.dtype == np.float64
+        assert counts.metadata['dtype'] == np.dtype(np.float64).str
+
+    # Different trials invalidate the file
+    with space.aggregateDataOutOfCore(SENDERS, [0, 1], funReduce=spike_counts,
+                                      fileName=fileName) as counts:
+        assert counts.shape == (2, 3, 2, N)
+
+
+def test_cache_key(tmpdir, space):
+    fileName = str(tmpdir.join('lambda.h5'))
+    # Lambdas have the same name, they are never loaded from the file
+    with space.aggregateDataOutOfCore(SENDERS, [0], fileName=fileName,
+                                      funReduce=lambda s: len(s)) as counts:
+        assert counts.metadata['funReduce'] is None
+        lengths = counts[...]
+    with space.aggregateDataOutOfCore(SENDERS, [0], fileName=fileName,
+                                      funReduce=lambda s: 2 * len(s)) as c:
+        assert_array_equal(c[...], 2 * lengths)
+
+    # Unless the key is given explicitly
+    with space.aggregateDataOutOfCore(SENDERS, [0], fileName=fileName,
+                                      funReduce=lambda s: len(s),
+                                      cacheKey='length') as counts:
+        assert counts.metadata['funReduce'] == 'length'
+    with space.aggregateDataOutOfCore(SENDERS, [0], fileName=fileName,
+                                      funReduce=lambda s: 2 * len(s),
+                                      cacheKey='length') as counts:
+        assert_array_equal(counts[...], lengths)
+
+    # A reduction of a different shape under the same key
+    def padded_counts(senders):
+        return np.bincount(np.asarray(senders, dtype=int), minlength=2 * N)
+    fileName = str(tmpdir.join('counts.h5'))
+    space.aggregateDataOutOfCore(SENDERS, [0], funReduce=spike_counts,
+                                 fileName=fileName, cacheKey='counts').close()
+    with space.aggregateDataOutOfCore(SENDERS, [0], funReduce=padded_counts,
+                                      fileName=fileName,
+                                      cacheKey='counts') as counts:
+        assert counts.shape == (2, 3, 1, 2 * N)
+        assert counts.metadata['itemShape'] == [2 * N]
+
+
+def test_all_at_once_and_errors(tmpdir, space):
+    trials = space.aggregateDataOutOfCore(['trials'], 'all-at-once',
+                                          funReduce=len, fileFormat='npy')
+    assert trials.file_name == os.path.join(space.rootDir, 'reductions_ooc',
+                                            'trials.npy')
+    assert_array_equal(trials[...], [[2, 2, 2], [2, np.nan, 2]])
+    trials.close()
+
+    def varying(senders):
+        return np.zeros(len(senders))
+    with pytest.raises(ValueError):
+        space.aggregateDataOutOfCore(SENDERS, [0], funReduce=varying,
+                                     fileName=str(tmpdir.join('v.h5')))
+    assert not os.path.exists(str(tmpdir.join('v.h5.json')))
+    with pytest.raises(ValueError):
+        space.aggregateDataOutOfCore(SENDERS, [0], funReduce=spike_counts,
+                                     fileName=str(tmpdir.join('i.h5')),
+                                     dtype=np.int32)
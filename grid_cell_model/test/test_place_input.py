@@ -0,0 +1,31 @@
+'''Tests of the place cell input template.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.place_input import PlaceCellInput
+from grid_cell_model.models.place_cells import UniformBoxPlaceCells
+
+
+@pytest.fixture(scope='module')
+def pc_input():
+    return PlaceCellInput(34, 30, 180., 60., [.0, .0], fieldSigma=60./12.)
+
+
+def test_sheet_inputs(pc_input):
+    '''Vectorised windows are the same as the ones extracted one by one.'''
+    helper = UniformBoxPlaceCells([180., 180.], (10, 10), 1., 5.,
+                                  random=False)
+    ctr_x, ctr_y = helper.centers[:, 0], helper.centers[:, 1]
+
+    windows = pc_input.getSheetInputs(ctr_x, ctr_y)
+    assert windows.shape == (len(ctr_x), 30, 34)
+    for n in range(len(ctr_x)):
+        assert np.all(windows[n] == pc_input.getSheetInput(ctr_x[n],
+                                                           ctr_y[n]))
+
+
+def test_sheet_inputs_outside(pc_input):
+    with pytest.raises(ValueError):
+        pc_input.getSheetInputs([1e4], [0.])
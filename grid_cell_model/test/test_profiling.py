@@ -0,0 +1,88 @@
+'''Tests of the profiling of the visitors.'''
+from __future__ import absolute_import, print_function, division
+
+import json
+
+import pytest
+import numpy as np
+
+from grid_cell_model.parameters.data_sets import DictDataSet
+from grid_cell_model.visitors.interface import DictDSVisitor
+from grid_cell_model.visitors.profiling import (ProfileLog, ProfilingVisitor,
+                                                read_profile_logs,
+                                                summarise_profile)
+
+
+class AllocatingVisitor(DictDSVisitor):
+    '''Allocates memory and stores the sum of the data.'''
+    def __init__(self):
+        self.visited = 0
+
+    def visitDictDataSet(self, ds, **kw):
+        if ds.data is None:
+            raise ValueError('No data')
+        data = np.ones(ds.data['size'])
+        ds.data['sum'] = float(np.sum(data))
+        self.visited += 1
+
+
+@pytest.fixture
+def log_dir(tmpdir):
+    return tmpdir.mkdir('profile')
+
+
+def test_profiling_visitor(log_dir):
+    fname = str(log_dir.join('job.jsonl'))
+    visitor = AllocatingVisitor()
+    with ProfileLog(fname, job={'row': 1}) as log:
+        prof = ProfilingVisitor(visitor, log)
+        assert prof.visited == 0
+        for trial in range(3):
+            data = {'size': 10**5}
+            DictDataSet(data).visit(prof, fileName='job.h5', trialNum=trial,
+                                    r=1, c=2)
+            assert data['sum'] == 10**5
+        with pytest.raises(ValueError):
+            DictDataSet(None).visit(prof, trialNum=3)
+    assert visitor.visited == 3
+
+    with open(fname) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 4
+    for trial, rec in enumerate(records):
+        assert rec['visitor'] == 'AllocatingVisitor'
+        assert rec['row'] == 1
+        assert rec['trial'] == trial
+        assert rec['wall_time'] >= 0
+        assert rec['cpu_time'] >= 0
+        assert rec['hdf5_bytes'] == 0
+    assert records[0]['file'] == 'job.h5'
+    assert (records[0]['r'], records[0]['c']) == (1, 2)
+    assert not records[0]['failed']
+    assert records[3]['failed']
+
+
+def test_summary(log_dir):
+    for job in range(2):
+        with ProfileLog(str(log_dir.join('job{0}.jsonl'.format(job)))) as log:
+            for trial in range(3):
+                log.record(visitor='Fast', wall_time=.1, cpu_time=.1,
+                           peak_rss_delta=0, hdf5_bytes=10, failed=False)
+                log.record(visitor='Slow', wall_time=1., cpu_time=.5,
+                           peak_rss_delta=100 * trial, hdf5_bytes=1,
+                           failed=trial == 2)
+    # Incomplete record of a killed job
+    with open(str(log_dir.join('job1.jsonl')), 'a') as f:
+        f.write('{"visitor": "Slow", "wall')
+
+    # The sweep directory contains the profile directory
+    records = read_profile_logs(str(log_dir.dirpath()))
+    assert len(records) == 12
+    slow, fast = summarise_profile(records)
+    assert slow.visitor == 'Slow'
+    assert slow.items == 6
+    assert slow.failed == 2
+    assert slow.wall_time == pytest.approx(6.)
+    assert slow.max_peak_rss_delta == 200
+    assert fast.visitor == 'Fast'
+    assert fast.hdf5_bytes == 60
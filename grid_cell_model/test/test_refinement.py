@@ -0,0 +1,121 @@
+'''Tests of the adaptive refinement of parameter sweeps.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from grid_cell_model.parameters import JobTrialSpace2D
+from grid_cell_model.parameters.refinement import SweepLayout
+from simtools.storage import DataStorage
+
+
+def step_layout():
+    '''A 3x3 sweep refined once along a step between the first two rows.'''
+    layout = SweepLayout.uniform([0., 1., 2.], [10., 20., 30.])
+    values = np.array([[0., 0., 0.],
+                       [1., 1., 1.],
+                       [1., 1., 1.]])
+    return layout, layout.refine(values, .5)
+
+
+def test_uniform():
+    layout = SweepLayout.uniform([0., 1., 2.], [10., 20.])
+    assert layout.shape == (3, 2)
+    assert layout.njobs == 6
+    assert len(layout.cells) == 2
+    assert layout.job_number(1, 1) == 3
+    rows, cols = layout.job_parameters()
+    assert_array_equal(rows, [0., 0., 1., 1., 2., 2.])
+    assert_array_equal(cols, [10., 20., 10., 20., 10., 20.])
+
+
+def test_refine():
+    layout, (refined, parents) = step_layout()
+    assert refined.shape == (5, 5)
+    assert_array_equal(refined.row_range, [0., .5, 1., 1.5, 2.])
+
+    # Old jobs keep their numbers
+    for job, (r, c) in enumerate(layout.positions):
+        assert refined.job_number(2 * r, 2 * c) == job
+
+    # Both cells of the first row split: 9 new points
+    assert refined.njobs == 9 + 9
+    new = refined.positions[9:]
+    assert set(map(tuple, new)) == set([(0, 1), (0, 3), (1, 0), (1, 1),
+                                        (1, 2), (1, 3), (1, 4), (2, 1),
+                                        (2, 3)])
+    assert len(refined.cells) == 4 * 2 + 2
+    assert np.count_nonzero(refined.simulated[2, :]) == 5
+    assert np.count_nonzero(refined.simulated[3, :]) == 0
+
+    # Interpolation parents
+    for (r, c), par in zip(new, parents):
+        pos = refined.positions[par]
+        assert_array_equal(np.mean(pos, axis=0), [r, c])
+
+
+def test_refine_nothing():
+    layout = SweepLayout.uniform([0., 1.], [0., 1.])
+    refined, parents = layout.refine(np.array([[0., np.nan], [np.nan, 5.]]),
+                                     10.)
+    assert parents == []
+    assert refined.njobs == 4
+    assert_array_equal(refined.cells, [[0, 0, 2]])
+
+    # Cells with less than two valid corners are never refined
+    refined, parents = layout.refine(np.array([[0., np.nan], [np.nan,
+                                                              np.nan]]), 0.)
+    assert parents == []
+
+
+def test_fill():
+    _, (refined, _) = step_layout()
+    data = refined.to_lattice(np.arange(refined.njobs))
+    filled = refined.fill(data)
+    assert np.all(np.isfinite(filled))
+    assert_array_equal(filled[refined.simulated], data[refined.simulated])
+    assert filled[3, 1] == data[2, 1]
+
+
+def test_dict():
+    _, (refined, _) = step_layout()
+    copy = SweepLayout.from_dict(refined.to_dict())
+    assert_array_equal(copy.positions, refined.positions)
+    assert_array_equal(copy.cells, refined.cells)
+    assert_array_equal(copy.row_range, refined.row_range)
+
+
+@pytest.fixture
+def irregular_space(tmpdir):
+    _, (refined, _) = step_layout()
+    rows, cols = refined.job_parameters()
+    meta = DataStorage.open(str(tmpdir.join('iterparams.h5')), 'w')
+    meta['iterParams'] = {'g_AMPA_total': rows, 'g_GABA_total': cols}
+    meta['dimension_labels'] = ['g_AMPA_total', 'g_GABA_total']
+    meta['dimensions'] = list(refined.shape)
+    meta['layout'] = refined.to_dict()
+    meta.close()
+    for job in range(refined.njobs):
+        fname = str(tmpdir.join('job{0:05}_output.h5'.format(job)))
+        ds = DataStorage.open(fname, 'w')
+        ds['trials'] = [{'analysis': {'job': job}}]
+        ds.close()
+    return refined, str(tmpdir)
+
+
+def test_irregular_space(irregular_space):
+    layout, rootDir = irregular_space
+    sp = JobTrialSpace2D((3, 3), rootDir)
+    assert sp.shape == (5, 5)
+    assert sp.layout is not None
+
+    jobs = sp.aggregateData(['analysis', 'job'], [0], loadData=False)[:, :, 0]
+    assert_array_equal(np.isfinite(jobs), layout.simulated)
+    assert_array_equal(jobs[layout.simulated],
+                       layout.to_lattice(np.arange(layout.njobs))[
+                           layout.simulated])
+
+    E, I = sp.getIteratedParameters()
+    assert_array_equal(E[:, 0], layout.row_range)
+    assert_array_equal(I[0, :], layout.col_range)
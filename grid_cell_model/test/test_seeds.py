@@ -8,13 +8,7 @@ from nest.hl_api        import NESTError
 from grid_cell_model.models.gc_net_nest import BasicGridCellNetwork, ConstPosInputs
 from grid_cell_model.models.seeds import TrialSeedGenerator
 
-from data.network_params import defaultParameters
-
-class Params(object):
-    '''Dictionary that has fields as natural naming.'''
-    def __init__(self, params):
-        self._params = params
-        self.__dict__ = params
+from data.network_params import defaultParameters, Params
 
 def run_network(options):
     '''Run network with given `options` and return the dictionary that would be
@@ -22,7 +16,7 @@ def run_network(options):
     '''
     o = options
 
-    seed_gen = TrialSeedGenerator(o.master_seed)
+    seed_gen = TrialSeedGenerator(o.master_seed, n_vp=o.nthreads)
 
     stateMonParams = {
             'start' : o.time - o.stateMonDur
@@ -141,3 +135,54 @@ def test_short_animal_movement(fix_params):
     #    ],
     #}
     assert cmp_dict(data1, data2) is True
+
+
+def test_trial_seeds():
+    '''Seeds of all the generators are deterministic and distinct.'''
+    seed_gen = TrialSeedGenerator(123456)
+    assert seed_gen.get_trial_seeds(0) == (123456, [123457], 123458)
+
+    seed_gen = TrialSeedGenerator(123456, n_vp=4)
+    seeds = seed_gen.get_trial_seeds(1)
+    assert seeds == TrialSeedGenerator(123456, n_vp=4).get_trial_seeds(1)
+    assert len(seeds.rng_seeds) == 4
+    all_seeds = [seeds.grng_seed, seeds.numpy_seed] + seeds.rng_seeds
+    assert len(set(all_seeds)) == len(all_seeds)
+    assert seeds != seed_gen.get_trial_seeds(2)
+    assert seeds != TrialSeedGenerator(123456, n_vp=2).get_trial_seeds(1)
+
+
+def test_check_master_seed():
+    seed_gen = TrialSeedGenerator(123456, n_vp=2)
+    scheme = TrialSeedGenerator.SEED_SCHEME
+    seed_gen.check_master_seed(123456, 123456, old_n_vp=2, old_scheme=scheme)
+    with pytest.raises(ValueError):
+        seed_gen.check_master_seed(123456, 123457, old_n_vp=2,
+                                   old_scheme=scheme)
+    # Data without the number of virtual processes
+    with pytest.raises(ValueError):
+        seed_gen.check_master_seed(123456, 123456, old_scheme=scheme)
+    # Data simulated with an older seeding scheme, or without the version
+    with pytest.raises(ValueError):
+        seed_gen.check_master_seed(123456, 123456, old_n_vp=2,
+                                   old_scheme=scheme - 1)
+    with pytest.raises(ValueError):
+        TrialSeedGenerator(123456).check_master_seed(123456, 123456)
+
+
+def test_multithreaded_reproducible(fix_params):
+    '''Simulations with several threads are reproducible.'''
+    p = fix_params.copy()
+    p['noise_sigma'] = 150.0 # pA
+    p['time']             = 500.  # ms
+    p['nthreads']         = 2
+    p['ntrials']          = 1
+    p['velON']            = 1
+    p['constantPosition'] = 0
+    p['master_seed']      = 123456
+
+    p['_einet_optdict'] = p.copy()
+
+    data1 = run_network(Params(p))
+    data2 = run_network(Params(p))
+    assert cmp_dict(data1, data2) is True
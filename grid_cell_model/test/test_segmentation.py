@@ -0,0 +1,129 @@
+'''Tests of the data-driven segmentation of parameter sweeps.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from grid_cell_model.analysis.segmentation import (segmentSweep, kMeans,
+                                                   gaussianMixture,
+                                                   smoothProbabilities,
+                                                   alignLabels)
+
+SHAPE = (31, 31)
+
+
+def regimes():
+    '''Three regimes of a sweep.'''
+    truth = np.zeros(SHAPE, dtype=int)
+    truth[:, 12:] = 1
+    truth[20:, 20:] = 2
+    return truth
+
+
+def sweep_features(truth, noise=.7, nTrials=5, seed=1):
+    '''Features of the regimes with trial-to-trial noise.'''
+    rng = np.random.RandomState(seed)
+    means = np.array([[0., 1., 5.], [1., 0., 5.], [2., 1., 0.]])
+    return [means[truth, f][..., np.newaxis] +
+            noise * rng.randn(*(SHAPE + (nTrials,)))
+            for f in range(means.shape[1])]
+
+
+def blobs(seed=0):
+    rng = np.random.RandomState(seed)
+    centers = np.array([[0., 0.], [5., 0.], [0., 5.]])
+    truth = np.repeat(np.arange(3), 50)
+    return centers[truth] + .5 * rng.randn(len(truth), 2), truth
+
+
+def test_kmeans_and_mixture():
+    data, truth = blobs()
+    labels, centers, inertia = kMeans(data, 3, rng=0)
+    assert np.all(alignLabels(labels, truth, 3)[labels] == truth)
+    assert inertia < .5 * len(data)
+
+    resp, weights, means, covs, logLik = gaussianMixture(data, 3, rng=0)
+    labels = np.argmax(resp, axis=1)
+    permutation = alignLabels(labels, truth, 3)
+    assert np.all(permutation[labels] == truth)
+    assert_allclose(np.sort(weights), [1. / 3] * 3, atol=1e-6)
+    order = np.argsort(permutation)
+    assert_allclose(means[order], [[0., 0.], [5., 0.], [0., 5.]], atol=.2)
+    assert_allclose(covs[:, 0, 0], .25, rtol=.5)
+
+    with pytest.raises(ValueError):
+        kMeans(data[:2], 3)
+
+
+def test_smoothing():
+    prob = np.zeros((5, 5, 2))
+    prob[..., 0] = .9
+    prob[2, 2, 0] = .3
+    prob[0, 0] = np.nan
+    prob[..., 1] = 1 - prob[..., 0]
+    smoothed = smoothProbabilities(prob, strength=2.)
+    assert np.argmax(smoothed[2, 2]) == 0
+    assert np.all(np.isnan(smoothed[0, 0]))
+    assert_allclose(np.nansum(smoothed, axis=2)[1:, 1:], 1.)
+    assert_allclose(smoothProbabilities(prob, strength=0)[1:, 1:],
+                    prob[1:, 1:])
+
+
+@pytest.mark.parametrize('method', ['kmeans', 'gmm'])
+def test_segment_sweep(method):
+    truth = regimes()
+    features = sweep_features(truth)
+    features[0][3, 3, :] = np.nan
+    features[1][4, 4, 0] = np.nan
+    seg = segmentSweep(features, 3, method=method, nBootstrap=10, seed=0)
+
+    assert seg.labels.shape == SHAPE
+    assert seg.labels.mask[3, 3] and not seg.labels.mask[4, 4]
+    # Ordered by the first feature
+    assert np.mean(seg.labels == truth) > .99
+    assert_allclose(seg.centers, [[0., 1., 5.], [1., 0., 5.], [2., 1., 0.]],
+                    atol=.1)
+    assert np.ma.mean(seg.stability) > .95
+    assert seg.stability.min() >= 0 and seg.stability.max() <= 1
+
+    # Sequence of clusters, as in ClusteredData
+    assert len(seg) == 3
+    assert sum(len(c) for c in seg) == truth.size - 1
+    assert np.all(seg.assignClusters().reshape(SHAPE) == seg.labels)
+
+
+def test_smoothing_and_stability():
+    truth = regimes()
+    features = sweep_features(truth, noise=1.2)
+    rough = segmentSweep(features, 3, nBootstrap=10, smoothing=0., seed=0)
+    smooth = segmentSweep(features, 3, nBootstrap=10, smoothing=2., seed=0)
+    assert np.mean(smooth.labels == truth) > np.mean(rough.labels == truth)
+    assert np.ma.mean(smooth.stability) > np.ma.mean(rough.stability)
+
+
+def test_unstable_point():
+    '''A point whose trials fall into two regimes is not stable.'''
+    truth = regimes()
+    features = sweep_features(truth, noise=.2, nTrials=6)
+    other = sweep_features(np.full(SHAPE, 2), noise=.2, nTrials=6)
+    for f, o in zip(features, other):
+        f[5, 5, :3] = o[5, 5, :3]
+    seg = segmentSweep(features, 3, nBootstrap=40, smoothing=0., seed=0)
+    assert seg.stability[5, 5] < .8
+    assert np.ma.median(seg.stability) == 1.
+
+
+def test_features_without_trials():
+    truth = regimes()
+    features = [f.mean(axis=2) for f in sweep_features(truth)]
+    features[0] = np.ma.MaskedArray(features[0])
+    features[0][0, 0] = np.ma.masked
+    seg = segmentSweep(features, 3, method='kmeans', nBootstrap=3, seed=0)
+    assert seg.labels.mask[0, 0]
+    assert np.all(seg.labels[1:] == truth[1:])
+
+    with pytest.raises(ValueError):
+        segmentSweep(features, 3, method='unknown')
+    with pytest.raises(ValueError):
+        segmentSweep(features + [np.zeros((3, 3))], 3)
@@ -0,0 +1,83 @@
+'''Tests of the compact state monitor layout.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from grid_cell_model.data_storage.sim_models import ei
+
+
+def make_monitors(n_neurons=3, n_samples=100, dt=0.1):
+    '''Status dictionaries of NEST multimeters, one per neuron.'''
+    t = np.arange(n_samples) * dt
+    mons = []
+    for n_idx in range(n_neurons):
+        mons.append({
+            'interval': dt,
+            'events': {
+                'times'         : t.copy(),
+                'senders'       : np.repeat(10 + n_idx, n_samples),
+                'V_m'           : np.sin(t) + n_idx,
+                'I_clamp_AMPA'  : np.cos(t) * n_idx,
+                'I_clamp_NMDA'  : np.ones(n_samples),
+                'I_clamp_GABA_A': -t,
+            }
+        })
+    return mons
+
+
+class TestCompactStateMon(object):
+    def test_same_signals(self):
+        mons = make_monitors()
+        compact = ei.compactStateMonData(mons)
+        assert ei.isCompactStateMon(compact)
+        assert not ei.isCompactStateMon(mons)
+        assert compact['vars']['V_m'].shape == (3, 100)
+
+        for n_idx in range(len(mons)):
+            for var in ('times', 'V_m', 'I_clamp_GABA_A'):
+                orig, dt_orig = ei.extractStateVariable(mons, n_idx, var)
+                sig, dt = ei.extractStateVariable(compact, n_idx, var)
+                assert dt == dt_orig
+                assert np.allclose(sig, orig)
+
+            var_list = ['I_clamp_AMPA', 'I_clamp_NMDA', 'I_clamp_GABA_A']
+            orig, _ = ei.sumAllVariables(make_monitors(), n_idx, var_list)
+            sig, _ = ei.sumAllVariables(compact, n_idx, var_list)
+            assert np.allclose(sig, orig)
+
+    def test_precomputed_sums(self):
+        compact = ei.compactStateMonData(make_monitors(), dtype=np.float32)
+        assert compact['vars']['V_m'].dtype == np.float32
+        name = ei.stateSumName(['I_clamp_AMPA', 'I_clamp_NMDA'])
+        assert name in compact['sums']
+        sig, _ = ei.sumAllVariables(compact, 1, ['I_clamp_AMPA',
+                                                 'I_clamp_NMDA'])
+        assert np.allclose(sig, compact['sums'][name][1])
+
+    def test_decimation(self):
+        mons = make_monitors()
+        compact = ei.compactStateMonData(mons, decimate=4)
+        sig, dt = ei.extractStateVariable(compact, 0, 'V_m')
+        t, _ = ei.extractStateVariable(compact, 0, 'times')
+        assert dt == pytest.approx(0.4)
+        assert np.allclose(sig, mons[0]['events']['V_m'][::4])
+        assert np.allclose(t, mons[0]['events']['times'][::4])
+
+        compact = ei.compactStateMonData(mons, decimate=4, lowpass=True)
+        sig, _ = ei.extractStateVariable(compact, 0, 'V_m')
+        t, _ = ei.extractStateVariable(compact, 0, 'times')
+        expected = mons[0]['events']['V_m'].reshape(-1, 4).mean(axis=1)
+        assert np.allclose(sig, expected)
+        assert np.allclose(t, np.arange(25) * 0.4 + 0.15)
+
+        with pytest.raises(ValueError):
+            ei.compactStateMonData(mons, decimate=0)
+
+    def test_list_interface(self):
+        mon = ei.stateMonitorList(ei.compactStateMonData(make_monitors()))
+        assert len(mon) == 3
+        assert mon[-1]['interval'] == mon[2]['interval']
+        assert np.all(mon[2]['events']['senders'] == 12)
+        with pytest.raises(IndexError):
+            mon[3]
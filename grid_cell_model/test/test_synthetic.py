@@ -0,0 +1,90 @@
+'''Tests of the synthetic simulation data.'''
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from grid_cell_model.models.synthetic import generateTrial, writeSweep
+from grid_cell_model.data_storage.sim_models.ei import (extractSpikes,
+                                                        sumAllVariables)
+from grid_cell_model.parameters import JobTrialSpace2D
+
+
+@pytest.fixture(scope='module')
+def trial():
+    return generateTrial(seed=1, Ne=20, Ni=20, time=2e3, state_nrec_f=3)
+
+
+def test_format(trial):
+    o = trial['options']
+    attr = trial['net_attr']
+    assert (attr['Ne_x'], attr['Ne_y']) == (20, 18)
+    assert attr['net_Ne'] == 20 * 18
+    assert o['time'] == 2e3
+
+    for pop, N in (('e', attr['net_Ne']), ('i', attr['net_Ni'])):
+        senders, times = extractSpikes(trial['spikeMon_' + pop])
+        assert len(times) > 0
+        assert np.all(np.diff(times) >= 0)
+        assert np.all((times >= 0) & (times <= o['time']))
+        assert np.all((senders >= 0) & (senders < N))
+
+    # Movement of the animal starts at theta_start_t
+    nPos = int((o['time'] - o['theta_start_t']) / attr['rat_dt']) + 1
+    assert len(attr['rat_pos_x']) == nPos
+    radius = np.hypot(attr['rat_pos_x'], attr['rat_pos_y'])
+    assert np.all(radius <= o['arenaSize'] / 2.)
+
+    assert len(trial['stateMon_e']) == 2
+    assert len(trial['stateMonF_e']) == 3
+    sig, dt = sumAllVariables(trial['stateMonF_e'], 0, ['I_clamp_GABA_A'])
+    assert dt == o['state_interval']
+    assert len(sig) == int(o['time'] / dt)
+
+
+def test_rates(trial):
+    '''Mean firing rates are in the range of the parameters, the bump makes
+    the E activity sparse.'''
+    o = trial['options']
+    senders, _ = extractSpikes(trial['spikeMon_e'])
+    rates = np.bincount(senders, minlength=trial['net_attr']['net_Ne'])
+    rates = rates / (o['time'] * 1e-3)
+    assert o['rate_e_min'] < np.mean(rates) < o['rate_e_max']
+    assert np.max(rates) > 4 * np.median(rates)
+
+
+def test_reproducible(trial):
+    other = generateTrial(seed=1, Ne=20, Ni=20, time=2e3, state_nrec_f=3)
+    assert_array_equal(trial['spikeMon_e']['events']['times'],
+                       other['spikeMon_e']['events']['times'])
+    other = generateTrial(seed=2, Ne=20, Ni=20, time=2e3)
+    assert 'stateMonF_e' not in other
+    assert (len(other['spikeMon_e']['events']['times']) !=
+            len(trial['spikeMon_e']['events']['times']))
+
+    with pytest.raises(TypeError):
+        generateTrial(seed=1, unknown_parameter=1)
+    with pytest.raises(ValueError):
+        generateTrial(seed=1, time=100., theta_start_t=500.)
+
+
+def test_compact():
+    data = generateTrial(seed=1, Ne=10, Ni=10, time=500., state_nrec_f=2,
+                         stateRecFormat={'dtype': np.float32, 'decimate': 2})
+    assert data['stateMonF_i']['vars']['I_clamp_GABA_A'].dtype == np.float32
+    sig, dt = sumAllVariables(data['stateMonF_i'], 1, ['I_clamp_GABA_A'])
+    assert dt == 2 * data['options']['state_interval']
+    assert len(sig) == int(data['options']['time'] / dt)
+
+
+def test_sweep(tmpdir):
+    writeSweep(str(tmpdir), (2, 3), trials=2, Ne=10, Ni=10, time=500.)
+    sp = JobTrialSpace2D(None, str(tmpdir), fileMode='r')
+    assert sp.shape == (2, 3)
+    counts = sp.aggregateData(['spikeMon_e', 'events', 'times'], [0, 1],
+                              funReduce=len, loadData=False)
+    assert counts.shape == (2, 3, 2)
+    assert np.all(counts > 0)
+    jobs = sp.aggregateData(['options', 'job_num'], [0], loadData=False)
+    assert_array_equal(jobs[:, :, 0], np.arange(6).reshape(2, 3))
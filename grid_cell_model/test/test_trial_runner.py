@@ -0,0 +1,81 @@
+'''Tests of the sequential and parallel trial runner.'''
+from __future__ import absolute_import, print_function, division
+
+import os
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.trial_runner import (run_trials, store_trial,
+                                                 shard_file_name)
+from simtools.storage import DataStorage
+
+
+def fake_trial(trial_idx, job, pos):
+    '''Save data derived from the trial number; stop at trial no. 3.'''
+    np.random.seed(trial_idx)
+    job['net_params'] = {'n': 10}
+    if trial_idx == 3:
+        return 1., True
+    store_trial(job, pos, {'idx': trial_idx, 'data': np.random.rand(5),
+                           'resumed': int(pos < len(job['trials']))})
+    return 1., False
+
+
+def open_job(tmpdir, name):
+    fname = str(tmpdir.join(name))
+    job = DataStorage.open(fname, 'a')
+    job['trials'] = []
+    return fname, job
+
+
+def check_trials(job, trial_list):
+    assert len(job['trials']) == len(trial_list)
+    for trial, trial_idx in zip(job['trials'], trial_list):
+        np.random.seed(trial_idx)
+        assert trial['idx'] == trial_idx
+        assert np.all(trial['data'] == np.random.rand(5))
+
+
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_run_trials(tmpdir, nproc):
+    fname, job = open_job(tmpdir, 'job{0}_output.h5'.format(nproc))
+    run_time = run_trials(job, fname, fake_trial, 0, 3, nproc=nproc)
+    assert run_time == 3.
+    assert job['invalidated'] == 1
+    assert job['net_params']['n'] == 10
+    check_trials(job, range(3))
+    assert sorted(os.listdir(str(tmpdir))) == [os.path.basename(fname)]
+    job.close()
+
+
+@pytest.mark.parametrize('nproc', [1, 3])
+def test_stop(tmpdir, nproc):
+    fname, job = open_job(tmpdir, 'job{0}_output.h5'.format(nproc))
+    run_trials(job, fname, fake_trial, 0, 5, nproc=nproc)
+    check_trials(job, range(3))
+    job.close()
+
+
+def test_resume_from_shards(tmpdir):
+    fname, job = open_job(tmpdir, 'job_output.h5')
+    run_trials(job, fname, fake_trial, 0, 1)
+
+    # Trial 1: started in the job; trial 2: complete shard; trial 3: not run
+    job['trials'].append({'idx': -1})
+    shard = DataStorage.open(shard_file_name(fname, 2), 'w')
+    shard['trials'] = [{'idx': 2, 'data': np.random.RandomState(2).rand(5),
+                        'resumed': 0}]
+    shard['complete'] = 1
+    shard.close()
+
+    run_trials(job, fname, fake_trial, 1, 3, nproc=2)
+    check_trials(job, range(3))
+    assert job['trials'][1]['resumed'] == 1
+    assert not os.path.exists(shard_file_name(fname, 2))
+    job.close()
+
+
+def test_shard_file_name():
+    assert (shard_file_name('out/job00012_output.h5', 3) ==
+            'out/job00012_output_trial003.h5')
@@ -0,0 +1,30 @@
+'''Tests of the positions and distances on the twisted torus.'''
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+
+from grid_cell_model.analysis.twisted_torus import (Position2D,
+                                                    twistedTorusDistance)
+
+
+def test_twisted_torus_distance():
+    x = np.array([0., 3., 9., 5.])
+    y = np.array([0., 0., 0., 7.])
+    d = twistedTorusDistance(0., 0., x, y, 10., 8.)
+    assert np.allclose(d, [0., 3., 1., 1.])
+    # Symmetric and broadcast
+    D = twistedTorusDistance(x[:, np.newaxis], y[:, np.newaxis],
+                             x[np.newaxis, :], y[np.newaxis, :], 10., 8.)
+    assert D.shape == (4, 4)
+    assert np.allclose(D, D.T)
+
+
+def test_images():
+    '''Neighbours across the Y border are shifted by half of the X size.'''
+    dim = Position2D(10., 8.)
+    others = Position2D(np.array([5., 0., 2.5]), np.array([7., 7., 4.]))
+    d = twistedTorusDistance(0., 0., others.x, others.y, dim.x, dim.y)
+    assert np.allclose(d, [1., np.hypot(5., 1.), np.hypot(2.5, 4.)])
+    # Positions outside of the torus are wrapped
+    assert np.allclose(twistedTorusDistance(10., 8., others.x, others.y,
+                                            dim.x, dim.y), d)
@@ -0,0 +1,69 @@
+'''Tests of the synaptic weight constructors.'''
+from __future__ import absolute_import, print_function, division
+
+from argparse import Namespace
+
+import pytest
+import numpy as np
+
+from grid_cell_model.models.gc_net import GridCellNetwork
+from grid_cell_model.models.construction.weights import (
+    IsomorphicConstructor, ProbabilisticConstructor,
+    SparseProbabilisticConstructor, sample_bernoulli_sparse)
+
+
+def test_sample_bernoulli_sparse_limits():
+    np.random.seed(1234)
+    p = np.array([0., 1., 0., 1., 1e-20, 1.])
+    for _ in range(100):
+        assert np.all(sample_bernoulli_sparse(p) == [1, 3, 5])
+    assert len(sample_bernoulli_sparse(np.zeros(10))) == 0
+
+
+def test_sample_bernoulli_sparse_frequencies():
+    np.random.seed(1234)
+    p = np.array([.9, .6, .3, .1, .03, .004, 0.])
+    trials = 20000
+    counts = np.zeros(len(p))
+    for _ in range(trials):
+        idx = sample_bernoulli_sparse(p)
+        assert np.all(np.diff(idx) > 0)
+        counts[idx] += 1
+    # Binomial standard deviation, 5 sigma
+    tolerance = 5 * np.sqrt(trials * p * (1 - p)) + 1
+    assert np.all(np.abs(counts - trials * p) < tolerance)
+
+
+@pytest.mark.parametrize('constructor', [IsomorphicConstructor(),
+                                         ProbabilisticConstructor(),
+                                         SparseProbabilisticConstructor()])
+def test_generate_connections(constructor):
+    np.random.seed(1234)
+    profile = np.exp(-np.linspace(-3, 3, 200)**2)
+    profile[:20] = 0.
+    targets, weights = constructor.generate_connections(profile, 2.5)
+    assert len(targets) == len(weights)
+    assert np.all(targets >= 0) and np.all(targets < len(profile))
+    assert np.all(np.diff(targets) > 0)
+    assert np.all(weights[profile[targets] == 0] == 0)
+    if not isinstance(constructor, IsomorphicConstructor):
+        assert np.all(weights == 2.5)
+        assert np.all(profile[targets] > 0)
+
+    np.random.seed(1234)
+    dense = constructor.generate_weights(profile, 2.5)
+    assert dense.shape == profile.shape
+    assert np.all(dense[targets] == weights)
+    assert np.count_nonzero(dense) == np.count_nonzero(weights)
+
+
+def test_select_weight_constructor():
+    select = GridCellNetwork._select_weight_constructor
+    assert isinstance(select(Namespace(probabilistic_synapses=0)),
+                      IsomorphicConstructor)
+    # Parameter files that predate sparse_synapses
+    assert type(select(Namespace(probabilistic_synapses=1))) is \
+        ProbabilisticConstructor
+    assert isinstance(select(Namespace(probabilistic_synapses=1,
+                                       sparse_synapses=1)),
+                      SparseProbabilisticConstructor)
@@ -13,6 +13,7 @@ Classes
     SpeedPlotter
     VelocityGainEstimator
     BumpPositionVisitor
+    BumpTrackingVisitor
 
 Functions
 ---------
@@ -37,6 +38,7 @@ import matplotlib.pyplot as plt
 
 from ..analysis import spikes as aspikes
 from ..analysis import image as image
+from ..analysis.bump_tracking import trackBump
 from ..data_storage.sim_models import ei as simei
 from ..otherpkg.log import getClassLogger
 from ..analysis.image import Position2D, fitGaussianBumpTT
@@ -57,6 +59,7 @@ __all__ = [
     'SpeedPlotter',
     'VelocityGainEstimator',
     'BumpPositionVisitor',
+    'BumpTrackingVisitor',
     'fitCircularSlope',
     'getLineFit',
     'fitBumpSpeed',
@@ -109,6 +112,13 @@ class BumpFittingVisitor(BumpVisitor):
         super(BumpFittingVisitor, self).__init__(forceUpdate, readme,
                 outputRoot, bumpERoot, bumpIRoot, winLen, tstart)
 
+    def getInputKeys(self):
+        return [('spikeMon_e',), ('spikeMon_i',), ('options', 'time')]
+
+    def getOutputKeys(self):
+        return [(self.outputRoot, self.bumpERoot),
+                (self.outputRoot, self.bumpIRoot)]
+
     def fitGaussianToMon(self, mon, Nx, Ny, tstart, tend):
         '''
         Fit a Gaussian function to the monitor mon, and return the results.
@@ -131,6 +141,8 @@ class BumpFittingVisitor(BumpVisitor):
             data[self.outputRoot] = {}
 
         a = data[self.outputRoot]
+        if self.isTerminated(data, a, 'bump'):
+            return
 
         # Determine tstart and tend
         # tstart == None --> second last time frame determined by winLen
@@ -598,12 +610,22 @@ class BumpPositionVisitor(BumpVisitor):
         self.rateThreshold  = rateThreshold
         self.maxRelBumpDiam = maxRelBumpDiam
 
+    def getInputKeys(self):
+        return [('spikeMon_e',), ('options', 'time'),
+                ('options', 'theta_start_t')]
+
+    def getOutputKeys(self):
+        return [(self.outputRoot, self.bumpERoot, key)
+                for key in ('positions', 'uniformML', 'isBump')]
+
 
     def visitDictDataSet(self, ds, **kw):
         data = ds.data
         data.set_item_chained((self.outputRoot, self.bumpERoot), {},
                               overwriteLast=False)
         out = data[self.outputRoot][self.bumpERoot]
+        if self.isTerminated(data, out, 'bump position'):
+            return
 
         # Resolve times
         if self.tstart is None:
@@ -665,4 +687,86 @@ class BumpPositionVisitor(BumpVisitor):
         )
 
 
+class BumpTrackingVisitor(BumpVisitor):
+    '''Tracks the bump position with an online tracker.
+
+    Unlike the :class:`BumpPositionVisitor`, the spikes are passed to the
+    :class:`~grid_cell_model.analysis.bump_tracking.OnlineBumpTracker` in
+    chunks of ``chunk`` ms and each estimate starts from the previous one,
+    which is much faster for long recordings.
+
+    The results are saved into ``<outputRoot>/<bumpERoot>/tracked``, with the
+    arrays ``times``, ``A``, ``mu_x``, ``mu_y``, ``sigma`` and ``err2Sum`` of
+    the same meaning as in the output of the :class:`BumpPositionVisitor`.
+
+    Parameters
+    ----------
+    tstart, tend : float, optional
+        Time span of the tracking (ms). Defaults are the start of the theta
+        stimulation and the end of the simulation.
+    win_dt : float
+        Time step of the estimates (ms).
+    tau : float
+        Time constant of the decay of the firing rates (ms).
+    method : str
+        ``'gaussian'`` or ``'mean'``, see
+        :class:`~grid_cell_model.analysis.bump_tracking.OnlineBumpTracker`.
+    chunk : float
+        Length of the chunks of spikes (ms).
+    '''
+    def __init__(self,
+            forceUpdate=False,
+            readme='',
+            outputRoot=defaults.analysisRoot,
+            bumpERoot='bump_e',
+            tstart=None,        # ms
+            tend=None,          # ms
+            win_dt=25.0,        # ms
+            tau=125.0,          # ms
+            method='gaussian',
+            chunk=10e3):        # ms
+        super(BumpTrackingVisitor, self).__init__(forceUpdate, readme,
+                outputRoot, bumpERoot, None, None, tstart)
+        self.tend = tend
+        self.win_dt = win_dt
+        self.tau = tau
+        self.method = method
+        self.chunk = chunk
+
+    def getInputKeys(self):
+        return [('spikeMon_e',), ('options', 'time'),
+                ('options', 'theta_start_t')]
+
+    def getOutputKeys(self):
+        return [(self.outputRoot, self.bumpERoot, 'tracked')]
 
+    def visitDictDataSet(self, ds, **kw):
+        data = ds.data
+        if self.outputRoot not in data.keys():
+            data[self.outputRoot] = {}
+        if self.bumpERoot not in data[self.outputRoot].keys():
+            data[self.outputRoot][self.bumpERoot] = {}
+        out = data[self.outputRoot][self.bumpERoot]
+        if self.isTerminated(data, out, 'bump tracking'):
+            return
+        if 'tracked' in out.keys() and not self.forceUpdate:
+            logger.info('%s: Data present. Skipping analysis.',
+                        self.__class__.__name__)
+            return
+
+        tstart = self.tstart
+        if tstart is None:
+            tstart = self.getOption(data, 'theta_start_t')
+        tend = self.tend
+        if tend is None:
+            tend = self.getSimulationTime(data)
+
+        logger.info('%s: Analysing data set.', self.__class__.__name__)
+        senders, times, sheetSize = self._getSpikeTrain(data, 'spikeMon_e',
+                ['Ne_x', 'Ne_y'])
+        order = np.argsort(times, kind='mergesort')
+        tracked = trackBump(senders[order], times[order], sheetSize, tstart,
+                            tend, self.win_dt, self.tau, method=self.method,
+                            chunk=self.chunk)
+        tracked['readme'] = self.readme
+        out['tracked'] = tracked
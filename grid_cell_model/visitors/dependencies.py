@@ -0,0 +1,379 @@
+'''Dependency tracking and incremental re-analysis of data sets.
+
+.. currentmodule:: grid_cell_model.visitors.dependencies
+
+The visitors store their results into the data sets they analyse and skip the
+analysis if the results are already present, unless ``forceUpdate`` is set.
+Results computed with different parameters or with an older version of the
+analysis code would be therefore kept silently. The :class:`AnalysisPlanner`
+stores, next to the results of each visitor, a provenance record:
+
+ * the fingerprint of the visitor: its class, :attr:`VERSION
+   <grid_cell_model.visitors.interface.DictDSVisitor.VERSION>` and parameters
+   (:meth:`getFingerprintParams
+   <grid_cell_model.visitors.interface.DictDSVisitor.getFingerprintParams>`),
+ * the state of each of its inputs (:meth:`getInputKeys
+   <grid_cell_model.visitors.interface.DictDSVisitor.getInputKeys>`); an
+   input produced by another visitor has the state of that visitor's
+   results,
+ * the outputs it produced (:meth:`getOutputKeys
+   <grid_cell_model.visitors.interface.DictDSVisitor.getOutputKeys>`).
+
+The records are stored under ``analysis/provenance`` as JSON strings. When the
+planner visits a data set again, it reruns only the visitors whose fingerprint
+or inputs changed, whose outputs have been removed, or which consume the
+outputs of a visitor that reruns. The visitors run in the order of their
+dependencies.
+
+Visitors that do not declare any outputs are not tracked; they are applied as
+usual.
+
+Example::
+
+    planner = AnalysisPlanner([ACVisitor, statsVisitor_e, gridVisitor])
+    for item in plan_space(space, planner):
+        print(item)
+    space.visit(planner)
+
+Classes
+-------
+
+.. autosummary::
+
+    AnalysisPlanner
+    PlannedTrial
+
+Functions
+---------
+
+.. autosummary::
+
+    visitor_fingerprint
+    plan_space
+'''
+from __future__ import absolute_import, print_function, division
+
+import json
+import hashlib
+import numbers
+import collections
+
+import numpy as np
+
+from ..otherpkg.log import getClassLogger
+from .interface import DictDSVisitor
+from . import defaults
+
+__all__ = ['AnalysisPlanner', 'PlannedTrial', 'visitor_fingerprint',
+           'plan_space']
+
+logger = getClassLogger('AnalysisPlanner', __name__)
+
+PROVENANCE_ROOT = 'provenance'
+'''Key of the provenance records in the analysis root of a data set.'''
+
+_PRESENT = 'present'
+_MISSING = 'missing'
+
+
+class PlannedTrial(collections.namedtuple('PlannedTrial',
+                                          ['r', 'c', 'trial', 'stale'])):
+    '''Visitors that are stale in one trial.
+
+    ``stale`` is a list of (provenance key, reason) pairs.'''
+    __slots__ = ()
+
+
+def _canonical(value):
+    '''Convert ``value`` into a JSON serialisable form.'''
+    if isinstance(value, dict):
+        return dict((str(k), _canonical(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _canonical(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if (value is None or isinstance(value, (bool, numbers.Number)) or
+            isinstance(value, (str, type(u'')))):
+        return value
+    if callable(value):
+        return '{0}.{1}'.format(getattr(value, '__module__', ''),
+                                getattr(value, '__name__', repr(value)))
+    if hasattr(value, '__dict__'):
+        return {'class': value.__class__.__name__,
+                'attributes': _canonical(vars(value))}
+    return repr(value)
+
+
+def _hash(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode('utf-8')
+                        ).hexdigest()
+
+
+def visitor_fingerprint(visitor):
+    '''Fingerprint of the class, version and parameters of a visitor.
+
+    Returns
+    -------
+    fingerprint : str
+        A hexadecimal hash.
+    '''
+    return _hash({'visitor': visitor.__class__.__name__,
+                  'version': visitor.VERSION,
+                  'params': _canonical(visitor.getFingerprintParams())})
+
+
+def _overlaps(path1, path2):
+    '''Whether one key path contains the other.'''
+    n = min(len(path1), len(path2))
+    return tuple(path1[:n]) == tuple(path2[:n])
+
+
+def _isParent(parent, path):
+    return len(parent) < len(path) and _overlaps(parent, path)
+
+
+class AnalysisPlanner(DictDSVisitor):
+    '''Applies a list of visitors, rerunning only the stale ones.
+
+    Parameters
+    ----------
+    visitors : list of DictDSVisitor
+        The visitors. They run in this order, unless a visitor consumes the
+        outputs of a visitor later in the list.
+    dryRun : bool, optional
+        If ``True``, only determine which visitors are stale; the data sets
+        are not modified.
+
+    Attributes
+    ----------
+    plans : list of PlannedTrial
+        Stale visitors in each visited trial.
+    '''
+    def __init__(self, visitors, dryRun=False):
+        self.dryRun = dryRun
+        self.plans = []
+        self._tracked = [v for v in visitors if len(v.getOutputKeys()) != 0]
+        keys = [v.getProvenanceKey() for v in self._tracked]
+        duplicates = set(k for k in keys if keys.count(k) > 1)
+        if duplicates:
+            raise ValueError('Visitors with the same provenance key: '
+                             '{0}'.format(sorted(duplicates)))
+
+        # Parameters are fixed here, visitors can change their attributes
+        # during the analysis
+        self._fingerprints = dict((v.getProvenanceKey(),
+                                   visitor_fingerprint(v))
+                                  for v in self._tracked)
+        self._upstream = self._dependencies(self._tracked)
+        self._visitors = self._order(visitors)
+
+    @property
+    def visitors(self):
+        '''The visitors, in the order in which they run.'''
+        return list(self._visitors)
+
+    @staticmethod
+    def _dependencies(visitors):
+        '''Keys of the visitors each visitor depends on.
+
+        A visitor depends on the visitors whose outputs it reads and on the
+        visitors that overwrite its outputs.
+        '''
+        upstream = {}
+        for v in visitors:
+            key = v.getProvenanceKey()
+            upstream[key] = set()
+            for other in visitors:
+                if other is v:
+                    continue
+                reads = any(_overlaps(i, o) for i in v.getInputKeys()
+                            for o in other.getOutputKeys())
+                overwrites = any(_isParent(o, mine)
+                                 for o in other.getOutputKeys()
+                                 for mine in v.getOutputKeys())
+                if reads or overwrites:
+                    upstream[key].add(other.getProvenanceKey())
+        return upstream
+
+    def _order(self, visitors):
+        '''Order the visitors so that each runs after its dependencies.'''
+        ordered = []
+        placed = set()
+        remaining = list(visitors)
+        while remaining:
+            for v in remaining:
+                if v not in self._tracked:
+                    break
+                if self._upstream[v.getProvenanceKey()] <= placed:
+                    break
+            else:
+                raise ValueError('Cyclic dependencies between the visitors: '
+                                 '{0}'.format([v.getProvenanceKey()
+                                               for v in remaining]))
+            remaining.remove(v)
+            ordered.append(v)
+            if v in self._tracked:
+                placed.add(v.getProvenanceKey())
+        return ordered
+
+    def _hasPath(self, data, path):
+        try:
+            return self.folderExists(data, path)
+        except (AttributeError, TypeError):
+            return False
+
+    def _loadRecords(self, data):
+        '''Provenance records stored in ``data``.'''
+        path = [defaults.analysisRoot, PROVENANCE_ROOT]
+        if not self._hasPath(data, path):
+            return {}
+        root = data[defaults.analysisRoot][PROVENANCE_ROOT]
+        records = {}
+        for key in root.keys():
+            value = root[key]
+            if isinstance(value, bytes) and not isinstance(value, str):
+                value = value.decode('utf-8')
+            try:
+                records[key] = json.loads(str(value))
+            except ValueError:
+                logger.warn('Corrupted provenance record: %s', key)
+        return records
+
+    def _saveRecord(self, data, key, record):
+        a = data[defaults.analysisRoot]
+        if PROVENANCE_ROOT not in a.keys():
+            a[PROVENANCE_ROOT] = {}
+        a[PROVENANCE_ROOT][key] = json.dumps(record, sort_keys=True)
+
+    def _inputState(self, data, path, producers, states):
+        '''State of an input: the states of the visitors producing it, or
+        whether it is present in the data.'''
+        keys = sorted(key for key, outputs in producers.items()
+                      if any(_overlaps(path, o) for o in outputs))
+        if len(keys) == 0:
+            return _PRESENT if self._hasPath(data, path) else _MISSING
+        return _hash([states.get(key) for key in keys])
+
+    def _staleReason(self, data, key, record, fingerprint, inputs, stale):
+        '''Why the visitor ``key`` must run, or ``None`` if it need not.'''
+        upstream = sorted(self._upstream[key] & set(stale))
+        if upstream:
+            return 'upstream {0} reruns'.format(', '.join(upstream))
+        if record is None:
+            return 'no provenance record'
+        if record.get('fingerprint') != fingerprint:
+            return 'parameters or code version changed'
+        if record.get('inputs') != inputs:
+            return 'inputs changed'
+        for path in record.get('outputs', []):
+            if not self._hasPath(data, path):
+                return 'outputs missing'
+        return None
+
+    def _run(self, visitor, ds, **kw):
+        '''Remove the outputs of ``visitor`` and recompute them.'''
+        data = ds.data
+        for path in visitor.getOutputKeys():
+            if self._hasPath(data, path):
+                parent = data
+                for name in path[:-1]:
+                    parent = parent[name]
+                del parent[path[-1]]
+        forceUpdate = getattr(visitor, 'forceUpdate', None)
+        if forceUpdate is not None:
+            visitor.forceUpdate = True
+        try:
+            visitor.visitDictDataSet(ds, **kw)
+        finally:
+            if forceUpdate is not None:
+                visitor.forceUpdate = forceUpdate
+
+    def plan(self, ds, **kw):
+        '''Determine the stale visitors in ``ds`` and, unless this is a dry
+        run, rerun them.
+
+        Returns
+        -------
+        stale : list of (str, str)
+            Provenance keys of the stale visitors and the reasons.
+        '''
+        data = ds.data
+        records = self._loadRecords(data)
+        producers = dict((key, rec.get('outputs', []))
+                         for key, rec in records.items())
+        for v in self._tracked:
+            producers[v.getProvenanceKey()] = v.getOutputKeys()
+        states = dict((key, rec.get('state')) for key, rec in records.items())
+
+        stale = collections.OrderedDict()
+        for visitor in self._visitors:
+            if visitor not in self._tracked:
+                if not self.dryRun:
+                    visitor.visitDictDataSet(ds, **kw)
+                continue
+
+            key = visitor.getProvenanceKey()
+            fingerprint = self._fingerprints[key]
+            inputs = [[list(path), self._inputState(data, path, producers,
+                                                    states)]
+                      for path in visitor.getInputKeys()]
+            reason = self._staleReason(data, key, records.get(key),
+                                       fingerprint, inputs, stale)
+            if reason is None:
+                continue
+
+            stale[key] = reason
+            state = _hash([fingerprint, inputs])
+            states[key] = state
+            if self.dryRun:
+                continue
+
+            logger.info('Running %s: %s', key, reason)
+            if not self.folderExists(data, [defaults.analysisRoot]):
+                data[defaults.analysisRoot] = {}
+            self._run(visitor, ds, **kw)
+            self._saveRecord(data, key, {
+                'visitor': visitor.__class__.__name__,
+                'version': visitor.VERSION,
+                'fingerprint': fingerprint,
+                'params': _canonical(visitor.getFingerprintParams()),
+                'inputs': inputs,
+                'outputs': [list(path) for path in visitor.getOutputKeys()
+                            if self._hasPath(data, path)],
+                'state': state,
+            })
+        return list(stale.items())
+
+    def visitDictDataSet(self, ds, **kw):
+        '''Apply the planner to one data set, see :meth:`plan`.'''
+        stale = self.plan(ds, **kw)
+        self.plans.append(PlannedTrial(kw.get('r'), kw.get('c'),
+                                       kw.get('trialNum'), stale))
+
+
+def plan_space(space, visitors, trialList=None):
+    '''Determine the stale visitors in all the trials of a parameter space,
+    without running them.
+
+    Parameters
+    ----------
+    space : JobTrialSpace2D
+        The parameter space.
+    visitors : list of DictDSVisitor, or AnalysisPlanner
+        The visitors to check.
+    trialList : list, optional
+        Trials to check, see :meth:`JobTrialSpace2D.visit
+        <grid_cell_model.parameters.param_space.JobTrialSpace2D.visit>`.
+
+    Returns
+    -------
+    plans : list of PlannedTrial
+        The trials with at least one stale visitor.
+    '''
+    if isinstance(visitors, AnalysisPlanner):
+        visitors = visitors.visitors
+    planner = AnalysisPlanner(visitors, dryRun=True)
+    space.visit(planner, trialList=trialList)
+    return [p for p in planner.plans if p.stale]
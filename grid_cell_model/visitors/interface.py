@@ -16,7 +16,9 @@ from __future__ import absolute_import, print_function
 from abc import ABCMeta, abstractmethod
 import os
 
-from ..data_storage.sim_models.ei import extractSpikes
+from ..data_storage.sim_models.ei import (extractSpikes, getTermination,
+                                          getSimulationTime)
+from ..otherpkg.log import log_info
 
 
 class Visitor(object):
@@ -62,8 +64,25 @@ class DictDSVisitor(Visitor):
 
     A visitor that takes a dictionary data set method of any kind and processes
     it. All the keys in the dictionary must be strings.
+
+    The visitors that store the results of an analysis into the data set
+    describe it for the dependency tracking in
+    :mod:`~grid_cell_model.visitors.dependencies`: the version of the code
+    (:attr:`VERSION`), the parameters (:meth:`getFingerprintParams`), the keys
+    of the data they read (:meth:`getInputKeys`) and the keys they write
+    (:meth:`getOutputKeys`).
     '''
 
+    #: Version of the analysis. Increase it whenever a change of the code
+    #: changes the results, so that the results stored by the older code are
+    #: recomputed.
+    VERSION = 1
+
+    #: Attributes of the visitor that do not change the results of the
+    #: analysis and are therefore excluded from :meth:`getFingerprintParams`.
+    #: The free-text ``readme`` only describes the output.
+    fingerprintExclude = ('forceUpdate', 'readme')
+
     @abstractmethod
     def visitDictDataSet(self, ds, **kw):
         '''
@@ -72,6 +91,42 @@ class DictDSVisitor(Visitor):
         '''
         raise NotImplementedError()
 
+    def getFingerprintParams(self):
+        '''Parameters of the analysis, as a dictionary.
+
+        By default these are all the attributes of the visitor, except the
+        ones in :attr:`fingerprintExclude`.
+        '''
+        return dict((name, value) for name, value in vars(self).items()
+                    if name not in self.fingerprintExclude)
+
+    def getInputKeys(self):
+        '''Keys of the data this visitor reads.
+
+        Returns
+        -------
+        keys : list of tuples
+            Each item is a chain of keys into the data set, e.g.
+            ``('spikeMon_e',)`` or ``('analysis', 'FR_e')``.
+        '''
+        return []
+
+    def getOutputKeys(self):
+        '''Keys of the data this visitor writes, in the same format as
+        :meth:`getInputKeys`. An empty list means the visitor does not store
+        any results.'''
+        return []
+
+    def getProvenanceKey(self):
+        '''Name under which the provenance of the results of this visitor is
+        stored. Visitors of the same class that write to different outputs
+        have different names.'''
+        outputs = self.getOutputKeys()
+        if len(outputs) == 0:
+            return self.__class__.__name__
+        return '{0}:{1}'.format(self.__class__.__name__,
+                                '.'.join(outputs[0]))
+
     def getOption(self, data, optStr):
         '''Extract an option from a data dictionary'''
         return data['options'][optStr]
@@ -80,6 +135,37 @@ class DictDSVisitor(Visitor):
         '''Extract a network parameter (p) from the data dictionary'''
         return data['net_attr'][p]
 
+    def getSimulationTime(self, data):
+        '''Return the simulated time (ms), taking into account a simulation
+        that has been terminated early.'''
+        return getSimulationTime(data)
+
+    def isTerminated(self, data, outputRoot, name):
+        '''Check whether the simulation has been terminated early.
+
+        If it has, the reason is saved into ``outputRoot`` under the key
+        ``termination``, so that the aggregated data of this trial can be
+        distinguished from missing data, and the skipped analysis is logged.
+
+        Parameters
+        ----------
+        data : dict-like
+            Data of one trial.
+        outputRoot : dict-like
+            Where the results of the analysis are stored.
+        name : str
+            Name of the analysis, for the log message.
+        '''
+        termination = getTermination(data)
+        if termination is None:
+            return False
+        log_info(self.__class__.__name__,
+                 "Simulation terminated early at {0} ms ({1}). Skipping the "
+                 "{2} analysis.".format(termination['t'],
+                                        termination['reason'], name))
+        outputRoot['termination'] = termination['reason']
+        return True
+
 
     def folderExists(self, d, nameList):
         '''
@@ -1,3 +1,7 @@
+from ...data_storage.sim_models.ei import (extractStateVariable,
+                                           sumAllVariables, stateMonitorList)
+
+
 class DetailedPlotVisitor(DictDSVisitor):
     '''
     Make a plot of E and I membrane potentials, currents and torus firing
@@ -162,7 +166,7 @@ class DetailedPlotVisitor(DictDSVisitor):
         # Plot a sample autocorrelation function
         ax_AC = subplot2grid((rows, cols), (3, 0), colspan=3)
         acVec = a['acVec']
-        acdt = data['stateMonF_e'][0]['interval']
+        acdt = stateMonitorList(data['stateMonF_e'])[0]['interval']
         acTimes = np.arange(acVec.shape[1]) * acdt
         signalPlot(acTimes, acVec[0], ax_AC, xlabel=None,
                 ylabel = 'I correlation')
@@ -173,7 +177,7 @@ class DetailedPlotVisitor(DictDSVisitor):
         # Plot all correlations
         ax_AC = subplot2grid((rows, cols), (3, 3), colspan=3)
         acVec = a['acVec']
-        acdt = data['stateMonF_e'][0]['interval']
+        acdt = stateMonitorList(data['stateMonF_e'])[0]['interval']
         acTimes = np.arange(acVec.shape[1]) * acdt
         plt.hold('on')
         for nIdx in xrange(acVec.shape[0]):
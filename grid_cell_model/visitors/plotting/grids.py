@@ -116,6 +116,24 @@ class GridPlotVisitor(DictDSVisitor):
         self.forceUpdate    = forceUpdate
         self.setSpikeType(spikeType)
 
+    # Output locations of figures do not change the results
+    fingerprintExclude = ('forceUpdate', 'readme', 'rootDir', 'outputDir')
+
+    #: Keys of the results in the ``analysis`` dictionary.
+    outputNames = ('bump_e', 'spikes_e', 'rat_pos_x', 'rat_pos_y', 'rat_dt',
+                   'rateMap_e', 'rateMap_e_X', 'rateMap_e_Y',
+                   'info_specificity', 'sparsity', 'FFTX', 'FFTY', 'FFT',
+                   'corr_X', 'corr_Y', 'corr', 'gridnessScore',
+                   'gridnessCorr', 'gridnessAngles')
+
+    def getInputKeys(self):
+        return [('spikeMon_e',), ('net_attr', 'rat_pos_x'),
+                ('net_attr', 'rat_pos_y'), ('net_attr', 'rat_dt'),
+                ('options', 'theta_start_t'), ('options', 'gridSep')]
+
+    def getOutputKeys(self):
+        return [('analysis', name) for name in self.outputNames]
+
     def _checkSpikeType(self, t):
         if (t == 'E' or t == 'I'):
             return True
@@ -177,6 +195,8 @@ class GridPlotVisitor(DictDSVisitor):
         if 'analysis' not in data.keys():
             data['analysis'] = {}
         outputRoot = data['analysis']
+        if self.isTerminated(data, outputRoot, 'grid field'):
+            return
 
         simT = self.getOption(data, 'time') # ms
         jobNum = self.getOption(data, 'job_num')
@@ -387,6 +407,13 @@ class IGridPlotVisitor(GridPlotVisitor):
                                                minGridnessT, plotOptions,
                                                forceUpdate)
 
+    def getInputKeys(self):
+        inputs = super(IGridPlotVisitor, self).getInputKeys()
+        return [('spikeMon_i',)] + inputs[1:]
+
+    def getOutputKeys(self):
+        return [('analysis', 'i_fields')]
+
     def visitDictDataSet(self, ds, **kw):
         data = ds.data
 
@@ -396,6 +423,8 @@ class IGridPlotVisitor(GridPlotVisitor):
         if 'i_fields' not in data['analysis'].keys():
             data['analysis']['i_fields'] = {}
         outputRoot = data['analysis']['i_fields']
+        if self.isTerminated(data, outputRoot, 'I grid field'):
+            return
 
         simT = self.getOption(data, 'time') # ms
         jobNum = self.getOption(data, 'job_num')
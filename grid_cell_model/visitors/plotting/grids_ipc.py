@@ -180,6 +180,8 @@ class GridPlotVisitor(DictDSVisitor):
 
         if 'analysis' not in data.keys():
             data['analysis'] = {}
+        if self.isTerminated(data, data['analysis'], 'grid field'):
+            return
 
         data['analysis']['neurons'] = []
 
@@ -409,6 +411,9 @@ class IGridPlotVisitor(GridPlotVisitor):
 
         if 'i_fields' not in data['analysis'].keys():
             data['analysis']['i_fields'] = {}
+        if self.isTerminated(data, data['analysis']['i_fields'],
+                             'I grid field'):
+            return
 
         data['analysis']['i_fields']['neurons'] = []
 
@@ -0,0 +1,259 @@
+'''Profiling of the visitors applied to parameter sweeps.
+
+.. currentmodule:: grid_cell_model.visitors.profiling
+
+A :class:`ProfilingVisitor` wraps any dictionary data set visitor and records,
+for each data set (trial) it visits:
+
+ * the wall clock time and the CPU time (user + system) of the visit,
+ * the increase of the peak resident set size (RSS) of the process, i.e. how
+   much the visit has raised the memory high-water mark,
+ * the amount of data loaded from the HDF5 files (see
+   :func:`simtools.storage.hdf5_storage.bytes_read`).
+
+The records are appended to a :class:`ProfileLog`, a text file with one JSON
+object per line, so that the logs of the analysis jobs of a sweep can be
+summarised together (``sweepls profile-summary``). Profiling is opt-in, see the
+``profile`` parameter of
+:meth:`~grid_cell_model.parameters.param_space.JobTrialSpace2D.visit`.
+
+Classes
+-------
+
+.. autosummary::
+
+    ProfileLog
+    ProfilingVisitor
+
+Functions
+---------
+
+.. autosummary::
+
+    read_profile_logs
+    summarise_profile
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import sys
+import json
+import glob
+import time
+import errno
+import socket
+import collections
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from simtools.storage.hdf5_storage import bytes_read
+
+from .interface import DictDSVisitor
+
+__all__ = ['ProfileLog', 'ProfilingVisitor', 'read_profile_logs',
+           'summarise_profile']
+
+PROFILE_DIR = 'profile'
+'''Subdirectory of a sweep with the profile logs of its analysis jobs.'''
+
+
+def _peak_rss():
+    '''Peak resident set size of this process (bytes), or ``None`` if it is
+    not available.'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+def _cpu_time():
+    '''User and system CPU time of this process (s).'''
+    times = os.times()
+    return times[0] + times[1]
+
+
+class ProfileLog(object):
+    '''A structured log of the profiling records.
+
+    Each record is a JSON object on a separate line. The file is opened in the
+    append mode, so several analysis runs can share one log.
+
+    Parameters
+    ----------
+    fileName : str
+        Path to the log file. The directory is created if it does not exist.
+    job : dict, optional
+        Fields added to every record, e.g. the position of the analysis job in
+        the sweep.
+    '''
+    def __init__(self, fileName, job=None):
+        dirName = os.path.dirname(fileName)
+        if dirName:
+            try:
+                os.makedirs(dirName)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        self._fileName = fileName
+        self._job = dict(job or {})
+        self._job.setdefault('host', socket.gethostname())
+        self._job.setdefault('pid', os.getpid())
+        self._f = open(fileName, 'a')
+
+    @property
+    def file_name(self):
+        '''Path to the log file.'''
+        return self._fileName
+
+    def record(self, **fields):
+        '''Write one record. ``fields`` must be serialisable to JSON.'''
+        rec = dict(self._job)
+        rec.update(fields)
+        self._f.write(json.dumps(rec, sort_keys=True) + '\n')
+        self._f.flush()
+
+    def close(self):
+        '''Close the log file.'''
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class ProfilingVisitor(DictDSVisitor):
+    '''Measure the resources used by a visitor.
+
+    All the attributes not defined here are taken from the wrapped visitor,
+    so the profiling visitor can be used in its place.
+
+    Parameters
+    ----------
+    visitor : DictDSVisitor
+        The visitor to profile.
+    log : ProfileLog
+        Where to write the records.
+    '''
+    def __init__(self, visitor, log):
+        self._visitor = visitor
+        self._log = log
+
+    @property
+    def visitor(self):
+        '''The profiled visitor.'''
+        return self._visitor
+
+    def __getattr__(self, name):
+        if name == '_visitor':
+            raise AttributeError(name)
+        return getattr(self._visitor, name)
+
+    def visitDictDataSet(self, ds, **kw):
+        wall = time.time()
+        cpu = _cpu_time()
+        peak = _peak_rss()
+        nbytes = bytes_read()
+        failed = True
+        try:
+            self._visitor.visitDictDataSet(ds, **kw)
+            failed = False
+        finally:
+            end_peak = _peak_rss()
+            self._log.record(
+                visitor=self._visitor.__class__.__name__,
+                file=kw.get('fileName', None),
+                trial=kw.get('trialNum', None),
+                r=kw.get('r', None),
+                c=kw.get('c', None),
+                wall_time=time.time() - wall,
+                cpu_time=_cpu_time() - cpu,
+                peak_rss_delta=(None if peak is None else end_peak - peak),
+                peak_rss=end_peak,
+                hdf5_bytes=bytes_read() - nbytes,
+                failed=failed)
+
+
+def read_profile_logs(path):
+    '''Read the profiling records.
+
+    Parameters
+    ----------
+    path : str
+        A log file, a directory with the log files (``*.jsonl``) or the root
+        directory of a sweep, whose logs are in the :data:`PROFILE_DIR`
+        subdirectory.
+
+    Returns
+    -------
+    records : list of dict
+        All the records. Lines that cannot be parsed, e.g. an incomplete last
+        line of a job that has been killed, are skipped.
+    '''
+    if os.path.isdir(path):
+        subdir = os.path.join(path, PROFILE_DIR)
+        if os.path.isdir(subdir):
+            path = subdir
+        fileNames = sorted(glob.glob(os.path.join(path, '*.jsonl')))
+    else:
+        fileNames = [path]
+
+    records = []
+    for fileName in fileNames:
+        with open(fileName) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+VisitorSummary = collections.namedtuple(
+    'VisitorSummary', ['visitor', 'items', 'failed', 'wall_time', 'cpu_time',
+                       'max_wall_time', 'max_peak_rss_delta', 'peak_rss',
+                       'hdf5_bytes'])
+
+
+def summarise_profile(records):
+    '''Summarise the profiling records of each visitor.
+
+    Returns
+    -------
+    summary : list of VisitorSummary
+        Total and maximal values for each visitor, sorted by the total wall
+        clock time, the largest first.
+    '''
+    groups = collections.OrderedDict()
+    for rec in records:
+        groups.setdefault(rec['visitor'], []).append(rec)
+
+    def total(recs, key):
+        return sum(rec.get(key) or 0 for rec in recs)
+
+    def maximum(recs, key):
+        values = [rec.get(key) for rec in recs if rec.get(key) is not None]
+        return max(values) if values else None
+
+    summary = []
+    for visitor, recs in groups.items():
+        summary.append(VisitorSummary(
+            visitor=visitor,
+            items=len(recs),
+            failed=sum(1 for rec in recs if rec.get('failed')),
+            wall_time=total(recs, 'wall_time'),
+            cpu_time=total(recs, 'cpu_time'),
+            max_wall_time=maximum(recs, 'wall_time'),
+            max_peak_rss_delta=maximum(recs, 'peak_rss_delta'),
+            peak_rss=maximum(recs, 'peak_rss'),
+            hdf5_bytes=total(recs, 'hdf5_bytes')))
+    summary.sort(key=lambda s: s.wall_time, reverse=True)
+    return summary
@@ -120,6 +120,15 @@ class AutoCorrelationVisitor(DictDSVisitor):
         self.bandEnd     = bandEnd
         self.forceUpdate = forceUpdate
 
+    # maxLag is determined from the data
+    fingerprintExclude = ('forceUpdate', 'readme', 'maxLag')
+
+    def getInputKeys(self):
+        return [(self.monName,), ('options', 'theta_freq')]
+
+    def getOutputKeys(self):
+        return [('analysis', key) for key in ('freq', 'acVal', 'acVec',
+                                              'ac_dt')]
 
 
     def extractACStat(self, mon):
@@ -192,7 +201,8 @@ class AutoCorrelationVisitor(DictDSVisitor):
             log_info("AutoCorrelationVisitor", "Analysing a dataset")
             o = data['options']
             self.maxLag = 1. / (o['theta_freq'] * 1e-3)
-            freq, acVal, acVec, dt = self.extractACStat(data[self.monName])
+            freq, acVal, acVec, dt = self.extractACStat(
+                simei.stateMonitorList(data[self.monName]))
             print(freq)
             a['freq']  = np.array(freq)
             a['acVal'] = np.array(acVal)
@@ -247,6 +257,12 @@ class CrossCorrelationVisitor(DictDSVisitor):
         self.norm        = norm
         self.forceUpdate = forceUpdate
 
+    def getInputKeys(self):
+        return [(self.monName,), ('options', 'theta_freq')]
+
+    def getOutputKeys(self):
+        return [('analysis', 'x-corr')]
+
 
     def extractCCStat(self, mon, out):
         '''Extract x-correlation statistics from a monitor.
@@ -321,7 +337,7 @@ class CrossCorrelationVisitor(DictDSVisitor):
             o = data['options']
             if (self.maxLag is None):
                 self.maxLag = 1. / (o['theta_freq'] * 1e-3)
-            self.extractCCStat(data[self.monName], a)
+            self.extractCCStat(simei.stateMonitorList(data[self.monName]), a)
         else:
             log_info("CrossCorrelationVisitor", "Data present. Skipping analysis.")
 
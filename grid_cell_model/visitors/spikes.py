@@ -48,7 +48,9 @@ class FiringRateVisitor(DictDSVisitor):
         tStart : float (ms)
             Start time of the analysis.
         tEnd : float (ms)
-            Analysis end time. If None, extract from the data
+            Analysis end time. If None, extract from the data. If the
+            simulation has been terminated early, the analysis ends at the
+            termination time.
         forceUpdate : boolean, optional
             Whether to do the data analysis even if the data already exists.
         sliding_analysis : boolean, optional
@@ -62,6 +64,13 @@ class FiringRateVisitor(DictDSVisitor):
         self.forceUpdate = forceUpdate
         self.sliding     = sliding_analysis
 
+    def getInputKeys(self):
+        return [('spikeMon_e',), ('spikeMon_i',), ('options', 'time'),
+                ('options', 'theta_start_t')]
+
+    def getOutputKeys(self):
+        return [('analysis', 'FR_e'), ('analysis', 'FR_i')]
+
     def _getSpikeTrain(self, data, monName, dimList):
         senders, times, N = DictDSVisitor._getSpikeTrain(self, data, monName,
                 dimList)
@@ -74,7 +83,9 @@ class FiringRateVisitor(DictDSVisitor):
         a = data['analysis']
 
         tStart = self._checkAttrIsNone(self.tStart, 'theta_start_t', data)
-        tEnd = self._checkAttrIsNone(self.tEnd, 'time', data)
+        # A simulation terminated early is analysed up to the termination
+        tEnd = min(self._checkAttrIsNone(self.tEnd, 'time', data),
+                   self.getSimulationTime(data))
 
         eSp = self._getSpikeTrain(data, 'spikeMon_e', ['Ne_x', 'Ne_y'])
         iSp = self._getSpikeTrain(data, 'spikeMon_i', ['Ni_x', 'Ni_y'])
@@ -156,6 +167,12 @@ class SpikeStatsVisitor(DictDSVisitor):
             self.NName = "net_Ni"
             self.outputName = "CV_i"
 
+    def getInputKeys(self):
+        return [(self.monitorName,)]
+
+    def getOutputKeys(self):
+        return [('analysis', self.outputName)]
+
 
     def visitDictDataSet(self, ds, **kw):
         data = ds.data
@@ -8,6 +8,9 @@ sweep data in various forms. The main data structure is the
 :class:`~grid_cell_model.parameters.JobTrialSpace2D` object) into a form that
 is usable for plotting the parameter sweeps.
 
+Aggregated data can be cached on disk, and shared between the plotters and
+figure builds, see :mod:`~noisefigs.EI_plotting.cache` and :func:`set_cache`.
+
 Old and deprecated functions
 ----------------------------
 
@@ -19,6 +22,14 @@ Old and deprecated functions
     computeVelYX
     aggregateType
 
+Cache
+-----
+
+.. autosummary::
+
+    set_cache
+    get_cache
+
 Data structures
 ---------------
 
@@ -47,6 +58,7 @@ Data structures
     MaxPopulationFR
     MaxThetaPopulationFR
     AvgPopulationFR
+    TerminatedFraction
     VelocityData
 
 
@@ -72,11 +84,15 @@ from grid_cell_model.analysis.image import Position2D
 import grid_cell_model.analysis.image as image
 import grid_cell_model.analysis.signal as asignal
 from grid_cell_model.parameters.metadata import EISweepExtractor
+from grid_cell_model.data_storage.sim_models.ei import TERMINATION_REASONS
 
 import logging
 logger = logging.getLogger(__name__)
 gammaAggrLogger = getClassLogger('GammaAggregateData', __name__)
 
+# Aggregation cache used by all the aggregations; None disables the cache
+_cache = None
+
 __all__ = [
     'aggregate2DTrial',
     'aggregate2D',
@@ -84,6 +100,9 @@ __all__ = [
     'computeVelYX',
     'aggregateType',
 
+    'set_cache',
+    'get_cache',
+
     'AggregateData',
     'FilteredData',
     'GridnessScore',
@@ -107,6 +126,7 @@ __all__ = [
     'MaxPopulationFR',
     'MaxThetaPopulationFR',
     'AvgPopulationFR',
+    'TerminatedFraction',
     'VelocityData',
 
     'AggregateDataFilter',
@@ -203,6 +223,20 @@ def computeVelYX(sp, iterList, r=0, c=0, trialNum=0, normalize=True, **kw):
     return E/Ne, I/Ni
 
 
+def set_cache(cache):
+    '''Set the aggregation cache (an
+    :class:`~noisefigs.EI_plotting.cache.AggregationCache`) of all the
+    :class:`AggregateData` objects created from now on and of
+    :func:`aggregateType`. ``None`` disables caching.'''
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    '''Return the current aggregation cache, or ``None``.'''
+    return _cache
+
+
 def aggregateType(sp, iterList, types, NTrials, ignoreNaNs=False, **kw):
     '''
     Automatically aggregate data according to the type of the data.
@@ -210,6 +244,16 @@ def aggregateType(sp, iterList, types, NTrials, ignoreNaNs=False, **kw):
     .. deprecated::
         Use the object-oriented versions instead.
     '''
+    if _cache is None:
+        return _aggregateType(sp, iterList, types, NTrials, ignoreNaNs, **kw)
+    return _cache.get(__name__ + '.aggregateType',
+                      (sp, iterList, types, NTrials, ignoreNaNs), kw,
+                      lambda: _aggregateType(sp, iterList, types, NTrials,
+                                             ignoreNaNs, **kw))
+
+
+def _aggregateType(sp, iterList, types, NTrials, ignoreNaNs=False, **kw):
+    '''Implementation of :func:`aggregateType`.'''
     type, subType = types
     vars          = ['analysis']
     output_dtype  = 'array'
@@ -317,8 +361,21 @@ def aggregateType(sp, iterList, types, NTrials, ignoreNaNs=False, **kw):
 
 
 class AggregateData(object):
+    '''Aggregated data of a parameter space.
+
+    If an aggregation cache has been set (see :func:`set_cache`), the
+    :meth:`getData` method of the new objects loads the data from the cache,
+    with a key given by the class and the arguments of the constructor.
+    '''
     analysisRoot = ['analysis']
 
+    def __new__(cls, *args, **kwargs):
+        obj = super(AggregateData, cls).__new__(cls)
+        if _cache is not None:
+            name = '{0}.{1}'.format(cls.__module__, cls.__name__)
+            obj.getData = _cache.wrap(name, obj.getData, args, kwargs)
+        return obj
+
     def __init__(self, space, iterList, NTrials, ignoreNaNs=False,
                  normalizeTicks=False, collapseTrials=True, r=0, c=0,
                  metadata_extractor=None):
@@ -347,6 +404,12 @@ class AggregateData(object):
         '''
         return FilteredData(self, filter_obj)
 
+    @property
+    def layout(self):
+        '''Layout of the jobs if the parameter space has been adaptively
+        refined, otherwise ``None``.'''
+        return getattr(self.sp, 'layout', None)
+
     @property
     def metadata(self):
         '''Return a read-only reference to the metadata.
@@ -369,6 +432,10 @@ class FilteredData(AggregateData):
         data.mask = np.logical_or(data.mask, self._filter.get_mask())
         return data, X, Y
 
+    @property
+    def layout(self):
+        return self._data.layout
+
     def pick_filtered_data(self):
         '''Return a 1D flattened array only containing the filtered data.'''
         data, _, _ = self.getData()
@@ -1103,16 +1170,25 @@ class PopulationFR(AggregateData):
             path = self.analysisRoot[0] + '/FR_e/popSliding'
             FR = self.sp.getReduction(path)
             nTrials = len(FR[0][0])
-            dataLen = len(FR[0][0][0])
-            self._FR = np.ndarray((self.sp.shape[0], self.sp.shape[1],
-                                        nTrials, dataLen),
-                                     dtype=np.double)
-            for r in xrange(self.sp.shape[0]):
-                for c in xrange(self.sp.shape[1]):
-                    for trialNum in xrange(nTrials):
-                        data = FR[r][c][trialNum]
-                        self._FR[r, c, trialNum, :] = \
-                                data if data is not None else np.nan
+            # Simulations terminated early have shorter firing rates
+            lengths = [len(data) for row in FR for item in row
+                       for data in item if data is not None]
+            if not lengths:
+                logger.warn('No population firing rates in %s; all the data '
+                            'are masked.', path)
+                self._FR = ma.masked_all((self.sp.shape[0], self.sp.shape[1],
+                                          nTrials, 1))
+            else:
+                self._FR = np.ndarray((self.sp.shape[0], self.sp.shape[1],
+                                       nTrials, max(lengths)),
+                                      dtype=np.double)
+                for r in xrange(self.sp.shape[0]):
+                    for c in xrange(self.sp.shape[1]):
+                        for trialNum in xrange(nTrials):
+                            data = FR[r][c][trialNum]
+                            self._FR[r, c, trialNum, :] = np.nan
+                            if data is not None:
+                                self._FR[r, c, trialNum, :len(data)] = data
 
             self._Y, self._X = computeYX(self.sp, self.iterList,
                                          normalizeTicks=self.normalizeTicks)
@@ -1220,6 +1296,49 @@ class AvgPopulationFR(AggregateData):
         return np.mean(maskNaNs(data, self.ignoreNaNs), axis=2), X, Y
 
 
+class TerminatedFraction(AggregateData):
+    '''Fraction of trials terminated early by the activity monitor.
+
+    Parameters
+    ----------
+    reason : str, or None
+        Count only the trials terminated for this reason (one of
+        :data:`~grid_cell_model.data_storage.sim_models.ei.TERMINATION_REASONS`).
+        If ``None``, count all the terminated trials.
+    '''
+    def __init__(self, space, iterList, NTrials, reason=None, **kw):
+        super(TerminatedFraction, self).__init__(space, iterList, NTrials,
+                                                 **kw)
+        if reason is not None and reason not in TERMINATION_REASONS:
+            raise ValueError("Unknown termination reason: "
+                             "{0}".format(reason))
+        self._reason = reason
+        self._terminated = None
+        self._X = None
+        self._Y = None
+
+    def getTrialData(self):
+        '''Return a 3D array of terminated (1) and complete (0) trials.
+
+        Missing data are NaN.
+        '''
+        if self._terminated is None:
+            codes = self.sp.aggregateTermination(range(self.NTrials))
+            if self._reason is None:
+                terminated = codes > 0
+            else:
+                terminated = codes == TERMINATION_REASONS.index(
+                    self._reason) + 1
+            self._terminated = np.where(np.isnan(codes), np.nan,
+                                        terminated.astype(np.double))
+            self._X, self._Y = self.metadata.xy_data
+        return self._terminated, self._X, self._Y
+
+    def getData(self):
+        data, X, Y = self.getTrialData()
+        return np.mean(maskNaNs(data, self.ignoreNaNs), axis=2), X, Y
+
+
 class VelocityData(AggregateData):
     '''Velocity data.'''
     def __init__(self, where, space, iterList, **kw):
@@ -0,0 +1,281 @@
+'''On-disk cache of the aggregated parameter sweep data.
+
+.. currentmodule:: noisefigs.EI_plotting.cache
+
+Most of the plotters aggregate data from the same parameter sweeps, e.g. the
+gridness scores or the gamma power for each noise level, and every one of them
+would load the data from all the job files of the sweep again. An
+:class:`AggregationCache` stores the output of
+:meth:`~noisefigs.EI_plotting.aggregate.AggregateData.getData` and of
+:func:`~noisefigs.EI_plotting.aggregate.aggregateType` in a directory, one NPZ
+file for each combination of
+
+ * the root directories of the parameter spaces,
+ * the aggregation class (or function) and all its arguments, i.e. the
+   iterated parameters, the number of trials, ``ignoreNaNs``, etc.
+
+Each cache file contains a fingerprint of the data files in the root
+directories, i.e. of the job files and ``iterparams.h5`` (their names, sizes
+and modification times). A cache file is used only if the fingerprint still
+matches, i.e. when no data have been simulated or analysed since the file has
+been created. The reductions files (``reductions*.h5`` and the out-of-core
+``reductions_ooc`` directory) are not part of the fingerprint: they are
+written by the aggregation itself, and opening them for writing changes their
+modification time.
+
+Only aggregations whose arguments are plain values (numbers, strings,
+sequences and dictionaries of them, named functions) or parameter spaces are
+cached. Aggregations that take other aggregations as arguments, e.g. the
+filters, are computed as usual from the (cached) data of their inputs.
+
+The cache is enabled by the ``aggregation_cache_dir`` option of the
+:class:`~noisefigs.env.NoiseEnvironment` configuration. Since the cache lives
+on disk, it is shared by all the plotters of a figure build, by the worker
+processes of a parallel build and by the following builds.
+
+Classes
+-------
+
+.. autosummary::
+
+    AggregationCache
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import re
+import errno
+import hashlib
+import logging
+import tempfile
+import functools
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['AggregationCache']
+
+# Increase to invalidate all the existing cache files when the format or the
+# meaning of the cached data changes.
+CACHE_VERSION = 1
+
+# Files of the parameter spaces whose change invalidates the cache
+_DATA_FILES = re.compile(r'^(.*job\d+_output|iterparams)\.h5$')
+
+
+class _Uncacheable(Exception):
+    '''Raised when an argument cannot be part of the cache key.'''
+    pass
+
+
+class AggregationCache(object):
+    '''A directory of cached aggregated data.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache files. Created if it does not exist.
+    '''
+    def __init__(self, cache_dir):
+        self._dir = cache_dir
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_dir(self):
+        '''Directory of the cache files.'''
+        return self._dir
+
+    def _key(self, obj, roots):
+        '''Convert ``obj`` into a string usable in a cache key. Root
+        directories of the parameter spaces are collected in ``roots``.'''
+        if hasattr(obj, 'rootDir'):
+            root = os.path.abspath(obj.rootDir)
+            roots.add(root)
+            return 'space({0!r}, {1!r})'.format(obj.__class__.__name__, root)
+        if obj is None or isinstance(obj, (bool, int, float, str)):
+            return repr(obj)
+        try:
+            if isinstance(obj, unicode):
+                return repr(obj)
+        except NameError:
+            pass
+        if isinstance(obj, np.ndarray) and obj.dtype != object:
+            return 'array({0!r}, {1!r})'.format(obj.dtype.str, obj.tolist())
+        if isinstance(obj, np.generic):
+            return repr(obj.item())
+        if isinstance(obj, (list, tuple)):
+            return '[{0}]'.format(', '.join(self._key(o, roots) for o in obj))
+        if isinstance(obj, dict):
+            items = sorted((str(k), self._key(v, roots))
+                           for k, v in obj.items())
+            return '{{{0}}}'.format(', '.join('{0}: {1}'.format(k, v)
+                                              for k, v in items))
+        name = getattr(obj, '__name__', None)
+        if callable(obj) and name is not None and name != '<lambda>':
+            return 'function({0}.{1})'.format(
+                getattr(obj, '__module__', None), name)
+        raise _Uncacheable(repr(obj))
+
+    def make_key(self, name, args, kwargs):
+        '''Create the cache key of an aggregation.
+
+        Returns
+        -------
+        key : str or None
+            The key, or ``None`` if the arguments cannot be cached.
+        roots : list of str
+            Root directories of the parameter spaces in the arguments.
+        '''
+        roots = set()
+        try:
+            key = 'v{0} {1}({2}, {3})'.format(CACHE_VERSION, name,
+                                              self._key(list(args), roots),
+                                              self._key(kwargs, roots))
+        except _Uncacheable as e:
+            logger.debug('Not caching %s, argument cannot be cached: %s',
+                         name, str(e))
+            return None, []
+        if len(roots) == 0:
+            return None, []
+        return key, sorted(roots)
+
+    @staticmethod
+    def fingerprint(roots):
+        '''Fingerprint of the job files and ``iterparams.h5`` in the
+        ``roots`` directories.'''
+        h = hashlib.sha1()
+        for root in roots:
+            try:
+                names = sorted(f for f in os.listdir(root)
+                               if _DATA_FILES.match(f))
+            except OSError:
+                names = []
+            h.update(root.encode('utf-8'))
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                h.update('{0} {1} {2!r}\n'.format(
+                    name, st.st_size, st.st_mtime).encode('utf-8'))
+        return h.hexdigest()
+
+    def _file_name(self, key):
+        '''Cache file of ``key``.'''
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._dir, digest + '.npz')
+
+    def load(self, key, roots):
+        '''Load data of ``key`` from the cache.
+
+        Returns
+        -------
+        data : tuple, or None
+            The data, or ``None`` if they are not in the cache or the cache
+            file is out of date.
+        '''
+        fname = self._file_name(key)
+        if not os.path.exists(fname):
+            return None
+        try:
+            with np.load(fname) as f:
+                if (str(f['key']) != key or
+                        str(f['fingerprint']) != self.fingerprint(roots)):
+                    logger.debug('Cache file %s is out of date.', fname)
+                    return None
+                out = []
+                for i in range(int(f['n'])):
+                    value = f['value{0}'.format(i)]
+                    if bool(f['masked{0}'.format(i)]):
+                        value = np.ma.MaskedArray(value,
+                                                  mask=f['mask{0}'.format(i)])
+                    out.append(value)
+        except (IOError, KeyError, ValueError) as e:
+            logger.warn('Cannot read cache file %s: %s', fname, str(e))
+            return None
+        return tuple(out)
+
+    def save(self, key, roots, fingerprint, data):
+        '''Save ``data``, a tuple of arrays, into the cache. The file is
+        replaced atomically, so that several processes can share the cache.
+
+        Returns
+        -------
+        saved : bool
+            ``False`` if the data cannot be cached.
+        '''
+        arrays = {
+            'key': np.array(key),
+            'fingerprint': np.array(fingerprint),
+            'n': np.array(len(data)),
+        }
+        for i, value in enumerate(data):
+            if not isinstance(value, np.ndarray) or value.dtype == object:
+                return False
+            masked = isinstance(value, np.ma.MaskedArray)
+            arrays['value{0}'.format(i)] = np.asarray(
+                value.data if masked else value)
+            arrays['masked{0}'.format(i)] = np.array(masked)
+            if masked:
+                arrays['mask{0}'.format(i)] = np.ma.getmaskarray(value)
+
+        fd, tmp_name = tempfile.mkstemp(suffix='.npz', dir=self._dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.rename(tmp_name, self._file_name(key))
+        except (IOError, OSError) as e:
+            logger.warn('Cannot save cache file: %s', str(e))
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            return False
+        return True
+
+    def get(self, name, args, kwargs, compute):
+        '''Return cached data of an aggregation, or compute and cache them.
+
+        Parameters
+        ----------
+        name : str
+            Full name of the aggregation class or function.
+        args, kwargs
+            Arguments of the aggregation, used as the cache key.
+        compute : callable
+            Computes the data if they are not cached. Must return a tuple of
+            arrays.
+        '''
+        key, roots = self.make_key(name, args, kwargs)
+        if key is None:
+            return compute()
+        data = self.load(key, roots)
+        if data is not None:
+            logger.debug('Aggregation cache hit: %s', key)
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        # Fingerprint before computing, so that data modified during the
+        # computation invalidate the cache file
+        fingerprint = self.fingerprint(roots)
+        data = compute()
+        if isinstance(data, tuple) and self.save(key, roots, fingerprint,
+                                                 data):
+            logger.debug('Aggregated data cached: %s', key)
+        return data
+
+    def wrap(self, name, method, args, kwargs):
+        '''Return a version of ``method`` that uses the cache, with the key
+        given by ``name``, ``args`` and ``kwargs``.'''
+        @functools.wraps(method)
+        def cached(*margs, **mkwargs):
+            if margs or mkwargs:
+                return method(*margs, **mkwargs)
+            return self.get(name, args, kwargs, method)
+        return cached
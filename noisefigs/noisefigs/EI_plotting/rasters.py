@@ -2,6 +2,16 @@
 
 .. currentmodule:: noisefigs.EI_plotting.rasters
 
+Long simulations of the full E and I populations contain millions of spikes.
+Drawing a marker for each of them takes minutes and produces huge vector
+figures. :func:`plotEIRaster` can therefore bin the spikes into a (neuron x
+time) grid of the resolution of the output figure and show the grid as an
+image (the ``density`` keyword argument). By default the image is used only
+when there are more than ``density_threshold`` spikes in the plotted window.
+:func:`plot_avg_firing_rate_spikes` has the same option: the population
+firing rate is computed from a histogram of all the spike times instead of the
+sliding firing rates of the individual neurons.
+
 Functions
 ---------
 
@@ -11,12 +21,15 @@ Functions
     plotEIRaster
     plotAvgFiringRate
     plot_avg_firing_rate_spikes
+    raster_density
+    population_rate
 '''
 import logging
 
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ti
+from matplotlib.colors import colorConverter
 
 import grid_cell_model.analysis.spikes as aspikes
 from grid_cell_model.plotting.global_defs       import globalAxesSettings
@@ -26,6 +39,89 @@ from grid_cell_model.plotting.signal            import signalPlot
 
 logger = logging.getLogger(__name__)
 
+# Default number of spikes above which the density rendering is used
+DENSITY_THRESHOLD = 50000
+
+
+def _use_density(density, nspikes, threshold):
+    '''Decide whether to use the density rendering.
+
+    Parameters
+    ----------
+    density : bool or 'auto'
+        ``True``/``False`` forces the density/exact rendering. ``'auto'``
+        uses the density rendering if ``nspikes > threshold``.
+    '''
+    if density == 'auto':
+        return nspikes > threshold
+    return bool(density)
+
+
+def _axes_pixels(ax, dpi):
+    '''Size of the axes in pixels when the figure is saved at ``dpi``.'''
+    fig = ax.get_figure()
+    width, height = ax.get_position().size * fig.get_size_inches()
+    return (max(int(np.ceil(width * dpi)), 1),
+            max(int(np.ceil(height * dpi)), 1))
+
+
+def raster_density(senders, times, N, tLimits, shape):
+    '''Bin spikes into a (neuron x time) grid.
+
+    Parameters
+    ----------
+    senders : np.ndarray
+        Neuron indexes of the spikes, ``0 <= senders < N``.
+    times : np.ndarray
+        Spike times.
+    N : int
+        Number of neurons.
+    tLimits : pair
+        Time range of the grid.
+    shape : pair of ints
+        Number of (neuron, time) bins. The number of neuron bins is limited
+        to ``N``.
+
+    Returns
+    -------
+    counts : np.ndarray
+        Number of spikes in each bin, of shape (neuron bins, time bins).
+    '''
+    nrows = max(min(int(shape[0]), int(N)), 1)
+    ncols = max(int(shape[1]), 1)
+    counts, _, _ = np.histogram2d(np.asarray(senders, dtype=float),
+                                  np.asarray(times, dtype=float),
+                                  bins=(nrows, ncols),
+                                  range=[[-.5, N - .5], tLimits])
+    return counts
+
+
+def _plot_raster_density(ax, populations, tLimits, dpi, saturation):
+    '''Show the spikes of ``populations`` as an image.
+
+    ``populations`` is a list of ``(senders, times, N, color)``; the
+    populations are stacked from the top, in the order of the list. Each bin is
+    drawn in the color of its population, with the opacity proportional to the
+    number of spikes, saturating at ``saturation`` spikes.
+    '''
+    Ntotal = sum(p[2] for p in populations)
+    width, height = _axes_pixels(ax, dpi)
+    images = []
+    for senders, times, N, color in populations:
+        rows = max(int(np.round(height * N / float(Ntotal))), 1)
+        counts = raster_density(senders, times, N, tLimits, (rows, width))
+        img = np.zeros(counts.shape + (4,))
+        img[:, :, 0:3] = colorConverter.to_rgb(color)
+        img[:, :, 3] = np.clip(counts / float(saturation), 0., 1.)
+        images.append((img, N))
+
+    top = .5
+    for img, N in images:
+        ax.imshow(img, extent=(tLimits[0], tLimits[1], top + N, top),
+                  origin='upper', aspect='auto', interpolation='nearest')
+        top += N
+
+
 def getSpikes(space, spaceType, r, c, trialNum, **kw):
     if (spaceType == 'velocity'):
         IvelIdx = kw.get('IvelIdx', 5) # Should correspond to Ivel==50 pA
@@ -50,7 +146,15 @@ def EIRaster(space, spaceType, r, c, tLimits, trialNum=0, **kw):
 
 
 def plotEIRaster(ESpikes, ISpikes, tLimits, ylabel=None, **kw):
-    '''Plot a raster plot E and I spikes.'''
+    '''Plot a raster plot E and I spikes.
+
+    Keyword arguments ``density``, ``density_threshold``, ``dpi`` and
+    ``density_saturation`` control the density rendering: ``density`` is
+    ``True``, ``False`` or ``'auto'`` (see the module description), ``dpi`` is
+    the resolution of the saved figure (300 by default) that determines the
+    number of time and neuron bins, and ``density_saturation`` is the number
+    of spikes in a bin that is drawn fully opaque (1 by default).
+    '''
     # kw arguments
     ax           = kw.pop('ax', plt.gca())
     yticks       = kw.pop('yticks', True)
@@ -71,6 +175,10 @@ def plotEIRaster(ESpikes, ISpikes, tLimits, ylabel=None, **kw):
     scaleHeight  = kw.pop('scaleHeight', .02)
     scaleTextSize= kw.pop('scaleTextSize', 'small')
     reshape_senders = kw.pop('reshape_senders', True)
+    density      = kw.pop('density', 'auto')
+    density_threshold = kw.pop('density_threshold', DENSITY_THRESHOLD)
+    dpi          = kw.pop('dpi', 300)
+    density_saturation = kw.pop('density_saturation', 1.)
     kw['markersize'] = kw.get('markersize', 1.0)
 
     if ylabel is None:
@@ -99,7 +207,8 @@ def plotEIRaster(ESpikes, ISpikes, tLimits, ylabel=None, **kw):
         Iy = ISenders // Ny
         ISenders = Iy + Ix * Ny
 
-    ISenders += ESpikes.N
+    useDensity = _use_density(density, len(ETimes) + len(ITimes),
+                              density_threshold)
 
     globalAxesSettings(ax)
     ax.minorticks_on()
@@ -110,8 +219,16 @@ def plotEIRaster(ESpikes, ISpikes, tLimits, ylabel=None, **kw):
     ax.yaxis.set_major_locator(ti.LinearLocator(2))
     ax.yaxis.set_minor_locator(ti.NullLocator())
 
-    ax.plot(ETimes, ESenders+1, '.', color='red',  mec='none', **kw)
-    ax.plot(ITimes, ISenders+1, '.', color='blue', mec='none', **kw)
+    if useDensity:
+        logger.debug('Raster plot: rendering %d spikes as density.',
+                     len(ETimes) + len(ITimes))
+        _plot_raster_density(ax, [(ESenders, ETimes, ESpikes.N, EColor),
+                                  (ISenders, ITimes, ISpikes.N, IColor)],
+                             tLimits, dpi, density_saturation)
+    else:
+        ISenders = ISenders + ESpikes.N
+        ax.plot(ETimes, ESenders+1, '.', color=EColor, mec='none', **kw)
+        ax.plot(ITimes, ISenders+1, '.', color=IColor, mec='none', **kw)
 
     ax.set_xlim(tLimits)
     ax.set_ylim([1, ESpikes.N+ISpikes.N])
@@ -162,21 +279,64 @@ def plotAvgFiringRate(space, spaceType, noise_sigma, popType, r, c, tLimits,
     return plot_avg_firing_rate_spikes(spikes, tLimits, **kw)
 
 
+def population_rate(spikes, tStart, tEnd, dt, winLen):
+    '''Population-average sliding firing rate computed from a histogram of
+    all the spike times.
+
+    The result is the same as the average of
+    :meth:`~grid_cell_model.analysis.spikes.PopulationSpikes.slidingFiringRate`
+    over the neurons, but the firing rates of the individual neurons are
+    never computed.
+
+    Returns
+    -------
+    rate, times : np.ndarray
+        The firing rate (Hz) and the corresponding times.
+    '''
+    tStart, tEnd, dt, winLen = (float(tStart), float(tEnd), float(dt),
+                                float(winLen))
+    szRate = int((tEnd - tStart) / dt) + 1
+    dtWlen = int(winLen / dt)
+    _, spikeTimes = spikes.rasterData()
+    # Truncated towards zero, as in slidingFiringRateTuple
+    steps = ((np.asarray(spikeTimes) - tStart) / dt).astype(int)
+    steps = steps[(steps >= 0) & (steps < szRate)]
+    counts = np.bincount(steps, minlength=szRate)
+
+    # Sum of the counts in [t, t + dtWlen), truncated at the end
+    cumsum = np.concatenate(([0], np.cumsum(counts)))
+    ends = np.minimum(np.arange(szRate) + dtWlen, szRate)
+    windowed = cumsum[ends] - cumsum[:szRate]
+    rate = windowed / (spikes.N * winLen * 1e-3)
+    return rate, np.linspace(tStart, tEnd, szRate)
+
+
 def plot_avg_firing_rate_spikes(spikes, tLimits, **kw):
-    '''Plot population-average firing rate from PopulationSpikes.'''
+    '''Plot population-average firing rate from PopulationSpikes.
+
+    With the ``density`` keyword argument (``True``, ``False`` or ``'auto'``,
+    the default), the rate is computed by :func:`population_rate`; ``'auto'``
+    uses it when there are more than ``density_threshold`` spikes.
+    '''
     # keyword arguments
     ax           = kw.pop('ax', plt.gca())
     sigmaTitle   = kw.pop('sigmaTitle', False)
     dt           = kw.pop('dt', .5)
     winLen       = kw.pop('winLen', 2.0)
+    density      = kw.pop('density', 'auto')
+    density_threshold = kw.pop('density_threshold', DENSITY_THRESHOLD)
     kw['xlabel'] = False
     kw['ylabel'] = kw.get('ylabel', 'r (Hz)')
 
     tStart = tLimits[0]
     tEnd   = tLimits[1]
 
-    rate, times = spikes.slidingFiringRate(tStart, tEnd, dt, winLen)
-    meanRate = np.mean(rate, axis=0)
+    nspikes = len(spikes.windowed(tLimits).rasterData()[1])
+    if _use_density(density, nspikes, density_threshold):
+        meanRate, times = population_rate(spikes, tStart, tEnd, dt, winLen)
+    else:
+        rate, times = spikes.slidingFiringRate(tStart, tEnd, dt, winLen)
+        meanRate = np.mean(rate, axis=0)
 
     signalPlot(times, meanRate, ax, **kw)
 
@@ -26,6 +26,7 @@ from matplotlib           import rcParams as rcp
 from grid_cell_model.plotting.global_defs import globalAxesSettings
 from grid_cell_model.plotting.low_level   import zeroLines
 from grid_cell_model.analysis import clustering
+from grid_cell_model.analysis.segmentation import segmentSweep
 
 from . import sweeps
 from . import aggregate as aggr
@@ -130,6 +131,12 @@ def plotDiffScatter(data, noise_sigmas, **kw):
 
 def plotSweepSegments(spaceList, noise_sigmas, iterList, thresholds, aggrTypes,
         NTrials, **kw):
+    '''Segment the sweeps by thresholds on the differences between noise
+    levels.
+
+    See :func:`plotRegimeSegments` for a segmentation that does not need the
+    thresholds.
+    '''
     #kw arguments
     r               = kw.pop('r', 0)
     c               = kw.pop('c', 0)
@@ -167,3 +174,59 @@ def plotSweepSegments(spaceList, noise_sigmas, iterList, thresholds, aggrTypes,
 
     return S, ax, cax
     
+
+
+def plotRegimeSegments(dataList, nClusters, **kw):
+    '''Segment a parameter sweep into regimes by clustering its features, and
+    plot the regimes.
+
+    The trials of the features are resampled to find the points whose regime
+    is not stable; they are delimited by a contour line. See
+    :func:`~grid_cell_model.analysis.segmentation.segmentSweep`.
+
+    **Parameters:**
+
+    dataList : list of AggregateData
+        The features, e.g. gridness scores, gamma power and bump fractions at
+        all the noise levels. Trial data are used if the object provides them
+        (``getTrialData``).
+    nClusters : int
+        Number of regimes.
+    method : str, optional
+        Clustering method, ``'gmm'`` or ``'kmeans'``.
+    nBootstrap, smoothing, seed : optional
+        Passed on to
+        :func:`~grid_cell_model.analysis.segmentation.segmentSweep`.
+    stabilityThreshold : float, optional
+        Points with a lower stability are delimited by a contour. ``None``
+        disables the contour.
+
+    **Returns:**
+
+    segmentation, S, ax, cax
+        The segmentation, and the return values of
+        :func:`~noisefigs.EI_plotting.sweeps.plot2DTrial`.
+    '''
+    method             = kw.pop('method', 'gmm')
+    nBootstrap         = kw.pop('nBootstrap', 50)
+    smoothing          = kw.pop('smoothing', 1.)
+    seed               = kw.pop('seed', None)
+    stabilityThreshold = kw.pop('stabilityThreshold', .8)
+    kw['cmap']         = kw.get('cmap', plt.get_cmap('Set1', nClusters))
+    kw['vmin']         = kw.get('vmin', -.5)
+    kw['vmax']         = kw.get('vmax', nClusters - .5)
+
+    features = []
+    for d in dataList:
+        features.append(getattr(d, 'getTrialData', d.getData)()[0])
+    _, X, Y = dataList[0].getData()
+
+    segmentation = segmentSweep(features, nClusters, method=method,
+                                nBootstrap=nBootstrap, smoothing=smoothing,
+                                seed=seed)
+    S, ax, cax = sweeps.plot2DTrial(X, Y, segmentation.labels, **kw)
+    if stabilityThreshold is not None:
+        ax.contour(X, Y, segmentation.stability.filled(1.),
+                   [stabilityThreshold], colors='k', linewidths=0.5)
+
+    return segmentation, S, ax, cax
@@ -18,6 +18,7 @@ Functions
     plotSweepAnnotation
     plotCollapsedSweeps
     plot_1d_sweep
+    fillIrregular
 
 Classes
 -------
@@ -307,6 +308,7 @@ def plotSweep(aggregateData, noise_sigma, **kw):
     sigmaTitle      = kw.pop('sigmaTitle', True)
 
     data, X, Y = aggregateData.getData()
+    data = fillIrregular(aggregateData, data)
     plotSweepLogger.info("min(data): {0}".format(np.nanmin(data)))
     plotSweepLogger.info("max(data): {0}".format(np.nanmax(data)))
     plotSweepLogger.info("median(data): {0}".format(np.median(data)))
@@ -323,6 +325,19 @@ def plotSweep(aggregateData, noise_sigma, **kw):
     return data, ax, cax
 
 
+def fillIrregular(aggregateData, data):
+    '''Fill the points of an adaptively refined parameter sweep that have not
+    been simulated with the values of the nearest simulated points, so that
+    the sweep can be plotted on its regular lattice.
+
+    Data of regular sweeps are returned unchanged.
+    '''
+    layout = aggregateData.layout
+    if layout is None or np.shape(data)[:2] != layout.shape:
+        return data
+    return layout.fill(data)
+
+
 def plot2DTrial(X, Y, C, ax=plt.gca(), xlabel=None, ylabel=None,
                 colorBar=False, clBarLabel="", vmin=None, vmax=None, title="",
                 clbarNTicks=2, xticks=True, yticks=True, cmap=None, cbar_kw={},
@@ -460,6 +475,7 @@ class Contours(object):
         if V is None:
             V = self.V
         d, X, Y = self.data.getData()
+        d = fillIrregular(self.data, d)
         # hack - add zero value to close contours
         d = np.hstack((d, np.zeros((d.shape[0], 1))))
         d = np.vstack((d, np.zeros((1, d.shape[1]))))
@@ -39,6 +39,9 @@ def _get_default_config():
         'even_shape': (31, 31),
         'noise_sigmas': [0, 150, 300],
 
+        # Directory of the on-disk cache of aggregated data; None disables it
+        'aggregation_cache_dir': None,
+
         # Sections
         'mpl': {
             'font.size': 11,
@@ -696,6 +699,9 @@ def _get_default_config():
         'scaleBar': [None, None, 25],
         'scaleX': .85,
         'scaleY': -.1,
+
+        # True/False: always/never bin the spikes into an image
+        'density': 'auto',
     }
     _default_config['EIRasterPlotter'] = EIRasterPlotter_config
 
@@ -705,6 +711,7 @@ def _get_default_config():
         'fig_size': (3, .65),
         'rateTop': .9,
         'ylabelPos': -0.35,
+        'density': 'auto',
     }
     _default_config['EIRatePlotter'] = EIRatePlotter_config
 
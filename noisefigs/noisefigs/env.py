@@ -9,6 +9,8 @@ from configobj import ConfigObj
 from simtools.plotting.env import Environment
 
 from .EI_plotting.base import NoiseDataSpaces
+from .EI_plotting import aggregate as aggr
+from .EI_plotting.cache import AggregationCache
 from . import defaultconfig as defc
 
 pp = pprint.PrettyPrinter(indent=2)
@@ -55,6 +57,18 @@ class NoiseEnvironment(MplEnvironment):
         else:
             self.ps = param_spaces
 
+        self._init_aggregation_cache()
+
+    def _init_aggregation_cache(self):
+        '''Enable the aggregation cache if the ``aggregation_cache_dir``
+        option is set.'''
+        cache_dir = self.config.get('aggregation_cache_dir', None)
+        if cache_dir is None:
+            aggr.set_cache(None)
+        else:
+            logger.info('Using aggregation cache in %s', cache_dir)
+            aggr.set_cache(AggregationCache(cache_dir))
+
     def _load_default_config(self):
         '''Load a default configuration for the Noise project.'''
         return defc.get_config()
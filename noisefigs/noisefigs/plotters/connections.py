@@ -18,6 +18,7 @@ Classes
 from __future__ import absolute_import, print_function
 
 import numpy as np
+from scipy import sparse
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ti
@@ -47,13 +48,33 @@ __all__ = [
 iterList  = ['g_AMPA_total', 'g_GABA_total']
 
 
+def getIncoming(M, neuronIdx):
+    '''Incoming weights of a neuron, from a (post, pre) connection matrix.
+
+    ``M`` can be a dense or a sparse matrix; a dense 1D array is returned.
+    '''
+    if sparse.issparse(M):
+        return M.getrow(neuronIdx).toarray().ravel()
+    return M[neuronIdx, :]
+
+
+def getOutgoing(M, neuronIdx):
+    '''Outgoing weights of a neuron, from a (post, pre) connection matrix.
+
+    ``M`` can be a dense or a sparse matrix; a dense 1D array is returned.
+    '''
+    if sparse.issparse(M):
+        return M.getcol(neuronIdx).toarray().ravel()
+    return M[:, neuronIdx]
+
+
 def plotEToI(sp, gIdx, neuronIdx, trialNum=0, **kw):
     title = kw.pop('title', 'I cell')
     ylim  = kw.pop('ylim', None)
 
     gE, gI = aggr.computeYX(sp, iterList)
     M      = sp[0][gIdx][trialNum].data['g_IE']
-    conns  = M[neuronIdx, :]
+    conns  = getIncoming(M, neuronIdx)
     ax = pconn.plotConnHistogram(conns,
             title=title, **kw)
     annG = gE[0, gIdx]
@@ -73,7 +94,7 @@ def plotIToE(sp, gIdx, neuronIdx, trialNum=0, **kw):
 
     gE, gI = aggr.computeYX(sp, iterList)
     M      = sp[0][gIdx][trialNum].data['g_EI']
-    conns  = M[neuronIdx, :]
+    conns  = getIncoming(M, neuronIdx)
     ax = pconn.plotConnHistogram(conns,
             title=title, **kw)
     annG = gI[0, gIdx]
@@ -106,7 +127,7 @@ def plotIToEBrokenAxis(sp, gIdx, neuronIdx, trialNum=0, axBoundaries=None,
 
     _, gI = aggr.computeYX(sp, iterList)
     M      = sp[0][gIdx][trialNum].data['g_EI']
-    conns  = M[neuronIdx, :]
+    conns  = getIncoming(M, neuronIdx)
 
     pconn.plotConnHistogram(conns, title=title, ax=axBottom, **kw)
     kw['ylabel'] = ''
@@ -234,7 +255,7 @@ class WeightPlotter(FigurePlotter):
         if not use_title:
             kw['title'] = ''
 
-        conns = np.reshape(data[var][:, neuronIdx], (Ny, Nx))
+        conns = np.reshape(getOutgoing(data[var], neuronIdx), (Ny, Nx))
         pconn.plot2DWeightMatrix(conns, **kw)
 
     def plotIncoming(self, gIdx, type, neuronIdx, trialNum=0, **kw):
@@ -259,7 +280,7 @@ class WeightPlotter(FigurePlotter):
         if not use_title:
             kw['title'] = ''
 
-        conns = np.reshape(data[var][neuronIdx, :], (Ny, Nx))
+        conns = np.reshape(getIncoming(data[var], neuronIdx), (Ny, Nx))
         pconn.plot2DWeightMatrix(conns, **kw)
 
 
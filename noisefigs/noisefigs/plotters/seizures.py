@@ -63,7 +63,11 @@ rasterTop     = 0.8
 
 
 class EIRasterPlotter(FigurePlotter):
-    '''Raster plots of spikes from both E and I populations.'''
+    '''Raster plots of spikes from both E and I populations.
+
+    The ``density`` option selects the rendering of the spikes, see
+    :mod:`~noisefigs.EI_plotting.rasters`.
+    '''
     dt = .1  # ms
     freq = 8. # Hz
     const = .4 # Fraction of max. theta
@@ -110,7 +114,8 @@ class EIRasterPlotter(FigurePlotter):
                 scaleX=self.myc['scaleX'],
                 scaleY=self.myc['scaleY'],
                 scaleTextYOffset=.03, scaleHeight=.005,
-                ann_EI=True)
+                ann_EI=True,
+                density=self.myc.get('density', 'auto'))
 
             fname = "%s/bumps_raster%d.%s" % (output_dir, int(noise_sigma),
                                               self.myc['fig_ext'])
@@ -121,6 +126,9 @@ class EIRasterPlotter(FigurePlotter):
 class EIRatePlotter(FigurePlotter):
     '''Raster plots of population-average firing rates from both E and I
     populations.
+
+    The ``density`` option selects how the rates are computed, see
+    :mod:`~noisefigs.EI_plotting.rasters`.
     '''
     def __init__(self, *args, **kwargs):
         super(EIRatePlotter, self).__init__(*args, **kwargs)
@@ -152,6 +160,7 @@ class EIRatePlotter(FigurePlotter):
                     ylabelPos=self.myc['ylabelPos'],
                     color='red',
                     tLimits=tLimits,
+                    density=self.myc.get('density', 'auto'),
                     ax=ax, **kw)
             fname = output_dir + "/bumps_rate_e{0}.pdf".format(noise_sigma)
             fig.savefig(fname, dpi=300, transparent=transparent)
@@ -173,6 +182,7 @@ class EIRatePlotter(FigurePlotter):
                     ylabelPos=self.myc['ylabelPos'],
                     color='blue',
                     tLimits=tLimits,
+                    density=self.myc.get('density', 'auto'),
                     ax=ax, **kw)
             fname = output_dir + "/bumps_rate_i{0}.pdf".format(noise_sigma)
             fig.savefig(fname, dpi=300, transparent=transparent)
@@ -0,0 +1,78 @@
+'''Tests of the on-disk cache of aggregated sweep data.'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import multiprocessing
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from noisefigs.EI_plotting.cache import AggregationCache
+
+
+class Space(object):
+    '''Parameter space that only has a root directory.'''
+    def __init__(self, rootDir):
+        self.rootDir = rootDir
+
+
+def touch(fileName, data=b'data'):
+    with open(fileName, 'ab') as f:
+        f.write(data)
+    mtime = os.path.getmtime(fileName) + 10
+    os.utime(fileName, (mtime, mtime))
+
+
+def load(cache_dir, rootDir):
+    '''Load the cached data in a new cache.'''
+    cache = AggregationCache(cache_dir)
+    key, roots = cache.make_key('Aggregation', [Space(rootDir)], {})
+    return cache.load(key, roots)
+
+
+@pytest.fixture
+def sweep(tmpdir):
+    rootDir = tmpdir.mkdir('sweep')
+    for name in ['job00000_output.h5', 'job00001_output.h5', 'iterparams.h5',
+                 'reductions.h5']:
+        touch(str(rootDir.join(name)))
+    cache = AggregationCache(str(tmpdir.join('cache')))
+    data = (np.arange(3.), np.ma.MaskedArray([1., 2.], mask=[0, 1]))
+    result = cache.get('Aggregation', [Space(str(rootDir))], {},
+                       lambda: data)
+    assert result is data
+    assert cache.misses == 1
+    return cache.cache_dir, str(rootDir)
+
+
+def test_hit_in_another_process(sweep):
+    cache_dir, rootDir = sweep
+    # The aggregation writes into the reductions files
+    touch(os.path.join(rootDir, 'reductions.h5'))
+    os.mkdir(os.path.join(rootDir, 'reductions_ooc'))
+    touch(os.path.join(rootDir, 'reductions_ooc', 'counts.h5'))
+
+    pool = multiprocessing.Pool(1)
+    try:
+        data = pool.apply(load, (cache_dir, rootDir))
+    finally:
+        pool.close()
+        pool.join()
+    assert data is not None
+    assert_array_equal(data[0], np.arange(3.))
+    assert_array_equal(data[1].mask, [False, True])
+
+
+def test_job_file_invalidates(sweep):
+    cache_dir, rootDir = sweep
+    assert load(cache_dir, rootDir) is not None
+    touch(os.path.join(rootDir, 'job00001_output.h5'))
+    assert load(cache_dir, rootDir) is None
+
+    cache = AggregationCache(cache_dir)
+    cache.get('Aggregation', [Space(rootDir)], {}, lambda: (np.zeros(2),))
+    assert cache.misses == 1
+    assert_array_equal(load(cache_dir, rootDir)[0], np.zeros(2))
+    touch(os.path.join(rootDir, 'job00002_output.h5'))
+    assert load(cache_dir, rootDir) is None
@@ -7,7 +7,8 @@ packages = [
 entry_points = {
     'console_scripts': [
         'gcm_hello_world = grid_cell_model.entry_points.gcm_hello_world:main',
-        'sweepls = grid_cell_model.entry_points.sweepls:main'
+        'sweepls = grid_cell_model.entry_points.sweepls:main',
+        'gcm_benchmark = grid_cell_model.entry_points.gcm_benchmark:main',
     ],
 }
 
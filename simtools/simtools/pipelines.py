@@ -1,15 +1,156 @@
-'''Define basic data structures for pipeline processing during the simulations.'''
+'''Define basic data structures for pipeline processing during the simulations.
+
+A :class:`Pipeline` either passes one :class:`PipelineData` object through
+its stages (:meth:`Pipeline.run`), or processes a stream of inputs, e.g. the
+items of a parameter sweep (:meth:`Pipeline.stream`). In the streaming mode
+the inputs are read lazily and each input passes through the stages as soon
+as the previous stages have produced it, so that only a bounded number of data
+objects is held in memory:
+
+ * Stages with ``stateless`` set to ``True`` are mapped over the stream in a
+   pool of worker processes. At most ``queue_size`` data objects are queued
+   for the workers at any time and the order of the stream is preserved.
+ * A :class:`ReducingStage` folds the stream into a single data object,
+   incrementally, as the data arrive.
+ * All the other stages are applied in the calling process, one data object
+   at a time.
+
+The time spent in each stage and the depth of the worker queues are reported
+in :attr:`Pipeline.stats`.
+'''
+from __future__ import absolute_import, print_function, division
+
+import time
+import collections
+import multiprocessing
+
+# Stateless stages of the streamed pipeline, inherited by the worker processes
+_worker_segments = None
+
 
 class PipelineStage(object):
     '''A base class for callable pipeline stage functors.
 
     This class can be configured and instances can be called inside a pipeline.
     The class must define/override the __call__ method.
+
+    A stage that sets ``stateless`` to ``True`` declares that it does not
+    keep any state between the calls and that it has no side effects in the
+    calling process. A streamed pipeline can then apply it in worker
+    processes, which requires the stage and the data to be picklable.
     '''
+    stateless = False
+
     def __call__(self, data_in):
         raise NotImplementedError
 
 
+class ReducingStage(PipelineStage):
+    '''A pipeline stage that folds a stream of data objects into one.
+
+    Subclasses must override :meth:`initial` and :meth:`fold` and can
+    override :meth:`finish`. In :meth:`Pipeline.run`, a reducing stage folds
+    the single data object it receives.
+    '''
+    def initial(self):
+        '''Return the initial value of the accumulator.'''
+        raise NotImplementedError
+
+    def fold(self, accumulator, data_in):
+        '''Fold ``data_in`` into ``accumulator`` and return the new
+        accumulator.'''
+        raise NotImplementedError
+
+    def finish(self, accumulator):
+        '''Convert the final accumulator into a :class:`PipelineData`
+        object.'''
+        return accumulator
+
+    def __call__(self, data_in):
+        return self.finish(self.fold(self.initial(), data_in))
+
+
+class StageStats(object):
+    '''Statistics of one stage of a streamed pipeline.
+
+    Attributes
+    ----------
+    name : str
+        Name of the stage.
+    items : int
+        Number of data objects processed.
+    time : float
+        Total time spent in the stage (s). For the stages that run in the
+        worker processes this is the sum over all the workers.
+    max_queue_depth : int
+        Maximal number of data objects waiting for, or being processed by,
+        the worker processes. Zero for the stages applied in the calling
+        process.
+    mean_queue_depth : float
+        Average queue depth at the times when the data were submitted.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.time = 0.
+        self.max_queue_depth = 0
+        self._depth_sum = 0
+        self._depth_n = 0
+
+    def _record_depth(self, depth):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self._depth_sum += depth
+        self._depth_n += 1
+
+    @property
+    def mean_queue_depth(self):
+        '''Average queue depth.'''
+        if self._depth_n == 0:
+            return 0.
+        return self._depth_sum / self._depth_n
+
+    def __str__(self):
+        return ('{0}: {1} items, {2:.3f} s, queue depth max {3}, mean '
+                '{4:.1f}'.format(self.name, self.items, self.time,
+                                 self.max_queue_depth, self.mean_queue_depth))
+
+
+def _stage_name(stage):
+    '''Name of a stage, for the statistics.'''
+    return getattr(stage, '__name__', stage.__class__.__name__)
+
+
+def _check_data(data):
+    '''Check the return value of a stage.'''
+    if not isinstance(data, PipelineData):
+        raise TypeError('All pipeline stages must strictly return a '
+                        'value of type '
+                        'simtools.pipelines.PipelineData.')
+    return data
+
+
+def _init_worker(segments):
+    '''Store the stateless stages in the worker process.'''
+    global _worker_segments  # pylint: disable=global-statement
+    _worker_segments = segments
+
+
+def _run_segment(segment_idx, data):
+    '''Apply a segment of stateless stages in a worker process.
+
+    Returns
+    -------
+    data, times
+        The output and the time spent in each stage.
+    '''
+    times = []
+    for stage in _worker_segments[segment_idx]:
+        start = time.time()
+        data = _check_data(stage(data))
+        times.append(time.time() - start)
+    return data, times
+
+
 class PipelineData(object):
     '''A pipeline data object.
 
@@ -28,6 +169,7 @@ class Pipeline(object):
     def __init__(self):
         self._data = None
         self._stages = []
+        self._stats = []
 
     def append(self, stage):
         '''Append a pipeline stage.
@@ -63,10 +205,151 @@ class Pipeline(object):
             Data after the last stage of the pipeline has been applied to it.
         '''
         for stage in self._stages:
-            data = stage(data)
-            if not isinstance(data, PipelineData):
-                raise TypeError('All pipeline stages must strictly return a '
-                                'value of type '
-                                'simtools.pipelines.PipelineData.')
+            data = _check_data(stage(data))
         return data
 
+    @property
+    def stats(self):
+        '''Statistics of the stages (a list of :class:`StageStats`) of the
+        last :meth:`stream`.'''
+        return self._stats
+
+    def _segments(self, pooled):
+        '''Group the stages into segments: lists of consecutive stateless
+        stages if ``pooled``, otherwise single stages.
+
+        Returns
+        -------
+        segments : list of (bool, list of int)
+            Whether the segment runs in the worker processes, and the indices
+            of its stages.
+        '''
+        segments = []
+        for idx, stage in enumerate(self._stages):
+            is_pooled = (pooled and getattr(stage, 'stateless', False) and
+                         not isinstance(stage, ReducingStage))
+            if is_pooled and segments and segments[-1][0]:
+                segments[-1][1].append(idx)
+            else:
+                segments.append((is_pooled, [idx]))
+        return segments
+
+    def _apply(self, idx, inputs):
+        '''Apply stage ``idx`` in this process.'''
+        stage = self._stages[idx]
+        stats = self._stats[idx]
+        if isinstance(stage, ReducingStage):
+            start = time.time()
+            acc = stage.initial()
+            stats.time += time.time() - start
+            for data in inputs:
+                start = time.time()
+                acc = stage.fold(acc, data)
+                stats.time += time.time() - start
+                stats.items += 1
+            start = time.time()
+            result = _check_data(stage.finish(acc))
+            stats.time += time.time() - start
+            yield result
+        else:
+            for data in inputs:
+                start = time.time()
+                data = _check_data(stage(data))
+                stats.time += time.time() - start
+                stats.items += 1
+                yield data
+
+    def _map(self, pool, segment_idx, stage_indices, inputs, queue_size):
+        '''Apply a segment of stateless stages in the worker processes, with
+        at most ``queue_size`` data objects in the queue.'''
+        pending = collections.deque()
+
+        def collect():
+            data, times = pending.popleft().get()
+            for idx, t in zip(stage_indices, times):
+                self._stats[idx].time += t
+                self._stats[idx].items += 1
+            return data
+
+        for data in inputs:
+            if len(pending) >= queue_size:
+                yield collect()
+            pending.append(pool.apply_async(_run_segment,
+                                            (segment_idx, data)))
+            for idx in stage_indices:
+                self._stats[idx]._record_depth(len(pending))
+        while pending:
+            yield collect()
+
+    def stream(self, inputs, processes=1, queue_size=None):
+        '''Run a stream of inputs through the pipeline.
+
+        This is a generator: the inputs are read and processed only as the
+        outputs are consumed.
+
+        Parameters
+        ----------
+        inputs : iterable
+            The inputs, passed on to the first stage one by one. These need
+            not be :class:`PipelineData` objects if the first stage converts
+            them, e.g. items of a parameter sweep.
+        processes : int or None
+            Number of worker processes for the stateless stages. 1 applies all
+            the stages in the calling process, ``None`` uses all the
+            available CPUs.
+        queue_size : int or None
+            Maximal number of data objects queued for the worker processes.
+            Defaults to twice the number of processes.
+
+        Yields
+        ------
+        data : PipelineData
+            Outputs of the last stage, in the order of the inputs. If the
+            pipeline contains a reducing stage, the stream is folded into one
+            data object at that stage.
+        '''
+        self._stats = [StageStats(_stage_name(stage))
+                       for stage in self._stages]
+        pooled = processes != 1
+        segments = self._segments(pooled)
+        pooled = pooled and any(is_pooled for is_pooled, _ in segments)
+
+        stream = iter(inputs)
+        pool = None
+        try:
+            if pooled:
+                if processes is None:
+                    processes = multiprocessing.cpu_count()
+                if queue_size is None:
+                    queue_size = 2 * processes
+                if queue_size < 1:
+                    raise ValueError("Queue size must be >= 1, got "
+                                     "{0}.".format(queue_size))
+                worker_segments = [
+                    [self._stages[idx] for idx in indices] if is_pooled
+                    else None
+                    for is_pooled, indices in segments]
+                pool = multiprocessing.Pool(processes,
+                                            initializer=_init_worker,
+                                            initargs=(worker_segments,))
+
+            for segment_idx, (is_pooled, indices) in enumerate(segments):
+                if is_pooled:
+                    stream = self._map(pool, segment_idx, indices, stream,
+                                       queue_size)
+                else:
+                    stream = self._apply(indices[0], stream)
+
+            for data in stream:
+                yield data
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                pool = None
+            raise
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
@@ -1,20 +1,159 @@
+'''Environment that runs computations and plotters.
+
+Computations are registered with an :class:`Environment` and run by
+:meth:`Environment.run`, either one by one in the current process, or in a
+pool of worker processes. A computation runs only after all the computations
+it depends on have finished successfully. Dependencies are declared either by
+the computation class, in its ``dependencies`` attribute (see
+:class:`~simtools.plotting.plotters.Computation`), or per registered object,
+with :meth:`Generator.depends_on`.
+
+In the parallel mode each computation runs in a fresh worker process, forked
+from the process that calls :meth:`Environment.run`, with the matplotlib
+``Agg`` backend. The computations therefore cannot share any data in memory;
+a computation that produces data for other computations must save them, e.g.
+into a file.
+'''
 from __future__ import absolute_import, print_function
 
+import time
 import logging
 import pprint
+import traceback
+import multiprocessing
 
 from configobj import ConfigObj
 
 pp = pprint.PrettyPrinter(indent=2)
 logger = logging.getLogger(__name__)
 
+# The environment being run by the worker processes. Set before the worker
+# pool is created, so that the forked workers inherit it.
+_worker_env = None
+
 
 class Generator(object):
+    '''A registered computation: its class, configuration and arguments.'''
     def __init__(self, cls, config, obj_args, obj_kwargs):
         self.cls = cls
         self.config = config
         self.obj_args = obj_args
         self.obj_kwargs = obj_kwargs
+        self.dependencies = []
+
+    @property
+    def name(self):
+        '''Name of the computation class.'''
+        return self.cls.__name__
+
+    def depends_on(self, *generators):
+        '''Run this computation only after all ``generators`` have finished
+        successfully.
+
+        Returns
+        -------
+        self : Generator
+            This object, so that the call can be chained with the
+            registration.
+        '''
+        self.dependencies.extend(generators)
+        return self
+
+    def run(self, env):
+        '''Create the computation object and run it in ``env``.'''
+        arg_list = self.obj_args + (self.config, env)
+        instance = self.cls(*arg_list, **self.obj_kwargs)
+        instance.run_all()
+
+
+class ComputationResult(object):
+    '''Outcome of one computation run by :meth:`Environment.run`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the computation class.
+    index : int
+        Registration order of the computation.
+    run_time : float
+        Run time (s).
+    error : str or None
+        Traceback of the error, if the computation failed.
+    skipped : bool
+        Whether the computation has not been run because one of its
+        dependencies failed.
+    '''
+    def __init__(self, name, index, run_time=0., error=None, skipped=False):
+        self.name = name
+        self.index = index
+        self.run_time = run_time
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def success(self):
+        '''``True`` if the computation has run without errors.'''
+        return self.error is None and not self.skipped
+
+    def __str__(self):
+        if self.skipped:
+            status = 'skipped'
+        elif self.error is not None:
+            status = 'FAILED'
+        else:
+            status = 'ok'
+        return '{0:3d} {1:40s} {2:8s} {3:8.1f} s'.format(
+            self.index, self.name, status, self.run_time)
+
+
+class RunSummary(object):
+    '''Summary of :meth:`Environment.run`: a list of
+    :class:`ComputationResult`, in the registration order.'''
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def failures(self):
+        '''Results of the computations that failed or have been skipped.'''
+        return [r for r in self.results if not r.success]
+
+    @property
+    def success(self):
+        '''``True`` if all the computations have run without errors.'''
+        return len(self.failures) == 0
+
+    def __str__(self):
+        lines = [str(r) for r in self.results]
+        for r in self.results:
+            if r.error is not None:
+                lines.append('\n{0} ({1}):\n{2}'.format(r.name, r.index,
+                                                         r.error))
+        return '\n'.join(lines)
+
+
+def _init_worker():
+    '''Use a non-interactive matplotlib backend in the worker processes.'''
+    import matplotlib.pyplot as plt
+    plt.switch_backend('agg')
+
+
+def _run_in_worker(idx, conn):
+    '''Run computation ``idx`` of the environment inherited from the
+    parent process and send the result through ``conn``.
+
+    A result is sent whatever the computation raises, even exceptions that
+    are not derived from :class:`Exception`.
+    '''
+    try:
+        _init_worker()
+        result = _worker_env._run_one(idx, catch=True)
+    except BaseException:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+        logger.error('Computation %d failed:\n%s', idx, error)
+        result = ComputationResult(_worker_env._generators[idx].name, idx,
+                                   error=error)
+    conn.send(result)
+    conn.close()
 
 
 class Environment(object):
@@ -63,6 +202,11 @@ class Environment(object):
             If ``True``, this will be merged with the environment config
             already present. If ``False``, ``config`` will be the only
             configuration file present for this particular object.
+
+        Returns
+        -------
+        generator : Generator
+            The registered object. Use it to declare dependencies.
         '''
         obj_config = None
         if config is not None:
@@ -74,7 +218,9 @@ class Environment(object):
         else:
             obj_config = self.config
 
-        self._generators.append(Generator(cls, obj_config, args, kwargs))
+        generator = Generator(cls, obj_config, args, kwargs)
+        self._generators.append(generator)
+        return generator
 
     def register_plotter(self, plotter_cls, config=None, merge_in=True):
         '''Register plotter class with the environment.
@@ -92,23 +238,202 @@ class Environment(object):
             If ``True``, this will be merged with the environment config
             already present. If ``False``, ``config`` will be the only
             configuration file present for this particular object.
+
+        Returns
+        -------
+        generator : Generator
+            The registered object.
         '''
-        self.register_class(plotter_cls, config, merge_in)
+        return self.register_class(plotter_cls, config, merge_in)
+
+    def _dependency_graph(self):
+        '''For each registered object, the set of indices of the objects it
+        depends on.'''
+        index = dict((id(g), i) for i, g in enumerate(self._generators))
+        deps = []
+        for i, g in enumerate(self._generators):
+            try:
+                d = set(index[id(dep)] for dep in g.dependencies)
+            except KeyError:
+                raise ValueError("{0} depends on a computation that has not "
+                                 "been registered.".format(g.name))
+            for dep_cls in getattr(g.cls, 'dependencies', ()):
+                d.update(j for j, h in enumerate(self._generators)
+                         if j != i and issubclass(h.cls, dep_cls))
+            deps.append(d)
+        return deps
+
+    @staticmethod
+    def _execution_order(deps):
+        '''Order the objects so that the dependencies come first; otherwise
+        keep the registration order.'''
+        order = []
+        done = set()
+        while len(order) < len(deps):
+            ready = [i for i in range(len(deps))
+                     if i not in done and deps[i] <= done]
+            if len(ready) == 0:
+                raise ValueError("The dependencies of the computations "
+                                 "contain a cycle.")
+            order.append(ready[0])
+            done.add(ready[0])
+        return order
+
+    def _run_one(self, idx, catch):
+        '''Run the registered object ``idx``. If ``catch`` is ``True``, an
+        exception is recorded in the result instead of being raised.'''
+        g = self._generators[idx]
+        logger.info('Running %s (%d).', g.name, idx)
+        start = time.time()
+        error = None
+        if catch:
+            try:
+                g.run(self)
+            except Exception:  # pylint: disable=broad-except
+                error = traceback.format_exc()
+                logger.error('%s (%d) failed:\n%s', g.name, idx, error)
+        else:
+            g.run(self)
+        return ComputationResult(g.name, idx, time.time() - start, error)
+
+    def _run_serial(self, deps, keep_going):
+        '''Run all the objects one by one in this process.'''
+        results = [None] * len(deps)
+        for i in self._execution_order(deps):
+            if any(not results[j].success for j in deps[i]):
+                results[i] = ComputationResult(self._generators[i].name, i,
+                                               skipped=True)
+            else:
+                results[i] = self._run_one(i, catch=keep_going)
+        return results
+
+    def _run_parallel(self, deps, processes, keep_going):
+        '''Run all the objects in worker processes, at most ``processes`` at
+        a time, each object as soon as its dependencies have finished.
 
-    def run(self):
-        '''Run everything.'''
-        for g in self._generators:
-            arg_list = g.obj_args + (g.config, self)
-            instance = g.cls(*arg_list, **g.obj_kwargs)
-            instance.run_all()
+        Each object runs in a new process. A process that exits without
+        sending its result (e.g. killed by a signal) is recorded as a
+        failure.'''
+        global _worker_env  # pylint: disable=global-statement
+        self._execution_order(deps)  # Check for cycles
+        if processes is None:
+            processes = multiprocessing.cpu_count()
 
+        results = [None] * len(deps)
+        pending = set(range(len(deps)))
+        running = {}
+        stop = False
 
-    def plot(self):
+        _worker_env = self
+        try:
+            while pending or running:
+                submitted = True
+                while submitted and len(running) < processes:
+                    submitted = False
+                    for i in sorted(pending):
+                        if any(results[j] is None for j in deps[i]):
+                            continue
+                        pending.discard(i)
+                        submitted = True
+                        if stop or any(not results[j].success
+                                       for j in deps[i]):
+                            results[i] = ComputationResult(
+                                self._generators[i].name, i, skipped=True)
+                            continue
+                        recv_conn, send_conn = multiprocessing.Pipe(False)
+                        proc = multiprocessing.Process(
+                            target=_run_in_worker, args=(i, send_conn))
+                        proc.start()
+                        send_conn.close()
+                        running[i] = (proc, recv_conn, time.time())
+                        if len(running) >= processes:
+                            break
+
+                for i, res in self._collect_finished(running):
+                    results[i] = res
+                    if not res.success and not keep_going:
+                        stop = True
+        finally:
+            for proc, _, _ in running.values():
+                proc.terminate()
+                proc.join()
+            _worker_env = None
+        return results
+
+    def _collect_finished(self, running, poll_interval=0.05):
+        '''Wait until at least one of the ``running`` processes finishes,
+        remove the finished processes and return their (index, result).'''
+        finished = []
+        while running and not finished:
+            for i, (proc, conn, start) in list(running.items()):
+                if (not conn.poll(poll_interval / len(running)) and
+                        proc.is_alive()):
+                    continue
+                res = None
+                # The process may have sent the result just before exiting
+                if conn.poll(0):
+                    try:
+                        res = conn.recv()
+                    except EOFError:
+                        pass
+                proc.join()
+                conn.close()
+                del running[i]
+                if res is None:
+                    name = self._generators[i].name
+                    res = ComputationResult(
+                        name, i, time.time() - start,
+                        error='Worker process exited with code {0} without '
+                              'a result.'.format(proc.exitcode))
+                    logger.error('%s (%d) failed: %s', name, i, res.error)
+                finished.append((i, res))
+        return finished
+
+    def run(self, processes=1, keep_going=False):
         '''Run everything.
 
-        This runs all registered objects' computation, not just the plotters.
-        Only for compatibility with older code.
+        Parameters
+        ----------
+        processes : int or None
+            Number of worker processes. 1 runs all the computations one by one
+            in the current process, ``None`` uses all the available CPUs.
+        keep_going : bool
+            If ``True``, a failure of a computation is recorded in the summary
+            and the remaining computations are still run, except the ones that
+            depend on the failed computation. If ``False``, the run stops at
+            the first failure: in the serial mode the exception is raised
+            immediately, in the parallel mode the computations that are
+            already running are finished and a RuntimeError with the summary
+            is raised.
+
+        Returns
+        -------
+        summary : RunSummary
+            The outcome of each computation.
         '''
-        self.run()
+        deps = self._dependency_graph()
+        if processes == 1:
+            results = self._run_serial(deps, keep_going)
+        else:
+            results = self._run_parallel(deps, processes, keep_going)
+        summary = RunSummary(results)
+
+        if summary.success:
+            logger.info('All computations finished:\n%s', summary)
+        else:
+            logger.error('%d of %d computations failed or have been '
+                         'skipped:\n%s', len(summary.failures),
+                         len(results), summary)
+            if not keep_going:
+                raise RuntimeError("Computations failed:\n{0}".format(
+                    summary))
+        return summary
 
+    def plot(self, processes=1, keep_going=False):
+        '''Run everything.
 
+        This runs all registered objects' computation, not just the plotters.
+        Only for compatibility with older code. See :meth:`run` for the
+        parameters.
+        '''
+        return self.run(processes, keep_going)
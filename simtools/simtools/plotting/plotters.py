@@ -31,7 +31,14 @@ class _FigureContextManager(object):
 
 
 class Computation(object):
-    '''Performs computation without returning any value.'''
+    '''Performs computation without returning any value.
+
+    The ``dependencies`` class attribute lists the computation classes that
+    must run before this one, if they have been registered in the same
+    environment (see :mod:`simtools.plotting.env`).
+    '''
+    dependencies = ()
+
     def __init__(self, config, env):
         self._env = env
         self._config = config
@@ -0,0 +1,227 @@
+'''In-process compaction of HDF5 data storage files.
+
+HDF5 does not reclaim space of objects that have been deleted or overwritten,
+which happens every time a key is re-assigned through
+:class:`~simtools.storage.hdf5_storage.HDF5MapStorage`. Compaction rewrites
+all the live objects of a file into a fresh file (optionally re-chunking and
+recompressing datasets) and atomically replaces the original file with it.
+
+This is an equivalent of running ``h5repack`` on each file, without having to
+shell out to external tools.
+'''
+from __future__ import absolute_import, print_function, division
+
+import os
+import logging
+import multiprocessing
+
+import h5py
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CompactionReport', 'live_bytes', 'compact_file', 'compact_files']
+
+
+class CompactionReport(object):
+    '''Summary of a compaction of a single file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file that has been (or would be) compacted.
+    size_before : int
+        File size, in bytes, before compaction.
+    size_after : int
+        File size, in bytes, after compaction. In a dry run this is an
+        estimate, equal to the number of bytes occupied by the live data.
+    dry_run : bool
+        Whether the file has been left untouched.
+    error : str or None
+        Error message if the compaction failed.
+    '''
+    def __init__(self, file_path, size_before, size_after, dry_run,
+                 error=None):
+        self.file_path = file_path
+        self.size_before = size_before
+        self.size_after = size_after
+        self.dry_run = dry_run
+        self.error = error
+
+    @property
+    def reclaimable(self):
+        '''Number of bytes reclaimed (or reclaimable in a dry run).'''
+        return max(self.size_before - self.size_after, 0)
+
+    @property
+    def success(self):
+        '''``True`` if no error occurred.'''
+        return self.error is None
+
+    def __str__(self):
+        if self.error is not None:
+            return '{0}: FAILED ({1})'.format(self.file_path, self.error)
+        return '{0}: {1} --> {2} bytes, {3} {4}'.format(
+            self.file_path, self.size_before, self.size_after,
+            self.reclaimable, 'reclaimable' if self.dry_run else 'reclaimed')
+
+
+def live_bytes(file_path):
+    '''Number of bytes occupied by the datasets reachable from the root group.
+
+    This does not include HDF5 metadata (object headers, B-trees, etc.).
+    '''
+    total = [0]
+
+    def _add(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            total[0] += obj.id.get_storage_size()
+
+    with h5py.File(file_path, 'r') as f:
+        f.visititems(_add)
+    return total[0]
+
+
+def _copy_attrs(src, dst):
+    '''Copy all HDF5 attributes from ``src`` to ``dst``.'''
+    for key, val in src.attrs.items():
+        dst.attrs[key] = val
+
+
+def _copy_dataset(name, src, dst_grp, chunks, compression, compression_opts):
+    '''Copy dataset ``src`` into ``dst_grp``, re-chunking and recompressing if
+    requested. The data are copied one block of chunks at a time so that big
+    datasets are never held in memory as a whole.
+    '''
+    if ((chunks is None and compression is None) or src.shape is None or
+            src.shape == () or src.size == 0):
+        dst_grp.copy(src, name)
+        return
+
+    kw = dict(
+        shape=src.shape,
+        dtype=src.dtype,
+        maxshape=src.maxshape,
+        chunks=src.chunks if chunks is None else chunks,
+        compression=src.compression if compression is None else compression,
+        compression_opts=(src.compression_opts if compression is None else
+                          compression_opts),
+        shuffle=src.shuffle,
+        fletcher32=src.fletcher32,
+    )
+    dst = dst_grp.create_dataset(name, **kw)
+    step = dst.chunks[0] if dst.chunks is not None else src.shape[0]
+    for start in range(0, src.shape[0], step):
+        stop = min(start + step, src.shape[0])
+        dst[start:stop] = src[start:stop]
+    _copy_attrs(src, dst)
+
+
+def _copy_group(src, dst, chunks, compression, compression_opts):
+    '''Recursively copy all the live objects from ``src`` to ``dst``.'''
+    _copy_attrs(src, dst)
+    for name, obj in src.items():
+        if isinstance(obj, h5py.Group):
+            _copy_group(obj, dst.create_group(name), chunks, compression,
+                        compression_opts)
+        elif isinstance(obj, h5py.Dataset):
+            _copy_dataset(name, obj, dst, chunks, compression,
+                          compression_opts)
+        else:
+            # Named data types, etc.
+            src.copy(obj, dst, name=name)
+
+
+def compact_file(file_path, chunks=None, compression=None,
+                 compression_opts=None, dry_run=False):
+    '''Compact a single HDF5 file in place.
+
+    The live objects are written into a temporary file in the same directory,
+    which then atomically replaces the original. The original file is left
+    untouched if anything fails.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the HDF5 file.
+    chunks : tuple, bool or None
+        New chunk shape applied to all datasets (``True`` lets h5py guess the
+        chunk shape). ``None`` keeps the original layout.
+    compression : str or None
+        New compression filter, e.g. ``'gzip'`` or ``'lzf'``. ``None`` keeps
+        the original filter.
+    compression_opts : any
+        Options of the compression filter, used only when ``compression`` is
+        set.
+    dry_run : bool
+        If ``True``, do not touch the file, only estimate the number of
+        reclaimable bytes.
+
+    Returns
+    -------
+    report : CompactionReport
+        Summary of the operation. Errors are reported here, not raised.
+    '''
+    size_before = os.path.getsize(file_path)
+    if dry_run:
+        try:
+            return CompactionReport(file_path, size_before,
+                                    live_bytes(file_path), dry_run=True)
+        except (IOError, OSError) as e:
+            return CompactionReport(file_path, size_before, size_before,
+                                    dry_run=True, error=str(e))
+
+    tmp_path = file_path + '.compacting'
+    try:
+        with h5py.File(file_path, 'r') as src:
+            with h5py.File(tmp_path, 'w') as dst:
+                _copy_group(src, dst, chunks, compression, compression_opts)
+        size_after = os.path.getsize(tmp_path)
+        os.rename(tmp_path, file_path)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warn('Compaction of %s failed: %s', file_path, str(e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return CompactionReport(file_path, size_before, size_before,
+                                dry_run=False, error=str(e))
+
+    logger.debug('Compacted %s: %d --> %d bytes', file_path, size_before,
+                 size_after)
+    return CompactionReport(file_path, size_before, size_after, dry_run=False)
+
+
+def _compact_file_star(args):
+    '''Unpack arguments for :func:`compact_file` inside a worker process.'''
+    file_path, kwargs = args
+    return compact_file(file_path, **kwargs)
+
+
+def compact_files(file_paths, processes=None, **kwargs):
+    '''Compact a list of HDF5 files in a pool of worker processes.
+
+    Files that do not exist are skipped.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Files to compact.
+    processes : int or None
+        Number of worker processes. ``None`` uses all the available CPUs, 1
+        compacts the files serially in the current process.
+    kwargs : keyword arguments
+        Passed on to :func:`compact_file`.
+
+    Returns
+    -------
+    reports : list of CompactionReport
+        One report for each existing file, in the order of ``file_paths``.
+    '''
+    jobs = [(path, kwargs) for path in file_paths if os.path.exists(path)]
+    if processes == 1 or len(jobs) <= 1:
+        return [_compact_file_star(job) for job in jobs]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_compact_file_star, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
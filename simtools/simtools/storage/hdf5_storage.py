@@ -14,6 +14,61 @@ from .interface import DataStorage
 
 modLogger = logging.getLogger(__name__)
 
+# Total size of the data loaded from HDF5 data sets, see bytes_read()
+_bytes_read = 0
+
+
+def bytes_read():
+    '''Total size (bytes) of the data loaded from HDF5 data sets by this
+    process.
+
+    The difference of two values is the amount of data a piece of code has
+    read, e.g. one analysis of one trial. The size is that of the loaded
+    (uncompressed) arrays.
+    '''
+    return _bytes_read
+
+
+def _count_bytes(value):
+    '''Add the size of a loaded ``value`` to :func:`bytes_read`.'''
+    global _bytes_read  # pylint: disable=global-statement
+    _bytes_read += getattr(value, 'nbytes', 0)
+    return value
+
+
+def _isSparseMatrix(value):
+    '''Check whether ``value`` is a :mod:`scipy.sparse` matrix, without
+    importing scipy.'''
+    return (type(value).__module__.startswith('scipy.sparse') and
+            hasattr(value, 'tocsr'))
+
+
+def _storeCSRMatrix(name, value, grp):
+    '''Store a CSR matrix ``value`` as a group ``name`` in ``grp``.'''
+    newGrp = grp.create_group(name)
+    newGrp.attrs['type'] = 'csr_matrix'
+    newGrp.attrs['shape'] = np.asarray(value.shape, dtype=np.int64)
+    for arrName in ('indptr', 'indices', 'data'):
+        arr = getattr(value, arrName)
+        if len(arr) == 0:
+            newGrp.create_dataset(name=arrName, data=arr)
+        else:
+            newGrp.create_dataset(name=arrName, data=arr, compression="gzip")
+
+
+def _loadCSRMatrix(grp):
+    '''Load a CSR matrix stored by :func:`_storeCSRMatrix` from ``grp``.'''
+    from scipy.sparse import csr_matrix
+    arrays = []
+    for arrName in ('data', 'indices', 'indptr'):
+        dset = grp[arrName]
+        if len(dset) == 0:
+            arrays.append(np.array([], dtype=dset.dtype))
+        else:
+            arrays.append(_count_bytes(dset[()]))
+    shape = tuple(int(n) for n in grp.attrs['shape'])
+    return csr_matrix(tuple(arrays), shape=shape)
+
 
 class HDF5DataStorage(DataStorage):
     '''
@@ -30,6 +85,7 @@ class HDF5DataStorage(DataStorage):
         * strings
         * Objects of class dict and classes derived from dict, containing all
             of the above types, including itself
+        * sparse matrices from :mod:`scipy.sparse` (see `Sparse matrices`_)
 
     All objects of non-dict type are stored in datasets, while for each dict a
     group is created (with a corresponding name).
@@ -70,6 +126,26 @@ class HDF5DataStorage(DataStorage):
     It is therefore recommended to convert the list to some other data type
     before storing it through this interface.
 
+    Sparse matrices
+    ---------------
+    A sparse matrix is stored in the compressed sparse row (CSR) format, as a
+    group with attribute 'type' == 'csr_matrix', which contains the ``indptr``,
+    ``indices`` and ``data`` arrays and the ``shape`` of the matrix. Matrices
+    in other sparse formats are converted to CSR before they are stored. When
+    accessed, a :class:`scipy.sparse.csr_matrix` is returned. :mod:`scipy` is
+    needed only when sparse matrices are stored or loaded.
+
+    Copying stored objects
+    ----------------------
+    A dict or list that is accessed from a (possibly different) HDF5 storage
+    can be assigned as a value, e.g.::
+
+        >>> d['trials'].append(other['trials'][0])
+
+    The object is then copied by the HDF5 library directly, without loading
+    it into memory, and resizable arrays (see :meth:`append_array`) stay
+    resizable.
+
     Cycles
     ------
     Note that in the current version, cycles are not detected in compound
@@ -104,10 +180,12 @@ class HDF5DataStorage(DataStorage):
                set to 'dict')
             2. List-like data set (a group again, with type attribute set to
                'list')
-            3. An atomic data (everything else)
+            3. A sparse matrix (a group with type attribute set to
+               'csr_matrix')
+            4. An atomic data (everything else)
 
-        1. and 2. will return a reference, 3. will return an actual copy of the
-           object.
+        1. and 2. will return a reference, 3. and 4. will return an actual
+           copy of the object.
         '''
         val = dataSet
         if isinstance(val, h5py.Group):
@@ -115,13 +193,15 @@ class HDF5DataStorage(DataStorage):
                 return HDF5MapStorage(self._file, val)
             elif val.attrs['type'] == 'list':
                 return HDF5ListStorage(self._file, val)
+            elif val.attrs['type'] == 'csr_matrix':
+                return _loadCSRMatrix(val)
             else:
                 raise Exception("Unknown type attribute encountered while "
                                 "parsing the get request. Please check "
                                 "whether your HDF5 file is in correct format")
         else:
             try:
-                return val.value
+                return _count_bytes(val.value)
             except ValueError:
                 if len(val) == 0:
                     return np.array([], dtype=val.dtype)
@@ -142,9 +222,17 @@ class HDF5DataStorage(DataStorage):
             * lists: list objects and classes inherited from list. A list is
               stored recursively as a group. See a note in `List performance`_
               for the performance limitations of storing lists.
+            * sparse matrices, stored as a group in the CSR format. See
+              `Sparse matrices`_.
+            * dicts and lists stored in an HDF5 storage, which are copied
+              natively. See `Copying stored objects`_.
         '''
         try:
-            if isinstance(value, MutableMapping):
+            if isinstance(value, HDF5DataStorage):
+                grp.copy(value._group, name)
+            elif _isSparseMatrix(value):
+                _storeCSRMatrix(name, value.tocsr(), grp)
+            elif isinstance(value, MutableMapping):
                 newGrp = grp.create_group(name)
                 newGrp.attrs['type'] = 'dict'
                 for k, v in iteritems(value):
@@ -225,6 +313,69 @@ class HDF5MapStorage(HDF5DataStorage, MutableMapping):
     def __iter__(self):
         return iter(self._group.keys())
 
+    def append_array(self, key, value, chunk_size=4096):
+        '''
+        Append ``value`` to an array stored under ``key``, along its first
+        axis.
+
+        The array is stored in a resizable, chunked dataset, which is created
+        on the first call. This makes it possible to store arrays of unknown
+        size incrementally, without holding the whole array in memory. When
+        accessed through the [] operator, the result is a normal array.
+
+        Parameters
+        ----------
+        key : str
+            Name of the array.
+        value : array-like
+            Data to append. All dimensions, except the first one, must match
+            those of the array already stored.
+        chunk_size : int
+            Chunk size along the first axis, used when creating the dataset.
+        '''
+        value = np.asanyarray(value)
+        if value.ndim == 0:
+            value = value.reshape(1)
+        if key not in self._group:
+            self._group.create_dataset(
+                name=key, data=value,
+                maxshape=(None,) + value.shape[1:],
+                chunks=(chunk_size,) + value.shape[1:],
+                compression="gzip")
+            return
+
+        dset = self._group[key]
+        if dset.shape[1:] != value.shape[1:]:
+            raise ValueError('Cannot append an array of shape {0} to a '
+                             'dataset of shape {1}.'.format(value.shape,
+                                                            dset.shape))
+        old_len = dset.shape[0]
+        dset.resize(old_len + value.shape[0], axis=0)
+        dset[old_len:] = value
+
+    def truncate_array(self, key, length):
+        '''
+        Shrink an array created by :meth:`append_array` to the first
+        ``length`` items along its first axis.
+
+        This can be used to discard data appended after a known consistent
+        point, for instance when resuming an interrupted simulation. If the
+        array is already shorter than ``length``, it is left unchanged.
+
+        Parameters
+        ----------
+        key : str
+            Name of the array.
+        length : int
+            New length of the first axis.
+        '''
+        if length < 0:
+            raise ValueError('Array length must be non-negative, got '
+                             '{0}.'.format(length))
+        dset = self._group[key]
+        if dset.shape[0] > length:
+            dset.resize(length, axis=0)
+
     def set_item_chained(self, keyTuple, value, overwriteLast=True):
         '''
         Set ``value`` into ``keyTuple[-1]``. ``keyTuple`` must contain only
@@ -0,0 +1,87 @@
+'''Tests of the simtools.storage.compaction module.'''
+from __future__ import absolute_import, print_function, division
+
+import os
+
+import numpy as np
+import h5py
+
+from simtools.storage.compaction import compact_file, compact_files
+
+
+def create_fragmented(path):
+    '''Create a file with a deleted dataset and some live data.'''
+    with h5py.File(path, 'w') as f:
+        grp = f.create_group('trials')
+        grp.attrs['type'] = 'list'
+        grp.create_dataset('0', data=np.arange(1000))
+        f.create_dataset('garbage', data=np.random.rand(100000))
+        f['scalar'] = 10
+        f.create_dataset('empty', data=np.array([]))
+    with h5py.File(path, 'a') as f:
+        del f['garbage']
+
+
+def check_content(path):
+    '''Check that the live data survived the compaction.'''
+    with h5py.File(path, 'r') as f:
+        assert f['trials'].attrs['type'] == 'list'
+        assert np.all(f['trials']['0'][()] == np.arange(1000))
+        assert f['scalar'][()] == 10
+        assert f['empty'].shape == (0,)
+        assert 'garbage' not in f
+
+
+class TestCompaction(object):
+    def test_compact(self, tmpdir):
+        path = str(tmpdir.join('job00000_output.h5'))
+        create_fragmented(path)
+        size_before = os.path.getsize(path)
+
+        report = compact_file(path)
+        assert report.success
+        assert report.size_before == size_before
+        assert report.size_after == os.path.getsize(path)
+        assert report.reclaimable > 100000 * 8 / 2
+        assert not os.path.exists(path + '.compacting')
+        check_content(path)
+
+    def test_recompress(self, tmpdir):
+        path = str(tmpdir.join('job00000_output.h5'))
+        create_fragmented(path)
+        report = compact_file(path, chunks=(100,), compression='gzip')
+        assert report.success
+        check_content(path)
+        with h5py.File(path, 'r') as f:
+            assert f['trials']['0'].chunks == (100,)
+            assert f['trials']['0'].compression == 'gzip'
+
+    def test_dry_run(self, tmpdir):
+        path = str(tmpdir.join('job00000_output.h5'))
+        create_fragmented(path)
+        size_before = os.path.getsize(path)
+        report = compact_file(path, dry_run=True)
+        assert report.success
+        assert report.reclaimable > 0
+        assert os.path.getsize(path) == size_before
+
+    def test_failure_keeps_original(self, tmpdir):
+        path = str(tmpdir.join('not_hdf5.h5'))
+        with open(path, 'w') as f:
+            f.write('not an HDF5 file')
+        report = compact_file(path)
+        assert not report.success
+        assert open(path).read() == 'not an HDF5 file'
+        assert not os.path.exists(path + '.compacting')
+
+    def test_pool(self, tmpdir):
+        paths = [str(tmpdir.join('job{0:05}_output.h5'.format(i)))
+                 for i in range(4)]
+        for path in paths:
+            create_fragmented(path)
+        reports = compact_files(paths + [str(tmpdir.join('missing.h5'))],
+                                processes=2)
+        assert [r.file_path for r in reports] == paths
+        for report, path in zip(reports, paths):
+            assert report.success
+            check_content(path)
@@ -2,7 +2,8 @@
 from __future__ import absolute_import, print_function, division
 
 import pytest
-from simtools.pipelines import PipelineStage, Pipeline, PipelineData
+from simtools.pipelines import (PipelineStage, ReducingStage, Pipeline,
+                                PipelineData)
 
 
 class Increment(PipelineStage):
@@ -20,6 +21,42 @@ def function_stage(data_in):
     return data_in
 
 
+def make_data(num):
+    '''Convert a number into a pipeline data object.'''
+    data = PipelineData()
+    data.items['num'] = num
+    return data
+
+
+class Square(PipelineStage):
+    '''A stateless stage, can be applied in worker processes.'''
+    stateless = True
+
+    def __call__(self, data_in):
+        data_in.items['num'] **= 2
+        return data_in
+
+
+class WrongReturnType(PipelineStage):
+    '''A stateless stage with a wrong return type for the pipeline.'''
+    stateless = True
+
+    def __call__(self, data_in):
+        return 'Wrong type'
+
+
+class Sum(ReducingStage):
+    '''Sum the numbers of the stream.'''
+    def initial(self):
+        return 0
+
+    def fold(self, accumulator, data_in):
+        return accumulator + data_in.items['num']
+
+    def finish(self, accumulator):
+        return make_data(accumulator)
+
+
 class TestPipeline(object):
     '''Test the pipeline class.'''
 
@@ -80,3 +117,74 @@ class TestPipeline(object):
         pipeline.append(wrong_return_type)
         with pytest.raises(TypeError):
             pipeline.run(PipelineData())
+
+
+class TestStream(object):
+    '''Test the streaming mode of the pipeline.'''
+
+    def _pipeline(self):
+        pipeline = Pipeline()
+        pipeline.append(make_data)
+        pipeline.append(Square())
+        pipeline.append(Increment())
+        return pipeline
+
+    def test_stream(self):
+        '''Outputs are in the order of the inputs.'''
+        pipeline = self._pipeline()
+        out = [data.items['num'] for data in pipeline.stream(range(10))]
+        assert out == [n**2 + 1 for n in range(10)]
+
+    def test_lazy(self):
+        '''Inputs are read only as the outputs are consumed.'''
+        read = []
+
+        def inputs():
+            for n in range(100):
+                read.append(n)
+                yield n
+
+        stream = self._pipeline().stream(inputs())
+        assert next(stream).items['num'] == 1
+        assert len(read) == 1
+
+    def test_parallel(self):
+        '''Stateless stages in worker processes, with a bounded queue.'''
+        pipeline = self._pipeline()
+        out = [data.items['num'] for data in
+               pipeline.stream(range(20), processes=2, queue_size=3)]
+        assert out == [n**2 + 1 for n in range(20)]
+
+        stats = pipeline.stats
+        assert [s.name for s in stats] == ['make_data', 'Square', 'Increment']
+        assert all(s.items == 20 for s in stats)
+        assert stats[1].max_queue_depth == 3
+        assert 0 < stats[1].mean_queue_depth <= 3
+        assert stats[2].max_queue_depth == 0
+
+    def test_reduce(self):
+        '''A reducing stage folds the stream into one data object.'''
+        pipeline = self._pipeline()
+        pipeline.append(Sum())
+        pipeline.append(Increment())
+        for processes in [1, 2]:
+            out = list(pipeline.stream(range(10), processes=processes))
+            assert len(out) == 1
+            assert out[0].items['num'] == sum(n**2 + 1 for n in range(10)) + 1
+            assert pipeline.stats[3].items == 10
+            assert pipeline.stats[4].items == 1
+
+        # A single data object in run()
+        pipeline = Pipeline()
+        pipeline.append(Sum())
+        pipeline.append(Increment())
+        assert pipeline.run(make_data(3)).items['num'] == 4
+
+    def test_return_type(self):
+        '''Test that a wrong return value is detected in a stream.'''
+        pipeline = Pipeline()
+        pipeline.append(WrongReturnType())
+        with pytest.raises(TypeError):
+            list(pipeline.stream(range(3)))
+        with pytest.raises(TypeError):
+            list(pipeline.stream(range(3), processes=2))
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, print_function, division
 
+import os
 import os.path
 
 import matplotlib
@@ -164,3 +165,113 @@ class TestEnvironment(object):
         out, _ = capsys.readouterr()
         assert out == "3\n10\n"
 
+
+class TestDependencies(object):
+    '''Test running computations with dependencies, serially and in
+    parallel.'''
+
+    class Producer(Computation):
+        '''Writes a number into a file.'''
+        def run_all(self, *args, **kwargs):
+            with open(self.get_fname('data.txt'), 'w') as f:
+                f.write('42')
+
+    class Consumer(Computation):
+        '''Copies the data of Producer.'''
+        def run_all(self, *args, **kwargs):
+            with open(self.get_fname('data.txt')) as f:
+                data = f.read()
+            with open(self.get_fname('copy.txt'), 'w') as f:
+                f.write(data)
+
+    class Failing(Computation):
+        '''Always fails.'''
+        def run_all(self, *args, **kwargs):
+            raise ValueError('Failing computation')
+
+    class Exiting(Computation):
+        '''Raises an exception not derived from Exception.'''
+        def run_all(self, *args, **kwargs):
+            raise SystemExit(1)
+
+    class Dying(Computation):
+        '''Kills its process without any cleanup.'''
+        def run_all(self, *args, **kwargs):
+            os._exit(3)
+
+    Consumer.dependencies = (Producer,)
+
+    @staticmethod
+    def get_env(tmpdir):
+        return Environment(ConfigObj({'output_dir': str(tmpdir)}))
+
+    @pytest.mark.parametrize('processes', [1, 2])
+    def test_class_dependencies(self, tmpdir, processes):
+        '''Producer is registered after Consumer but runs first.'''
+        env = self.get_env(tmpdir)
+        env.register_class(self.Consumer)
+        env.register_class(self.Producer)
+        summary = env.run(processes=processes)
+        assert summary.success
+        assert [r.name for r in summary.results] == ['Consumer', 'Producer']
+        assert tmpdir.join('copy.txt').read() == '42'
+
+    def test_depends_on(self, capsys):
+        env = Environment(ConfigObj({
+            'NumPrinter': {'number': 1},
+        }))
+        first = env.register_class(TestEnvironment.NumPrinter)
+        env.register_class(TestEnvironment.NumPrinter,
+                           config={'NumPrinter': {'number': 2}}
+                           ).depends_on(first)
+        first.depends_on(env.register_class(
+            TestEnvironment.NumPrinter, config={'NumPrinter': {'number': 3}}))
+        env.run()
+        out, _ = capsys.readouterr()
+        assert out == "3\n1\n2\n"
+
+    def test_cycle(self):
+        env = Environment(ConfigObj())
+        a = env.register_class(TestEnvironment.NumPrinter)
+        b = env.register_class(TestEnvironment.NumPrinter).depends_on(a)
+        a.depends_on(b)
+        with pytest.raises(ValueError):
+            env.run()
+
+    @pytest.mark.parametrize('processes', [1, 2])
+    def test_keep_going(self, tmpdir, processes):
+        '''Failures are collected; dependent computations are skipped.'''
+        env = self.get_env(tmpdir)
+        failing = env.register_class(self.Failing)
+        env.register_class(self.Producer)
+        env.register_class(self.Consumer).depends_on(failing)
+        summary = env.run(processes=processes, keep_going=True)
+        assert not summary.success
+        assert [r.index for r in summary.failures] == [0, 2]
+        assert 'Failing computation' in summary.results[0].error
+        assert summary.results[2].skipped
+        assert tmpdir.join('data.txt').check()
+        assert not tmpdir.join('copy.txt').check()
+
+    def test_stop_on_failure(self, tmpdir):
+        env = self.get_env(tmpdir)
+        env.register_class(self.Failing)
+        with pytest.raises(ValueError):
+            env.run()
+        with pytest.raises(RuntimeError):
+            env.run(processes=2)
+
+    def test_worker_dies(self, tmpdir):
+        '''Workers that die or raise BaseException are reported as failed
+        instead of blocking the run.'''
+        env = self.get_env(tmpdir)
+        dying = env.register_class(self.Dying)
+        env.register_class(self.Exiting)
+        env.register_class(self.Producer)
+        env.register_class(self.Consumer).depends_on(dying)
+        summary = env.run(processes=2, keep_going=True)
+        assert [r.index for r in summary.failures] == [0, 1, 3]
+        assert 'exited with code 3' in summary.results[0].error
+        assert 'SystemExit' in summary.results[1].error
+        assert summary.results[2].success
+        assert summary.results[3].skipped
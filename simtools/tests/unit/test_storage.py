@@ -6,6 +6,7 @@ import numbers
 
 import pytest
 from simtools.storage import DataStorage
+from simtools.storage.hdf5_storage import bytes_read
 
 notImplMsg = "Not implemented"
 
@@ -170,6 +171,100 @@ class TestHDF5Storage(object):
         assert np.all(arr == ds['empty'])
         assert len(ds['empty']) == 0
 
+    def test_bytes_read(self, tmpdir):
+        ds = open_storage(tmpdir, 'test_bytes_read.h5', 'w')
+        ds['arr'] = np.arange(100.)
+        ds['nested'] = {'arr': np.arange(10, dtype=np.int32)}
+        ds.close()
+
+        ds = open_storage(tmpdir, 'test_bytes_read.h5', 'r')
+        start = bytes_read()
+        ds['arr']
+        assert bytes_read() - start == 800
+        ds['nested']['arr']
+        assert bytes_read() - start == 840
+        ds.close()
+
+    def test_append_array(self, tmpdir):
+        ds = open_storage(tmpdir, 'test_append_array.h5', 'w')
+        ds['events'] = {}
+        ds['events'].append_array('times', np.array([], dtype=float))
+        assert len(ds['events']['times']) == 0
+
+        ds['events'].append_array('times', np.arange(10.))
+        ds['events'].append_array('times', np.arange(10., 25.),
+                                  chunk_size=3)
+        ds['events'].append_array('times', 25.)
+        assert np.all(ds['events']['times'] == np.arange(26.))
+
+        ds['events'].append_array('matrix', np.zeros((2, 3)))
+        ds['events'].append_array('matrix', np.ones((1, 3)))
+        assert ds['events']['matrix'].shape == (3, 3)
+        with pytest.raises(ValueError):
+            ds['events'].append_array('matrix', np.ones((1, 4)))
+        ds.close()
+
+    def test_truncate_array(self, tmpdir):
+        ds = open_storage(tmpdir, 'test_truncate_array.h5', 'w')
+        ds.append_array('times', np.arange(10.))
+        ds.truncate_array('times', 4)
+        assert np.all(ds['times'] == np.arange(4.))
+
+        # Longer than the array: no change
+        ds.truncate_array('times', 100)
+        assert len(ds['times']) == 4
+
+        # Appending continues after the truncated data
+        ds.append_array('times', np.arange(4., 6.))
+        assert np.all(ds['times'] == np.arange(6.))
+
+        ds.truncate_array('times', 0)
+        assert len(ds['times']) == 0
+        with pytest.raises(ValueError):
+            ds.truncate_array('times', -1)
+        ds.close()
+
+    def test_sparse_matrix(self, tmpdir):
+        sparse = pytest.importorskip('scipy.sparse')
+        dense = np.array([[0., 1., 0., 2.],
+                          [0., 0., 0., 0.],
+                          [3., 0., 0., 0.]])
+
+        ds = open_storage(tmpdir, 'test_sparse_matrix.h5', 'w')
+        ds['csr'] = sparse.csr_matrix(dense)
+        ds['coo'] = sparse.coo_matrix(dense)
+        ds['empty'] = sparse.csr_matrix((2, 5))
+        ds['nested'] = {'m': [sparse.csr_matrix(dense)]}
+        ds.close()
+
+        ds = open_storage(tmpdir, 'test_sparse_matrix.h5', 'r')
+        for M in (ds['csr'], ds['coo'], ds['nested']['m'][0]):
+            assert sparse.isspmatrix_csr(M)
+            assert M.shape == dense.shape
+            assert np.all(M.toarray() == dense)
+        assert ds['empty'].shape == (2, 5)
+        assert ds['empty'].nnz == 0
+        ds.close()
+
+    def test_copy_stored(self, tmpdir):
+        src = DataStorage.open(str(tmpdir.join('test_copy_src.h5')), 'w')
+        src['trials'] = [{'x': np.arange(5.), 'l': [1, 2, {'y': 3}]}]
+        src['trials'][0].append_array('times', np.arange(3.))
+        dst = DataStorage.open(str(tmpdir.join('test_copy_dst.h5')), 'w')
+        dst['trials'] = []
+
+        dst['trials'].append(src['trials'][0])
+        dst['copy'] = src['trials']
+        src.close()
+
+        trial = dst['trials'][0]
+        assert np.all(trial['x'] == np.arange(5.))
+        assert trial['l'][0] == 1 and trial['l'][2]['y'] == 3
+        trial.append_array('times', 3.)
+        assert np.all(trial['times'] == np.arange(4.))
+        assert len(dst['copy']) == 1
+        dst.close()
+
     def test_chained_getter(self, tmpdir):
         test_dict = dict(int=123,
                          float=111.1,